@@ -27,6 +27,7 @@ from prompits.AgentAddress import AgentAddress
 from prompits.Practice import Practice
 from prompits.messages.StatusMessage import StatusMessage
 from prompits.messages.UsePracticeMessage import UsePracticeRequest, UsePracticeResponse
+from prompits import Deadline
 
 # Global flag to control the main loop
 running = True
@@ -837,14 +838,16 @@ def handle_grpc_message(grpc_plug, message, client_socket=None, client_address=N
             else:
                 raise ValueError(f"sender not found in content, content: {content}")
             # pass content["body"]["practice_name"] as practice name, content["body"]["arguments"] as **kwargs
-            response = agent.UsePractice(content["body"]["practice_name"], **content["body"]["arguments"])
+            # the practice and the calls it makes stop waiting when the sender does
+            with Deadline.Scope(content["body"].get("deadline")):
+                response = agent.UsePractice(content["body"]["practice_name"], **content["body"]["arguments"])
             if "result" in response:
                 result = response["result"]
             else:
                 result = response
             print(f"Result: {result}")
             log(f"Result: {result}")
-            message = UsePracticeResponse(content["body"]["practice_name"],result,sender,recipients, content["msg_id"])
+            message = UsePracticeResponse(content["body"]["practice_name"],result,sender,recipients, msg_id=content["msg_id"])
             print(f"Sending UsePracticeResponse: {message}")
             log(f"Sending UsePracticeResponse: {message}")
             agent.SendMessage(message, recipients)
@@ -86,7 +86,9 @@ def main():
     arguments = {"tool_name":"list_directory","arguments":{"path":"/Users/alvincho/Downloads/temp"}}
     result = agent.UsePracticeRemote("filesystem/list_directory","Agent1@MainPlaza",arguments )
     print(f"\nResult: {result}")
-    content=json.loads(result[0]["content"])
+    content=result[0]["content"]
+    if isinstance(content, str):
+        content=json.loads(content)
     files = content["body"]["result"]["content"][0]
     print(f"File: {files["text"]}")
 
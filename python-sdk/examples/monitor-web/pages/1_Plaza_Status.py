@@ -552,7 +552,7 @@ with agent_detail_container:
                                                                 st.json(response_item)
                                                             elif 'content' in response_item:
                                                                 try:
-                                                                    content = json.loads(response_item['content'])
+                                                                    content = response_item['content'] if isinstance(response_item['content'], dict) else json.loads(response_item['content'])
                                                                     if 'error' in content:
                                                                         st.error(f"Practice execution failed: {content['error']}")
                                                                         st.json(content)
@@ -114,7 +114,7 @@ def main():
     #print(f"\n\n**** Received message: {result}\n\n")
     msg=result[0]
     print(f"msg: {msg}")
-    content=json.loads(msg["content"])
+    content=msg["content"] if isinstance(msg["content"], dict) else json.loads(msg["content"])
     #print(f"\n\n**** Response: {response}\n\n")
     #print(f"Response result: {response.keys()}")
     for practice in content["body"]["result"]:
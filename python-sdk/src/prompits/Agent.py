@@ -45,6 +45,9 @@
 # }
 
 from multiprocessing import Pool
+import asyncio
+import functools
+import hashlib
 import platform
 import uuid
 import psutil
@@ -58,23 +61,38 @@ import logging
 from typing import Dict, List, Any, Optional, Union, Callable
 from datetime import datetime
 import traceback
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 
 from .Plaza import Plaza
 from .Practice import Practice
 from .messages.UsePracticeMessage import UsePracticeRequest, UsePracticeResponse
 from .plazas.AgentPlaza import AgentPlaza
 from .plugs.gRPCPlug import gRPCPlug
+from .plugs.LoopbackPlug import LoopbackPlug
 from .services.APIService import APIService
 from .services.JobMarket import JobMarket
 from .LogEvent import LogEvent
 
 from .Message import Message
+from .FanOut import FanOut
+from .DedupCache import DedupCache
+from .PeerHealth import PeerHealth, PeerUnavailableError
+from .PeerDirectory import PeerDirectory
+from . import Deadline
 from .Plug import Plug
 from .Pit import Pit
 from .Pool import Pool
 from .pools.DatabasePool import DatabasePool
 from .AgentAddress import AgentAddress
 from .services.Pouch import Pouch
+# Plug types advertised by peers that accept gRPC calls
+GRPC_PLUG_TYPES = ("gRPCPlug", "AsyncGRPCPlug")
+# Status codes of ExecutePractice calls counted as failures of the peer, those worth a retry,
+# and those of a busy peer (retried, but not counted against its health)
+PEER_FAILURE_CODES = ("UNAVAILABLE", "DEADLINE_EXCEEDED")
+RETRYABLE_CODES = ("UNAVAILABLE",)
+BUSY_CODES = ("RESOURCE_EXHAUSTED",)
+
 # Setup logging
 logger = logging.getLogger('prompits')
 logger.setLevel(logging.DEBUG)
@@ -230,11 +248,29 @@ class Agent(Pit):
         self.connected_plazas : dict[str, Plaza] = {}
         self.running = False
         self.advertisement_threads = {}
+        self.advertised_hashes = {}  # plaza_name -> catalogue hash of the last full advertisement
+        self.plaza_subscriptions = {}  # plaza_name -> subscription to the membership changes of the plaza
         self.environments = self.detect_environments()
         self.message_handler = None
-        self.peer_list = {}  # Dictionary to store peer information
+        # Advertisements of the peers, loaded from the plazas with a TTL
+        self.peer_directory = PeerDirectory(self._list_plaza_agents)
+        self.peer_list = self.peer_directory.peers  # Dictionary to store peer information
         self.refresh_thread = None  # Thread for refreshing advertisements
         self.refresh_stop_event = None  # Event to signal the refresh thread to stop
+        self.grpc_client_plug = None  # Client plug used when the agent has no gRPCPlug of its own
+        self.tcp_client_plug = None  # Client plug used when the agent has no TCPPlug of its own
+        self.http_client_plug = None  # Client plug used when the agent has no HTTPPlug of its own
+        self.shm_client_plug = None  # Client plug used when the agent has no SharedMemoryPlug of its own
+        # Delivers messages to and from agents of this process, registered while the agent runs
+        self.loopback_plug = LoopbackPlug(f"{self.name}_loopback", f"Loopback plug of agent {self.name}").set_agent(self)
+        self.pending_requests: Dict[str, Future] = {}  # msg_id -> Future of requests waiting for a response
+        self.pending_lock = threading.Lock()
+        self.practice_call_mode = "direct"  # Default mode of UsePracticeRemote: "direct" or "message"
+        self.peer_call_modes: Dict[str, str] = {}  # agent_address -> call mode for that peer
+        self.fanout_workers = 16  # Maximum number of recipients SendMessage sends to at a time
+        self.fanout = None  # FanOut pool, created on first use
+        self.dedup_cache = DedupCache()  # Requests received, by msg_id, so retries are executed once
+        self.peer_health = PeerHealth()  # Retries and circuit breaker per peer
         
         # Add agent practices
         self.AddPractice(Practice("ListPits", self.ListPits))
@@ -243,6 +279,8 @@ class Agent(Pit):
         self.AddPractice(Practice("SendMessage", self.SendMessage))
         self.AddPractice(Practice("ReceiveMessage", self.ReceiveMessage))
         self.AddPractice(Practice("Advertise", self.Advertise))
+        self.AddPractice(Practice("PeerHealth", self.peer_health.Stats))
+        self.AddPractice(Practice("PeerDirectory", self.peer_directory.Stats))
         peer_list = []
 
     @property
@@ -372,6 +410,40 @@ class Agent(Pit):
                 self.log(f"Error importing TCPPlug: {str(e)}", 'ERROR')
                 return None
                 
+            # Create the component
+            try:
+                component = component_class(name, description, **config_copy)
+                return component
+            except Exception as e:
+                self.log(f"Error creating component {component_type} with name {name}: {str(e)}", 'ERROR')
+                traceback.print_exc()
+                return None
+        elif component_type == "HTTPPlug":
+            # Import the component class
+            try:
+                from prompits.plugs.HTTPPlug import HTTPPlug
+                component_class = HTTPPlug
+            except ImportError as e:
+                self.log(f"Error importing HTTPPlug: {str(e)}", 'ERROR')
+                return None
+                
+            # Create the component
+            try:
+                component = component_class(name, description, **config_copy)
+                return component
+            except Exception as e:
+                self.log(f"Error creating component {component_type} with name {name}: {str(e)}", 'ERROR')
+                traceback.print_exc()
+                return None
+        elif component_type == "SharedMemoryPlug":
+            # Import the component class
+            try:
+                from prompits.plugs.SharedMemoryPlug import SharedMemoryPlug
+                component_class = SharedMemoryPlug
+            except ImportError as e:
+                self.log(f"Error importing SharedMemoryPlug: {str(e)}", 'ERROR')
+                return None
+                
             # Create the component
             try:
                 component = component_class(name, description, **config_copy)
@@ -389,6 +461,23 @@ class Agent(Pit):
                 self.log(f"Error importing gRPCPlug: {str(e)}", 'ERROR')
                 return None
                 
+            # Create the component
+            try:
+                component = component_class(name, description, **config_copy)
+                return component
+            except Exception as e:
+                self.log(f"Error creating component {component_type} with name {name}: {str(e)}", 'ERROR')
+                traceback.print_exc()
+                return None
+        elif component_type == "AsyncGRPCPlug":
+            # Import the component class
+            try:
+                from prompits.plugs.AsyncGRPCPlug import AsyncGRPCPlug
+                component_class = AsyncGRPCPlug
+            except ImportError as e:
+                self.log(f"Error importing AsyncGRPCPlug: {str(e)}", 'ERROR')
+                return None
+                
             # Create the component
             try:
                 component = component_class(name, description, **config_copy)
@@ -496,6 +585,8 @@ class Agent(Pit):
         for plug_name, plug in agent_info.plugs.items():
             # create the plug
             agent.plugs[plug_name] = agent.create_component(plug["type"], plug)
+            if agent.plugs[plug_name] is not None:
+                agent.plugs[plug_name].set_agent(agent)
             agent.log(f"Added plug {plug_name} to agent {agent.name}", 'DEBUG')
         # Process pools
         for pool_name, pool in agent_info.pools.items():
@@ -666,57 +757,323 @@ class Agent(Pit):
             "memory": memory_info
         }
 
-    def SendMessage(self, message: Message, recipients: List[AgentAddress]):
+    def SendMessage(self, message: Message, recipients: List[AgentAddress], min_acks: int = None, timeout: float = None):
         """
         Send a message to other agents.
         
+        Recipients are sent to concurrently on the fan-out pool of the agent
+        (fanout_workers threads), a single recipient on the calling thread.
+        
         Args:
             message: The message to send
-            recipients: List of AgentAddress objects
+            recipients: List of AgentAddress objects, dicts or "agent_id@plaza_name" strings
+            min_acks: Return as soon as this many recipients acknowledged the message,
+                None waits for every recipient
+            timeout: Seconds to wait for min_acks, None waits for the sends to finish
             
         Returns:
-            bool: True if the message was sent successfully, False otherwise
+            DeliveryReport: Result per recipient, true if min_acks recipients acknowledged
         """
         self.log(f"Sending message to {len(recipients)} recipients", 'DEBUG')
+        # remember the response of a request, duplicates of the request are answered with it
+        if getattr(message, 'type', None) == "UsePracticeResponse" and message.msg_id:
+            self.dedup_cache.Complete(message.msg_id, message)
+        addresses = {}
         for recipient in recipients:
             if isinstance(recipient, str):
                 recipient = AgentAddress(recipient.split('@')[0], recipient.split('@')[1])
-                recipient_string = recipient.to_string()
             elif isinstance(recipient, dict):
-                recipient_string = recipient['agent_id']+'@'+recipient['plaza_name']
                 recipient = AgentAddress(recipient['agent_id'], recipient['plaza_name'])
-            else:
-                recipient_string = recipient.to_string()
-            
-            self.log(f"Processing recipient: {recipient_string}", 'DEBUG')
-            
-            if recipient.to_string() not in self.peer_list.keys():
-                self.log(f"Recipient {recipient} not in peer list, attempting to advertise", 'DEBUG')
-                self.Advertise(recipient.plaza_name)
-                if recipient.to_string() not in self.peer_list.keys():
-                    self.log(f"Recipient {recipient} not found in peer list after advertising", 'ERROR')
-                    raise ValueError(f"Recipient {recipient} not found in peer list")
-            
-            if recipient.to_string() in self.peer_list.keys():
-                plugs_info = self.peer_list[recipient.to_string()]['agent_info']['components']['plugs']
-                for plug_info in plugs_info:
-                    if "type" in plugs_info[plug_info]:
-                        if plugs_info[plug_info]['type'] == 'gRPCPlug':
-                            address={"host": plugs_info[plug_info]['host'], "port": plugs_info[plug_info]['port']}
-                            plug = gRPCPlug(address["host"], address["port"])
-                            #f"Sending via gRPCPlug to {address}")
-                            self.log(f"Sending via gRPCPlug to {address}", 'DEBUG')
-                            if plug.SendMessage(recipient, message, address):
-                                return True
-                        else:
-                            self.log(f"Unsupported plug type: {plugs_info[plug_info]['type']}", 'ERROR')
-                            raise ValueError(f"Unsupported plug type: {plugs_info[plug_info]['type']}")
-                    else:   
-                        self.log(f"No plug type specified in plug info", 'ERROR')
-                        raise ValueError(f"No plug type: {plug_info}")
-            else:
-                self.log(f"Recipient {recipient} not found in peer list", 'ERROR')
-                raise ValueError(f"Recipient {recipient} not found in peer list")
+            addresses[recipient.to_string()] = recipient
+        
+        report = self._get_fanout().Send(
+            lambda key: self.peer_health.Call(key, lambda: self._SendToRecipient(message, addresses[key])),
+            list(addresses), min_acks, timeout)
+        for recipient, error in report.errors.items():
+            self.log(f"Failed to send message to {recipient}: {error}", 'ERROR')
+        return report
+
+    def _SendToRecipient(self, message: Message, recipient: AgentAddress) -> bool:
+        """
+        Send a message to one recipient through a plug it advertises.
+        
+        Args:
+            message: The message to send
+            recipient: Address of the recipient
+            
+        Returns:
+            bool: True if the message was delivered, False otherwise
+            
+        Raises:
+            ValueError: If the recipient is unknown or advertises no usable plug
+        """
+        # an agent of this process gets the message without encoding it
+        if self.loopback_plug.IsLocal(recipient):
+            self.log(f"Sending via LoopbackPlug to {recipient}", 'DEBUG')
+            return self.loopback_plug.SendMessage(recipient, message)
+        
+        peer = self.peer_directory.Lookup(recipient.to_string())
+        if peer is None:
+            self.log(f"Recipient {recipient} is not active on plaza {recipient.plaza_name}", 'ERROR')
+            raise ValueError(f"Recipient {recipient} not found in peer list")
+        
+        plugs_info = peer['agent_info']['components']['plugs']
+        # a peer on the same host is reached through shared memory before any network plug
+        for plug_info in plugs_info:
+            if plugs_info[plug_info].get('type') == "SharedMemoryPlug":
+                plug = self._get_shm_plug()
+                if plug.IsLocal(plugs_info[plug_info]):
+                    self.log(f"Sending via SharedMemoryPlug to inbox {plugs_info[plug_info]['inbox']}", 'DEBUG')
+                    if plug.SendMessage(recipient, message, plugs_info[plug_info]):
+                        return True
+        for plug_info in plugs_info:
+            if "type" in plugs_info[plug_info]:
+                if plugs_info[plug_info]['type'] == "SharedMemoryPlug":
+                    # tried above, not reachable from another host
+                    continue
+                elif plugs_info[plug_info]['type'] in GRPC_PLUG_TYPES:
+                    address={"host": plugs_info[plug_info]['host'], "port": plugs_info[plug_info]['port']}
+                    plug = self._get_grpc_plug()
+                    self.log(f"Sending via gRPCPlug to {address}", 'DEBUG')
+                    # pass the whole advertised info so the plug sees the features the peer supports
+                    if plug.SendMessage(recipient, message, plugs_info[plug_info]):
+                        return True
+                elif plugs_info[plug_info]['type'] == "TCPPlug":
+                    plug = self._get_tcp_plug()
+                    self.log(f"Sending via TCPPlug to {plugs_info[plug_info].get('host')}:{plugs_info[plug_info].get('port')}", 'DEBUG')
+                    if plug.SendMessage(recipient, message, plugs_info[plug_info]):
+                        return True
+                elif plugs_info[plug_info]['type'] == "HTTPPlug":
+                    plug = self._get_http_plug()
+                    self.log(f"Sending via HTTPPlug to {plugs_info[plug_info].get('host')}:{plugs_info[plug_info].get('port')}", 'DEBUG')
+                    if plug.SendMessage(recipient, message, plugs_info[plug_info]):
+                        return True
+                else:
+                    self.log(f"Unsupported plug type: {plugs_info[plug_info]['type']}", 'ERROR')
+                    raise ValueError(f"Unsupported plug type: {plugs_info[plug_info]['type']}")
+            else:   
+                self.log(f"No plug type specified in plug info", 'ERROR')
+                raise ValueError(f"No plug type: {plug_info}")
+        return False
+
+    def _get_fanout(self) -> FanOut:
+        """
+        Get the pool sending messages to many recipients, creating it on first use.
+        
+        Returns:
+            FanOut: The fan-out pool
+        """
+        if self.fanout is None:
+            with self.pending_lock:
+                if self.fanout is None:
+                    self.fanout = FanOut(self.fanout_workers, f"{self.name}_fanout")
+        return self.fanout
+
+    def _list_plaza_agents(self, plaza_name: str) -> List[Dict[str, Any]]:
+        """
+        Get the active agents of a plaza, for the peer directory.
+        
+        Args:
+            plaza_name: Name of the plaza
+            
+        Returns:
+            list: The agents returned by ListActiveAgents, [] if the agent is not on the plaza
+        """
+        plaza = self.plazas.get(plaza_name)
+        if plaza is None:
+            return []
+        return plaza.UsePractice('ListActiveAgents')
+
+    def _get_peer_grpc_info(self, recipient: AgentAddress):
+        """
+        Get the connection information of the gRPCPlug advertised by a peer.
+        
+        Args:
+            recipient: Address of the peer
+            
+        Returns:
+            dict: {"host": str, "port": int}, or None if the peer has no gRPCPlug
+        """
+        peer = self.peer_directory.Lookup(recipient.to_string())
+        if peer is None:
+            self.log(f"Recipient {recipient} not found in peer list", 'ERROR')
+            return None
+        plugs_info = peer['agent_info']['components']['plugs']
+        for plug_info in plugs_info.values():
+            if plug_info.get('type') in GRPC_PLUG_TYPES:
+                return {"host": plug_info['host'], "port": plug_info['port']}
+        return None
+
+    def SetPracticeCallMode(self, mode: str, agent_address: str = None):
+        """
+        Set how UsePracticeRemote calls remote practices.
+        
+        "direct" executes the practice with one ExecutePractice RPC, "message" sends a
+        UsePracticeRequest and waits for the UsePracticeResponse message.
+        
+        Args:
+            mode: "direct" or "message"
+            agent_address: Peer in the format "agent_id@plaza_name", None sets the default for all peers
+            
+        Returns:
+            bool: True if set successfully
+        """
+        if mode not in ("direct", "message"):
+            raise ValueError(f"Invalid practice call mode: {mode}")
+        if agent_address is None:
+            self.practice_call_mode = mode
+        else:
+            self.peer_call_modes[agent_address] = mode
+        return True
+
+    def _UsePracticeDirect(self, practice: str, agent_id: str, plaza_name: str, practice_input: dict, timeout: float):
+        """
+        Execute a practice on a remote agent with one ExecutePractice RPC.
+        
+        The result is returned in the same form as a response received on the message path.
+        
+        Args:
+            practice: The practice to use
+            agent_id: ID of the remote agent
+            plaza_name: Plaza of the remote agent
+            practice_input: Input parameters of the practice
+            timeout: Deadline of the call in seconds
+            
+        Returns:
+            list or dict: List with the response message, {"error": ...} on failure,
+                or None if the peer cannot execute practices directly
+        """
+        recipient = AgentAddress(agent_id, plaza_name)
+        # an agent of this process runs the practice on the calling thread, arguments are not encoded
+        deadline = time.time() + timeout
+        response = self.loopback_plug.ExecutePractice(recipient, practice, practice_input, deadline)
+        if response is not None:
+            return self._DirectPracticeResult(practice, recipient, plaza_name, response)
+        plug_info = self._get_peer_grpc_info(recipient)
+        if plug_info is None:
+            return None
+        # retries reuse the request id, the peer executes the practice once
+        request_id = str(uuid.uuid4())
+        response = self.peer_health.Call(
+            recipient.to_string(),
+            lambda: self._get_grpc_plug().ExecutePractice(practice, practice_input, plug_info,
+                                                          max(deadline - time.time(), 0.001), request_id=request_id),
+            failed=self._peer_failed, retryable=lambda r: r.get("code") in RETRYABLE_CODES,
+            deadline=deadline, busy=self._peer_busy)
+        if response is None:
+            return None
+        return self._DirectPracticeResult(practice, recipient, plaza_name, response)
+
+    @staticmethod
+    def _peer_failed(response) -> bool:
+        """
+        Whether the result of an ExecutePractice call means the peer could not be reached.
+        """
+        return response is not None and response.get("code") in PEER_FAILURE_CODES
+
+    @staticmethod
+    def _peer_busy(response) -> bool:
+        """
+        Whether the result of an ExecutePractice call means the peer is healthy but busy.
+        """
+        return response is not None and response.get("code") in BUSY_CODES
+
+    def _DirectPracticeResult(self, practice: str, recipient: AgentAddress, plaza_name: str, response: dict):
+        """
+        Convert the result of an ExecutePractice call into the result of UsePracticeRemote.
+        
+        The result has the form of a response received in message mode: a list with the
+        dict a plug delivers, its content the decoded UsePracticeResponse.
+        """
+        agent_id = recipient.agent_id
+        if not response["success"]:
+            self.log(f"Error executing practice {practice} on agent {agent_id}: {response['error']}", 'ERROR')
+            return {"error": response["error"]}
+        message = UsePracticeResponse(practice, response["result"], recipient, [AgentAddress(self.agent_id, plaza_name)], msg_id=str(uuid.uuid4()))
+        return [{
+            'id': message.msg_id,
+            'type': 'Message',
+            'content': message.ToJson(),
+            'timestamp': int(time.time())
+        }]
+
+    def _get_grpc_plug(self):
+        """
+        Get a gRPCPlug to send messages with.
+        
+        Uses one of the agent's own gRPCPlugs if it has any, otherwise a client plug
+        created on first use. Either way the channels come from the shared ChannelManager,
+        so no connection is set up per message.
+        
+        Returns:
+            gRPCPlug: The plug to send with
+        """
+        for plug in self.plugs.values():
+            if isinstance(plug, gRPCPlug):
+                return plug
+        if self.grpc_client_plug is None:
+            self.grpc_client_plug = gRPCPlug(f"{self.name}_grpc_client", f"gRPC client plug of agent {self.name}")
+            self.grpc_client_plug.set_agent(self)
+        return self.grpc_client_plug
+
+    def _get_tcp_plug(self):
+        """
+        Get a TCPPlug to send messages with.
+        
+        Uses one of the agent's own TCPPlugs if it has any, otherwise a client plug
+        created on first use. The plug keeps its connections to peers open and reuses them.
+        
+        Returns:
+            TCPPlug: The plug to send with
+        """
+        from .plugs.TCPPlug import TCPPlug
+        for plug in self.plugs.values():
+            if isinstance(plug, TCPPlug):
+                return plug
+        if self.tcp_client_plug is None:
+            self.tcp_client_plug = TCPPlug(f"{self.name}_tcp_client", f"TCP client plug of agent {self.name}")
+            self.tcp_client_plug.set_agent(self)
+        return self.tcp_client_plug
+
+    def _get_http_plug(self):
+        """
+        Get an HTTPPlug to send messages with.
+        
+        Uses one of the agent's own HTTPPlugs if it has any, otherwise a client plug
+        created on first use. The plug keeps a pooled session per peer, so connections
+        are kept alive across messages.
+        
+        Returns:
+            HTTPPlug: The plug to send with
+        """
+        from .plugs.HTTPPlug import HTTPPlug
+        for plug in self.plugs.values():
+            if isinstance(plug, HTTPPlug):
+                return plug
+        if self.http_client_plug is None:
+            self.http_client_plug = HTTPPlug(f"{self.name}_http_client", f"HTTP client plug of agent {self.name}")
+            self.http_client_plug.set_agent(self)
+        return self.http_client_plug
+
+    def _get_shm_plug(self):
+        """
+        Get a SharedMemoryPlug to send messages with.
+        
+        Uses one of the agent's own SharedMemoryPlugs if it has any, otherwise a client
+        plug created on first use. The client plug only writes to the inboxes of peers,
+        it does not read an inbox of its own.
+        
+        Returns:
+            SharedMemoryPlug: The plug to send with
+        """
+        from .plugs.SharedMemoryPlug import SharedMemoryPlug
+        for plug in self.plugs.values():
+            if isinstance(plug, SharedMemoryPlug):
+                return plug
+        if self.shm_client_plug is None:
+            self.shm_client_plug = SharedMemoryPlug(f"{self.name}_shm_client", f"Shared memory client plug of agent {self.name}")
+            self.shm_client_plug.set_agent(self)
+        return self.shm_client_plug
 
     def ReceiveMessage(self, msg_count: int = 0):
         """
@@ -730,9 +1087,12 @@ class Agent(Pit):
         self.log(f"Receiving messages (count: {msg_count})", 'INFO')
         #print(f"Receiving messages (count: {msg_count})")
         msg_list:[Message] = []
-        for plug in self.plugs.values():
+        for plug in list(self.plugs.values()) + [self.loopback_plug]:
             try:
                 message = plug.UsePractice("ReceiveMessage", msg_count)
+                if message is not None and self._expired_request(message):
+                    self.log(f"Deadline of a request received by plug {plug.name} exceeded while it waited, dropping it", 'WARNING')
+                    continue
                 msg_list.append(message)
                 #print(f"\n\n**** Message: {message}\n\n")
                 self.log(f"Received message {message} from plug {plug.name}", 'DEBUG')
@@ -744,6 +1104,133 @@ class Agent(Pit):
         return msg_list
         
 
+    def receive_message(self, message):
+        """
+        Handle a message delivered by a plug.
+        
+        If the message is a UsePracticeResponse answering a pending request,
+        the future of the request is completed with the message.
+        
+        A UsePracticeRequest already received (a retry) is consumed: it is answered
+        with the response sent for the first one, if there is one yet. A request whose
+        deadline has passed is consumed and dropped, its sender no longer waits for it.
+        
+        A PlazaChanges message (membership changes pushed by a plaza the agent
+        subscribed to) is consumed and applied to the peer directory.
+        
+        Args:
+            message: The received message, a Message or the dict delivered by the plug
+            
+        Returns:
+            bool: True if the message answered a pending request, duplicated a
+                received request or was a PlazaChanges message, False otherwise
+        """
+        msg_type, msg_id = self._get_message_type_and_id(message)
+        if msg_type == "PlazaChanges":
+            changes = self._get_message_body(message)
+            if isinstance(changes, dict):
+                self.peer_directory.Apply(changes)
+            return True
+        if msg_type == "UsePracticeRequest" and Deadline.Expired(Deadline.Of(message)):
+            self.log(f"Deadline of request {msg_id} exceeded before it was handled, dropping it", 'WARNING')
+            return True
+        if msg_type == "UsePracticeRequest" and msg_id:
+            return self._deduplicate_request(msg_id)
+        if msg_type != "UsePracticeResponse" or not msg_id:
+            return False
+        with self.pending_lock:
+            future = self.pending_requests.pop(msg_id, None)
+        if future is None:
+            self.log(f"Received response {msg_id} with no pending request", 'DEBUG')
+            return False
+        if not future.done():
+            future.set_result(message)
+        return True
+
+    def _expired_request(self, message) -> bool:
+        """
+        Whether a received message is a UsePracticeRequest whose deadline has passed.
+        """
+        msg_type, _ = self._get_message_type_and_id(message)
+        return msg_type == "UsePracticeRequest" and Deadline.Expired(Deadline.Of(message))
+
+    def _deduplicate_request(self, msg_id: str) -> bool:
+        """
+        Record a received UsePracticeRequest, answering it if it duplicates a request already answered.
+        
+        Args:
+            msg_id: ID of the request
+            
+        Returns:
+            bool: True if the request is a duplicate and must not be handled again
+        """
+        future, new = self.dedup_cache.Begin(msg_id)
+        if new:
+            return False
+        if future.done():
+            response = future.result()
+            self.log(f"Duplicate request {msg_id}, sending the response again", 'DEBUG')
+            # not on the thread of the plug delivering messages
+            self._get_fanout().executor.submit(self.SendMessage, response, list(response.recipients))
+        else:
+            self.log(f"Duplicate request {msg_id} received while it is handled, dropping it", 'DEBUG')
+        return True
+
+    def _get_message_content(self, message):
+        """
+        Get the decoded content of a message delivered by a plug as a dict.
+        
+        Plugs deliver the content either decoded (typed and codec encoded messages)
+        or as the message JSON. The JSON is decoded once and replaces the string in
+        the delivered dict, so later reads (deadline, body, the caller of
+        ReceiveMessage) use the decoded content.
+        
+        Args:
+            message: The dict delivered by the plug
+            
+        Returns:
+            dict: The content, None if it is not a JSON object
+        """
+        if not isinstance(message, dict):
+            return None
+        content = message.get("content", message)
+        if isinstance(content, str):
+            try:
+                content = json.loads(content)
+            except json.JSONDecodeError:
+                return None
+            if isinstance(content, dict) and "content" in message:
+                message["content"] = content
+        return content if isinstance(content, dict) else None
+
+    def _get_message_type_and_id(self, message):
+        """
+        Get the type and msg_id of a received message.
+        
+        Plugs deliver either a Message or a dict whose content is the message JSON.
+        
+        Args:
+            message: The received message
+            
+        Returns:
+            tuple: (type, msg_id), None for values that cannot be found
+        """
+        if isinstance(message, Message):
+            return message.type, message.msg_id
+        content = self._get_message_content(message)
+        if content is None:
+            return None, None
+        return content.get("type"), content.get("msg_id")
+
+    def _get_message_body(self, message):
+        """
+        Get the body of a received message, a Message or a dict whose content is the message JSON.
+        """
+        if isinstance(message, Message):
+            return message.body
+        content = self._get_message_content(message)
+        return content.get("body") if content is not None else None
+
     def remove_pit(self, pit_name: str):
         """
         Remove a pit from the agent.
@@ -963,20 +1450,60 @@ class Agent(Pit):
             
             # Advertise the agent on the plaza
             result = plaza.Advertise(self.agent_id, self.name, self.description, agent_info)
+            if result:
+                self.advertised_hashes[plaza_name] = self._catalogue_hash(agent_info)
             print(f"Advertised agent {self.agent_id} on plaza {plaza_name}")
             self.log(f"Advertised agent {self.agent_id} on plaza {plaza_name}", 'INFO')
-
-            # load peer list from plaza
-            active_agents = plaza.UsePractice('ListActiveAgents')
-            for agent in active_agents:
-                self.peer_list[agent['agent_id']+ '@' + plaza_name] = agent
-                self.peer_list[agent['agent_name']+ '@' + plaza_name] = agent
             return result
         except Exception as e:
             self.log(f"Error advertising agent: {str(e)}\n{traceback.format_exc()}", 'ERROR')
             traceback.print_exc()
             return False
 
+    @staticmethod
+    def _catalogue_hash(agent_info: Dict[str, Any]) -> str:
+        """
+        Hash the catalogue of an advertisement: the agent, its components and practices,
+        without the environments, which change at every refresh.
+        
+        Args:
+            agent_info: The advertisement (Agent.ToJson)
+            
+        Returns:
+            str: Hex digest of the catalogue
+        """
+        def catalogue(value):
+            if isinstance(value, dict):
+                return {k: catalogue(v) for k, v in value.items() if k != "environments"}
+            if isinstance(value, (list, tuple)):
+                return [catalogue(v) for v in value]
+            return value
+        data = json.dumps(catalogue(agent_info), sort_keys=True, default=str)
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def RefreshAdvertisement(self, plaza_name: str):
+        """
+        Keep the advertisement of the agent on a plaza alive.
+        
+        Sends a heartbeat, which only updates the advertisement time, while the catalogue
+        is the one last advertised on the plaza. The agent is advertised again in full when
+        its catalogue changed, or when the plaza has no active advertisement of it anymore.
+        
+        Args:
+            plaza_name: Name of the plaza
+            
+        Returns:
+            bool: True if refreshed successfully, False otherwise
+        """
+        plaza = self.plazas.get(plaza_name)
+        advertised = self.advertised_hashes.get(plaza_name)
+        if advertised is not None and hasattr(plaza, 'Heartbeat'):
+            if advertised == self._catalogue_hash(self.ToJson()) and plaza.Heartbeat(self.agent_id):
+                self.log(f"Sent heartbeat to plaza {plaza_name}", 'DEBUG')
+                return True
+            self.log(f"Catalogue changed or advertisement expired, advertising again on plaza {plaza_name}", 'DEBUG')
+        return self.Advertise(plaza_name)
+
     def start_advertisement_refresh(self, plaza_name: str, interval: int = 60):
         """
         Start refreshing advertisements on a plaza.
@@ -1068,7 +1595,7 @@ class Agent(Pit):
             while not stop_event.is_set():
                 try:
                     # Refresh advertisement
-                    self.Advertise(plaza_name)
+                    self.RefreshAdvertisement(plaza_name)
                 except Exception as e:
                     self.log(f"Error refreshing advertisement on plaza {plaza_name}: {str(e)}", 'ERROR')
                     traceback.print_exc()
@@ -1127,6 +1654,9 @@ class Agent(Pit):
         self.running = True
         self.log("Starting agent", 'INFO')
         
+        # Make the agent reachable from the other agents of this process
+        self.loopback_plug.start()
+        
         # Start all plugs
         for plug_name, plug in self.plugs.items():
             if hasattr(plug, 'start'):
@@ -1156,6 +1686,18 @@ class Agent(Pit):
                 self.log(f"Error advertising on plaza {plaza_name}: {str(e)}", 'ERROR')
                 traceback.print_exc()
         
+        # Follow the membership changes of the running plazas instead of reloading them
+        for plaza_name, plaza in self.plazas.items():
+            if getattr(plaza, 'running', False) and hasattr(plaza, 'SubscribeChanges'):
+                try:
+                    changes = plaza.SubscribeChanges(plaza.version, subscriber=self.peer_directory.Apply)
+                    self.plaza_subscriptions[plaza_name] = changes["subscription_id"]
+                except Exception as e:
+                    self.log(f"Error subscribing to the changes of plaza {plaza_name}: {str(e)}", 'ERROR')
+        
+        # Keep the advertisements of the peers fresh in the background
+        self.peer_directory.Start()
+        
         # Start automatic advertisement refresh if requested
         if auto_refresh:
             try:
@@ -1205,6 +1747,34 @@ class Agent(Pit):
                 self.log(f"Error stopping advertisement refresh for plaza {plaza_name}: {str(e)}", 'ERROR')
                 traceback.print_exc()
         
+        # Agents of this process can no longer reach this one directly
+        self.loopback_plug.stop()
+        self.peer_directory.Stop()
+        for plaza_name, subscription_id in list(self.plaza_subscriptions.items()):
+            plaza = self.plazas.get(plaza_name)
+            if plaza is not None and hasattr(plaza, 'UnsubscribeChanges'):
+                plaza.UnsubscribeChanges(subscription_id)
+        self.plaza_subscriptions.clear()
+        
+        # Stop the fan-out pool, sends in progress finish in the background
+        if self.fanout is not None:
+            self.fanout.Shutdown()
+            self.fanout = None
+
+        # Close the streams and connections of the client plugs
+        if self.grpc_client_plug is not None:
+            self.grpc_client_plug.stop()
+            self.grpc_client_plug = None
+        if self.shm_client_plug is not None:
+            self.shm_client_plug.stop()
+            self.shm_client_plug = None
+        if self.tcp_client_plug is not None:
+            self.tcp_client_plug.stop()
+            self.tcp_client_plug = None
+        if self.http_client_plug is not None:
+            self.http_client_plug.stop()
+            self.http_client_plug = None
+
         # Stop all pits
         for pit_type, pit_type_dict in list(self.pits.items()):
             for pit_name, pit in pit_type_dict.items():
@@ -1664,7 +2234,7 @@ class Agent(Pit):
                 # Refresh advertisements on all plazas
                 for plaza_name in plazas:
                     try:
-                        self.Advertise(plaza_name)
+                        self.RefreshAdvertisement(plaza_name)
                     except Exception as e:
                         self.log(f"Error refreshing advertisement on plaza {plaza_name}: {str(e)}", 'ERROR')
                         traceback.print_exc()
@@ -1821,7 +2391,7 @@ class Agent(Pit):
             self.log(f"Error adding component {component_type}/{component_name}: {str(e)}", 'ERROR')
             return False
 
-    def UsePracticeRemote(self, practice: str, agent_address: str, practice_input: dict = None):
+    def UsePracticeRemote(self, practice: str, agent_address: str, practice_input: dict = None, timeout: float = 20, mode: str = None):
         """
         Use a practice from a remote agent.
         
@@ -1837,11 +2407,17 @@ class Agent(Pit):
             practice: The practice to use, can be in the format "pit_name/practice_name" or just "practice_name"
             agent_address: The address of the agent to call in the format "agent_id@plaza_name"
             practice_input: Dictionary containing input parameters for the practice
+            timeout: Seconds to wait for the response of a remote agent, shortened to the
+                time left when called from a practice with a deadline (see Deadline)
+            mode: "direct" to execute the practice with one ExecutePractice RPC, "message" to send
+                a UsePracticeRequest message. Defaults to the mode set for the peer with
+                SetPracticeCallMode. Direct calls fall back to messages if the peer lacks the RPC.
             
         Returns:
             dict: A dictionary containing the result of the practice or error information
                 Success case: {"result": <result_value>, ...}
                 Error case: {"error": <error_message>}
+            For remote agents the success case is a list with the received response message.
                 
         Raises:
             No exceptions are raised; errors are returned in the result dictionary
@@ -1890,30 +2466,114 @@ class Agent(Pit):
                             
             return self.UsePractice(practice, **practice_input)
         
+        if practice_input is None:
+            practice_input = {}
+        
+        # a practice called on behalf of a request does not outlive the request
+        timeout = Deadline.Clamp(timeout)
+        if timeout is not None and timeout <= 0:
+            return {"error": f"Deadline exceeded before calling practice {practice} on agent {agent_address}"}
+        
+        # Execute the practice in one round trip when the peer supports it
+        mode = mode or self.peer_call_modes.get(agent_address, self.practice_call_mode)
+        if mode == "direct":
+            try:
+                result = self._UsePracticeDirect(practice, agent_id, plaza_name, practice_input, timeout)
+                if result is not None:
+                    return result
+                # remember that the peer lacks the RPC so later calls skip the attempt
+                self.log(f"Agent {agent_address} cannot execute practices directly, using messages", 'DEBUG')
+                self.peer_call_modes[agent_address] = "message"
+            except PeerUnavailableError as e:
+                self.log(str(e), 'WARNING')
+                return {"error": str(e)}
+            except Exception as e:
+                self.log(f"Error executing practice {practice} directly on agent {agent_address}, using messages: {str(e)}\n{traceback.format_exc()}", 'ERROR')
+        
         # Use the SendMessage method to call the practice on the remote agent
         try:
             # Send the request through the plaza
             self.log(f"Sending request to agent {agent_id} on plaza {plaza_name} with practice {practice} and input {practice_input}", 'DEBUG')
-            #print(f"Advertising on plaza {plaza_name}")
-            self.Advertise(plaza_name)
-            msg = UsePracticeRequest(practice,self.agent_id+'@'+plaza_name, [AgentAddress(agent_id, plaza_name)], arguments=practice_input)
-            if self.SendMessage(msg, [AgentAddress(agent_id, plaza_name)]):
-                # wait for max 20 seconds for a response
-                start_time = time.time()
-                while time.time() - start_time < 20:
-                    result = self.ReceiveMessage()
-                    if result:
-                        self.log(f"Received result from agent {agent_id} on plaza {plaza_name}: {result}", 'DEBUG')
-                        self.log(f"Result: {result}", 'DEBUG')
-                        #print(f"Result: {result}")
-                        return result
-                self.log(f"No response from agent {agent_id} on plaza {plaza_name} after 10 seconds", 'WARNING')
-                return {"error": f"No response from agent {agent_id} on plaza {plaza_name} after 10 seconds"}
-            else:
-                self.log(f"Failed to send message to agent {agent_id} on plaza {plaza_name}\n{traceback.format_exc()}", 'ERROR')
-                return {"error": f"Failed to send message to agent {agent_id} on plaza {plaza_name}"}
+            msg_id = str(uuid.uuid4())
+            msg = UsePracticeRequest(practice,self.agent_id+'@'+plaza_name, [AgentAddress(agent_id, plaza_name)], arguments=practice_input, msg_id=msg_id,
+                                     deadline=time.time() + timeout)
+            # register before sending so a fast response is not missed
+            future = Future()
+            with self.pending_lock:
+                self.pending_requests[msg_id] = future
+            try:
+                if not self.SendMessage(msg, [AgentAddress(agent_id, plaza_name)]):
+                    self.log(f"Failed to send message to agent {agent_id} on plaza {plaza_name}\n{traceback.format_exc()}", 'ERROR')
+                    return {"error": f"Failed to send message to agent {agent_id} on plaza {plaza_name}"}
+                # wait for the response to this request, completed by receive_message
+                try:
+                    result = future.result(timeout=timeout)
+                except FutureTimeoutError:
+                    self.log(f"No response from agent {agent_id} on plaza {plaza_name} after {timeout} seconds", 'WARNING')
+                    return {"error": f"No response from agent {agent_id} on plaza {plaza_name} after {timeout} seconds"}
+                self.log(f"Received result from agent {agent_id} on plaza {plaza_name}: {result}", 'DEBUG')
+                return [result]
+            finally:
+                with self.pending_lock:
+                    self.pending_requests.pop(msg_id, None)
         except Exception as e:
             error_msg = f"Error using remote practice {practice} on agent {agent_address}: {str(e)}\n{traceback.format_exc()}"
             self.log(error_msg, 'ERROR')
             traceback.print_exc()
             return {"error": error_msg}
+
+    async def UsePracticeRemoteAsync(self, practice: str, agent_address: str, practice_input: dict = None, timeout: float = 20, mode: str = None):
+        """
+        Use a practice from a remote agent from a running event loop.
+        
+        Direct calls go through the async stub when the agent has an AsyncGRPCPlug, so
+        no thread is held while the remote practice runs. Other calls run UsePracticeRemote
+        in the default executor of the loop.
+        
+        Args:
+            practice: The practice to use
+            agent_address: The address of the agent to call in the format "agent_id@plaza_name"
+            practice_input: Dictionary containing input parameters for the practice
+            timeout: Seconds to wait for the response of a remote agent
+            mode: "direct" or "message", see UsePracticeRemote
+            
+        Returns:
+            The result of UsePracticeRemote
+        """
+        loop = asyncio.get_running_loop()
+        # clamped here, the deadline of the caller is not carried to executor threads
+        timeout = Deadline.Clamp(timeout)
+        if timeout is not None and timeout <= 0:
+            return {"error": f"Deadline exceeded before calling practice {practice} on agent {agent_address}"}
+        mode = mode or self.peer_call_modes.get(agent_address, self.practice_call_mode)
+        plug = self._get_grpc_plug()
+        agent_id, _, plaza_name = agent_address.partition('@')
+        if mode == "direct" and hasattr(plug, 'ExecutePracticeAsync') and plaza_name and agent_id != self.agent_id:
+            recipient = AgentAddress(agent_id, plaza_name)
+            try:
+                if self.peer_directory.Get(recipient.to_string()) is not None:
+                    plug_info = self._get_peer_grpc_info(recipient)
+                else:
+                    # looking up an unknown peer loads its plaza, which blocks
+                    plug_info = await loop.run_in_executor(None, self._get_peer_grpc_info, recipient)
+                if plug_info is not None:
+                    request_id = str(uuid.uuid4())
+                    deadline = time.time() + timeout
+                    response = await self.peer_health.CallAsync(
+                        recipient.to_string(),
+                        lambda: plug.ExecutePracticeAsync(practice, practice_input or {}, plug_info,
+                                                          max(deadline - time.time(), 0.001), request_id=request_id),
+                        failed=self._peer_failed, retryable=lambda r: r.get("code") in RETRYABLE_CODES,
+                        deadline=deadline, busy=self._peer_busy)
+                    if response is not None:
+                        return self._DirectPracticeResult(practice, recipient, plaza_name, response)
+                    self.log(f"Agent {agent_address} cannot execute practices directly, using messages", 'DEBUG')
+                    self.peer_call_modes[agent_address] = "message"
+            except PeerUnavailableError as e:
+                self.log(str(e), 'WARNING')
+                return {"error": str(e)}
+            except Exception as e:
+                self.log(f"Error executing practice {practice} directly on agent {agent_address}, using messages: {str(e)}\n{traceback.format_exc()}", 'ERROR')
+            mode = "message"
+        return await loop.run_in_executor(
+            None, functools.partial(self.UsePracticeRemote, practice, agent_address, practice_input, timeout, mode))
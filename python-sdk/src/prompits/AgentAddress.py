@@ -98,11 +98,15 @@ class AgentAddress:
         Initialize the AgentAddress from a JSON object.
         
         Args:
-            json_data: JSON object containing AgentAddress configuration
+            json_data: JSON object containing AgentAddress configuration, or the
+                "agent_id@plaza_name" string written by Message.ToJson
             
         Returns:
             AgentAddress: The initialized AgentAddress
         """
+        if isinstance(json_data, str):
+            agent_id, _, plaza_name = json_data.partition('@')
+            return cls(agent_id, plaza_name or None)
         agent_id = json_data.get("agent_id")
         plaza_name = json_data.get("plaza_name")
         
@@ -0,0 +1,157 @@
+# Deadline gives a practice the time left before its caller gives up
+# A caller of UsePracticeRemote stopped waiting after its timeout, but the remote
+# agent kept executing the practice and answered nobody. Requests now carry an
+# absolute deadline (time.time() seconds): as the "deadline" of a UsePracticeRequest
+# body, or as the gRPC deadline of an ExecutePractice call. Receivers drop requests
+# that expired before they could start them (Start), and execute the others inside a Scope,
+# where Remaining() tells the practice how much time it has left. Calls made by the
+# practice to other agents inherit the deadline.
+
+import contextvars
+import json
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+
+_deadline: contextvars.ContextVar = contextvars.ContextVar("prompits_deadline", default=None)
+
+
+class DeadlineExceededError(TimeoutError):
+    """
+    Raised when a call queued for execution starts after its deadline.
+    """
+
+
+def Current() -> Optional[float]:
+    """
+    Get the deadline of the practice being executed.
+
+    Returns:
+        float: Absolute deadline in time.time() seconds, None if there is none
+    """
+    return _deadline.get()
+
+
+def Remaining() -> Optional[float]:
+    """
+    Get the time left before the deadline of the practice being executed.
+
+    Returns:
+        float: Seconds left, 0 once expired, None if there is no deadline
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(deadline - time.time(), 0.0)
+
+
+def Expired(deadline: Optional[float] = None) -> bool:
+    """
+    Check whether a deadline, or the deadline of the practice being executed, has passed.
+
+    Args:
+        deadline: The deadline, the current one if None
+
+    Returns:
+        bool: True if the deadline has passed, False if it has not or there is none
+    """
+    if deadline is None:
+        deadline = _deadline.get()
+    return deadline is not None and time.time() >= deadline
+
+
+@contextmanager
+def Scope(deadline: Optional[float]):
+    """
+    Run a block with a deadline. An enclosing earlier deadline is kept.
+
+    Args:
+        deadline: Absolute deadline in time.time() seconds, None keeps the current one
+    """
+    current = _deadline.get()
+    if deadline is None or (current is not None and current <= deadline):
+        yield current
+        return
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def Call(deadline: Optional[float], func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Call a function inside a Scope, for functions run on another thread (contextvars
+    are not carried to executor threads).
+
+    Args:
+        deadline: Absolute deadline in time.time() seconds
+        func: The function
+        *args, **kwargs: Arguments of the function
+
+    Returns:
+        The result of the function
+    """
+    with Scope(deadline):
+        return func(*args, **kwargs)
+
+
+def Start(deadline: Optional[float], func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Call a function inside a Scope unless its deadline passed, for calls queued on an
+    executor whose caller may give up while they wait for a thread.
+
+    Args:
+        deadline: Absolute deadline in time.time() seconds
+        func: The function
+        *args, **kwargs: Arguments of the function
+
+    Returns:
+        The result of the function
+
+    Raises:
+        DeadlineExceededError: If the deadline passed before the call started
+    """
+    if Expired(deadline):
+        raise DeadlineExceededError("Deadline exceeded before execution")
+    return Call(deadline, func, *args, **kwargs)
+
+
+def Clamp(timeout: Optional[float]) -> Optional[float]:
+    """
+    Shorten a timeout to the time left before the current deadline.
+
+    Args:
+        timeout: Timeout in seconds, None for none
+
+    Returns:
+        float: The shorter of the timeout and the time left
+    """
+    remaining = Remaining()
+    if remaining is None:
+        return timeout
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+def Of(message) -> Optional[float]:
+    """
+    Get the deadline of a UsePracticeRequest.
+
+    Args:
+        message: A Message, Message.ToJson dict, or the dict delivered by a plug
+
+    Returns:
+        float: The deadline, None if the message has none
+    """
+    body = getattr(message, 'body', None)
+    if body is None and isinstance(message, dict):
+        content = message.get("content", message)
+        if isinstance(content, str):
+            try:
+                content = json.loads(content)
+            except json.JSONDecodeError:
+                return None
+        body = content.get("body") if isinstance(content, dict) else None
+    if not isinstance(body, dict):
+        return None
+    return body.get("deadline") or None
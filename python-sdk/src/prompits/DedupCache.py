@@ -0,0 +1,140 @@
+# DedupCache remembers the requests an agent received, by msg_id, with their response
+# A sender retrying a request it got no answer for made the receiver run the practice
+# again, which is costly for LLM calls and wrong for practices changing state such as
+# JobMarket ones. The receiver now records each request id it executes: a duplicate
+# arriving while the request runs waits for it, one arriving afterwards is answered
+# with the cached response. Entries are dropped least recently used first beyond
+# max_entries, and after ttl seconds, so retries are expected within ttl.
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, Optional, Tuple
+
+
+class DedupCache:
+    """
+    Bounded LRU/TTL cache of request ids and the futures of their responses.
+
+    Attributes:
+        max_entries: Maximum number of requests remembered
+        ttl: Seconds a request is remembered
+        hits: Number of duplicates found
+        misses: Number of new requests
+        evictions: Number of entries dropped to stay under max_entries
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 600):
+        """
+        Initialize a DedupCache.
+
+        Args:
+            max_entries: Maximum number of requests remembered
+            ttl: Seconds a request is remembered, from when it was received
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, Tuple[Future, float]]" = OrderedDict()  # id -> (future, received time)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def Begin(self, msg_id: str) -> Tuple[Future, bool]:
+        """
+        Record a received request, or find the request it duplicates.
+
+        Args:
+            msg_id: ID of the request
+
+        Returns:
+            tuple: (future, new). new is True for a request seen for the first time,
+                the caller then executes it and calls Complete. Otherwise the future
+                holds, or will hold, the response of the first request.
+        """
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(msg_id)
+            if entry is not None and now - entry[1] < self.ttl:
+                self.entries.move_to_end(msg_id)
+                self.hits += 1
+                return entry[0], False
+            future = Future()
+            self.entries[msg_id] = (future, now)
+            self.entries.move_to_end(msg_id)
+            self.misses += 1
+            self._Trim(now)
+            return future, True
+
+    def Complete(self, msg_id: str, response: Any, keep: bool = True) -> bool:
+        """
+        Set the response of a request, releasing the duplicates waiting for it.
+
+        Args:
+            msg_id: ID of the request
+            response: The response
+            keep: Answer later duplicates with the response. False forgets the
+                request, for failures a retry should execute again
+
+        Returns:
+            bool: False if the request was not recorded with Begin (or expired)
+        """
+        with self.lock:
+            entry = self.entries.get(msg_id)
+            if entry is None:
+                return False
+            if not keep:
+                del self.entries[msg_id]
+        if not entry[0].done():
+            entry[0].set_result(response)
+        return True
+
+    def Get(self, msg_id: str) -> Optional[Future]:
+        """
+        Get the future of the response of a recorded request.
+
+        Args:
+            msg_id: ID of the request
+
+        Returns:
+            Future: The future, or None if the request is not recorded
+        """
+        with self.lock:
+            entry = self.entries.get(msg_id)
+        if entry is None or time.time() - entry[1] >= self.ttl:
+            return None
+        return entry[0]
+
+    def _Trim(self, now: float):
+        """
+        Drop expired entries from the least recently used end, then entries beyond max_entries.
+        """
+        while self.entries:
+            msg_id, (_, received) = next(iter(self.entries.items()))
+            if now - received < self.ttl:
+                break
+            del self.entries[msg_id]
+        while self.max_entries and len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def Stats(self) -> Dict[str, Any]:
+        """
+        Get statistics about the cache.
+
+        Returns:
+            dict: Size, limits and counters
+        """
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
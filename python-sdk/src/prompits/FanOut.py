@@ -0,0 +1,188 @@
+# FanOut sends one message to many recipients concurrently
+# Agent.SendMessage used to send to recipients one after the other, so a broadcast
+# to dozens of agents took the sum of their round trips. FanOut runs the sends on a
+# bounded thread pool and returns a DeliveryReport with the result per recipient.
+# With min_acks the report is returned as soon as that many recipients acknowledged,
+# the remaining sends complete in the background and update the report.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+
+class DeliveryReport:
+    """
+    Result of sending a message to a list of recipients.
+
+    A report is true when the completion policy is met: min_acks recipients
+    acknowledged the message (all recipients by default). Existing callers that
+    test the result of Agent.SendMessage as a bool keep working.
+
+    Attributes:
+        recipients: Recipients, as "agent_id@plaza_name" strings
+        min_acks: Number of acknowledgements needed to complete
+        results: Result per recipient: "pending", "delivered" or "failed"
+        errors: Error message per failed recipient
+    """
+
+    PENDING = "pending"
+    DELIVERED = "delivered"
+    FAILED = "failed"
+
+    def __init__(self, recipients: List[str], min_acks: Optional[int] = None):
+        """
+        Initialize a DeliveryReport.
+
+        Args:
+            recipients: Recipients, as "agent_id@plaza_name" strings
+            min_acks: Number of acknowledgements needed to complete, None for all recipients
+        """
+        self.recipients = list(recipients)
+        self.min_acks = len(self.recipients) if min_acks is None else min(min_acks, len(self.recipients))
+        self.results: Dict[str, str] = {recipient: self.PENDING for recipient in self.recipients}
+        self.errors: Dict[str, str] = {}
+        self._cond = threading.Condition()
+
+    def __bool__(self) -> bool:
+        return self.acks >= self.min_acks
+
+    def __repr__(self) -> str:
+        return f"DeliveryReport(acks={self.acks}, failed={len(self.failed)}, pending={len(self.pending)}, min_acks={self.min_acks})"
+
+    @property
+    def acks(self) -> int:
+        """Number of recipients the message was delivered to."""
+        return len(self.delivered)
+
+    @property
+    def delivered(self) -> List[str]:
+        """Recipients the message was delivered to."""
+        return [r for r, result in self.results.items() if result == self.DELIVERED]
+
+    @property
+    def failed(self) -> List[str]:
+        """Recipients the message could not be delivered to."""
+        return [r for r, result in self.results.items() if result == self.FAILED]
+
+    @property
+    def pending(self) -> List[str]:
+        """Recipients still being sent to."""
+        return [r for r, result in self.results.items() if result == self.PENDING]
+
+    @property
+    def complete(self) -> bool:
+        """Whether min_acks was reached or every send finished."""
+        return self.acks >= self.min_acks or not self.pending
+
+    def Record(self, recipient: str, delivered: bool, error: str = None):
+        """
+        Record the result of sending to one recipient.
+
+        Args:
+            recipient: The recipient
+            delivered: Whether the message was delivered
+            error: Error message if it was not
+        """
+        with self._cond:
+            self.results[recipient] = self.DELIVERED if delivered else self.FAILED
+            if not delivered:
+                self.errors[recipient] = error or "Not delivered"
+            self._cond.notify_all()
+
+    def Wait(self, timeout: float = None, all_recipients: bool = False) -> bool:
+        """
+        Wait for the completion policy, or for every recipient.
+
+        Args:
+            timeout: Seconds to wait, None waits forever
+            all_recipients: Wait until every send finished instead of until min_acks
+
+        Returns:
+            bool: Whether the awaited condition was met before the timeout
+        """
+        with self._cond:
+            if all_recipients:
+                return self._cond.wait_for(lambda: not self.pending, timeout)
+            return self._cond.wait_for(lambda: self.complete, timeout)
+
+    def ToJson(self) -> Dict[str, Any]:
+        """
+        Convert the report to a JSON object.
+
+        Returns:
+            dict: Results and errors per recipient
+        """
+        return {
+            "success": bool(self),
+            "acks": self.acks,
+            "min_acks": self.min_acks,
+            "results": dict(self.results),
+            "errors": dict(self.errors)
+        }
+
+
+class FanOut:
+    """
+    Bounded thread pool sending a message to many recipients.
+
+    Attributes:
+        max_workers: Maximum number of sends running at a time
+    """
+
+    def __init__(self, max_workers: int = 16, name: str = "fanout"):
+        """
+        Initialize a FanOut.
+
+        Args:
+            max_workers: Maximum number of sends running at a time
+            name: Prefix of the worker thread names
+        """
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+
+    def Send(self, send: Callable[[str], bool], recipients: List[str], min_acks: Optional[int] = None,
+             timeout: Optional[float] = None) -> DeliveryReport:
+        """
+        Send to every recipient concurrently.
+
+        A single recipient is sent to on the calling thread.
+
+        Args:
+            send: Function sending to one recipient, returning True when delivered;
+                exceptions count as failures
+            recipients: Recipients, as "agent_id@plaza_name" strings
+            min_acks: Return once this many recipients acknowledged, None waits for all
+            timeout: Seconds to wait for the completion policy, None waits forever
+
+        Returns:
+            DeliveryReport: The report, still updated by sends running in the background
+        """
+        # a recipient listed twice is sent to once
+        recipients = list(dict.fromkeys(recipients))
+        report = DeliveryReport(recipients, min_acks)
+        if len(recipients) == 1:
+            self._SendOne(send, recipients[0], report)
+            return report
+        for recipient in recipients:
+            self.executor.submit(self._SendOne, send, recipient, report)
+        report.Wait(timeout)
+        return report
+
+    @staticmethod
+    def _SendOne(send: Callable[[str], bool], recipient: str, report: DeliveryReport):
+        """
+        Send to one recipient and record the result.
+        """
+        try:
+            report.Record(recipient, bool(send(recipient)))
+        except Exception as e:
+            report.Record(recipient, False, str(e))
+
+    def Shutdown(self, wait: bool = False):
+        """
+        Stop the worker threads.
+
+        Args:
+            wait: Whether to wait for running sends
+        """
+        self.executor.shutdown(wait=wait)
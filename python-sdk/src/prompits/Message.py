@@ -3,19 +3,130 @@
 # Message contains type, sent_time, body, attachments, sender, recipients
 
 
+import copy
+import io
+import os
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, BinaryIO
 from .AgentAddress import AgentAddress
 
+# Priorities of messages, served in this order by the queues of receivers (MessageQueue)
+PRIORITY_HIGH = 1
+PRIORITY_NORMAL = 2
+PRIORITY_LOW = 3
+PRIORITY_NAMES = {PRIORITY_HIGH: "high", PRIORITY_NORMAL: "normal", PRIORITY_LOW: "low"}
+
+# Default priority of message types, other types are PRIORITY_NORMAL
+TYPE_PRIORITIES = {
+    "StatusMessage": PRIORITY_HIGH
+}
+
+
+def PriorityOf(message: Any) -> int:
+    """
+    Get the priority of a message.
+    
+    Args:
+        message: A Message, StatusMessage, Message.ToJson dict, or the dict delivered by a plug
+        
+    Returns:
+        int: PRIORITY_HIGH, PRIORITY_NORMAL or PRIORITY_LOW
+    """
+    priority = getattr(message, 'priority', None)
+    if priority is None and isinstance(message, dict):
+        priority = message.get("priority")
+        content = message.get("content")
+        if not priority and isinstance(content, dict):
+            priority = content.get("priority") or TYPE_PRIORITIES.get(content.get("type"))
+        if not priority:
+            priority = TYPE_PRIORITIES.get(message.get("type"))
+    return priority or PRIORITY_NORMAL
+
+
+class FrozenDict(dict):
+    """
+    A dict that cannot be modified, used for the bodies of messages shared between agents.
+    
+    It is a dict subclass, so it is encoded and compared like a dict. Copies made
+    with copy.copy or copy.deepcopy are plain, modifiable containers: receivers
+    copy a body to change it, the sender and other receivers keep seeing the original.
+    """
+    
+    def _ReadOnly(self, *args, **kwargs):
+        raise TypeError("Message body is read-only, copy it to modify it")
+    
+    __setitem__ = __delitem__ = __ior__ = _ReadOnly
+    clear = pop = popitem = setdefault = update = _ReadOnly
+    
+    def __copy__(self):
+        return dict(self)
+    
+    def __deepcopy__(self, memo):
+        return {copy.deepcopy(k, memo): copy.deepcopy(v, memo) for k, v in self.items()}
+    
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+class FrozenList(list):
+    """
+    A list that cannot be modified, see FrozenDict.
+    """
+    
+    def _ReadOnly(self, *args, **kwargs):
+        raise TypeError("Message body is read-only, copy it to modify it")
+    
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _ReadOnly
+    append = clear = extend = insert = pop = remove = reverse = sort = _ReadOnly
+    
+    def __copy__(self):
+        return list(self)
+    
+    def __deepcopy__(self, memo):
+        return [copy.deepcopy(v, memo) for v in self]
+    
+    def __reduce__(self):
+        return (list, (list(self),))
+
+
+def Freeze(value: Any) -> Any:
+    """
+    Get a read-only version of a JSON-like value.
+    
+    Dicts and lists are rebuilt as FrozenDict and FrozenList, recursively; other
+    values are shared as they are. Values that are already frozen are returned
+    without being walked again.
+    
+    Args:
+        value: The value to freeze
+        
+    Returns:
+        The frozen value
+    """
+    if isinstance(value, (FrozenDict, FrozenList)):
+        return value
+    if isinstance(value, dict):
+        return FrozenDict((k, Freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return FrozenList(Freeze(v) for v in value)
+    return value
+
+
 class Attachment:
     """
     Represents a file or data attachment that can be included with a message.
     
     Attachments can contain various types of data like documents, images, or
     any serializable content that needs to be transmitted along with a message.
+    
+    Large binary content can stay on disk: an attachment with a path and no data
+    is read from the file when it is sent, and large attachments received over
+    gRPC are spooled to a file and delivered with their path. Use Open or Read
+    to get the content either way.
     """
     
-    def __init__(self, name: str, content_type: str, data: Any):
+    def __init__(self, name: str, content_type: str, data: Any = None, path: Optional[str] = None,
+                 size: Optional[int] = None, handle: Optional[str] = None):
         """
         Initialize an Attachment instance.
         
@@ -23,10 +134,50 @@ class Attachment:
             name: Name or identifier for the attachment
             content_type: MIME type or format identifier for the content
             data: The actual attachment data
+            path: File holding the content, when data is None
+            size: Size of the content in bytes, when it is not in data
+            handle: Handle of the content uploaded to a peer, set on the wire only
         """
         self.name = name
         self.content_type = content_type
         self.data = data
+        self.path = path
+        self.size = size
+        self.handle = handle
+    
+    def Size(self) -> Optional[int]:
+        """
+        Get the size of the binary content.
+        
+        Returns:
+            int: Size in bytes, or None if the data is not binary
+        """
+        if isinstance(self.data, (bytes, bytearray, memoryview)):
+            return len(self.data)
+        if self.path is not None:
+            return os.path.getsize(self.path)
+        return self.size
+    
+    def Open(self) -> BinaryIO:
+        """
+        Open the binary content for reading, from the file if the attachment has one.
+        
+        Returns:
+            BinaryIO: A readable binary file object
+        """
+        if self.data is None and self.path is not None:
+            return open(self.path, 'rb')
+        return io.BytesIO(bytes(self.data))
+    
+    def Read(self) -> bytes:
+        """
+        Read the whole binary content into memory.
+        
+        Returns:
+            bytes: The content
+        """
+        with self.Open() as f:
+            return f.read()
 
     def ToJson(self) -> Dict[str, Any]:
         """
@@ -35,11 +186,18 @@ class Attachment:
         Returns:
             Dict[str, Any]: Dictionary representation of the attachment
         """
-        return {
+        json_data = {
             "name": self.name,
             "content_type": self.content_type,
             "data": self.data
         }
+        if self.path is not None:
+            json_data["path"] = self.path
+        if self.handle is not None:
+            json_data["handle"] = self.handle
+        if self.size is not None:
+            json_data["size"] = self.size
+        return json_data
 
     @staticmethod
     def FromJson(json_data: Dict[str, Any]) -> 'Attachment':
@@ -55,7 +213,10 @@ class Attachment:
         return Attachment(
             name=json_data["name"],
             content_type=json_data["content_type"],
-            data=json_data["data"]
+            data=json_data.get("data"),
+            path=json_data.get("path"),
+            size=json_data.get("size"),
+            handle=json_data.get("handle")
         )
 
 class Message:
@@ -65,9 +226,13 @@ class Message:
     Message is the core communication unit that contains information sent between
     agents including the message type, content body, sender, recipients, and
     optional attachments.
+    
+    Receivers serve queued messages by priority: control messages such as
+    StatusMessage are high priority and overtake queued practice requests.
     """
     
-    def __init__(self, type: str, body: Dict[str, Any], sender: AgentAddress, recipients: List[AgentAddress], msg_id: Optional[str] = None, attachments: Optional[List[Attachment]] = None, timestamp: Optional[datetime] = None):
+    def __init__(self, type: str, body: Dict[str, Any], sender: AgentAddress, recipients: List[AgentAddress], msg_id: Optional[str] = None, attachments: Optional[List[Attachment]] = None, timestamp: Optional[datetime] = None,
+                 priority: Optional[int] = None):
         """
         Initialize a Message instance.
         
@@ -79,6 +244,8 @@ class Message:
             msg_id: Optional unique message identifier
             attachments: Optional list of attachments to include
             timestamp: Optional timestamp for the message (defaults to current time)
+            priority: PRIORITY_HIGH, PRIORITY_NORMAL or PRIORITY_LOW (defaults to the
+                priority of the type in TYPE_PRIORITIES, else PRIORITY_NORMAL)
         """
         self.type = type
         self.body = body
@@ -87,16 +254,18 @@ class Message:
         self.msg_id = msg_id
         self.attachments = attachments or []
         self.timestamp = timestamp or datetime.now()
+        self.priority = priority or TYPE_PRIORITIES.get(type, PRIORITY_NORMAL)
 
     def ToJson(self) -> Dict[str, Any]:
         """
         Convert the message to a JSON-serializable dictionary.
         
         Returns:
-            Dict[str, Any]: Dictionary representation of the message
+            Dict[str, Any]: Dictionary representation of the message, with "priority"
+                only when it differs from the default of the type
         """
         sender_json = str(self.sender)
-        return {
+        json_data = {
             "type": self.type,
             "body": self.body,
             "sender": sender_json,
@@ -105,6 +274,9 @@ class Message:
             "attachments": [a.ToJson() for a in self.attachments],
             "timestamp": self.timestamp.isoformat()
         }
+        if self.priority != TYPE_PRIORITIES.get(self.type, PRIORITY_NORMAL):
+            json_data["priority"] = self.priority
+        return json_data
 
     @staticmethod
     def FromJson(json_data: Dict[str, Any]) -> 'Message':
@@ -124,7 +296,67 @@ class Message:
             recipients=[AgentAddress.FromJson(r) for r in json_data["recipients"]],
             msg_id=json_data.get("msg_id"),
             attachments=[Attachment.FromJson(a) for a in json_data.get("attachments", [])],
-            timestamp=datetime.fromisoformat(json_data["timestamp"])
+            timestamp=datetime.fromisoformat(json_data["timestamp"]) if json_data.get("timestamp") else None,
+            priority=json_data.get("priority")
+        )
+
+    def Freeze(self) -> 'Message':
+        """
+        Get a read-only copy of the message, to hand to other agents by reference.
+        
+        The copy shares the values of the message but its body, recipients and
+        attachments are frozen (see FrozenDict), so receivers cannot change what the
+        sender or other receivers see. Freezing a frozen message only copies the
+        Message object. The sender must not modify the message while it is delivered.
+        
+        Returns:
+            Message: The frozen copy, of the same class as the message
+        """
+        frozen = copy.copy(self)
+        frozen.body = Freeze(self.body)
+        frozen.recipients = Freeze(self.recipients)
+        frozen.attachments = Freeze(self.attachments)
+        return frozen
+
+    def ToProto(self, target=None):
+        """
+        Convert the message to the typed AgentMessage protobuf used on the gRPC path.
+        
+        Args:
+            target: Optional AgentMessage to fill in place
+            
+        Returns:
+            AgentMessage: The encoded message
+            
+        Raises:
+            TypeError, ValueError: If the body or attachments cannot be represented
+        """
+        # imported here so messages don't depend on protobuf unless it is used
+        from .plugs.ProtoCodec import ProtoCodec
+        return ProtoCodec.Encode(self, target)
+
+    @staticmethod
+    def FromProto(proto) -> 'Message':
+        """
+        Create a Message from an AgentMessage protobuf.
+        
+        Args:
+            proto: The AgentMessage to decode
+            
+        Returns:
+            Message: New instance initialized with the data
+        """
+        from .plugs.ProtoCodec import ProtoCodec
+        json_data = ProtoCodec.Decode(proto)
+        return Message(
+            type=json_data["type"],
+            body=json_data["body"],
+            sender=AgentAddress(proto.sender.agent_id, proto.sender.plaza_name) if proto.HasField('sender') else None,
+            recipients=[AgentAddress(r.agent_id, r.plaza_name) for r in proto.recipients],
+            msg_id=json_data["msg_id"],
+            attachments=[Attachment.FromJson(a) for a in json_data["attachments"]],
+            timestamp=datetime.fromisoformat(json_data["timestamp"]) if json_data["timestamp"] else None,
+            priority=json_data.get("priority")
         )
 
     # declare variables
@@ -132,6 +364,7 @@ class Message:
     msg_id: str
     timestamp: datetime
     body: dict
+    priority: int
     attachments: list
     sender: AgentAddress
     recipients: list[AgentAddress]
@@ -0,0 +1,168 @@
+# MessageQueue is the bounded queue of messages received by a plug
+# A plain list grows without bound when an agent receives messages faster than it
+# handles them, and list.pop(0) is O(n). MessageQueue is a deque with a high-water
+# mark: once that many messages wait, new ones are rejected and the plug tells the
+# sender it is busy, so overload pushes back on senders instead of exhausting memory.
+# Messages are queued by priority (Message.priority): get() returns high-priority
+# messages such as StatusMessages before the UsePracticeRequests queued ahead of them.
+# To keep a stream of high-priority messages from starving the others, a waiting
+# lower-priority message is served after starvation_limit messages passed it.
+
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+from .Message import PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW, PRIORITY_NAMES
+
+
+class MessageQueue:
+    """
+    Bounded multi-level queue with blocking get and a high-water mark.
+
+    There is one FIFO lane per priority. put() rejects messages once high_water_mark
+    messages are queued in all lanes. Control messages can be put with force=True,
+    they are accepted up to maxsize.
+
+    Attributes:
+        maxsize: Maximum number of queued messages, forced messages included
+        high_water_mark: Number of queued messages from which put() rejects messages
+        accepted_count: Number of messages accepted
+        dropped_count: Number of messages rejected
+        peak_depth: Largest number of messages queued at once
+        starvation_limit: Number of higher-priority messages served while a message
+            waits, after which it is served
+        promoted_count: Number of messages served early by starvation protection
+    """
+
+    def __init__(self, maxsize: int = 10000, high_water_mark: Optional[int] = None, starvation_limit: int = 8):
+        """
+        Initialize a MessageQueue.
+
+        Args:
+            maxsize: Maximum number of queued messages (0 for no limit)
+            high_water_mark: Number of queued messages from which messages are rejected,
+                defaults to maxsize
+            starvation_limit: Number of higher-priority messages served while a lower-priority
+                message waits, after which the lower-priority message is served
+        """
+        self.maxsize = maxsize
+        self.high_water_mark = high_water_mark if high_water_mark is not None else maxsize
+        if self.maxsize and self.high_water_mark > self.maxsize:
+            self.high_water_mark = self.maxsize
+        self.starvation_limit = starvation_limit
+        # lanes in priority order, and the number of messages served past each lane's oldest message
+        self._lanes = {priority: deque() for priority in (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)}
+        self._passed = {priority: 0 for priority in self._lanes}
+        self._depth = 0
+        self._cond = threading.Condition()
+        self.accepted_count = 0
+        self.dropped_count = 0
+        self.promoted_count = 0
+        self.peak_depth = 0
+        self.busy_since = None
+
+    def __len__(self) -> int:
+        return self._depth
+
+    @property
+    def busy(self) -> bool:
+        """Whether the queue is at its high-water mark."""
+        return bool(self.high_water_mark) and self._depth >= self.high_water_mark
+
+    def put(self, item: Any, force: bool = False, priority: int = PRIORITY_NORMAL) -> bool:
+        """
+        Add a message to the queue.
+
+        Args:
+            item: The message
+            force: Accept the message above the high-water mark, up to maxsize
+            priority: Priority of the message, PRIORITY_HIGH, PRIORITY_NORMAL or PRIORITY_LOW
+
+        Returns:
+            bool: True if the message was queued, False if it was rejected
+        """
+        with self._cond:
+            depth = self._depth
+            limit = self.maxsize if force else self.high_water_mark
+            if limit and depth >= limit:
+                self.dropped_count += 1
+                if self.busy_since is None:
+                    self.busy_since = time.time()
+                return False
+            self._lanes.get(priority, self._lanes[PRIORITY_NORMAL]).append(item)
+            self._depth += 1
+            self.accepted_count += 1
+            if depth + 1 > self.peak_depth:
+                self.peak_depth = depth + 1
+            self._cond.notify()
+            return True
+
+    def get(self, timeout: Optional[float] = 0) -> Optional[Any]:
+        """
+        Remove and return the oldest message of the highest priority, or the oldest
+        message of a lower priority passed over starvation_limit times.
+
+        Args:
+            timeout: Seconds to wait for a message, 0 returns at once, None waits forever
+
+        Returns:
+            The message, or None if no message arrived in time
+        """
+        with self._cond:
+            if not self._depth:
+                if timeout == 0 or not self._cond.wait_for(lambda: self._depth, timeout):
+                    return None
+            item = self._lanes[self._NextLane()].popleft()
+            self._depth -= 1
+            if self.busy_since is not None and not self.busy:
+                self.busy_since = None
+            return item
+
+    def _NextLane(self) -> int:
+        """
+        Choose the lane to serve, counting the passed-over lanes. Called with the lock held.
+        """
+        waiting = [priority for priority, lane in self._lanes.items() if lane]
+        served = waiting[0]
+        for priority in waiting[1:]:
+            if self._passed[priority] >= self.starvation_limit:
+                served = priority
+                self.promoted_count += 1
+                break
+        for priority in waiting:
+            if priority > served:
+                self._passed[priority] += 1
+        self._passed[served] = 0
+        return served
+
+    def clear(self):
+        """
+        Remove all queued messages.
+        """
+        with self._cond:
+            for priority, lane in self._lanes.items():
+                lane.clear()
+                self._passed[priority] = 0
+            self._depth = 0
+            self.busy_since = None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get statistics about the queue.
+
+        Returns:
+            dict: Depth, limits and counters
+        """
+        with self._cond:
+            return {
+                "depth": self._depth,
+                "depth_by_priority": {PRIORITY_NAMES[priority]: len(lane) for priority, lane in self._lanes.items()},
+                "promoted": self.promoted_count,
+                "peak_depth": self.peak_depth,
+                "high_water_mark": self.high_water_mark,
+                "maxsize": self.maxsize,
+                "accepted": self.accepted_count,
+                "dropped": self.dropped_count,
+                "busy": self.busy
+            }
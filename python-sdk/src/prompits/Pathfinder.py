@@ -255,26 +255,17 @@ class Pathfinder(Pit):
         # If not found locally, check other agents through plazas
         plaza_name = "MainPlaza"
         self.log(f"Practice {practice} not found locally, searching in remote agents", 'DEBUG')
-        agents_info = self.agent.UsePractice(f"{plaza_name}/ListActiveAgents")
-        #self.log(f"agents_info: {agents_info}","DEBUG")
-        for agent_info in agents_info:
+        matches = self.agent.UsePractice(f"{plaza_name}/FindAgentsByPractice", practice) or []
+        for match in matches:
             # Skip ourselves - we already checked local pits
-            if agent_info["agent_id"] == self.agent.agent_id:
+            if match["agent_id"] == self.agent.agent_id:
                 continue
-                
-            # find in each pits of the agent
-            for pit_type in agent_info["agent_info"]["components"].keys():
-                for pit in agent_info["agent_info"]["components"][pit_type].keys():
-                    if pit in agent_info["agent_info"]["components"][pit_type]:
-                        #self.log(f"pit in agent_info: {pit}","DEBUG")
-                        #self.log(f"{agent_info['agent_info']['components'][pit_type]}","DEBUG")
-                        if "practices" in agent_info["agent_info"]["components"][pit_type][pit]:
-                            for remote_practice in agent_info["agent_info"]["components"][pit_type][pit]['practices']:
-                                if remote_practice == practice:
-                                    self.log(f"Found practice: {pit+'/'+practice} in remote agent {agent_info['agent_id']}","INFO")
-                                    return {"agent_address": agent_info["agent_id"]+'@'+plaza_name, "practice": pit+"/"+practice}
-                    else:
-                        self.log(f"pit not in agent_info: {pit}","DEBUG")
+            # Skip agents that failed recently, another agent with the practice may be healthy
+            if not self.agent.peer_health.IsAvailable(match["agent_id"]+'@'+plaza_name):
+                self.log(f"Skipping unavailable agent {match['agent_id']}", 'DEBUG')
+                continue
+            self.log(f"Found practice: {match['practice']} in remote agent {match['agent_id']}","INFO")
+            return {"agent_address": match["agent_id"]+'@'+plaza_name, "practice": match["practice"]}
         
         self.log(f"No agent found for practice {practice}", 'WARNING')
         return None
@@ -353,7 +344,11 @@ class Pathfinder(Pit):
                 self.log(f"Practice {agent_info['practice']} returned: {responses}", 'DEBUG')
                 
                 # Process outputs and update variables
-                response=json.loads(responses[0]['content'])['body']
+                # content is a JSON string, or already a dictionary for typed gRPC messages
+                content = responses[0]['content']
+                if isinstance(content, str):
+                    content = json.loads(content)
+                response = content['body']
                 if 'result' in response:
                     if hasattr(poststep.post, 'outputs') and poststep.post.outputs:
                         for output_key, output_config in poststep.post.outputs.items():
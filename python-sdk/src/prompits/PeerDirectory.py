@@ -0,0 +1,291 @@
+# PeerDirectory caches the advertisements of the peers an agent sends to
+# Every remote call used to re-advertise the agent on the plaza (serializing the agent,
+# writing it to the plaza pool) and reload ListActiveAgents in full, just to find the
+# plugs of the recipient. The directory keeps the listing of each plaza with a TTL per
+# entry: a lookup is a dict access, and never writes to the plaza. A miss loads the
+# listing of the plaza once (concurrent misses wait for the same load); an address
+# still missing afterwards is remembered as unknown for negative_ttl seconds so
+# repeated sends to it do not reload the plaza. A background thread reloads the
+# plazas in use every refresh_interval seconds, and expired entries are served while
+# their plaza is reloaded. Keeping the agent's own advertisement fresh is left to the
+# advertisement refresh (Agent.RefreshPractice). A plaza whose membership changes are
+# followed (AgentPlaza.SubscribeChanges) is kept up to date by Apply, and is not
+# reloaded while its changes keep arriving.
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PeerDirectory:
+    """
+    TTL cache of the agents advertised on plazas, keyed by "agent_id@plaza_name"
+    and "agent_name@plaza_name".
+
+    Attributes:
+        peers: The cached advertisements, in the format of ListActiveAgents
+        ttl: Seconds an entry is fresh after its plaza was loaded
+        negative_ttl: Seconds an address not found on its plaza is remembered as unknown
+        refresh_interval: Seconds between background reloads of the plazas in use
+    """
+
+    def __init__(self, loader: Callable[[str], List[Dict[str, Any]]], ttl: float = 60, negative_ttl: float = 5,
+                 refresh_interval: Optional[float] = None):
+        """
+        Initialize a PeerDirectory.
+
+        Args:
+            loader: Function returning the active agents of a plaza (ListActiveAgents)
+            ttl: Seconds an entry is fresh after its plaza was loaded
+            negative_ttl: Seconds an address not found on its plaza is remembered as unknown
+            refresh_interval: Seconds between background reloads, ttl / 2 if None
+        """
+        self.loader = loader
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.refresh_interval = refresh_interval if refresh_interval is not None else ttl / 2
+        self.peers: Dict[str, Dict[str, Any]] = {}
+        self.expires: Dict[str, float] = {}  # address -> time the entry expires
+        self.unknown: Dict[str, float] = {}  # address -> time the negative entry expires
+        self.loaded: Dict[str, float] = {}  # plaza_name -> time of the last load
+        self.plaza_locks: Dict[str, threading.Lock] = {}
+        self.lock = threading.Lock()
+        self.stale_plazas = set()
+        self.wake = threading.Event()
+        self.stop_event = None
+        self.thread = None
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.stale_hits = 0
+        self.loads = 0
+        self.load_errors = 0
+        self.applied = 0
+
+    def __contains__(self, address: str) -> bool:
+        return address in self.peers
+
+    def __len__(self) -> int:
+        return len(self.peers)
+
+    def Get(self, address: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the cached advertisement of a peer, without loading its plaza.
+
+        Args:
+            address: "agent_id@plaza_name" or "agent_name@plaza_name"
+
+        Returns:
+            dict: The advertisement, None if it is not cached
+        """
+        return self.peers.get(address)
+
+    def Lookup(self, address: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the advertisement of a peer, loading its plaza on a miss.
+
+        An expired entry is returned as it is and its plaza reloaded in the background.
+
+        Args:
+            address: "agent_id@plaza_name" or "agent_name@plaza_name"
+
+        Returns:
+            dict: The advertisement, None if the peer is not active on its plaza
+        """
+        entry = self.peers.get(address)
+        if entry is not None:
+            if time.time() >= self.expires.get(address, 0):
+                self.stale_hits += 1
+                self._RefreshLater(address.rpartition('@')[2])
+            else:
+                self.hits += 1
+            return entry
+        if time.time() < self.unknown.get(address, 0):
+            self.negative_hits += 1
+            return None
+        self.misses += 1
+        plaza_name = address.rpartition('@')[2]
+        self.Refresh(plaza_name, max_age=self.negative_ttl)
+        entry = self.peers.get(address)
+        if entry is None:
+            self.unknown[address] = time.time() + self.negative_ttl
+        return entry
+
+    def Refresh(self, plaza_name: str, max_age: float = 0) -> bool:
+        """
+        Load the active agents of a plaza. Concurrent calls for a plaza load it once.
+
+        Args:
+            plaza_name: Name of the plaza
+            max_age: Skip the load if the plaza was loaded less than max_age seconds ago
+
+        Returns:
+            bool: False if the plaza could not be loaded
+        """
+        with self.lock:
+            plaza_lock = self.plaza_locks.setdefault(plaza_name, threading.Lock())
+        with plaza_lock:
+            if max_age and time.time() - self.loaded.get(plaza_name, 0) < max_age:
+                return True
+            try:
+                agents = self.loader(plaza_name)
+            except Exception as e:
+                self.load_errors += 1
+                logger.error(f"Error loading the agents of plaza {plaza_name}: {str(e)}")
+                return False
+            self.loads += 1
+            self.Update(plaza_name, agents or [])
+            return True
+
+    def Update(self, plaza_name: str, agents: List[Dict[str, Any]]):
+        """
+        Replace the cached agents of a plaza with a listing of its active agents.
+
+        Args:
+            plaza_name: Name of the plaza
+            agents: Active agents, in the format of ListActiveAgents
+        """
+        now = time.time()
+        expires = now + self.ttl
+        suffix = '@' + plaza_name
+        with self.lock:
+            listed = set()
+            for agent in agents:
+                for key in (agent.get('agent_id'), agent.get('agent_name')):
+                    if key:
+                        address = key + suffix
+                        self.peers[address] = agent
+                        self.expires[address] = expires
+                        self.unknown.pop(address, None)
+                        listed.add(address)
+            # agents no longer listed are gone from the plaza
+            for address in [a for a in self.peers if a.endswith(suffix) and a not in listed]:
+                del self.peers[address]
+                self.expires.pop(address, None)
+            self.loaded[plaza_name] = now
+            self.stale_plazas.discard(plaza_name)
+
+    def Apply(self, changes: Dict[str, Any]):
+        """
+        Apply the membership changes of a plaza (AgentPlaza.SubscribeChanges), marking
+        its agents fresh. A reset, or changes of a plaza never loaded, reload the plaza.
+
+        Args:
+            changes: "plaza", "reset" and "events" ("join", "update" or "leave" of an agent)
+        """
+        plaza_name = changes.get("plaza")
+        if not plaza_name:
+            return
+        if changes.get("reset") or plaza_name not in self.loaded:
+            # the changes only complete a listing of the plaza
+            self.Refresh(plaza_name)
+            return
+        now = time.time()
+        suffix = '@' + plaza_name
+        with self.lock:
+            for change in changes.get("events") or []:
+                addresses = [key + suffix for key in (change.get("agent_id"), change.get("agent_name")) if key]
+                for address in addresses:
+                    if change.get("event") == "leave":
+                        self.peers.pop(address, None)
+                        self.expires.pop(address, None)
+                    else:
+                        self.peers[address] = change.get("agent")
+                        self.unknown.pop(address, None)
+            # the plaza is followed, its entries are as fresh as the last changes
+            for address in self.peers:
+                if address.endswith(suffix):
+                    self.expires[address] = now + self.ttl
+            self.loaded[plaza_name] = now
+            self.stale_plazas.discard(plaza_name)
+            self.applied += 1
+
+    def Invalidate(self, address: Optional[str] = None):
+        """
+        Forget a peer, or every peer, so the next lookup loads its plaza again.
+
+        Args:
+            address: "agent_id@plaza_name", None for all peers
+        """
+        with self.lock:
+            if address is None:
+                self.peers.clear()
+                self.expires.clear()
+                self.unknown.clear()
+                self.loaded.clear()
+            else:
+                self.peers.pop(address, None)
+                self.expires.pop(address, None)
+                self.unknown.pop(address, None)
+                self.loaded.pop(address.rpartition('@')[2], None)
+
+    def _RefreshLater(self, plaza_name: str):
+        """
+        Ask the background thread to reload a plaza, reloading it now if the thread is not running.
+        """
+        if self.thread is None or not self.thread.is_alive():
+            # no background thread, the caller keeps the expired entry and reloads
+            self.Refresh(plaza_name)
+            return
+        self.stale_plazas.add(plaza_name)
+        self.wake.set()
+
+    def Start(self):
+        """
+        Start reloading the plazas in use in the background.
+        """
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._RefreshLoop, args=(self.stop_event,), daemon=True,
+                                       name="peer_directory_refresh")
+        self.thread.start()
+
+    def Stop(self):
+        """
+        Stop the background reloads.
+        """
+        if self.stop_event is not None:
+            self.stop_event.set()
+            self.wake.set()
+        self.thread = None
+
+    def _RefreshLoop(self, stop_event: threading.Event):
+        """
+        Reload the plazas loaded before every refresh_interval seconds, and stale plazas when asked.
+        """
+        while not stop_event.is_set():
+            self.wake.wait(self.refresh_interval)
+            self.wake.clear()
+            if stop_event.is_set():
+                break
+            now = time.time()
+            for plaza_name, loaded in list(self.loaded.items()):
+                if plaza_name in self.stale_plazas or now - loaded >= self.refresh_interval:
+                    self.Refresh(plaza_name)
+
+    def Stats(self) -> Dict[str, Any]:
+        """
+        Get statistics about the directory.
+
+        Returns:
+            dict: Size, settings and counters
+        """
+        return {
+            "peers": len(self.peers),
+            "unknown": sum(1 for expires in list(self.unknown.values()) if expires > time.time()),
+            "plazas": {plaza_name: round(time.time() - loaded, 1) for plaza_name, loaded in list(self.loaded.items())},
+            "ttl": self.ttl,
+            "negative_ttl": self.negative_ttl,
+            "refresh_interval": self.refresh_interval,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "negative_hits": self.negative_hits,
+            "loads": self.loads,
+            "load_errors": self.load_errors,
+            "applied": self.applied
+        }
@@ -0,0 +1,375 @@
+# PeerHealth retries failed sends to a peer and stops calling peers that keep failing
+# A failed send used to be logged and forgotten, so every later call to a peer that
+# is down waited out a full connect timeout again. Agent now sends through PeerHealth:
+# a failed attempt is retried after a jittered exponential backoff, and a circuit
+# breaker per peer opens after failure_threshold consecutive failures. While it is
+# open calls fail at once with PeerUnavailableError; after reset_timeout one call is
+# let through as a probe (half-open) and its result closes or reopens the circuit.
+# A busy reply (the peer is healthy but at its limits) is retried with the same
+# backoff but does not count for or against the health of the peer.
+# Receivers deduplicate requests by msg_id, so a retried request is executed once.
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PeerUnavailableError(ConnectionError):
+    """
+    Raised instead of calling a peer whose circuit is open.
+
+    Attributes:
+        peer: The peer
+        retry_at: Time at which the circuit lets a probe through
+    """
+
+    def __init__(self, peer: str, retry_at: float):
+        super().__init__(f"Peer {peer} is unavailable, circuit open for another {max(retry_at - time.time(), 0):.1f}s")
+        self.peer = peer
+        self.retry_at = retry_at
+
+
+class RetryPolicy:
+    """
+    Number of attempts and backoff between them.
+
+    Delays use "full jitter": a random duration between 0 and the exponential
+    backoff, so peers retrying after a common failure do not retry in lockstep.
+
+    Attributes:
+        max_attempts: Attempts per call, the first one included
+        base_delay: Backoff before the second attempt, doubled for each further attempt
+        max_delay: Largest backoff
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.05, max_delay: float = 2.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def Delay(self, attempt: int) -> float:
+        """
+        Get the backoff after a failed attempt.
+
+        Args:
+            attempt: Number of the failed attempt, from 0
+
+        Returns:
+            float: Seconds to wait before the next attempt
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Health of one peer.
+
+    Attributes:
+        peer: The peer
+        state: "closed" (calls go through), "open" (calls fail at once) or
+            "half_open" (one probe call goes through)
+        failures: Consecutive failures
+        opened_at: Time the circuit last opened
+        retry_at: Time from which an open circuit lets a probe through
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, peer: str, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        """
+        Initialize a CircuitBreaker.
+
+        Args:
+            peer: The peer
+            failure_threshold: Consecutive failures opening the circuit
+            reset_timeout: Seconds the circuit stays open before a probe
+        """
+        self.peer = peer
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.retry_at = 0.0
+        self.probing = False
+        self.total_failures = 0
+        self.total_successes = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        """Whether a call would be let through now."""
+        with self.lock:
+            if self.state == self.OPEN:
+                return time.time() >= self.retry_at
+            return not (self.state == self.HALF_OPEN and self.probing)
+
+    def Allow(self) -> bool:
+        """
+        Ask to call the peer. An open circuit past retry_at turns half-open and
+        lets this call through as the probe.
+
+        Returns:
+            bool: Whether the call may go ahead
+        """
+        with self.lock:
+            if self.state == self.OPEN and time.time() >= self.retry_at:
+                self.state = self.HALF_OPEN
+                self.probing = False
+                logger.info(f"Circuit of peer {self.peer} half-open, probing")
+            if self.state == self.HALF_OPEN:
+                if self.probing:
+                    self.rejected += 1
+                    return False
+                self.probing = True
+                return True
+            if self.state == self.OPEN:
+                self.rejected += 1
+                return False
+            return True
+
+    def RecordSuccess(self):
+        """
+        Record a successful call, closing the circuit.
+        """
+        with self.lock:
+            self.total_successes += 1
+            self.failures = 0
+            self.probing = False
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit of peer {self.peer} closed")
+            self.state = self.CLOSED
+
+    def RecordFailure(self):
+        """
+        Record a failed call. A failed probe, or failure_threshold consecutive
+        failures, open the circuit.
+        """
+        with self.lock:
+            self.total_failures += 1
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit of peer {self.peer} open after {self.failures} consecutive failures")
+                self.state = self.OPEN
+                self.probing = False
+                self.opened_at = time.time()
+                self.retry_at = self.opened_at + self.reset_timeout
+
+    def Release(self):
+        """
+        Give back the probe of a call that ended without a result (an error unrelated to the peer's health).
+        """
+        with self.lock:
+            self.probing = False
+
+    def ToJson(self) -> Dict[str, Any]:
+        """
+        Convert the state of the circuit to a JSON object.
+        """
+        with self.lock:
+            return {
+                "peer": self.peer,
+                "state": self.state,
+                "failures": self.failures,
+                "opened_at": self.opened_at,
+                "retry_at": self.retry_at if self.state == self.OPEN else None,
+                "total_failures": self.total_failures,
+                "total_successes": self.total_successes,
+                "rejected": self.rejected
+            }
+
+
+class PeerHealth:
+    """
+    Retry policy and circuit breakers of the peers of an agent.
+
+    Attributes:
+        retry: The retry policy
+        failure_threshold: Consecutive failures opening the circuit of a peer
+        reset_timeout: Seconds a circuit stays open before a probe
+        breakers: Circuit breaker per peer
+    """
+
+    def __init__(self, retry: Optional[RetryPolicy] = None, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        """
+        Initialize a PeerHealth.
+
+        Args:
+            retry: Retry policy, 3 attempts from 50 ms backoff if None
+            failure_threshold: Consecutive failures opening the circuit of a peer
+            reset_timeout: Seconds a circuit stays open before a probe
+        """
+        self.retry = retry or RetryPolicy()
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.lock = threading.Lock()
+
+    def Breaker(self, peer: str) -> CircuitBreaker:
+        """
+        Get the circuit breaker of a peer, creating it on first use.
+        """
+        breaker = self.breakers.get(peer)
+        if breaker is None:
+            with self.lock:
+                breaker = self.breakers.get(peer)
+                if breaker is None:
+                    breaker = CircuitBreaker(peer, self.failure_threshold, self.reset_timeout)
+                    self.breakers[peer] = breaker
+        return breaker
+
+    def IsAvailable(self, peer: str) -> bool:
+        """
+        Check whether a peer would be called now.
+
+        Args:
+            peer: The peer, "agent_id@plaza_name"
+
+        Returns:
+            bool: False while the circuit of the peer is open
+        """
+        breaker = self.breakers.get(peer)
+        return breaker is None or breaker.available
+
+    def State(self, peer: str) -> str:
+        """
+        Get the state of the circuit of a peer.
+
+        Returns:
+            str: "closed", "open" or "half_open"
+        """
+        breaker = self.breakers.get(peer)
+        return breaker.state if breaker is not None else CircuitBreaker.CLOSED
+
+    def Call(self, peer: str, call: Callable[[], Any], failed: Callable[[Any], bool] = lambda result: not result,
+             retryable: Callable[[Any], bool] = lambda result: True, deadline: Optional[float] = None,
+             busy: Callable[[Any], bool] = lambda result: False) -> Any:
+        """
+        Call a peer, retrying failed attempts, unless its circuit is open.
+
+        Exceptions raised by call (e.g. an unknown peer) are neither retried nor
+        counted as failures, they are raised to the caller.
+
+        Args:
+            peer: The peer, "agent_id@plaza_name"
+            call: Function calling the peer
+            failed: Whether a result is a failure, a false result by default
+            retryable: Whether a failed result is worth another attempt
+            deadline: time.time() after which no further attempt is made
+            busy: Whether a result is a busy reply of a healthy peer, retried without
+                counting as a failure or a success
+
+        Returns:
+            The result of the last attempt
+
+        Raises:
+            PeerUnavailableError: If the circuit of the peer is open
+        """
+        breaker = self.Breaker(peer)
+        attempt = 0
+        while True:
+            if not breaker.Allow():
+                raise PeerUnavailableError(peer, breaker.retry_at)
+            try:
+                result = call()
+            except BaseException:
+                breaker.Release()
+                raise
+            if busy(result):
+                breaker.Release()
+                if attempt + 1 >= self.retry.max_attempts:
+                    return result
+            elif not failed(result):
+                breaker.RecordSuccess()
+                return result
+            else:
+                breaker.RecordFailure()
+                if attempt + 1 >= self.retry.max_attempts or not retryable(result):
+                    return result
+            delay = self.retry.Delay(attempt)
+            if deadline is not None and time.time() + delay >= deadline:
+                return result
+            logger.debug(f"Attempt {attempt + 1} to peer {peer} failed, retrying in {delay:.3f}s")
+            time.sleep(delay)
+            attempt += 1
+
+    async def CallAsync(self, peer: str, call: Callable[[], Awaitable[Any]],
+                        failed: Callable[[Any], bool] = lambda result: not result,
+                        retryable: Callable[[Any], bool] = lambda result: True, deadline: Optional[float] = None,
+                        busy: Callable[[Any], bool] = lambda result: False) -> Any:
+        """
+        Call a peer from an event loop, see Call.
+
+        Args:
+            peer: The peer, "agent_id@plaza_name"
+            call: Function returning the awaitable calling the peer
+            failed: Whether a result is a failure, a false result by default
+            retryable: Whether a failed result is worth another attempt
+            deadline: time.time() after which no further attempt is made
+            busy: Whether a result is a busy reply of a healthy peer, retried without
+                counting as a failure or a success
+
+        Returns:
+            The result of the last attempt
+
+        Raises:
+            PeerUnavailableError: If the circuit of the peer is open
+        """
+        breaker = self.Breaker(peer)
+        attempt = 0
+        while True:
+            if not breaker.Allow():
+                raise PeerUnavailableError(peer, breaker.retry_at)
+            try:
+                result = await call()
+            except BaseException:
+                breaker.Release()
+                raise
+            if busy(result):
+                breaker.Release()
+                if attempt + 1 >= self.retry.max_attempts:
+                    return result
+            elif not failed(result):
+                breaker.RecordSuccess()
+                return result
+            else:
+                breaker.RecordFailure()
+                if attempt + 1 >= self.retry.max_attempts or not retryable(result):
+                    return result
+            delay = self.retry.Delay(attempt)
+            if deadline is not None and time.time() + delay >= deadline:
+                return result
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def Reset(self, peer: Optional[str] = None):
+        """
+        Forget the failures of a peer, or of all peers.
+        """
+        with self.lock:
+            if peer is None:
+                self.breakers.clear()
+            else:
+                self.breakers.pop(peer, None)
+
+    def Stats(self) -> Dict[str, Any]:
+        """
+        Get the state of the circuits of all peers.
+
+        Returns:
+            dict: Circuit state per peer, and the peers that are unavailable
+        """
+        breakers = list(self.breakers.values())
+        return {
+            "peers": {breaker.peer: breaker.ToJson() for breaker in breakers},
+            "unavailable": [breaker.peer for breaker in breakers if not breaker.available]
+        }
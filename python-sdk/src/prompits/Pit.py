@@ -203,6 +203,34 @@ class Pit(ABC):
             
             raise ValueError(error_msg)
 
+    async def UsePracticeAsync(self, practice_name, *args, **kwargs):
+        """
+        Call the practice function with the arguments from a running event loop.
+        
+        Async practices are awaited, others run in the default executor.
+        
+        Args:
+            practice_name: Name of the practice to use
+            *args: Positional arguments
+            **kwargs: Keyword arguments
+            
+        Returns:
+            Any: Result of the practice
+        """
+        if practice_name not in self.practices:
+            error_msg = f"Practice {practice_name} not found"
+            self.emit_log_event(error_msg, 'ERROR')
+            raise ValueError(error_msg)
+        practice = self.practices[practice_name]
+        for sub in self.log_subscribers:
+            if hasattr(practice, 'subscribe_to_logs') and sub not in practice.log_subscribers:
+                practice.subscribe_to_logs(sub)
+        try:
+            return await practice.UseAsync(*args, **kwargs)
+        except Exception as e:
+            self.emit_log_event(f"Error in practice {practice_name}: {str(e)}\n{traceback.format_exc()}", 'ERROR')
+            raise
+
     def AddPractice(self, practice: Practice):
         """
         Add a practice to the pit.
@@ -13,11 +13,14 @@ import threading
 import time
 import uuid
 
-from .Message import Message
+from .Message import Message, PriorityOf, PRIORITY_HIGH
 from .Practice import Practice
 from .AgentAddress import AgentAddress
 from .LogEvent import LogEvent
 from .Pit import Pit
+from .codecs import Codec, CodecRegistry
+from .MessageQueue import MessageQueue
+from .messages.StatusMessage import StatusMessage
 
 class Plug(Pit):
     """
@@ -31,13 +34,18 @@ class Plug(Pit):
     Other agents can connect to the plug by using the connect practice.
     """
     
-    def __init__(self, name: str, description: str = None):
+    def __init__(self, name: str, description: str = None, codecs: List[str] = None,
+                 queue_size: int = 10000, high_water_mark: int = None):
         """
         Initialize a Plug.
         
         Args:
             name: Name of the plug
             description: Description of the plug
+            codecs: Names of the codecs the plug accepts, in order of preference (default: all available)
+            queue_size: Maximum number of received messages waiting for ReceiveMessage
+            high_water_mark: Number of waiting messages from which new messages are rejected
+                as busy (default: queue_size)
         """
         super().__init__(name, description or f"Plug {name}")
         
@@ -47,11 +55,21 @@ class Plug(Pit):
         self.AddPractice(Practice("Echo", self._Echo))
         self.AddPractice(Practice("ConnectToAgent", self._ConnectToAgent))
         self.AddPractice(Practice("DisconnectFromAgent", self._DisconnectFromAgent))
+        self.AddPractice(Practice("QueueStats", self.QueueStats))
 
         # remote_agent is a dictionary of agent addresses and connections status
         # key is the agent address, value is a dictionary with the connection status and the plug
         self.remote_agent={}
         
+        # names of the codecs this plug accepts, advertised to peers in ToJson
+        if codecs is None:
+            self.codecs = CodecRegistry.Available()
+        else:
+            self.codecs = [name for name in codecs if CodecRegistry.Get(name)] or ["json"]
+        
+        # received messages waiting for ReceiveMessage
+        self.message_queue = MessageQueue(queue_size, high_water_mark)
+        
     def _ConnectToAgent(self, agent:AgentAddress, plugs_info:Dict[str, Any]):
         """
         Connect to an agent.
@@ -89,7 +107,8 @@ class Plug(Pit):
                         "name": practice.name,
                         "description": practice.description
                     }
-                    
+        
+        json_data["codecs"] = self.codecs
         return json_data
     
     def FromJson(self, json_data):
@@ -104,8 +123,22 @@ class Plug(Pit):
         """
         self.name = json_data.get("name", self.name)
         self.description = json_data.get("description", self.description)
+        self.codecs = [name for name in json_data.get("codecs", self.codecs) if CodecRegistry.Get(name)] or ["json"]
         return self
 
+    def _GetCodec(self, plugs_info: Dict[str, Any] = None) -> Codec:
+        """
+        Get the codec to send to a peer with.
+        
+        Args:
+            plugs_info: The plug info advertised by the peer
+            
+        Returns:
+            Codec: The first codec of this plug the peer accepts, JSON if the peer advertises none
+        """
+        peer_codecs = plugs_info.get("codecs") if plugs_info else None
+        return CodecRegistry.Negotiate(peer_codecs, self.codecs)
+
     @abstractmethod
     def _Listen(self, plugs_info:Dict[str, Any]):
         """
@@ -181,22 +214,67 @@ class Plug(Pit):
             message: The received message
         
         Returns:
-            bool: True if notification was successful, False otherwise
+            bool: True if the agent consumed the message (e.g. it answered a pending request),
+                False if the plug should keep it for ReceiveMessage
         """
-        if hasattr(self, 'agent') and self.agent:
+        if hasattr(self, 'agent') and self.agent and hasattr(self.agent, 'receive_message'):
             try:
-                self.agent.receive_message(message)
-                return True
+                return bool(self.agent.receive_message(message))
             except Exception as e:
                 self.log(f"Error notifying agent: {str(e)}", 'ERROR')
                 return False
         return False 
     
-    def _add_agent(self, agent):
+    def _EnqueueMessage(self, message, force: bool = False) -> bool:
         """
-        Add an agent to the plug.
+        Queue a received message for ReceiveMessage, in the lane of its priority.
+        
+        Args:
+            message: The received message
+            force: Queue the message above the high-water mark, for control messages.
+                High-priority messages are always forced
+            
+        Returns:
+            bool: True if queued, False if the queue is at its high-water mark
+        """
+        was_busy = self.message_queue.busy_since is not None
+        priority = PriorityOf(message)
+        if self.message_queue.put(message, force or priority == PRIORITY_HIGH, priority):
+            return True
+        if not was_busy:
+            self.log(f"Plug {self.name} is busy: {len(self.message_queue)} messages waiting, rejecting new messages", 'WARNING')
+        return False
+
+    def _BusyStatus(self) -> StatusMessage:
+        """
+        Get the "busy" StatusMessage sent to senders of rejected messages.
+        """
+        agent = getattr(self, 'agent', None)
+        agent_id = getattr(agent, 'agent_id', None) or self.name
+        plaza_name = next(iter(getattr(agent, 'plazas', None) or {}), "")
+        return StatusMessage(AgentAddress(agent_id, plaza_name), "busy")
+
+    def QueueStats(self) -> Dict[str, Any]:
+        """
+        Get the depth and counters of the queue of received messages.
+        
+        Returns:
+            dict: Depth, limits and accepted/dropped counters
+        """
+        return self.message_queue.stats()
+
+    def set_agent(self, agent):
+        """
+        Set the agent the plug delivers received messages to.
+        
+        Args:
+            agent: The agent
+            
+        Returns:
+            Plug: The plug
         """
         self.agent = agent
+        return self
         
     def _remove_agent(self):
         """
@@ -2,6 +2,7 @@
 # contains a function can be used by other agents
 
 import asyncio
+import functools
 import inspect
 import traceback
 from typing import Any, Callable, Dict, Optional
@@ -91,6 +92,26 @@ class Practice:
             
             raise
 
+    async def UseAsync(self, *args, **kwargs) -> Any:
+        """
+        Execute the practice from a running event loop.
+        
+        Async practices are awaited on the loop, other practices run in the default
+        executor so they don't block it.
+        """
+        if not self.is_async:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, functools.partial(self.Use, *args, **kwargs))
+        try:
+            if self.parameters:
+                kwargs = {**self.parameters, **kwargs}
+            result = await self.function(*args, **kwargs)
+            self.log(f"Practice {self.name} completed successfully", 'DEBUG')
+            return result
+        except Exception as e:
+            self.log(f"Error in practice {self.name}: {e}\n{traceback.format_exc()}", 'ERROR')
+            raise
+
     def Info(self) -> Dict:
         """Get information about the practice."""
         try:
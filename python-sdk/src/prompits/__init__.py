@@ -19,6 +19,7 @@ from .Plaza import Plaza
 from .Practice import Practice
 from .messages.StatusMessage import StatusMessage
 from .messages.UsePracticeMessage import UsePracticeResponse
+from .FanOut import DeliveryReport
 
 # Import specific implementations
 from .pools.PostgresPool import PostgresPool
@@ -49,7 +50,8 @@ __all__ = [
     'Plaza',
     'AgentPlaza',
     'StatusMessage',
-    'UsePracticeResponse'
+    'UsePracticeResponse',
+    'DeliveryReport'
 ]
 
 # Instead, provide a function to get the classes
@@ -69,6 +71,7 @@ def get_class(class_name):
     class_map = {
         "TCPPlug": "prompits.plugs.TCPPlug",
         "HTTPPlug": "prompits.plugs.HTTPPlug",
+        "SharedMemoryPlug": "prompits.plugs.SharedMemoryPlug",
         "PostgresPool": "prompits.pools.PostgresPool",
         "AgentPlaza": "prompits.plazas.AgentPlaza",
         # Add more classes as needed
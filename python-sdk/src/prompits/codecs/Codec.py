@@ -0,0 +1,169 @@
+# Codec is the base class of message serializers
+# CodecRegistry keeps the codecs available in this process, in order of preference.
+# Plugs advertise the names of the codecs they accept in their plug info, and the
+# sender picks the first codec in its own preference order that the peer accepts.
+# Peers that advertise no codecs get standard JSON, written by the fastest JSON codec available.
+
+import threading
+from datetime import datetime, date
+from typing import Any, Dict, List, Optional
+
+
+class Codec:
+    """
+    Base class of codecs.
+
+    Attributes:
+        name: Name advertised to peers
+        content_type: MIME type of the encoded data
+        json_compatible: Whether the output is standard JSON that any JSON reader can decode
+    """
+    name = None
+    content_type = None
+    json_compatible = False
+
+    def IsAvailable(self) -> bool:
+        """
+        Check if the library of the codec is installed.
+
+        Returns:
+            bool: True if the codec can be used
+        """
+        return True
+
+    def Encode(self, data: Any) -> bytes:
+        """
+        Encode data to bytes.
+
+        Args:
+            data: JSON-compatible data, objects with ToJson are converted with it
+
+        Returns:
+            bytes: The encoded data
+        """
+        raise NotImplementedError("Encode method must be implemented by the subclass")
+
+    def Decode(self, data: bytes) -> Any:
+        """
+        Decode bytes.
+
+        Args:
+            data: The encoded data
+
+        Returns:
+            Any: The decoded data
+        """
+        raise NotImplementedError("Decode method must be implemented by the subclass")
+
+    @staticmethod
+    def default(obj: Any) -> Any:
+        """
+        Convert objects the codec cannot serialize natively.
+
+        Objects with a ToJson method (Message, AgentAddress, Attachment...) use it,
+        dates become ISO strings and sets become lists; other objects fall back to
+        their attributes, as json.dumps(default=vars) did.
+
+        Args:
+            obj: The object to convert
+
+        Returns:
+            Any: A serializable value
+        """
+        if hasattr(obj, 'ToJson'):
+            return obj.ToJson()
+        if isinstance(obj, (datetime, date)):
+            return obj.isoformat()
+        if isinstance(obj, (set, frozenset)):
+            return list(obj)
+        return vars(obj)
+
+
+class CodecRegistry:
+    """
+    Process-wide registry of codecs.
+    """
+    _codecs: Dict[str, Codec] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def Register(cls, codec: Codec):
+        """
+        Register a codec. Codecs registered first are preferred.
+
+        Args:
+            codec: The codec to register
+        """
+        with cls._lock:
+            cls._codecs[codec.name] = codec
+
+    @classmethod
+    def Get(cls, name: str) -> Optional[Codec]:
+        """
+        Get an available codec by name.
+
+        Args:
+            name: Name of the codec
+
+        Returns:
+            Codec: The codec, or None if it is unknown or its library is not installed
+        """
+        codec = cls._codecs.get(name)
+        if codec is None or not codec.IsAvailable():
+            return None
+        return codec
+
+    @classmethod
+    def GetByContentType(cls, content_type: str) -> Optional[Codec]:
+        """
+        Get an available codec by MIME type.
+
+        Args:
+            content_type: The MIME type, parameters such as charset are ignored
+
+        Returns:
+            Codec: The codec, or None if none matches
+        """
+        if not content_type:
+            return None
+        content_type = content_type.split(';')[0].strip().lower()
+        for codec in cls._codecs.values():
+            if codec.content_type == content_type and codec.IsAvailable():
+                return codec
+        return None
+
+    @classmethod
+    def Available(cls) -> List[str]:
+        """
+        Get the names of the available codecs in order of preference.
+
+        Returns:
+            list: Codec names
+        """
+        return [name for name, codec in cls._codecs.items() if codec.IsAvailable()]
+
+    @classmethod
+    def Negotiate(cls, peer_codecs: Optional[List[str]], local_codecs: Optional[List[str]] = None) -> Codec:
+        """
+        Pick the codec to send to a peer with.
+
+        Args:
+            peer_codecs: Codec names advertised by the peer, None for peers that predate codecs
+            local_codecs: Codec names this side may use, in order of preference (default: all available)
+
+        Returns:
+            Codec: The first local codec the peer accepts. If the peer advertises no codecs, or
+                none in common, the first local codec writing standard JSON.
+        """
+        local_codecs = local_codecs or cls.Available()
+        if peer_codecs:
+            for name in local_codecs:
+                if name in peer_codecs:
+                    codec = cls.Get(name)
+                    if codec is not None:
+                        return codec
+        for name in local_codecs:
+            codec = cls.Get(name)
+            if codec is not None and codec.json_compatible:
+                return codec
+        return cls._codecs["json"]
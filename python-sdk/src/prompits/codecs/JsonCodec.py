@@ -0,0 +1,40 @@
+# JsonCodec serializes with the standard library json module
+# Always available, and the codec used with peers that advertise no codecs
+
+import json
+from typing import Any
+
+from .Codec import Codec
+
+
+class JsonCodec(Codec):
+    """
+    Codec using the standard library json module.
+    """
+    name = "json"
+    content_type = "application/json"
+    json_compatible = True
+
+    def Encode(self, data: Any) -> bytes:
+        """
+        Encode data to UTF-8 JSON.
+
+        Args:
+            data: The data to encode
+
+        Returns:
+            bytes: The encoded data
+        """
+        return json.dumps(data, default=Codec.default).encode('utf-8')
+
+    def Decode(self, data: bytes) -> Any:
+        """
+        Decode JSON.
+
+        Args:
+            data: The encoded data, bytes or str
+
+        Returns:
+            Any: The decoded data
+        """
+        return json.loads(data)
@@ -0,0 +1,53 @@
+# MsgpackCodec serializes with MessagePack, a compact binary format
+# Bytes values (e.g. attachment data) are kept as bytes instead of failing or being
+# converted. Optional: needs "pip install msgpack"
+
+from typing import Any
+
+from .Codec import Codec
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class MsgpackCodec(Codec):
+    """
+    Codec using MessagePack.
+    """
+    name = "msgpack"
+    content_type = "application/msgpack"
+
+    def IsAvailable(self) -> bool:
+        """
+        Check if msgpack is installed.
+
+        Returns:
+            bool: True if msgpack can be imported
+        """
+        return msgpack is not None
+
+    def Encode(self, data: Any) -> bytes:
+        """
+        Encode data to MessagePack.
+
+        Args:
+            data: The data to encode
+
+        Returns:
+            bytes: The encoded data
+        """
+        return msgpack.packb(data, default=Codec.default, use_bin_type=True)
+
+    def Decode(self, data: bytes) -> Any:
+        """
+        Decode MessagePack.
+
+        Args:
+            data: The encoded data
+
+        Returns:
+            Any: The decoded data
+        """
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
@@ -0,0 +1,53 @@
+# OrjsonCodec serializes JSON with orjson, several times faster than the json module
+# Produces standard JSON, so any JSON reader can decode it. Optional: needs "pip install orjson"
+
+from typing import Any
+
+from .Codec import Codec
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class OrjsonCodec(Codec):
+    """
+    Codec using orjson.
+    """
+    name = "orjson"
+    content_type = "application/json"
+    json_compatible = True
+
+    def IsAvailable(self) -> bool:
+        """
+        Check if orjson is installed.
+
+        Returns:
+            bool: True if orjson can be imported
+        """
+        return orjson is not None
+
+    def Encode(self, data: Any) -> bytes:
+        """
+        Encode data to UTF-8 JSON.
+
+        Args:
+            data: The data to encode
+
+        Returns:
+            bytes: The encoded data
+        """
+        return orjson.dumps(data, default=Codec.default, option=orjson.OPT_NON_STR_KEYS)
+
+    def Decode(self, data: bytes) -> Any:
+        """
+        Decode JSON.
+
+        Args:
+            data: The encoded data, bytes or str
+
+        Returns:
+            Any: The decoded data
+        """
+        return orjson.loads(data)
@@ -0,0 +1,24 @@
+"""
+Codecs package initialization.
+
+Codecs serialize message dictionaries to bytes. The CodecRegistry holds the codecs
+available in this process and picks the one to use with each peer.
+"""
+
+from .Codec import Codec, CodecRegistry
+from .JsonCodec import JsonCodec
+from .OrjsonCodec import OrjsonCodec
+from .MsgpackCodec import MsgpackCodec
+
+# order of preference: orjson is the fastest to encode and decode, msgpack is the most compact
+CodecRegistry.Register(OrjsonCodec())
+CodecRegistry.Register(MsgpackCodec())
+CodecRegistry.Register(JsonCodec())
+
+__all__ = [
+    'Codec',
+    'CodecRegistry',
+    'JsonCodec',
+    'OrjsonCodec',
+    'MsgpackCodec'
+]
@@ -3,6 +3,7 @@
 from datetime import datetime
 from typing import Dict, Any, Optional
 from ..AgentAddress import AgentAddress
+from ..Message import PRIORITY_HIGH
 
 class StatusMessage:
     """
@@ -11,8 +12,12 @@ class StatusMessage:
     StatusMessage contains information about an agent's current state,
     including its address, status value, and the timestamp when the
     status was recorded.
+    
+    Status messages are high priority: receivers serve them before queued practice requests.
     """
     
+    priority = PRIORITY_HIGH
+    
     def __init__(self, agent_address: AgentAddress, status: str, timestamp: Optional[datetime] = None):
         """
         Initialize a StatusMessage instance.
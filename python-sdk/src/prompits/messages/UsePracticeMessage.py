@@ -2,6 +2,7 @@
 # contains the practice name, and the sender and recipients, and arguments
 
 import json
+import warnings
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 from ..AgentAddress import AgentAddress
@@ -11,7 +12,7 @@ class UsePracticeRequest(Message):
     """
     A message that requests the use of a practice.
     """
-    def __init__(self, practice_name: str, sender: AgentAddress, recipients: List[AgentAddress], arguments: Dict[str, Any] = None, msg_id: str = None, attachments: List[Attachment] = None):
+    def __init__(self, practice_name: str, sender: AgentAddress, recipients: List[AgentAddress], arguments: Dict[str, Any] = None, msg_id: str = None, attachments: List[Attachment] = None, deadline: Optional[float] = None, priority: Optional[int] = None):
         """
         Initialize a UsePracticeRequest message.
         
@@ -22,32 +23,61 @@ class UsePracticeRequest(Message):
             arguments (Dict[str, Any]): The arguments to pass to the practice
             msg_id (str): The message ID
             attachments (List[Attachment]): The attachments to pass to the practice
+            deadline (float): Absolute time (time.time() seconds) after which the sender no longer
+                waits for the response, receivers drop the request once it has passed
+            priority (int): Priority of the request in the queues of receivers, e.g.
+                PRIORITY_LOW for batch work (default: PRIORITY_NORMAL)
         """
+        body = {"practice_name": practice_name, "arguments": arguments or {}}
+        if deadline is not None:
+            body["deadline"] = deadline
         super().__init__(
             type="UsePracticeRequest",
-            body={"practice_name": practice_name, "arguments": arguments or {}},
+            body=body,
             sender=sender,
             recipients=recipients,
             msg_id=msg_id,
-            attachments=attachments
+            attachments=attachments,
+            priority=priority
         )
         self.practice_name = practice_name
         self.arguments = arguments or {}
+        self.deadline = deadline
 
     @property
     def args(self) -> Dict[str, Any]:
         return self.arguments
 
-    @staticmethod
-    def FromJson(json_data: Dict[str, Any]) -> 'UsePracticeRequest':
-        msg = Message.FromJson(json_data)
+    def FromJson(self_or_data, json_data: Dict[str, Any] = None) -> 'UsePracticeRequest':
+        """
+        Create a UsePracticeRequest from JSON data, as written by ToJson.
+        
+        Called on an instance, request.FromJson(json_data) updates the practice name and
+        arguments of the request instead, as it used to. That use is deprecated.
+        
+        Args:
+            json_data: Dictionary containing serialized message data
+            
+        Returns:
+            UsePracticeRequest: New instance initialized with the data, or the updated instance
+        """
+        if isinstance(self_or_data, UsePracticeRequest):
+            warnings.warn("UsePracticeRequest.FromJson on an instance is deprecated, "
+                          "call it on the class to create a request", DeprecationWarning, stacklevel=2)
+            self = self_or_data
+            self.body['practice_name'] = self.practice_name = json_data['body']['practice_name']
+            self.body['arguments'] = self.arguments = json_data['body']['arguments']
+            return self
+        msg = Message.FromJson(self_or_data)
         return UsePracticeRequest(
             practice_name=msg.body["practice_name"],
             arguments=msg.body["arguments"],
             sender=msg.sender,
             recipients=msg.recipients,
             msg_id=msg.msg_id,
-            attachments=msg.attachments
+            attachments=msg.attachments,
+            deadline=msg.body.get("deadline"),
+            priority=msg.priority
         )
 
     def __str__(self):
@@ -58,14 +88,10 @@ class UsePracticeRequest(Message):
     
     def ToJson(self) -> dict:
         json_msg = super().ToJson()
-        json_msg['body']['practice_name'] = self.body['practice_name']
-        json_msg['body']['arguments'] = self.body['arguments']
+        # a copy, the body of a frozen request is read-only
+        json_msg['body'] = dict(json_msg['body'], practice_name=self.body['practice_name'],
+                                arguments=self.body['arguments'])
         return json_msg
-
-    def FromJson(self, json_data: Dict[str, Any]):
-        super().FromJson(json_data)
-        self.body['practice_name'] = json_data['body']['practice_name']
-        self.body['arguments'] = json_data['body']['arguments']
     
 class UsePracticeResponse(Message):
     """
@@ -96,9 +122,31 @@ class UsePracticeResponse(Message):
         self.result = result
         self.error = error
 
-    @staticmethod
-    def FromJson(json_data: Dict[str, Any]) -> 'UsePracticeResponse':
-        msg = Message.FromJson(json_data)
+    def FromJson(self_or_data, json_data=None) -> 'UsePracticeResponse':
+        """
+        Create a UsePracticeResponse from JSON data, as written by ToJson.
+        
+        Called on an instance, response.FromJson(json_data) loads the data, a dictionary or
+        its JSON string, into the response instead, as it used to. That use is deprecated.
+        
+        Args:
+            json_data: Dictionary containing serialized message data
+            
+        Returns:
+            UsePracticeResponse: New instance initialized with the data, or the updated instance
+        """
+        if isinstance(self_or_data, UsePracticeResponse):
+            warnings.warn("UsePracticeResponse.FromJson on an instance is deprecated, "
+                          "call it on the class to create a response", DeprecationWarning, stacklevel=2)
+            self = self_or_data
+            if isinstance(json_data, str):
+                json_data = json.loads(json_data)
+            loaded = UsePracticeResponse.FromJson(json_data)
+            self.body, self.sender, self.recipients = loaded.body, loaded.sender, loaded.recipients
+            self.msg_id, self.attachments = loaded.msg_id, loaded.attachments
+            self.practice_name, self.result, self.error = loaded.practice_name, loaded.result, loaded.error
+            return self
+        msg = Message.FromJson(self_or_data)
         return UsePracticeResponse(
             practice_name=msg.body["practice_name"],
             result=msg.body["result"],
@@ -138,10 +186,3 @@ class UsePracticeResponse(Message):
             "msg_id": self.msg_id,
             "attachments": self.attachments
         }
-    
-    def FromJson(self, json_data):
-        self.body = json.loads(json_data)
-        self.sender = AgentAddress(self.body['sender'])
-        self.recipients = [AgentAddress(recipient) for recipient in self.body['recipients']]
-        self.msg_id = self.body['msg_id']
-        self.attachments = [Attachment(attachment['name'], attachment['content']) for attachment in self.body['attachments']]
\ No newline at end of file
@@ -6,10 +6,12 @@ their practices and request services from other agents. It connect to a pool
 and store the advertisements in a table in the pool.
 """
 
+import hashlib
 import threading
 import time
 import uuid
-from typing import Dict, List, Any, Optional
+from collections import deque
+from typing import Callable, Dict, List, Any, Optional, Union
 from datetime import datetime, timedelta
 import traceback
 import json
@@ -21,6 +23,7 @@ from ..pools.DatabasePool import DatabasePool
 from ..Practice import Practice
 from ..AgentAddress import AgentAddress
 from ..LogEvent import LogEvent
+from ..Message import Message
 
 class AgentPlaza(Plaza):
     """
@@ -29,9 +32,29 @@ class AgentPlaza(Plaza):
     A AgentPlaza maintains a list of advertisements from agents and provides
     methods for agents to advertise, search for advertisements, and
     request services from other agents.
+    
+    The plaza keeps an in-memory index from practice names to the agents (and their
+    pits) advertising them, so FindAgentsByPractice does not scan every advertisement.
+    The index is updated by Advertise and update_agent_stop_time, and rebuilt from the
+    table every index_refresh seconds to pick up agents advertised through other plaza
+    instances sharing the table. A search finding no agent rebuilds the index first if it
+    was not rebuilt for index_miss_refresh seconds, so a new agent advertised through
+    another plaza instance is found without waiting for the next refresh.
+    
+    Membership changes seen by the index (agents joining, leaving, or updating their
+    advertisement) are kept in a change log with increasing versions, so peers can
+    follow them with SubscribeChanges instead of reloading ListActiveAgents.
+    
+    While the plaza runs, a cleanup job marks the advertisements which were not
+    refreshed for expire_after seconds as stopped, and removes the advertisements
+    stopped for more than retention seconds, so the table holds little more than
+    the live agents.
     """
     
-    def __init__(self, name: str = "AgentPlaza", description: str = None, pool=None, table_name: str="agents", agent=None):
+    def __init__(self, name: str = "AgentPlaza", description: str = None, pool=None, table_name: str="agents", agent=None,
+                 index_refresh: float = 30, change_log_size: int = 1000, cleanup_interval: float = 60,
+                 expire_after: float = 300, retention: Optional[float] = 86400, cleanup_batch_size: int = 100,
+                 cleanup_max_batches: int = 10, index_miss_refresh: float = 1):
         """
         Initialize an AgentPlaza.
         
@@ -41,6 +64,14 @@ class AgentPlaza(Plaza):
             pool: Database pool
             table_name: Name of the table to store agent data
             agent: Reference to the owning agent
+            index_refresh: Seconds after which the practice index is rebuilt from the table
+            change_log_size: Number of membership changes kept for SubscribeChanges
+            cleanup_interval: Seconds between runs of the cleanup job
+            expire_after: Seconds without refresh after which an advertisement is marked stopped
+            retention: Seconds a stopped advertisement is kept before it is removed, None to keep them
+            cleanup_batch_size: Number of rows expired or removed per batch
+            cleanup_max_batches: Number of batches per cleanup run
+            index_miss_refresh: Seconds after which a search finding no agent rebuilds the index
         """
         # Create the schema for the agents table
         from ..Schema import DataType
@@ -82,6 +113,35 @@ class AgentPlaza(Plaza):
         self.running = False
         self.pools = [pool] if pool else []
         
+        # practice name -> {agent_id: [pit names]}, and agent_id -> indexed advertisement
+        self.practice_index: Dict[str, Dict[str, List[str]]] = {}
+        self.indexed_agents: Dict[str, Dict[str, Any]] = {}
+        self.index_lock = threading.Lock()
+        self.index_refresh = index_refresh
+        self.index_miss_refresh = index_miss_refresh
+        self.index_time = 0
+        # one rebuild at a time, and agent_id -> time of its last change by this plaza
+        self.rebuild_lock = threading.Lock()
+        self.index_touched: Dict[str, float] = {}
+        
+        # membership change log, and subscription_id -> {"subscriber", "version"}
+        self.changes = deque(maxlen=change_log_size)
+        self.version = 0
+        self.subscriptions: Dict[str, Dict[str, Any]] = {}
+        self.changes_lock = threading.Lock()
+        self.changes_event = threading.Event()
+        self.sync_thread = None
+        
+        # cleanup job
+        self.cleanup_interval = cleanup_interval
+        self.expire_after = expire_after
+        self.retention = retention
+        self.cleanup_batch_size = max(1, cleanup_batch_size)
+        self.cleanup_max_batches = max(1, cleanup_max_batches)
+        self.cleanup_event = threading.Event()
+        self.cleanup_stats = {"runs": 0, "last_run": None, "last_duration": 0, "last_expired": 0,
+                              "last_removed": 0, "expired": 0, "removed": 0, "backlog": 0}
+        
         # Don't Create the table 
         # if self.pool and self.pool.TableExists(self.table_name):
         #     self.pool.DropTable(self.table_name)
@@ -99,12 +159,19 @@ class AgentPlaza(Plaza):
             else:
                 self.log(f"Table {self.table_name} creation failed", 'ERROR')
                 raise Exception(f"Agent Table {self.table_name} creation failed")
+        self._create_indexes()
         
         # Add practices
         self.AddPractice(Practice("SearchAdvertisements", self.search_advertisements))
         self.AddPractice(Practice("Advertise", self.Advertise))
+        self.AddPractice(Practice("Heartbeat", self.Heartbeat))
         self.AddPractice(Practice("AddPool", self.add_pool))
         self.AddPractice(Practice("ListActiveAgents", self.list_active_agents))
+        self.AddPractice(Practice("FindAgentsByPractice", self.find_agents_by_practice))
+        self.AddPractice(Practice("SubscribeChanges", self.SubscribeChanges))
+        self.AddPractice(Practice("UnsubscribeChanges", self.UnsubscribeChanges))
+        self.AddPractice(Practice("Cleanup", self.cleanup))
+        self.AddPractice(Practice("CleanupStats", self.get_cleanup_stats))
         
         # Store reference to the owning agent
         self.agent = agent
@@ -187,8 +254,16 @@ class AgentPlaza(Plaza):
         name = json_data.get("name", "AgentPlaza")
         description = json_data.get("description", None)
         table_name = json_data.get("table_name", "agents")
+        index_refresh = json_data.get("index_refresh", 30)
+        change_log_size = json_data.get("change_log_size", 1000)
         
-        return cls(name, description, pool, table_name, agent)
+        return cls(name, description, pool, table_name, agent, index_refresh, change_log_size,
+                   cleanup_interval=json_data.get("cleanup_interval", 60),
+                   expire_after=json_data.get("expire_after", 300),
+                   retention=json_data.get("retention", 86400),
+                   cleanup_batch_size=json_data.get("cleanup_batch_size", 100),
+                   cleanup_max_batches=json_data.get("cleanup_max_batches", 10),
+                   index_miss_refresh=json_data.get("index_miss_refresh", 1))
     
     def Advertise(self, agent_id: str, agent_name: str, description: str = None, agent_info: Dict = None):
         """
@@ -237,6 +312,7 @@ class AgentPlaza(Plaza):
             else:
                 agent_data["create_time"] = now
                 self.pool.UsePractice("Insert", self.table_name, agent_data, self.agent_table_schema)
+            self._index_agent(agent_id, agent_name, agent_info, now, description)
             
             self.log(f"Advertised agent {agent_id} on plaza {self.name}", 'DEBUG')
             return True
@@ -245,6 +321,370 @@ class AgentPlaza(Plaza):
             self.log(f"Error advertising agent: {str(e)}\n{traceback.format_exc()}", 'ERROR')
             return False
     
+    def Heartbeat(self, agent_id: str):
+        """
+        Keep the advertisement of an agent active, without rewriting its agent info.
+        
+        Args:
+            agent_id: ID of the agent
+            
+        Returns:
+            bool: True if the advertisement was updated, False if the agent has no active
+                advertisement and must advertise again
+        """
+        try:
+            existing_agent = self.pool.UsePractice("GetTableData", self.table_name, {"agent_id": agent_id})
+            if not existing_agent or existing_agent[0].get("stop_time") is not None:
+                self.log(f"No active advertisement for agent {agent_id}", 'DEBUG')
+                return False
+            now = datetime.now()
+            self.pool.UsePractice("Update", self.table_name, {"update_time": now}, {"agent_id": agent_id}, self.agent_table_schema)
+            with self.index_lock:
+                if agent_id in self.indexed_agents:
+                    self.indexed_agents[agent_id]["update_time"] = now
+            return True
+        except Exception as e:
+            self.log(f"Error updating heartbeat of agent {agent_id}: {str(e)}", 'ERROR')
+            return False
+
+    def find_agents_by_practice(self, practice: str, active_minutes=1):
+        """
+        Find the active agents advertising a practice.
+        
+        Args:
+            practice: Name of the practice, or "pit_name/practice_name" to match one pit
+            active_minutes: Only agents advertised within this many minutes
+            
+        Returns:
+            list: {"agent_id", "agent_name", "pit", "practice"} per agent and pit with the practice,
+                "practice" being the name to call it with ("pit/practice")
+        """
+        if time.time() - self.index_time >= self.index_refresh:
+            self._rebuild_index()
+        matches = self._find_indexed(practice, active_minutes)
+        if not matches and time.time() - self.index_time >= self.index_miss_refresh:
+            # the agent may have advertised through another plaza instance since the last rebuild
+            self._rebuild_index()
+            matches = self._find_indexed(practice, active_minutes)
+        return matches
+
+    def _find_indexed(self, practice: str, active_minutes=1) -> List[Dict[str, str]]:
+        """
+        Find the active agents advertising a practice in the practice index.
+        """
+        pit_name, _, practice_name = practice.rpartition('/')
+        active_since = datetime.now() - timedelta(minutes=active_minutes)
+        matches = []
+        with self.index_lock:
+            for agent_id, pits in self.practice_index.get(practice_name, {}).items():
+                indexed = self.indexed_agents.get(agent_id)
+                update_time = indexed["update_time"] if indexed else None
+                if indexed is None or (isinstance(update_time, datetime) and update_time <= active_since):
+                    continue
+                for pit in pits:
+                    if not pit_name or pit == pit_name:
+                        matches.append({
+                            "agent_id": agent_id,
+                            "agent_name": indexed["agent_name"],
+                            "pit": pit,
+                            "practice": f"{pit}/{practice_name}"
+                        })
+        return matches
+
+    @staticmethod
+    def _practices_of(agent_info: Dict) -> List[tuple]:
+        """
+        Get the (practice name, pit name) pairs of the pits in an advertisement.
+        """
+        pairs = []
+        if isinstance(agent_info, str):
+            try:
+                agent_info = json.loads(agent_info)
+            except json.JSONDecodeError:
+                return pairs
+        components = (agent_info or {}).get("components") or {}
+        for pits in components.values():
+            if not isinstance(pits, dict):
+                continue
+            for pit_name, pit_info in pits.items():
+                practices = pit_info.get("practices") if isinstance(pit_info, dict) else None
+                for practice in practices or []:
+                    if isinstance(practice, dict):
+                        practice = practice.get("name")
+                    if practice:
+                        pairs.append((practice, pit_name))
+        return pairs
+
+    @staticmethod
+    def _info_hash(agent_info: Any) -> str:
+        """
+        Hash an agent info, to tell updated advertisements from refreshed ones.
+        """
+        if not isinstance(agent_info, str):
+            agent_info = json.dumps(agent_info, sort_keys=True, default=str)
+        return hashlib.sha256(agent_info.encode()).hexdigest()
+
+    def _index_entry(self, agent_id: str, agent_name: str, description: Optional[str], agent_info: Any,
+                     update_time: Any) -> Dict[str, Any]:
+        """
+        Build the index entry of an advertisement.
+        """
+        return {
+            "agent_name": agent_name,
+            "update_time": update_time,
+            "practices": self._practices_of(agent_info),
+            "info_hash": self._info_hash(agent_info),
+            "agent": {
+                "agent_id": agent_id,
+                "agent_name": agent_name,
+                "description": description,
+                "agent_info": agent_info
+            }
+        }
+
+    def _index_agent(self, agent_id: str, agent_name: str, agent_info: Dict, update_time: datetime,
+                     description: str = None):
+        """
+        Add an advertisement to the practice index, replacing the previous one of the agent,
+        and record the change: a join if the agent was not indexed, an update if its agent info changed.
+        """
+        entry = self._index_entry(agent_id, agent_name, description, agent_info, update_time)
+        with self.index_lock:
+            previous = self._unindex_locked(agent_id)
+            self.index_touched[agent_id] = time.time()
+            for practice, pit in entry["practices"]:
+                self.practice_index.setdefault(practice, {}).setdefault(agent_id, []).append(pit)
+            self.indexed_agents[agent_id] = entry
+        if previous is None:
+            self._record_changes([("join", agent_id, entry)])
+        elif previous["info_hash"] != entry["info_hash"]:
+            self._record_changes([("update", agent_id, entry)])
+
+    def _unindex_agent(self, agent_id: str):
+        """
+        Remove an agent from the practice index, recording its leave.
+        """
+        with self.index_lock:
+            previous = self._unindex_locked(agent_id)
+            self.index_touched[agent_id] = time.time()
+        if previous is not None:
+            self._record_changes([("leave", agent_id, previous)])
+
+    def _unindex_locked(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Remove an agent from the practice index, with index_lock held.
+        
+        Returns:
+            dict: The removed index entry, None if the agent was not indexed
+        """
+        indexed = self.indexed_agents.pop(agent_id, None)
+        if indexed is None:
+            return None
+        for practice, _ in indexed["practices"]:
+            agents = self.practice_index.get(practice)
+            if agents is not None:
+                agents.pop(agent_id, None)
+                if not agents:
+                    del self.practice_index[practice]
+        return indexed
+
+    def _rebuild_index(self):
+        """
+        Rebuild the practice index from the advertisements of the active agents in the table,
+        recording the agents which joined, left or updated their advertisement since the last build.
+        
+        The agents indexed or removed by this plaza while the table was read keep their
+        current entry, so a rebuild does not undo a concurrent Advertise or removal.
+        """
+        requested = time.time()
+        with self.rebuild_lock:
+            if self.index_time >= requested:
+                # rebuilt by another thread while this one waited
+                return
+            started = time.time()
+            self.index_time = started
+            agents = self.list_active_agents(active_minutes=max(self.index_refresh / 60, 1))
+            indexed_agents = {}
+            for agent in agents:
+                indexed_agents[agent["agent_id"]] = self._index_entry(
+                    agent["agent_id"], agent.get("agent_name"), agent.get("description"),
+                    agent.get("agent_info"), agent.get("update_time"))
+            with self.index_lock:
+                previous_agents = self.indexed_agents
+                for agent_id, touched in self.index_touched.items():
+                    if touched < started:
+                        continue
+                    if agent_id in previous_agents:
+                        indexed_agents[agent_id] = previous_agents[agent_id]
+                    else:
+                        indexed_agents.pop(agent_id, None)
+                self.index_touched = {}
+                practice_index = {}
+                for agent_id, entry in indexed_agents.items():
+                    for practice, pit in entry["practices"]:
+                        practice_index.setdefault(practice, {}).setdefault(agent_id, []).append(pit)
+                self.practice_index = practice_index
+                self.indexed_agents = indexed_agents
+        changes = []
+        for agent_id, entry in indexed_agents.items():
+            previous = previous_agents.get(agent_id)
+            if previous is None:
+                changes.append(("join", agent_id, entry))
+            elif previous["info_hash"] != entry["info_hash"]:
+                changes.append(("update", agent_id, entry))
+        for agent_id, previous in previous_agents.items():
+            if agent_id not in indexed_agents:
+                changes.append(("leave", agent_id, previous))
+        self._record_changes(changes)
+        self.log(f"Indexed {len(practice_index)} practices of {len(indexed_agents)} agents", 'DEBUG')
+
+    def _record_changes(self, changes: List[tuple]):
+        """
+        Append membership changes to the change log, each with the next version.
+        
+        Args:
+            changes: (event, agent_id, index entry) per change, event being "join", "leave" or "update"
+        """
+        if not changes:
+            return
+        now = time.time()
+        with self.changes_lock:
+            for event, agent_id, entry in changes:
+                self.version += 1
+                change = {
+                    "version": self.version,
+                    "event": event,
+                    "agent_id": agent_id,
+                    "agent_name": entry["agent_name"],
+                    "time": now
+                }
+                if event != "leave":
+                    change["agent"] = entry["agent"]
+                self.changes.append(change)
+        self.changes_event.set()
+
+    def _changes_since(self, since_version: int, limit: int = None) -> Dict[str, Any]:
+        """
+        Get the changes of the change log after a version.
+        
+        Returns:
+            dict: "version" of the last change returned, "reset" and "events", see SubscribeChanges
+        """
+        with self.changes_lock:
+            oldest = self.changes[0]["version"] if self.changes else self.version + 1
+            if since_version > self.version or since_version < oldest - 1:
+                # changes were dropped from the log, or the version is from another plaza instance
+                return {"plaza": self.name, "version": self.version, "reset": True, "events": []}
+            events = [change for change in self.changes if change["version"] > since_version]
+        if limit is not None and len(events) > limit:
+            events = events[:limit]
+        version = events[-1]["version"] if events else max(since_version, 0)
+        return {"plaza": self.name, "version": version, "reset": False, "events": events}
+
+    def SubscribeChanges(self, since_version: int = 0, subscriber: Union[str, Callable, None] = None,
+                         limit: int = None):
+        """
+        Get the membership changes of the plaza after a version, optionally subscribing to the next ones.
+        
+        Changes are "join" (with the advertisement of the agent, in the format of
+        ListActiveAgents), "update" (the agent advertised a different agent info) and
+        "leave" (the agent stopped, was removed, or its advertisement expired), numbered
+        with increasing versions. A subscriber keeps the version of the last change it
+        applied and passes it as since_version. If the plaza no longer has the changes
+        after since_version, "reset" is True: the subscriber reloads ListActiveAgents and
+        continues from the returned version.
+        
+        A subscriber gets the next changes pushed after each synchronization of the
+        plaza with its table (every index_refresh seconds while the plaza is running, or
+        when an agent advertises through this plaza), with no events if nothing changed.
+        
+        Args:
+            since_version: Version of the last change the caller has, 0 for all changes
+            subscriber: Address ("agent_id@plaza_name") sent a PlazaChanges message through the
+                plugs of the owning agent, or a function called with the changes
+            limit: Maximum number of events returned
+            
+        Returns:
+            dict: "plaza", "version", "reset", "events", and the "subscription_id" if subscribed
+        """
+        if time.time() - self.index_time >= self.index_refresh:
+            self._rebuild_index()
+        changes = self._changes_since(since_version, limit)
+        if subscriber is not None:
+            subscription_id = str(uuid.uuid4())
+            with self.changes_lock:
+                self.subscriptions[subscription_id] = {"subscriber": subscriber, "version": changes["version"]}
+            changes["subscription_id"] = subscription_id
+            self.log(f"Subscribed {subscriber if isinstance(subscriber, str) else 'a function'} to changes from version {changes['version']}", 'DEBUG')
+        return changes
+
+    def UnsubscribeChanges(self, subscription_id: str):
+        """
+        Stop pushing changes to a subscriber.
+        
+        Args:
+            subscription_id: ID returned by SubscribeChanges
+            
+        Returns:
+            bool: True if the subscription existed, False otherwise
+        """
+        with self.changes_lock:
+            return self.subscriptions.pop(subscription_id, None) is not None
+
+    def _notify_subscribers(self):
+        """
+        Push the changes each subscriber has not received yet. A subscriber whose
+        delivery fails is unsubscribed.
+        """
+        with self.changes_lock:
+            subscriptions = list(self.subscriptions.items())
+        for subscription_id, subscription in subscriptions:
+            changes = self._changes_since(subscription["version"])
+            subscriber = subscription["subscriber"]
+            try:
+                if callable(subscriber):
+                    subscriber(changes)
+                    delivered = True
+                else:
+                    delivered = self._send_changes(subscriber, changes)
+            except Exception as e:
+                self.log(f"Error pushing changes to a subscriber: {str(e)}", 'ERROR')
+                delivered = False
+            if delivered:
+                subscription["version"] = changes["version"]
+            else:
+                self.log(f"Unsubscribing {subscription_id}, its changes could not be delivered", 'WARNING')
+                self.UnsubscribeChanges(subscription_id)
+
+    def _send_changes(self, address: str, changes: Dict[str, Any]) -> bool:
+        """
+        Send changes to a subscriber in a PlazaChanges message, through the plugs of the owning agent.
+        """
+        if self.agent is None:
+            self.log(f"Plaza {self.name} has no agent to send changes to {address}", 'ERROR')
+            return False
+        agent_id, _, plaza_name = address.partition('@')
+        message = Message("PlazaChanges", changes, AgentAddress(self.agent.agent_id, plaza_name or self.name),
+                          [AgentAddress(agent_id, plaza_name or self.name)])
+        return bool(self.agent.SendMessage(message, [AgentAddress(agent_id, plaza_name or self.name)]))
+
+    def _sync_loop(self):
+        """
+        Synchronize the index with the table every index_refresh seconds, pushing the changes to the subscribers.
+        """
+        while self.running:
+            try:
+                changed = self.changes_event.wait(self.index_refresh)
+                self.changes_event.clear()
+                if not self.running:
+                    break
+                if not changed or time.time() - self.index_time >= self.index_refresh:
+                    self._rebuild_index()
+                    self.changes_event.clear()
+                self._notify_subscribers()
+            except Exception as e:
+                self.log(f"Error in sync loop: {str(e)}", 'ERROR')
+
     def update_agent_stop_time(self, agent_id: str):
         """
         Update the stop time of an agent.
@@ -262,6 +702,7 @@ class AgentPlaza(Plaza):
                 "stop_time": now
             }
             self.pool.UsePractice("Update", self.table_name, data, {"agent_id": agent_id}, self.agent_table_schema)
+            self._unindex_agent(agent_id)
             self.log(f"Updated stop time for agent {agent_id}", 'DEBUG')
             return True
         except Exception as e:
@@ -280,6 +721,7 @@ class AgentPlaza(Plaza):
             return False
         
         self.running = True
+        self.cleanup_event.clear()
         self.log("Starting plaza", 'INFO')
         
         # Start the cleanup thread
@@ -287,6 +729,10 @@ class AgentPlaza(Plaza):
         self.cleanup_thread.daemon = True
         self.cleanup_thread.start()
         
+        # Start the thread pushing membership changes to the subscribers
+        self.sync_thread = threading.Thread(target=self._sync_loop, daemon=True)
+        self.sync_thread.start()
+        
         return True
     
     def stop(self):
@@ -296,9 +742,14 @@ class AgentPlaza(Plaza):
         self.running = False
         
         # Wait for the cleanup thread to finish
+        self.cleanup_event.set()
         if self.cleanup_thread:
             self.cleanup_thread.join(timeout=1)
             self.cleanup_thread = None
+        if self.sync_thread:
+            self.changes_event.set()
+            self.sync_thread.join(timeout=1)
+            self.sync_thread = None
     
     def remove_advertisement(self, agent_id: str):
         """
@@ -312,6 +763,7 @@ class AgentPlaza(Plaza):
         """
         try:
             self.pool.UsePractice("Delete", self.table_name, {"agent_id": agent_id})
+            self._unindex_agent(agent_id)
             self.log(f"Removed advertisement for agent {agent_id}", 'DEBUG')
             return True
         except Exception as e:
@@ -370,15 +822,164 @@ class AgentPlaza(Plaza):
     
     def _cleanup_loop(self):
         """
-        Cleanup loop to remove inactive agents.
+        Cleanup loop to expire inactive agents, running cleanup every cleanup_interval seconds.
         """
         while self.running:
             try:
-                time.sleep(60)
-                self.log("Running cleanup loop", 'DEBUG')
-                # TODO: Implement cleanup logic
+                self.cleanup_event.wait(self.cleanup_interval)
+                if not self.running:
+                    break
+                self.cleanup()
             except Exception as e:
                 self.log(f"Error in cleanup loop: {str(e)}", 'ERROR')
+
+    def _create_indexes(self):
+        """
+        Create the indexes of the agents table used by list_active_agents and cleanup.
+        """
+        for column in ("update_time", "stop_time"):
+            try:
+                if self.pool.UsePractice("CreateTableIndex", self.table_name, f"{self.table_name}_{column}_idx", [column]) is False:
+                    self.log(f"Index on {self.table_name}.{column} not created", 'WARNING')
+            except NotImplementedError:
+                self.log(f"Pool {self.pool.name} does not support table indexes", 'DEBUG')
+                return
+            except Exception as e:
+                self.log(f"Error creating index on {self.table_name}.{column}: {str(e)}", 'WARNING')
+
+    def cleanup(self):
+        """
+        Expire inactive agents in bounded batches.
+        
+        Advertisements not refreshed for expire_after seconds are marked stopped
+        (status "expired"), and advertisements stopped for more than retention seconds
+        are removed. Each batch selects at most cleanup_batch_size rows and updates or
+        deletes them with one statement, which checks the row is still stale so an agent
+        refreshing its advertisement meanwhile is kept. At most cleanup_max_batches
+        batches are run, the rest is left to the next run.
+        
+        Returns:
+            dict: The statistics of the run, see CleanupStats
+        """
+        started = time.time()
+        now = datetime.now()
+        stale = {"$and": [
+            {"update_time": {"$lt": now - timedelta(seconds=self.expire_after)}},
+            {"stop_time": None}
+        ]}
+        expired, batches, expire_left = self._cleanup_batches(stale, self._expire_agents, self.cleanup_max_batches)
+        removed, remove_left = 0, 0
+        if self.retention is not None and batches < self.cleanup_max_batches and not self.cleanup_event.is_set():
+            stopped = {"stop_time": {"$lt": now - timedelta(seconds=self.retention)}}
+            removed, _, remove_left = self._cleanup_batches(stopped, self._remove_agents,
+                                                            self.cleanup_max_batches - batches)
+        with self.index_lock:
+            stats = self.cleanup_stats
+            stats["runs"] += 1
+            stats["last_run"] = now.isoformat()
+            stats["last_duration"] = round(time.time() - started, 3)
+            stats["last_expired"] = expired
+            stats["last_removed"] = removed
+            stats["expired"] += expired
+            stats["removed"] += removed
+            stats["backlog"] = expire_left + remove_left
+            result = dict(stats)
+        if expired or removed:
+            self.log(f"Cleanup expired {expired} and removed {removed} advertisements in {result['last_duration']}s", 'INFO')
+        return result
+
+    def _cleanup_batches(self, where: Dict, apply: Callable[[List[str], Dict], int], batches: int) -> tuple:
+        """
+        Apply a batch operation to the rows matching where, selecting cleanup_batch_size rows per batch,
+        for at most batches batches or until the plaza stops.
+        
+        Args:
+            where: Condition of the rows to handle
+            apply: Called with the agent ids of a batch and where, returns the number of rows handled
+            batches: Maximum number of batches
+            
+        Returns:
+            tuple: (rows handled, batches run, rows left counted up to cleanup_batch_size)
+        """
+        done = 0
+        run = 0
+        while True:
+            rows = self.pool.UsePractice("GetTableData", self.table_name, where, table_schema=self.agent_table_schema,
+                                         max_rows=self.cleanup_batch_size) or []
+            agent_ids = [row["agent_id"] for row in rows]
+            if not agent_ids or run >= batches or (run and self.cleanup_event.is_set()):
+                return done, run, len(agent_ids)
+            run += 1
+            done += apply(agent_ids, where)
+
+    def _expire_agents(self, agent_ids: List[str], where: Dict) -> int:
+        """
+        Mark the advertisements of agents which stopped refreshing them as stopped, in one update.
+        
+        Returns:
+            int: Number of advertisements expired
+        """
+        try:
+            data = {"status": "expired", "stop_time": datetime.now()}
+            batch = {"$and": [{"agent_id": {"$in": agent_ids}}, where]}
+            if not self.pool.UsePractice("Update", self.table_name, data, batch, self.agent_table_schema):
+                return 0
+            return self._unindex_gone(agent_ids, {"$and": [{"agent_id": {"$in": agent_ids}}, {"stop_time": None}]})
+        except Exception as e:
+            self.log(f"Error expiring {len(agent_ids)} agents: {str(e)}", 'ERROR')
+            return 0
+
+    def _remove_agents(self, agent_ids: List[str], where: Dict) -> int:
+        """
+        Remove the advertisements of agents stopped for more than retention seconds, in one delete.
+        
+        Returns:
+            int: Number of advertisements removed
+        """
+        try:
+            batch = {"$and": [{"agent_id": {"$in": agent_ids}}, where]}
+            if not self.pool.UsePractice("Delete", self.table_name, batch):
+                return 0
+            return self._unindex_gone(agent_ids, {"agent_id": {"$in": agent_ids}})
+        except Exception as e:
+            self.log(f"Error removing {len(agent_ids)} advertisements: {str(e)}", 'ERROR')
+            return 0
+
+    def _unindex_gone(self, agent_ids: List[str], kept: Dict) -> int:
+        """
+        Remove from the practice index the agents of a batch which no longer match kept,
+        those still matching having refreshed their advertisement meanwhile.
+        
+        Returns:
+            int: Number of agents removed
+        """
+        remaining = self.pool.UsePractice("GetTableData", self.table_name, kept, table_schema=self.agent_table_schema,
+                                          max_rows=len(agent_ids)) or []
+        remaining_ids = {row["agent_id"] for row in remaining}
+        gone = [agent_id for agent_id in agent_ids if agent_id not in remaining_ids]
+        for agent_id in gone:
+            self._unindex_agent(agent_id)
+        return len(gone)
+
+    def get_cleanup_stats(self):
+        """
+        Get the statistics of the cleanup job.
+        
+        Returns:
+            dict: Settings, number of runs, rows expired and removed by the last run and in
+                total, and the backlog of rows left by the last run (counted up to
+                batch_size rows of expired and of removed advertisements)
+        """
+        with self.index_lock:
+            stats = dict(self.cleanup_stats)
+        stats.update({
+            "cleanup_interval": self.cleanup_interval,
+            "expire_after": self.expire_after,
+            "retention": self.retention,
+            "batch_size": self.cleanup_batch_size,
+            "max_batches": self.cleanup_max_batches
+        })
+        return stats
     
     def add_pool(self, pool):
         """
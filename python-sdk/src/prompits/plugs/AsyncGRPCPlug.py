@@ -0,0 +1,451 @@
+# AsyncGRPCPlug is a gRPCPlug whose server and client stubs run on asyncio with grpc.aio
+# The threaded gRPCPlug server ties up a worker thread per call for as long as the call
+# runs, e.g. while a practice waits on an LLM. Here calls are coroutines on one event loop,
+# so an agent can keep thousands of calls in flight; async practices (Practice.is_async)
+# are awaited on the loop and only blocking practices use a thread from a bounded pool.
+# The plug is wire compatible with gRPCPlug and inherits its sync API.
+
+import asyncio
+import json
+import threading
+import time
+import traceback
+from concurrent import futures
+from typing import Any, Dict, Optional
+
+import grpc
+import grpc.aio
+
+from ..AgentAddress import AgentAddress
+from .. import Deadline
+from .ChannelManager import ChannelManager
+from .gRPCPlug import gRPCPlug, AgentServicer
+from .PracticeScheduler import PracticeBusyError
+from prompits.plugs.protos import agent_pb2
+from prompits.plugs.protos import agent_pb2_grpc
+
+
+class AsyncAgentServicer(agent_pb2_grpc.AgentServicer):
+    """
+    Servicer of AsyncGRPCPlug, with async methods run on the event loop of the plug.
+
+    Calls that only read local state reuse the AgentServicer implementation.
+    """
+
+    def __init__(self, grpc_plug: 'AsyncGRPCPlug'):
+        """
+        Initialize the AsyncAgentServicer with a reference to the AsyncGRPCPlug.
+
+        Args:
+            grpc_plug: The AsyncGRPCPlug instance that this servicer is associated with
+        """
+        super().__init__()
+        self.grpc_plug = grpc_plug
+        self.sync_servicer = AgentServicer(grpc_plug)
+
+    async def SendMessage(self, request, context):
+        """
+        Handle an incoming message.
+
+        The message is handed to gRPCPlug._HandleIncoming on the practice executor,
+        as event handlers of the plug and the agent may block. Messages are rejected
+        with RESOURCE_EXHAUSTED and a busy StatusMessage when the queue is full.
+        """
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(None, self.grpc_plug._HandleIncoming, request):
+            status = json.dumps(self.grpc_plug._BusyStatus().ToJson())
+            context.set_code(grpc.StatusCode.RESOURCE_EXHAUSTED)
+            context.set_details(status)
+            return agent_pb2.MessageResponse(success=False, message=status)
+        return agent_pb2.MessageResponse(success=True, message="Message received")
+
+    async def MessageStream(self, request_iterator, context):
+        """
+        Refuse message streams, callers fall back to SendMessage.
+
+        Unary calls are cheap on the async server, so the plug does not keep
+        per-peer streams with their reader threads.
+        """
+        await context.abort(grpc.StatusCode.UNIMPLEMENTED, "Message streams are not served by AsyncGRPCPlug")
+
+    async def PutAttachment(self, request_iterator, context):
+        """
+        Receive an attachment uploaded in chunks, writing them on the practice executor.
+
+        Args:
+            request_iterator: Async iterator of AttachmentChunk sent by the caller
+            context: The gRPC context object
+
+        Returns:
+            AttachmentReceipt: The number of bytes spooled
+        """
+        loop = asyncio.get_running_loop()
+        spool = self.grpc_plug.attachment_spool
+        spool_file = None
+        try:
+            async for chunk in request_iterator:
+                if spool_file is None:
+                    spool_file = await loop.run_in_executor(None, spool.Open, chunk.handle)
+                await loop.run_in_executor(None, spool_file.Write, chunk)
+        except Exception as e:
+            if spool_file is not None:
+                spool_file.Discard()
+            self.grpc_plug.log(f"Error receiving attachment: {str(e)}", 'ERROR')
+            return agent_pb2.AttachmentReceipt(success=False, error=str(e))
+        if spool_file is None or not spool.Complete(spool_file):
+            return agent_pb2.AttachmentReceipt(success=False, error="Incomplete attachment")
+        return agent_pb2.AttachmentReceipt(success=True, size=spool_file.size)
+
+    async def Echo(self, request, context):
+        """Echo a message back to the sender."""
+        return self.sync_servicer.Echo(request, context)
+
+    async def GetAgentInfo(self, request, context):
+        """Get information about the agent."""
+        return self.sync_servicer.GetAgentInfo(request, context)
+
+    async def ListPractices(self, request, context):
+        """List the practices of the agent."""
+        return self.sync_servicer.ListPractices(request, context)
+
+    async def ExecutePractice(self, request, context):
+        """
+        Execute a practice of the agent.
+
+        Async practices are awaited on the event loop, others run on the practice executor.
+
+        Args:
+            request: The gRPC ExecutePracticeRequest containing the practice name and parameters
+            context: The gRPC context object
+
+        Returns:
+            PracticeResponse: The result of executing the practice, or an error message
+        """
+        agent = getattr(self.grpc_plug, 'agent', None)
+        if not agent:
+            context.set_code(grpc.StatusCode.UNAVAILABLE)
+            context.set_details("Agent not available")
+            return agent_pb2.PracticeResponse(success=False, error="Agent not available")
+        if not hasattr(agent, 'UsePractice'):
+            return agent_pb2.PracticeResponse(success=False, error="Agent does not support UsePractice method")
+
+        # A retried request is executed once, duplicates get the response of the first one
+        dedup_cache = getattr(agent, 'dedup_cache', None)
+        if not request.request_id or dedup_cache is None:
+            return await self._ExecutePractice(agent, request, context)
+        future, new = dedup_cache.Begin(request.request_id)
+        if not new:
+            try:
+                # shielded: a timeout must not cancel the future the first request completes
+                return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), context.time_remaining())
+            except asyncio.TimeoutError:
+                return agent_pb2.PracticeResponse(success=False, error=f"Request {request.request_id} is still running")
+        response = agent_pb2.PracticeResponse(success=False, error="Practice execution interrupted")
+        try:
+            response = await self._ExecutePractice(agent, request, context)
+        finally:
+            # failures are not kept, a retry executes the practice again
+            dedup_cache.Complete(request.request_id, response, keep=response.success)
+        return response
+
+    async def _ExecutePractice(self, agent, request, context):
+        """
+        Execute the practice of an ExecutePractice request.
+        """
+        # Shed requests whose caller gave up while they waited
+        remaining = context.time_remaining()
+        if remaining is not None and remaining <= 0:
+            self.grpc_plug.log(f"Deadline of practice {request.practice_name} exceeded before execution, dropping it", 'WARNING')
+            return agent_pb2.PracticeResponse(success=False, error="Deadline exceeded before execution")
+        deadline = time.time() + remaining if remaining is not None else None
+        params = AgentServicer._DecodeParameters(request)
+        scheduler = self.grpc_plug.practice_scheduler
+        try:
+            if hasattr(agent, 'UsePracticeAsync'):
+                with scheduler.Slot(request.practice_name), Deadline.Scope(deadline):
+                    result = await agent.UsePracticeAsync(request.practice_name, **params)
+            else:
+                result = await asyncio.wrap_future(scheduler.Submit(
+                    request.practice_name, Deadline.Start, deadline, agent.UsePractice, request.practice_name, **params))
+            return self.sync_servicer._PracticeResponse(result, context)
+        except PracticeBusyError as e:
+            context.set_code(grpc.StatusCode.RESOURCE_EXHAUSTED)
+            context.set_details(str(e))
+            return agent_pb2.PracticeResponse(success=False, error=str(e))
+        except Exception as e:
+            return agent_pb2.PracticeResponse(success=False, error=str(e))
+
+
+class AsyncGRPCPlug(gRPCPlug):
+    """
+    gRPC plug built on grpc.aio.
+
+    The server and the async client stubs run on an event loop owned by the plug,
+    on a background thread. Blocking message handlers run on a thread pool of
+    practice_workers threads, the default executor of the loop, and sync practices
+    on the data-plane executor of the practice scheduler, also practice_workers threads.
+
+    Coroutines of the plug can be awaited from any event loop, calls are moved to
+    the loop of the plug when needed. The sync methods inherited from gRPCPlug keep
+    working and use the pooled sync channels.
+
+    Attributes:
+        loop: The event loop of the plug, started on first use
+        max_concurrent_rpcs: Maximum number of calls handled at a time, None for no limit
+        practice_workers: Number of threads running blocking practices and handlers
+    """
+
+    def __init__(self, name: str, description: str = None, host: str = "localhost", port: int = 9000, is_server: bool = False,
+                 max_concurrent_rpcs: int = None, practice_workers: int = 32, streaming: bool = False, **kwargs):
+        """
+        Initialize the async gRPC plug.
+
+        Args:
+            name: Name of the plug
+            description: Description of the plug
+            host: Host to connect to
+            port: Port to connect to
+            is_server: Whether this plug is a server
+            max_concurrent_rpcs: Maximum number of calls handled at a time, further calls are
+                rejected with RESOURCE_EXHAUSTED (default: no limit)
+            practice_workers: Number of threads running blocking practices and handlers
+            streaming: Whether to send messages over MessageStream to peers that advertise it
+            **kwargs: Other gRPCPlug settings
+        """
+        # set before gRPCPlug.__init__, which starts the server
+        self.max_concurrent_rpcs = max_concurrent_rpcs
+        self.practice_workers = practice_workers
+        self.loop = None
+        self.loop_thread = None
+        self.loop_lock = threading.Lock()
+        self.aio_channels: Dict[str, Any] = {}
+        kwargs.setdefault("data_workers", practice_workers)
+        super().__init__(name, description, host, port, is_server, streaming=streaming, **kwargs)
+
+    def _GetLoop(self) -> asyncio.AbstractEventLoop:
+        """
+        Get the event loop of the plug, starting it on first use.
+
+        Returns:
+            asyncio.AbstractEventLoop: The running loop
+        """
+        with self.loop_lock:
+            if self.loop is None or self.loop.is_closed():
+                loop = asyncio.new_event_loop()
+                loop.set_default_executor(futures.ThreadPoolExecutor(
+                    max_workers=self.practice_workers, thread_name_prefix=f"{self.name}_practice"))
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                self.loop_thread = threading.Thread(target=run, daemon=True, name=f"{self.name}_loop")
+                self.loop_thread.start()
+                ready.wait()
+                self.loop = loop
+            return self.loop
+
+    def RunCoroutine(self, coro) -> futures.Future:
+        """
+        Run a coroutine on the event loop of the plug from any thread.
+
+        Args:
+            coro: The coroutine
+
+        Returns:
+            concurrent.futures.Future: Future of the result
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._GetLoop())
+
+    async def _OnLoop(self, coro):
+        """
+        Await a coroutine on the event loop of the plug, which owns the aio channels.
+        """
+        loop = self._GetLoop()
+        if asyncio.get_running_loop() is loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    def _Listen(self, plugs_info: Dict[str, Any]):
+        """Listen for incoming connections
+
+        Args:
+            plugs_info: Dictionary with connection information
+
+        Returns:
+            bool: True if listening successfully, False otherwise
+        """
+        if not self.is_server:
+            self.log(f"gRPC Plug {self.name} is not a server", 'WARNING')
+            return False
+        if self.server is not None:
+            return True
+        try:
+            return self.RunCoroutine(self._ListenAsync()).result(timeout=30)
+        except Exception as e:
+            self.log(f"Error starting async gRPC server {self.name}: {str(e)}\n{traceback.format_exc()}", 'ERROR')
+            return False
+
+    async def _ListenAsync(self):
+        """
+        Create and start the grpc.aio server on the event loop of the plug.
+        """
+        server = grpc.aio.server(options=ChannelManager.server_options(),
+                                 maximum_concurrent_rpcs=self.max_concurrent_rpcs)
+        agent_pb2_grpc.add_AgentServicer_to_server(AsyncAgentServicer(self), server)
+
+        # if self.port is 0, try to find an open port, starting at 9000
+        if self._port == 0:
+            for port in range(9000, 9100):
+                try:
+                    server_address = f"{self._host}:{port}"
+                    if server.add_insecure_port(server_address):
+                        self._port = port
+                        break
+                except Exception as e:
+                    self.log(f"Error adding insecure port {port}: {str(e)}", 'ERROR')
+        else:
+            server_address = f"{self._host}:{self._port}"
+            server.add_insecure_port(server_address)
+
+        await server.start()
+        self.server = server
+        self.log(f"Async gRPC server {self.name} listening on {server_address}", 'INFO')
+        self.running = True
+        return True
+
+    def _StopServer(self):
+        """
+        Stop the server and close the aio channels.
+        """
+        if self.loop is None:
+            return
+        try:
+            self.RunCoroutine(self._StopAsync()).result(timeout=10)
+        except Exception as e:
+            self.log(f"Error stopping async gRPC plug {self.name}: {str(e)}", 'ERROR')
+
+    async def _StopAsync(self):
+        """
+        Stop the server and close the aio channels on the event loop of the plug.
+        """
+        if self.server is not None:
+            await self.server.stop(0)
+        channels = list(self.aio_channels.values())
+        self.aio_channels.clear()
+        for channel, _ in channels:
+            await channel.close()
+
+    def _GetAioStub(self, server_address: str):
+        """
+        Get the async stub for a peer. Must be called on the event loop of the plug.
+        """
+        entry = self.aio_channels.get(server_address)
+        if entry is None:
+            channel = grpc.aio.insecure_channel(server_address, options=self.channel_manager.channel_options())
+            entry = (channel, agent_pb2_grpc.AgentStub(channel))
+            self.aio_channels[server_address] = entry
+        return entry[1]
+
+    async def SendMessageAsync(self, agent: AgentAddress, message, plug_info: Dict[str, Any] = None) -> bool:
+        """
+        Send a message to an agent with the async stub.
+
+        Args:
+            agent: AgentAddress
+            message: Message
+            plug_info: Plug information advertised by the peer, with "host" and "port"
+
+        Returns:
+            bool: True if sent successfully, False otherwise
+        """
+        plug_info = plug_info or {}
+        if not (plug_info.get('host') and plug_info.get('port')):
+            self.log(f"No connection info for agent {agent}, skipping", 'WARNING')
+            return False
+        server_address = f"{plug_info.get('host')}:{plug_info.get('port')}"
+        deadline = Deadline.Of(message)
+        if Deadline.Expired(deadline):
+            self.log(f"Deadline of message {getattr(message, 'msg_id', '')} to {agent} exceeded, dropping it", 'WARNING')
+            return False
+        if getattr(message, 'attachments', None):
+            # attachments may be read from files or uploaded with PutAttachment, off the caller's loop
+            loop = asyncio.get_running_loop()
+            try:
+                msg, size = await loop.run_in_executor(None, self._BuildMessage, message, plug_info)
+            except (grpc.RpcError, ValueError, OSError) as e:
+                self.log(f"Error sending attachments to {server_address}: {str(e)}", 'ERROR')
+                return False
+        else:
+            msg, size = self._BuildMessage(message, plug_info)
+        compression = None
+        if not msg.compression and self._UseTransportCompression(size):
+            compression = grpc.Compression.Gzip
+        timeout = max(deadline - time.time(), 0.001) if deadline is not None else None
+        return await self._OnLoop(self._SendAsync(server_address, msg, compression, timeout))
+
+    async def _SendAsync(self, server_address: str, msg, compression, timeout: float = None) -> bool:
+        """
+        Send a built message on the event loop of the plug.
+        """
+        try:
+            await self._GetAioStub(server_address).SendMessage(msg, timeout=timeout, compression=compression)
+            return True
+        except grpc.RpcError as e:
+            if e.code() == grpc.StatusCode.RESOURCE_EXHAUSTED:
+                self.log(f"Peer {server_address} is busy, message rejected: {e.details()}", 'WARNING')
+                return False
+            # an unavailable peer is reconnected by the channel itself, with backoff
+            self.log(f"Error sending message to {server_address}: {e.code()} {e.details()}", 'ERROR')
+            return False
+
+    async def ExecutePracticeAsync(self, practice_name: str, arguments: Dict[str, Any], plug_info: Dict[str, Any],
+                                   timeout: float = 20, request_id: str = None) -> Optional[Dict[str, Any]]:
+        """
+        Execute a practice on a remote agent with the async stub.
+
+        Args:
+            practice_name: Name of the practice to execute
+            arguments: Arguments of the practice, each sent JSON encoded
+            plug_info: Plug information advertised by the peer, with "host" and "port"
+            timeout: Deadline of the call in seconds
+            request_id: ID of the request, see gRPCPlug.ExecutePractice
+
+        Returns:
+            dict: {"success": bool, "result": Any, "error": str}, or None if the
+                peer does not provide the ExecutePractice RPC
+        """
+        server_address = f"{plug_info.get('host')}:{plug_info.get('port')}"
+        request = self._PracticeRequest(practice_name, arguments, request_id)
+        compression = grpc.Compression.Gzip if self._UseTransportCompression(request.ByteSize()) else None
+        return await self._OnLoop(self._ExecuteAsync(practice_name, server_address, request, timeout, compression))
+
+    async def _ExecuteAsync(self, practice_name: str, server_address: str, request, timeout: float, compression):
+        """
+        Execute a practice on the event loop of the plug.
+        """
+        try:
+            response = await self._GetAioStub(server_address).ExecutePractice(
+                request, timeout=timeout, compression=compression)
+        except grpc.RpcError as e:
+            return self._PracticeError(practice_name, server_address, e)
+        return self._PracticeResult(response)
+
+    def ToJson(self):
+        """Convert the async gRPC plug to a JSON object"""
+        json_data = super().ToJson()
+        json_data.update({
+            "type": "AsyncGRPCPlug",
+            "max_concurrent_rpcs": self.max_concurrent_rpcs,
+            "practice_workers": self.practice_workers
+        })
+        return json_data
+
+    def FromJson(self, json_data):
+        """Initialize the async gRPC plug from a JSON object"""
+        super().FromJson(json_data)
+        self.max_concurrent_rpcs = json_data.get("max_concurrent_rpcs", self.max_concurrent_rpcs)
+        self.practice_workers = json_data.get("practice_workers", self.practice_workers)
+        return self
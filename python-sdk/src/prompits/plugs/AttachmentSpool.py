@@ -0,0 +1,217 @@
+# AttachmentSpool moves large attachments between agents in fixed-size chunks
+# Inline attachments are encoded whole inside the message on both sides, and gRPC
+# rejects messages above 4 MB. A gRPCPlug instead uploads an attachment above its
+# threshold with the PutAttachment RPC, one chunk at a time, read from the bytes or
+# the file of the attachment, and sends the message with the handle only. The
+# receiver writes the chunks to a spool file and delivers the attachment with the
+# path of that file, so memory use does not grow with the size of attachments.
+
+import os
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterator, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Size of the chunks sent with PutAttachment, well below the 4 MB gRPC message limit
+CHUNK_SIZE = 256 * 1024
+
+
+class SpoolFile:
+    """
+    A spool file being written from the chunks of an upload.
+
+    Attributes:
+        handle: Handle of the upload
+        path: Path of the spool file
+        size: Bytes written so far
+        expected_size: Total size announced by the sender, 0 if unknown
+    """
+
+    def __init__(self, handle: str, spool_dir: str):
+        self.handle = handle
+        fd, self.path = tempfile.mkstemp(prefix="attachment-", dir=spool_dir)
+        self.file = os.fdopen(fd, 'wb')
+        self.size = 0
+        self.expected_size = 0
+
+    def Write(self, chunk) -> None:
+        """
+        Append a chunk (an agent_pb2.AttachmentChunk) to the file.
+        """
+        if chunk.size:
+            self.expected_size = chunk.size
+        self.file.write(chunk.data)
+        self.size += len(chunk.data)
+
+    def Discard(self) -> None:
+        """
+        Close and delete the file of a failed upload.
+        """
+        self.file.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+class AttachmentSpool:
+    """
+    Spool files of attachments uploaded by peers, waiting for the message referring to them.
+
+    Uploads complete before the message is sent, so Claim finds the file when the
+    message arrives. Files whose message never arrives are deleted after ttl seconds;
+    claimed files belong to the receiver of the message.
+
+    Attributes:
+        spool_dir: Directory of the spool files
+        ttl: Seconds an unclaimed spool file is kept
+    """
+
+    def __init__(self, spool_dir: Optional[str] = None, ttl: float = 3600):
+        """
+        Initialize an AttachmentSpool.
+
+        Args:
+            spool_dir: Directory of the spool files, a "prompits-spool" directory in the
+                system temporary directory if None
+            ttl: Seconds an unclaimed spool file is kept
+        """
+        self.spool_dir = spool_dir or os.path.join(tempfile.gettempdir(), "prompits-spool")
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self.ttl = ttl
+        self.files: Dict[str, Tuple[str, int, float]] = {}  # handle -> (path, size, received time)
+        self.lock = threading.Lock()
+
+    def Open(self, handle: str) -> SpoolFile:
+        """
+        Start receiving an upload.
+
+        Args:
+            handle: Handle chosen by the sender
+
+        Returns:
+            SpoolFile: The file to write the chunks to
+        """
+        self.Expire()
+        return SpoolFile(handle, self.spool_dir)
+
+    def Complete(self, spool_file: SpoolFile) -> bool:
+        """
+        Finish an upload and keep its file until the message claims it.
+
+        Args:
+            spool_file: The file of the upload
+
+        Returns:
+            bool: False if fewer bytes than announced arrived, the file is then deleted
+        """
+        spool_file.file.close()
+        if spool_file.expected_size and spool_file.size != spool_file.expected_size:
+            logger.warning(f"Attachment {spool_file.handle} truncated: {spool_file.size} of {spool_file.expected_size} bytes")
+            spool_file.Discard()
+            return False
+        with self.lock:
+            self.files[spool_file.handle] = (spool_file.path, spool_file.size, time.time())
+        return True
+
+    def Receive(self, chunks: Iterator[Any]) -> Tuple[Optional[str], int]:
+        """
+        Write an upload to a spool file.
+
+        Args:
+            chunks: Iterator of agent_pb2.AttachmentChunk
+
+        Returns:
+            tuple: (handle, size), handle is None if the upload failed
+        """
+        spool_file = None
+        try:
+            for chunk in chunks:
+                if spool_file is None:
+                    spool_file = self.Open(chunk.handle)
+                spool_file.Write(chunk)
+        except Exception:
+            if spool_file is not None:
+                spool_file.Discard()
+            raise
+        if spool_file is None or not self.Complete(spool_file):
+            return None, 0
+        return spool_file.handle, spool_file.size
+
+    def Claim(self, handle: str) -> Optional[Tuple[str, int]]:
+        """
+        Take the spool file of an upload.
+
+        Args:
+            handle: Handle of the upload
+
+        Returns:
+            tuple: (path, size), or None if no upload has this handle
+        """
+        with self.lock:
+            entry = self.files.pop(handle, None)
+        if entry is None:
+            return None
+        return entry[0], entry[1]
+
+    def Expire(self) -> int:
+        """
+        Delete the spool files not claimed within ttl seconds.
+
+        Returns:
+            int: Number of files deleted
+        """
+        limit = time.time() - self.ttl
+        with self.lock:
+            expired = [handle for handle, (_, _, received) in self.files.items() if received < limit]
+            paths = [self.files.pop(handle)[0] for handle in expired]
+        for path in paths:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        return len(paths)
+
+    @staticmethod
+    def NewHandle() -> str:
+        """
+        Get a handle for a new upload.
+        """
+        return str(uuid.uuid4())
+
+    @staticmethod
+    def Chunks(attachment, handle: str, chunk_size: int = CHUNK_SIZE) -> Iterator[Any]:
+        """
+        Split the content of an attachment into AttachmentChunk messages.
+
+        Bytes are sliced through a memoryview and files are read one chunk at a
+        time, so only one chunk is copied at a time.
+
+        Args:
+            attachment: Attachment with bytes data or a path
+            handle: Handle of the upload
+            chunk_size: Size of the chunks
+
+        Returns:
+            Iterator of agent_pb2.AttachmentChunk
+        """
+        from prompits.plugs.protos import agent_pb2
+        size = attachment.Size() or 0
+        if attachment.data is None and attachment.path is not None:
+            with open(attachment.path, 'rb') as f:
+                first = True
+                while True:
+                    data = f.read(chunk_size)
+                    if not data and not first:
+                        return
+                    yield agent_pb2.AttachmentChunk(handle=handle, data=data, size=size if first else 0)
+                    first = False
+        else:
+            view = memoryview(attachment.data)
+            for offset in range(0, max(len(view), 1), chunk_size):
+                yield agent_pb2.AttachmentChunk(handle=handle, data=bytes(view[offset:offset + chunk_size]),
+                                                size=size if offset == 0 else 0)
@@ -0,0 +1,447 @@
+# ChannelManager keeps long-lived gRPC channels and stubs per peer address
+# Creating a channel per message pays TCP + HTTP/2 setup on every call, so
+# channels are cached per process, keyed by "host:port", and reused by every gRPCPlug
+# configured with the same channel settings
+
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+import grpc
+
+from prompits.plugs.protos import agent_pb2_grpc
+
+logger = logging.getLogger(__name__)
+
+
+class _ChannelEntry:
+    """
+    A cached channel together with its stub and bookkeeping.
+    """
+
+    def __init__(self, address: str, channel, stub):
+        """
+        Initialize a channel entry.
+
+        Args:
+            address: The "host:port" address of the peer
+            channel: The gRPC channel
+            stub: The AgentStub bound to the channel
+        """
+        self.address = address
+        self.channel = channel
+        self.stub = stub
+        self.created_time = time.time()
+        self.last_used = self.created_time
+        self.state = None
+        self.healthy = True
+        # calls and streams using the channel, and whether it is closed once they end
+        self.in_use = 0
+        self.retired = False
+
+    def on_state_change(self, state):
+        """
+        Connectivity callback registered with the channel.
+
+        A channel in TRANSIENT_FAILURE fails calls until its reconnection backoff
+        ends, even once the peer is back (e.g. restarted on the same address), so it
+        is replaced on next use like a channel which was shut down.
+
+        Args:
+            state: The new grpc.ChannelConnectivity state
+        """
+        self.state = state
+        self.healthy = state not in (grpc.ChannelConnectivity.TRANSIENT_FAILURE, grpc.ChannelConnectivity.SHUTDOWN)
+
+
+class ChannelManager:
+    """
+    Per-process manager of pooled gRPC channels and stubs.
+
+    Channels are keyed by "host:port" and kept open with HTTP/2 keepalive.
+    Channels that have not been used for idle_timeout seconds are closed,
+    channels that were shut down or failed to connect (TRANSIENT_FAILURE, or a call
+    in use_stub failing with UNAVAILABLE) are replaced on next use, and at most
+    max_channels channels are kept open (least recently used first out). Callers hold a channel
+    with use_stub, or acquire and release, while their calls run; a channel in use
+    is never closed by eviction, and a replaced channel is closed once it is released.
+
+    Managers are shared per set of settings (see shared), so a plug's settings
+    do not change the channels of plugs configured differently.
+
+    Attributes:
+        max_channels: Maximum number of open channels
+        idle_timeout: Seconds after which an unused channel is closed
+        keepalive_time_ms: Interval between keepalive pings
+        keepalive_timeout_ms: Time to wait for a keepalive ack
+        keepalive_without_calls: Whether to send keepalive pings on idle channels
+    """
+
+    _shared: Dict[Tuple, "ChannelManager"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_channels: int = 64, idle_timeout: float = 300,
+                 keepalive_time_ms: int = 60000, keepalive_timeout_ms: int = 20000,
+                 keepalive_without_calls: bool = False, options: Optional[List[Tuple[str, Any]]] = None):
+        """
+        Initialize a ChannelManager.
+
+        Args:
+            max_channels: Maximum number of open channels
+            idle_timeout: Seconds after which an unused channel is closed (0 disables eviction)
+            keepalive_time_ms: Interval between keepalive pings
+            keepalive_timeout_ms: Time to wait for a keepalive ack before closing the connection
+            keepalive_without_calls: Whether to send keepalive pings when there are no active calls
+            options: Extra channel options passed to grpc.insecure_channel
+        """
+        self.max_channels = max_channels
+        self.idle_timeout = idle_timeout
+        self.keepalive_time_ms = keepalive_time_ms
+        self.keepalive_timeout_ms = keepalive_timeout_ms
+        self.keepalive_without_calls = keepalive_without_calls
+        self.extra_options = list(options or [])
+        self._entries: "OrderedDict[str, _ChannelEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+        self.created_count = 0
+        self.evicted_count = 0
+        self.reconnect_count = 0
+
+    @classmethod
+    def default(cls) -> "ChannelManager":
+        """
+        Get the process-wide ChannelManager with the default settings, creating it if needed.
+
+        Returns:
+            ChannelManager: The shared manager
+        """
+        return cls.shared()
+
+    @classmethod
+    def shared(cls, max_channels: Optional[int] = None, idle_timeout: Optional[float] = None,
+               keepalive_time_ms: Optional[int] = None) -> "ChannelManager":
+        """
+        Get the process-wide ChannelManager with these settings, creating it if needed.
+
+        Plugs configured with the same settings share their channels, arguments that
+        are None take the default setting.
+
+        Args:
+            max_channels: Maximum number of open channels
+            idle_timeout: Seconds after which an unused channel is closed
+            keepalive_time_ms: Interval between keepalive pings
+
+        Returns:
+            ChannelManager: The shared manager
+        """
+        settings = {name: value for name, value in (("max_channels", max_channels), ("idle_timeout", idle_timeout),
+                                                     ("keepalive_time_ms", keepalive_time_ms)) if value is not None}
+        key = tuple(sorted(settings.items()))
+        with cls._shared_lock:
+            manager = cls._shared.get(key)
+            if manager is None:
+                manager = cls._shared[key] = cls(**settings)
+        return manager
+
+    def configure(self, max_channels: Optional[int] = None, idle_timeout: Optional[float] = None,
+                  keepalive_time_ms: Optional[int] = None, keepalive_timeout_ms: Optional[int] = None,
+                  keepalive_without_calls: Optional[bool] = None):
+        """
+        Update the manager settings. Only arguments that are not None are changed.
+
+        Keepalive settings apply to channels created after the call. The settings
+        apply to every plug using this manager.
+
+        Args:
+            max_channels: Maximum number of open channels
+            idle_timeout: Seconds after which an unused channel is closed
+            keepalive_time_ms: Interval between keepalive pings
+            keepalive_timeout_ms: Time to wait for a keepalive ack
+            keepalive_without_calls: Whether to send keepalive pings when there are no active calls
+        """
+        with self._lock:
+            if max_channels is not None:
+                self.max_channels = max_channels
+            if idle_timeout is not None:
+                self.idle_timeout = idle_timeout
+            if keepalive_time_ms is not None:
+                self.keepalive_time_ms = keepalive_time_ms
+            if keepalive_timeout_ms is not None:
+                self.keepalive_timeout_ms = keepalive_timeout_ms
+            if keepalive_without_calls is not None:
+                self.keepalive_without_calls = keepalive_without_calls
+            removed = self._enforce_cap()
+        for entry in removed:
+            self._close_entry(entry)
+
+    def channel_options(self) -> List[Tuple[str, Any]]:
+        """
+        Get the options used for new channels.
+
+        Returns:
+            list: gRPC channel options
+        """
+        options = [
+            ('grpc.keepalive_time_ms', self.keepalive_time_ms),
+            ('grpc.keepalive_timeout_ms', self.keepalive_timeout_ms),
+            ('grpc.keepalive_permit_without_calls', 1 if self.keepalive_without_calls else 0),
+            ('grpc.http2.max_pings_without_data', 0),
+            # channels share connections through gRPC's global subchannel pool, so a channel
+            # replacing a failed one would inherit its reconnection backoff
+            ('grpc.use_local_subchannel_pool', 1),
+        ]
+        return options + self.extra_options
+
+    @staticmethod
+    def server_options(min_ping_interval_ms: int = 10000) -> List[Tuple[str, Any]]:
+        """
+        Get server options that accept the keepalive pings sent by pooled channels.
+
+        Args:
+            min_ping_interval_ms: Minimum interval between pings accepted from a client
+
+        Returns:
+            list: gRPC server options
+        """
+        return [
+            ('grpc.keepalive_permit_without_calls', 1),
+            ('grpc.http2.min_ping_interval_without_data_ms', min_ping_interval_ms),
+            ('grpc.http2.max_ping_strikes', 0),
+        ]
+
+    @contextmanager
+    def use_stub(self, address: str):
+        """
+        Hold the channel to the address while calls are made with its stub.
+
+        Args:
+            address: The "host:port" address of the peer
+
+        Yields:
+            AgentStub: The stub bound to the pooled channel
+        """
+        entry = self.acquire(address)
+        try:
+            yield entry.stub
+        except grpc.RpcError as e:
+            # UNAVAILABLE on a connected channel comes from the peer itself, not from the connection
+            if (isinstance(e, grpc.Call) and e.code() == grpc.StatusCode.UNAVAILABLE
+                    and entry.state != grpc.ChannelConnectivity.READY):
+                entry.healthy = False
+            raise
+        finally:
+            self.release(entry)
+
+    def acquire(self, address: str) -> _ChannelEntry:
+        """
+        Get the entry of the channel to the address and hold it until release is called,
+        for callers keeping a channel across calls (streams, connected plugs).
+
+        Args:
+            address: The "host:port" address of the peer
+
+        Returns:
+            _ChannelEntry: The entry, with its channel and stub
+        """
+        return self._get_entry(address, hold=True)
+
+    def release(self, entry: _ChannelEntry):
+        """
+        Release an entry held with acquire, closing its channel if it was replaced meanwhile.
+
+        Args:
+            entry: The entry returned by acquire
+        """
+        with self._lock:
+            entry.in_use -= 1
+            entry.last_used = time.time()
+            close = entry.retired and entry.in_use <= 0
+        if close:
+            self._close_entry(entry)
+
+    def get_channel(self, address: str):
+        """
+        Get an open channel to the address, creating or replacing it if needed.
+
+        The channel is not held, use acquire to keep it from being evicted.
+
+        Args:
+            address: The "host:port" address of the peer
+
+        Returns:
+            grpc.Channel: The channel
+        """
+        return self._get_entry(address).channel
+
+    def get_stub(self, address: str):
+        """
+        Get the AgentStub for the address.
+
+        The channel is not held, use use_stub to keep it from being evicted during the call.
+
+        Args:
+            address: The "host:port" address of the peer
+
+        Returns:
+            AgentStub: The stub bound to the pooled channel
+        """
+        return self._get_entry(address).stub
+
+    def invalidate(self, address: str):
+        """
+        Replace the channel to the address so the next call reconnects.
+
+        The channel is closed once the calls and streams using it end.
+
+        Args:
+            address: The "host:port" address of the peer
+        """
+        with self._lock:
+            entry = self._entries.get(address)
+            closed = self._retire(entry) if entry is not None else []
+        for old in closed:
+            self._close_entry(old)
+        if entry is not None:
+            logger.debug(f"Invalidated gRPC channel to {address}")
+
+    def evict_idle(self) -> int:
+        """
+        Close channels that have been idle longer than idle_timeout.
+
+        Returns:
+            int: Number of channels closed
+        """
+        with self._lock:
+            closed = self._sweep_idle(time.time())
+        for entry in closed:
+            self._close_entry(entry)
+        return len(closed)
+
+    def close(self):
+        """
+        Close all channels.
+        """
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            self._close_entry(entry)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get statistics about the pooled channels.
+
+        Returns:
+            dict: Open channels and counters
+        """
+        with self._lock:
+            channels = {
+                address: {
+                    "state": entry.state.name if entry.state is not None else None,
+                    "healthy": entry.healthy,
+                    "in_use": entry.in_use,
+                    "idle_seconds": round(time.time() - entry.last_used, 3)
+                }
+                for address, entry in self._entries.items()
+            }
+        return {
+            "open_channels": len(channels),
+            "max_channels": self.max_channels,
+            "created": self.created_count,
+            "evicted": self.evicted_count,
+            "reconnected": self.reconnect_count,
+            "channels": channels
+        }
+
+    def _get_entry(self, address: str, hold: bool = False) -> _ChannelEntry:
+        """
+        Get the entry for the address, creating or replacing it if needed, and hold it if hold is True.
+        """
+        now = time.time()
+        closed = []
+        with self._lock:
+            entry = self._entries.get(address)
+            if entry is not None and not entry.healthy:
+                # the channel was shut down or failed to connect, a new one connects at once
+                closed.extend(self._retire(entry))
+                self.reconnect_count += 1
+                entry = None
+            if entry is None:
+                entry = self._create_entry(address)
+                self._entries[address] = entry
+            else:
+                self._entries.move_to_end(address)
+            entry.last_used = now
+            if hold:
+                entry.in_use += 1
+            if self.idle_timeout and now - self._last_sweep > min(self.idle_timeout, 60):
+                closed.extend(self._sweep_idle(now))
+            closed.extend(self._enforce_cap())
+        for old in closed:
+            self._close_entry(old)
+        return entry
+
+    def _create_entry(self, address: str) -> _ChannelEntry:
+        """
+        Create a new channel and stub. Must be called with the lock held.
+        """
+        channel = grpc.insecure_channel(address, options=self.channel_options())
+        entry = _ChannelEntry(address, channel, agent_pb2_grpc.AgentStub(channel))
+        channel.subscribe(entry.on_state_change, try_to_connect=False)
+        self.created_count += 1
+        logger.debug(f"Opened gRPC channel to {address}")
+        return entry
+
+    def _retire(self, entry: _ChannelEntry) -> List[_ChannelEntry]:
+        """
+        Remove an entry, returning it to be closed unless it is in use, in which case
+        it is closed by the last release. Must be called with the lock held.
+        """
+        if self._entries.get(entry.address) is entry:
+            del self._entries[entry.address]
+        if entry.in_use > 0:
+            entry.retired = True
+            return []
+        return [entry]
+
+    def _sweep_idle(self, now: float) -> List[_ChannelEntry]:
+        """
+        Remove idle entries which are not in use. Must be called with the lock held.
+        """
+        self._last_sweep = now
+        if not self.idle_timeout:
+            return []
+        idle = [address for address, entry in self._entries.items()
+                if entry.in_use <= 0 and now - entry.last_used > self.idle_timeout]
+        removed = [self._entries.pop(address) for address in idle]
+        self.evicted_count += len(removed)
+        return removed
+
+    def _enforce_cap(self) -> List[_ChannelEntry]:
+        """
+        Remove least recently used entries above max_channels, skipping those in use
+        (the cap is exceeded while every channel is in use). Must be called with the lock held.
+        """
+        excess = len(self._entries) - self.max_channels if self.max_channels else 0
+        if excess <= 0:
+            return []
+        idle = [address for address, entry in self._entries.items() if entry.in_use <= 0][:excess]
+        removed = [self._entries.pop(address) for address in idle]
+        self.evicted_count += len(removed)
+        return removed
+
+    def _close_entry(self, entry: _ChannelEntry):
+        """
+        Close the channel of an entry.
+        """
+        try:
+            entry.channel.unsubscribe(entry.on_state_change)
+        except Exception:
+            pass
+        try:
+            entry.channel.close()
+        except Exception as e:
+            logger.debug(f"Error closing gRPC channel to {entry.address}: {str(e)}")
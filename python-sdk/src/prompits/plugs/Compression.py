@@ -0,0 +1,98 @@
+# Compression of large gRPC messages
+# A plug advertises the algorithms it decompresses in ToJson. Messages above the
+# size threshold are sent as a Message envelope whose data holds the compressed
+# serialized Message, so compression works the same on unary calls and streams.
+# gzip comes from the standard library, zstd is used when the zstandard package
+# (or the compression.zstd module of Python 3.14) is installed.
+
+import gzip
+from typing import List, Optional
+
+try:
+    from compression import zstd as _zstd
+    _zstd_compress, _zstd_decompress = _zstd.compress, _zstd.decompress
+except ImportError:
+    try:
+        import zstandard as _zstd
+        _zstd_compress, _zstd_decompress = _zstd.compress, _zstd.decompress
+    except ImportError:
+        _zstd = None
+
+# Compression level, favoring speed: messages are compressed once per send
+GZIP_LEVEL = 5
+ZSTD_LEVEL = 3
+
+
+class Compression:
+    """
+    Compression algorithms for message payloads.
+
+    Algorithms are listed in order of preference, zstd first because it
+    compresses faster and better than gzip.
+    """
+
+    @staticmethod
+    def Available() -> List[str]:
+        """
+        Get the names of the algorithms available in this process.
+
+        Returns:
+            list: Algorithm names in order of preference
+        """
+        return (["zstd"] if _zstd is not None else []) + ["gzip"]
+
+    @staticmethod
+    def Negotiate(peer_algorithms: Optional[List[str]], local_algorithms: Optional[List[str]] = None) -> Optional[str]:
+        """
+        Choose the algorithm to compress messages sent to a peer.
+
+        Args:
+            peer_algorithms: Algorithms advertised by the peer
+            local_algorithms: Algorithms enabled locally, in order of preference (default: all available)
+
+        Returns:
+            str: The first local algorithm the peer accepts, or None if there is none
+        """
+        if not peer_algorithms:
+            return None
+        available = Compression.Available()
+        for name in local_algorithms if local_algorithms is not None else available:
+            if name in peer_algorithms and name in available:
+                return name
+        return None
+
+    @staticmethod
+    def Compress(algorithm: str, data: bytes) -> bytes:
+        """
+        Compress data.
+
+        Args:
+            algorithm: "gzip" or "zstd"
+            data: The data to compress
+
+        Returns:
+            bytes: The compressed data
+        """
+        if algorithm == "gzip":
+            return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+        if algorithm == "zstd" and _zstd is not None:
+            return _zstd_compress(data, ZSTD_LEVEL)
+        raise ValueError(f"Compression algorithm {algorithm} is not available")
+
+    @staticmethod
+    def Decompress(algorithm: str, data: bytes) -> bytes:
+        """
+        Decompress data.
+
+        Args:
+            algorithm: "gzip" or "zstd"
+            data: The compressed data
+
+        Returns:
+            bytes: The decompressed data
+        """
+        if algorithm == "gzip":
+            return gzip.decompress(data)
+        if algorithm == "zstd" and _zstd is not None:
+            return _zstd_decompress(data)
+        raise ValueError(f"Compression algorithm {algorithm} is not available")
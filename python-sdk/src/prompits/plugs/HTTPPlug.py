@@ -1,25 +1,33 @@
-""""
-!!! This is not implemented yet.
-
+"""
 HTTP Plug module for communication between agents over HTTP.
 
 An HTTP Plug allows agents to communicate with each other over HTTP.
 It provides methods for sending and receiving HTTP requests and responses.
+
+Incoming requests are served by a threading HTTP/1.1 server, so a peer keeps its
+connection open across messages. Outgoing requests go through one requests.Session
+per base URL, whose connection pool keeps connections to that peer alive, so an agent
+that can only use HTTP does not pay a TCP (and TLS) setup per message.
 """
 
 import json
 import threading
 import time
+import traceback
 import uuid
 from datetime import datetime
-from typing import Dict, Any, List, Optional, Union
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional, Union, Callable
+from urllib.parse import urlsplit, parse_qs
 import requests
+from requests.adapters import HTTPAdapter
 
 from ..Plug import Plug
 from ..Practice import Practice
 from ..Message import Message
 from ..AgentAddress import AgentAddress
 from ..LogEvent import LogEvent
+from ..codecs import CodecRegistry
 
 class HTTPPlug(Plug):
     """
@@ -27,9 +35,17 @@ class HTTPPlug(Plug):
     
     An HTTP Plug allows agents to communicate with each other over HTTP.
     It provides methods for sending HTTP requests and receiving responses.
+    
+    Attributes:
+        session: Session of the plug's own base URL, its headers and auth apply to all sessions
+        sessions: Pooled sessions, by base URL
+        pool_size: Maximum number of kept-alive connections per base URL
+        server: The HTTPServer serving the plug's routes, once connected
     """
     
-    def __init__(self, name: str, description: str = None, host: str = "localhost", port: int = 8000, base_path: str = "", use_https: bool = False):
+    def __init__(self, name: str, description: str = None, host: str = "localhost", port: int = 8000, base_path: str = "", use_https: bool = False,
+                 codecs: List[str] = None, queue_size: int = 10000, high_water_mark: int = None,
+                 pool_size: int = 10, request_timeout: float = 30, keep_alive_timeout: float = 60):
         """
         Initialize an HTTP Plug.
         
@@ -40,16 +56,26 @@ class HTTPPlug(Plug):
             port: Port to connect to
             base_path: Base path for API endpoints
             use_https: Whether to use HTTPS
-        """
-        super().__init__(name, description or f"HTTP Plug {name}")
+            codecs: Names of the codecs accepted, all available codecs if None
+            queue_size: Maximum number of received messages waiting for receive()
+            high_water_mark: Number of waiting messages from which new messages are rejected as busy
+            pool_size: Maximum number of kept-alive connections per base URL
+            request_timeout: Seconds to wait for a response
+            keep_alive_timeout: Seconds the server keeps an idle connection open
+        """
+        super().__init__(name, description or f"HTTP Plug {name}", codecs, queue_size, high_water_mark)
         self.host = host
         self.port = port
         self.base_path = base_path.strip('/')
         self.use_https = use_https
+        self.pool_size = pool_size
+        self.request_timeout = request_timeout
+        self.keep_alive_timeout = keep_alive_timeout
         self.connected = False
-        self.session = None
-        self.message_queue = []
-        self.message_lock = threading.Lock()
+        self.server = None
+        self.sessions: Dict[str, requests.Session] = {}
+        self.sessions_lock = threading.Lock()
+        self.session = self._GetSession(self._base_url())
         
         # Add HTTP-specific practices
         self.AddPractice(Practice("Connect", self.connect))
@@ -98,6 +124,67 @@ class HTTPPlug(Plug):
         self.use_https = json_data.get("use_https", self.use_https)
         return self
     
+    def _GetSession(self, base_url: str) -> requests.Session:
+        """
+        Get the pooled session of a base URL, creating it on first use.
+        
+        Args:
+            base_url: "scheme://host:port" of the peer
+            
+        Returns:
+            requests.Session: The session, keeping up to pool_size connections alive
+        """
+        session = self.sessions.get(base_url)
+        if session is not None:
+            return session
+        with self.sessions_lock:
+            session = self.sessions.get(base_url)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                # default headers and auth are those set on the plug's own session
+                default = getattr(self, 'session', None)
+                if default is not None:
+                    session.headers.update(default.headers)
+                    session.auth = default.auth
+                self.sessions[base_url] = session
+            return session
+    
+    def _ForEachSession(self, update: Callable[[requests.Session], None]):
+        """
+        Apply a change of default headers or auth to all sessions.
+        """
+        with self.sessions_lock:
+            sessions = list(self.sessions.values())
+        for session in sessions:
+            update(session)
+    
+    def _Listen(self, plugs_info: Dict[str, Any]):
+        """
+        Start the HTTP server serving the message route.
+        
+        Args:
+            plugs_info: Dictionary with connection information
+            
+        Returns:
+            bool: True if the server is running, False otherwise
+        """
+        if self.server is not None and self.server.running:
+            return True
+        self.server = HTTPServer(self.host, self.port, self.base_path, keep_alive_timeout=self.keep_alive_timeout)
+        
+        # Add a route for handling messages
+        self.server.add_route("POST", "message", self._handle_message)
+        
+        if not self.server.start():
+            self.server = None
+            return False
+        # port 0 binds a free port, advertise the one chosen
+        self.port = self.server.port
+        return True
+    
     def connect(self):
         """
         Connect the HTTP plug.
@@ -106,32 +193,20 @@ class HTTPPlug(Plug):
             bool: True if connected successfully, False otherwise
         """
         if self.connected:
-            print(f"HTTP Plug {self.name} is already connected")
+            self.log(f"HTTP Plug {self.name} is already connected", 'DEBUG')
             return True
         
         try:
-            # Create a new session
-            self.session = requests.Session()
-            
             # Start the HTTP server
-            self.server = HTTPServer(self.host, self.port, self.base_path)
-            
-            # Add a route for handling messages
-            self.server.add_route("POST", "message", self._handle_message)
-            
-            # Start the server
-            if self.server.start():
+            if self._Listen({}):
                 self.connected = True
-                print(f"Connected HTTP Plug {self.name} to {self._build_url()}")
+                self.log(f"Connected HTTP Plug {self.name} to {self._build_url()}", 'INFO')
                 return True
             else:
-                print(f"Failed to start HTTP server for {self.name}")
-                self.session = None
+                self.log(f"Failed to start HTTP server for {self.name}", 'ERROR')
                 return False
         except Exception as e:
-            print(f"Error connecting HTTP Plug {self.name}: {str(e)}")
-            traceback.print_exc()
-            self.session = None
+            self.log(f"Error connecting HTTP Plug {self.name}: {str(e)}\n{traceback.format_exc()}", 'ERROR')
             return False
     
     def disconnect(self):
@@ -141,32 +216,25 @@ class HTTPPlug(Plug):
         Returns:
             bool: True if disconnected successfully, False otherwise
         """
-        if not self.connected:
-            print(f"HTTP Plug {self.name} is not connected")
-            return True
-        
         try:
-            # Close the session
-            if self.session:
-                self.session.close()
-                self.session = None
+            # Close the pooled connections, the sessions stay usable and reconnect on demand
+            self._ForEachSession(lambda session: session.close())
             
             # Stop the server
-            if hasattr(self, 'server') and self.server:
+            if self.server:
                 self.server.stop()
                 self.server = None
             
             self.connected = False
-            print(f"Disconnected HTTP Plug {self.name}")
+            self.log(f"Disconnected HTTP Plug {self.name}", 'INFO')
             return True
         except Exception as e:
-            print(f"Error disconnecting HTTP Plug {self.name}: {str(e)}")
-            traceback.print_exc()
+            self.log(f"Error disconnecting HTTP Plug {self.name}: {str(e)}\n{traceback.format_exc()}", 'ERROR')
             return False
     
     def send(self, message: Dict[str, Any]):
         """
-        Send a message.
+        Send a message and queue the response for receive().
         
         Args:
             message: Message to send
@@ -174,33 +242,61 @@ class HTTPPlug(Plug):
         Returns:
             bool: True if sent successfully, False otherwise
         """
-        if not self.connected:
-            print(f"HTTP Plug {self.name} is not connected")
+        response_data = self._request(message)
+        if response_data is None:
             return False
         
+        # responses answer our own requests, keep them even when the queue is busy
+        self.message_queue.put(response_data, force=True)
+        
+        # Notify the agent about the received message
+        self._NotifyAgent(response_data)
+        return True
+    
+    def _request(self, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Send a request through the pooled session of its base URL.
+        
+        Args:
+            message: Request with "method", "endpoint" or "url", "data", "params",
+                "headers" and the "plug_info" of the peer
+            
+        Returns:
+            dict: The response, or None if the request failed
+        """
         try:
             # Extract message details
             method = message.get("method", "GET").upper()
             endpoint = message.get("endpoint", "")
             data = message.get("data")
             params = message.get("params")
-            headers = message.get("headers", {})
+            headers = dict(message.get("headers") or {})
             
             # Build the URL
-            url = self._build_url(endpoint)
+            url = message.get("url") or self._build_url(endpoint)
+            parts = urlsplit(url)
+            session = self._GetSession(f"{parts.scheme}://{parts.netloc}")
+            
+            # Encode the body with the codec negotiated with the peer, if its plug info is known
+            body = None
+            if method in ("POST", "PUT") and data is not None:
+                codec = self._GetCodec(message.get("plug_info"))
+                body = codec.Encode(data)
+                headers.setdefault("Content-Type", codec.content_type)
             
             # Send the request
+            timeout = message.get("timeout", self.request_timeout)
             if method == "GET":
-                response = self.session.get(url, params=params, headers=headers)
+                response = session.get(url, params=params, headers=headers, timeout=timeout)
             elif method == "POST":
-                response = self.session.post(url, json=data, params=params, headers=headers)
+                response = session.post(url, data=body, params=params, headers=headers, timeout=timeout)
             elif method == "PUT":
-                response = self.session.put(url, json=data, params=params, headers=headers)
+                response = session.put(url, data=body, params=params, headers=headers, timeout=timeout)
             elif method == "DELETE":
-                response = self.session.delete(url, params=params, headers=headers)
+                response = session.delete(url, params=params, headers=headers, timeout=timeout)
             else:
-                print(f"Unsupported HTTP method: {method}")
-                return False
+                self.log(f"Unsupported HTTP method: {method}", 'ERROR')
+                return None
             
             # Store the response in the message queue
             response_data = {
@@ -216,38 +312,34 @@ class HTTPPlug(Plug):
                 }
             }
             
-            # Try to parse JSON response
+            # Try to parse the response with the codec matching its content type
             try:
-                response_data["json"] = response.json()
+                codec = CodecRegistry.GetByContentType(response.headers.get("Content-Type"))
+                if codec is not None:
+                    response_data["json"] = codec.Decode(response.content)
+                else:
+                    response_data["json"] = response.json()
             except:
                 pass
             
-            with self.message_lock:
-                self.message_queue.append(response_data)
-            
-            # Notify the agent about the received message
-            self.notify_agent(response_data)
-            
-            print(f"Sent {method} request to {url}")
-            return True
+            self.log(LogEvent('DEBUG', 'HTTP_REQUEST', f"{method} {url}: {response.status_code}"))
+            return response_data
         except Exception as e:
-            print(f"Error sending message via HTTP Plug {self.name}: {str(e)}")
-            traceback.print_exc()
-            return False
+            self.log(LogEvent('ERROR', 'HTTP_REQUEST', f"Error sending message via HTTP Plug {self.name}: {str(e)}"))
+            return None
     
-    def receive(self) -> Optional[Dict[str, Any]]:
+    def receive(self, timeout: float = 0) -> Optional[Dict[str, Any]]:
         """
         Receive a message.
         
+        Args:
+            timeout: Seconds to wait for a message, 0 returns at once, None waits forever
+        
         Returns:
             dict: Received message, or None if no message is available
         """
-        with self.message_lock:
-            if not self.message_queue:
-                return None
-            
-            # Get the oldest message
-            return self.message_queue.pop(0)
+        # Get the oldest message
+        return self.message_queue.get(timeout)
     
     def is_connected(self) -> bool:
         """
@@ -277,9 +369,7 @@ class HTTPPlug(Plug):
             "headers": headers
         }
         
-        if self.send(message):
-            return self.receive()
-        return None
+        return self._request(message)
     
     def post(self, endpoint: str, data: Any = None, params: Dict[str, Any] = None, headers: Dict[str, str] = None):
         """
@@ -302,9 +392,7 @@ class HTTPPlug(Plug):
             "headers": headers
         }
         
-        if self.send(message):
-            return self.receive()
-        return None
+        return self._request(message)
     
     def put(self, endpoint: str, data: Any = None, params: Dict[str, Any] = None, headers: Dict[str, str] = None):
         """
@@ -327,9 +415,7 @@ class HTTPPlug(Plug):
             "headers": headers
         }
         
-        if self.send(message):
-            return self.receive()
-        return None
+        return self._request(message)
     
     def delete(self, endpoint: str, params: Dict[str, Any] = None, headers: Dict[str, str] = None):
         """
@@ -350,9 +436,7 @@ class HTTPPlug(Plug):
             "headers": headers
         }
         
-        if self.send(message):
-            return self.receive()
-        return None
+        return self._request(message)
     
     def set_headers(self, headers: Dict[str, str]):
         """
@@ -364,12 +448,8 @@ class HTTPPlug(Plug):
         Returns:
             bool: True if headers were set successfully
         """
-        if not self.connected or not self.session:
-            print(f"HTTP Plug {self.name} is not connected")
-            return False
-        
-        self.session.headers.update(headers)
-        print(f"Set headers for HTTP Plug {self.name}")
+        self._ForEachSession(lambda session: session.headers.update(headers))
+        self.log(f"Set headers for HTTP Plug {self.name}", 'DEBUG')
         return True
     
     def set_auth(self, auth_type: str, credentials: Union[str, Dict[str, str], List[str]]):
@@ -383,22 +463,18 @@ class HTTPPlug(Plug):
         Returns:
             bool: True if authentication was set successfully
         """
-        if not self.connected or not self.session:
-            print(f"HTTP Plug {self.name} is not connected")
-            return False
-        
         try:
             if auth_type.lower() == "basic":
                 # For basic auth, credentials should be [username, password]
                 if isinstance(credentials, list) and len(credentials) == 2:
-                    self.session.auth = (credentials[0], credentials[1])
+                    self._ForEachSession(lambda session: setattr(session, "auth", (credentials[0], credentials[1])))
                 else:
                     print("Basic authentication requires a list with username and password")
                     return False
             elif auth_type.lower() == "bearer":
                 # For bearer auth, credentials should be the token string
                 if isinstance(credentials, str):
-                    self.session.headers.update({"Authorization": f"Bearer {credentials}"})
+                    self._ForEachSession(lambda session: session.headers.update({"Authorization": f"Bearer {credentials}"}))
                 else:
                     print("Bearer authentication requires a token string")
                     return False
@@ -406,7 +482,7 @@ class HTTPPlug(Plug):
                 # For API key, credentials should be {header_name: key} or {param_name: key}
                 if isinstance(credentials, dict) and len(credentials) == 1:
                     key_name, key_value = next(iter(credentials.items()))
-                    self.session.headers.update({key_name: key_value})
+                    self._ForEachSession(lambda session: session.headers.update({key_name: key_value}))
                 else:
                     print("API key authentication requires a dictionary with one key-value pair")
                     return False
@@ -435,8 +511,7 @@ class HTTPPlug(Plug):
         endpoint = endpoint.strip('/')
         
         # Build the base URL
-        protocol = "https" if self.use_https else "http"
-        base_url = f"{protocol}://{self.host}:{self.port}"
+        base_url = self._base_url()
         
         # Add base path if specified
         if self.base_path:
@@ -448,6 +523,14 @@ class HTTPPlug(Plug):
         
         return base_url
     
+    def _base_url(self, plug_info: Dict[str, Any] = None) -> str:
+        """
+        Get "scheme://host:port" of this plug, or of the peer plug described by plug_info.
+        """
+        plug_info = plug_info or {}
+        protocol = "https" if plug_info.get("use_https", self.use_https) else "http"
+        return f"{protocol}://{plug_info.get('host', self.host)}:{plug_info.get('port', self.port)}"
+    
     def echo(self, message):
         """
         Echo a message back to the sender.
@@ -458,9 +541,123 @@ class HTTPPlug(Plug):
         Returns:
             dict: The message
         """
-        print(f"Echoing message: {message}")
+        return self._Echo(message)
+    
+    def _Echo(self, message: str):
+        """
+        Echo a message back.
+        
+        Args:
+            message: Message to echo
+            
+        Returns:
+            dict: The message
+        """
         return {"echo": message}
     
+    def SendMessage(self, agent: AgentAddress, message: Message, plug_info: Dict[str, Any] = {}):
+        """
+        Send a message to an agent by POSTing it to the message route of its HTTP plug.
+        
+        Args:
+            agent: AgentAddress
+            message: Message
+            plug_info: Plug information advertised by the peer
+                {
+                    "host": str,
+                    "port": int,
+                    "base_path": str,
+                    "use_https": bool
+                }
+                
+        Returns:
+            bool: True if the peer accepted the message, False otherwise
+        """
+        if not plug_info or not plug_info.get('host') or not plug_info.get('port'):
+            self.log(f"No connection info for agent {agent}, skipping", 'WARNING')
+            return False
+        base_path = (plug_info.get('base_path') or '').strip('/')
+        url = f"{self._base_url(plug_info)}/{base_path + '/' if base_path else ''}message"
+        response = self._request({
+            "method": "POST",
+            "url": url,
+            "data": {
+                "id": str(uuid.uuid4()),
+                "type": "Message",
+                "content": message.ToJson() if isinstance(message, Message) else message,
+                "timestamp": int(time.time())
+            },
+            "plug_info": plug_info
+        })
+        if response is None:
+            return False
+        if response["status_code"] == 503:
+            self.log(f"Agent {agent} is busy, message rejected", 'WARNING')
+            return False
+        return response["status_code"] == 200
+    
+    def ReceiveMessage(self, msg_count: int = 0, timeout: float = 0):
+        """
+        Receive a message.
+        
+        Args:
+            msg_count: Number of messages to receive
+            timeout: Seconds to wait for a message, 0 returns at once, None waits forever
+            
+        Returns:
+            dict: Received message, or None if no message is available
+        """
+        return self.message_queue.get(timeout)
+    
+    def _Connect(self, agent: AgentAddress, plugs_info: Dict[str, Any]):
+        """
+        Prepare the pooled session of an agent; connections open on the first request.
+        
+        Args:
+            agent: AgentAddress
+            plugs_info: Plug information advertised by the agent
+            
+        Returns:
+            bool: True
+        """
+        self._GetSession(self._base_url(plugs_info))
+        return True
+    
+    def _Disconnect(self, agent: AgentAddress, plugs_info: Dict[str, Any]):
+        """
+        Close the pooled connections to an agent.
+        
+        Args:
+            agent: AgentAddress
+            plugs_info: Plug information advertised by the agent
+            
+        Returns:
+            bool: True if the agent had a session
+        """
+        with self.sessions_lock:
+            session = self.sessions.get(self._base_url(plugs_info))
+        if session is None:
+            return False
+        session.close()
+        return True
+    
+    def _IsConnected(self) -> bool:
+        """
+        Check if the HTTP server of the plug is running.
+        
+        Returns:
+            bool: True if connected, False otherwise
+        """
+        return self.connected
+    
+    def start(self):
+        """Start the HTTP plug"""
+        return self.connect()
+    
+    def stop(self):
+        """Stop the HTTP plug"""
+        return self.disconnect()
+    
     def _handle_message(self, request):
         """
         Handle an incoming message.
@@ -472,17 +669,27 @@ class HTTPPlug(Plug):
             dict: Response to the request
         """
         try:
-            # Parse the message
-            message = request.get("json", {})
-            
-            # Add the message to the queue
-            with self.message_lock:
-                self.message_queue.append(message)
-            
-            # Notify the agent about the received message
-            self.notify_agent(message)
+            # Parse the message, decoding the body with the codec matching its content type
+            message = request.get("json")
+            if message is None and request.get("body"):
+                codec = CodecRegistry.GetByContentType(request.get("headers", {}).get("Content-Type"))
+                message = (codec or CodecRegistry.Get("json")).Decode(request["body"])
+            message = message or {}
+            
+            # Responses to pending requests go straight to the waiting caller
+            if self._NotifyAgent(message):
+                return {
+                    "status": "success",
+                    "message": "Message received"
+                }
             
-            print(f"Received message on HTTP Plug {self.name}: {message}")
+            # Add the message to the queue, or tell the sender we are busy (HTTP 503)
+            if not self._EnqueueMessage(message):
+                return {
+                    "status": "busy",
+                    "status_code": 503,
+                    "message": self._BusyStatus().ToJson()
+                }
             
             # Return a success response
             return {
@@ -490,36 +697,118 @@ class HTTPPlug(Plug):
                 "message": "Message received"
             }
         except Exception as e:
-            print(f"Error handling message on HTTP Plug {self.name}: {str(e)}")
-            traceback.print_exc()
+            self.log(f"Error handling message on HTTP Plug {self.name}: {str(e)}\n{traceback.format_exc()}", 'ERROR')
             return {
                 "status": "error",
+                "status_code": 500,
                 "message": str(e)
             }
 
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """
+    Request handler dispatching HTTP/1.1 requests to the routes of an HTTPServer.
+    
+    Every response carries a Content-Length, so clients keep the connection open
+    for the next request. Idle connections are closed after the server's
+    keep_alive_timeout.
+    """
+    
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately, without TCP_NODELAY every response waits for a delayed ACK
+    disable_nagle_algorithm = True
+    
+    def do_GET(self):
+        self._Dispatch()
+    
+    def do_POST(self):
+        self._Dispatch()
+    
+    def do_PUT(self):
+        self._Dispatch()
+    
+    def do_DELETE(self):
+        self._Dispatch()
+    
+    def _Dispatch(self):
+        """
+        Call the handler of the route of the request and write its result.
+        """
+        http_server = self.server.http_server
+        parts = urlsplit(self.path)
+        handler = http_server.routes.get(f"{self.command}:{parts.path.strip('/')}")
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if handler is None:
+            self._Respond(404, {"status": "error", "message": f"No route for {self.command} {parts.path}"})
+            return
+        request = {
+            "method": self.command,
+            "path": parts.path,
+            "params": {key: values[0] if len(values) == 1 else values for key, values in parse_qs(parts.query).items()},
+            "headers": dict(self.headers),
+            "body": body,
+            "client_address": self.client_address
+        }
+        try:
+            result = handler(request)
+        except Exception as e:
+            http_server.log_error(f"Error in route {self.command} {parts.path}: {str(e)}")
+            self._Respond(500, {"status": "error", "message": str(e)})
+            return
+        status_code = result.get("status_code", 200) if isinstance(result, dict) else 200
+        self._Respond(status_code, result)
+    
+    def _Respond(self, status_code: int, result: Any):
+        """
+        Write a response encoded with the server's codec.
+        """
+        codec = self.server.http_server.codec
+        payload = codec.Encode(result)
+        self.send_response(status_code)
+        self.send_header("Content-Type", codec.content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def log_message(self, format, *args):
+        # one line per request is too much at message rates, errors are logged by the server
+        pass
+
+
 class HTTPServer:
     """
     HTTP Server for handling incoming HTTP requests.
     
     This class provides a simple HTTP server that can be used to receive
     incoming HTTP requests and route them to the appropriate handlers.
+    Requests are served by a ThreadingHTTPServer speaking HTTP/1.1 with
+    keep-alive, one thread per open connection.
     """
     
-    def __init__(self, host: str = "localhost", port: int = 8000, base_path: str = ""):
+    def __init__(self, host: str = "localhost", port: int = 8000, base_path: str = "",
+                 keep_alive_timeout: float = 60, request_queue_size: int = 128):
         """
         Initialize an HTTP Server.
         
         Args:
             host: Host to bind to
-            port: Port to bind to
+            port: Port to bind to, 0 binds a free port
             base_path: Base path for API endpoints
+            keep_alive_timeout: Seconds an idle connection is kept open
+            request_queue_size: Backlog of connections waiting to be accepted
         """
         self.host = host
         self.port = port
         self.base_path = base_path.strip('/')
+        self.keep_alive_timeout = keep_alive_timeout
+        self.request_queue_size = request_queue_size
         self.routes = {}
         self.running = False
         self.server_thread = None
+        self.httpd = None
+        # responses are standard JSON, written by the fastest JSON codec available
+        self.codec = CodecRegistry.Negotiate(None, None)
         
     def add_route(self, method: str, endpoint: str, handler):
         """
@@ -594,8 +883,11 @@ class HTTPServer:
             return True
         
         try:
-            # In a real implementation, this would start a web server
-            # For now, we'll just simulate it with a thread
+            handler = type("_RequestHandler", (_RequestHandler,), {"timeout": self.keep_alive_timeout})
+            server_class = type("_ThreadingHTTPServer", (ThreadingHTTPServer,), {"request_queue_size": self.request_queue_size})
+            self.httpd = server_class((self.host, self.port), handler)
+            self.httpd.http_server = self
+            self.port = self.httpd.server_address[1]
             self.running = True
             self.server_thread = threading.Thread(
                 target=self._server_loop,
@@ -609,6 +901,7 @@ class HTTPServer:
             print(f"Error starting HTTP Server: {str(e)}")
             traceback.print_exc()
             self.running = False
+            self.httpd = None
             return False
     
     def stop(self):
@@ -623,9 +916,10 @@ class HTTPServer:
             return True
         
         try:
-            # In a real implementation, this would stop the web server
-            # For now, we'll just simulate it
             self.running = False
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
             
             # Wait for the server thread to finish
             if self.server_thread:
@@ -639,18 +933,14 @@ class HTTPServer:
             traceback.print_exc()
             return False
     
+    def log_error(self, message: str):
+        """
+        Log an error raised while serving a request.
+        """
+        print(f"HTTP Server {self.host}:{self.port}: {message}")
+    
     def _server_loop(self):
         """
-        Main server loop.
-        
-        This method simulates a server loop that would handle incoming requests.
-        In a real implementation, this would be replaced with a proper web server.
+        Main server loop, serving requests until the server is stopped.
         """
-        print(f"HTTP Server running on {self.host}:{self.port}")
-        
-        while self.running:
-            # In a real implementation, this would handle incoming requests
-            # For now, we'll just sleep to simulate the server running
-            time.sleep(1)
-        
-        print("HTTP Server loop stopped") 
\ No newline at end of file
+        self.httpd.serve_forever(poll_interval=0.5)
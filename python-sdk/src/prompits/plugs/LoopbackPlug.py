@@ -0,0 +1,351 @@
+# LoopbackPlug delivers messages between agents living in the same Python process
+# Agents in one process (tests, the monitor web app, embedded deployments) still sent
+# each other messages through gRPC, encoding and decoding every message. Every Agent
+# registers a LoopbackPlug in the process-wide LoopbackDirectory under its agent_id
+# when it starts; Agent.SendMessage looks recipients up there first and delivers the
+# message without encoding it. Receivers get the same dict as from a network plug, its
+# content the dictionary of Message.ToJson. Messages are frozen (Message.Freeze) before
+# delivery, so the sender and the receivers share the body without copying it and none
+# of them can change what the others see.
+
+import threading
+import time
+import traceback
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from ..Plug import Plug
+from ..Message import Message, PRIORITY_NORMAL
+from ..AgentAddress import AgentAddress
+from .. import Deadline
+
+
+class LoopbackDirectory:
+    """
+    Per-process directory of the LoopbackPlugs of running agents, keyed by agent_id.
+    """
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self):
+        self.plugs: Dict[str, 'LoopbackPlug'] = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def default(cls) -> "LoopbackDirectory":
+        """
+        Get the directory shared by all agents of the process.
+        """
+        if cls._default is None:
+            with cls._default_lock:
+                if cls._default is None:
+                    cls._default = cls()
+        return cls._default
+
+    def register(self, agent_id: str, plug: 'LoopbackPlug'):
+        """
+        Register the plug of an agent, replacing the plug previously registered for agent_id.
+
+        Args:
+            agent_id: ID of the agent
+            plug: The agent's LoopbackPlug
+        """
+        with self.lock:
+            self.plugs[agent_id] = plug
+
+    def unregister(self, agent_id: str, plug: 'LoopbackPlug' = None):
+        """
+        Remove the plug of an agent.
+
+        Args:
+            agent_id: ID of the agent
+            plug: Only remove the entry if it is this plug
+        """
+        with self.lock:
+            if plug is None or self.plugs.get(agent_id) is plug:
+                self.plugs.pop(agent_id, None)
+
+    def lookup(self, agent_id: str) -> Optional['LoopbackPlug']:
+        """
+        Get the plug of an agent running in this process.
+
+        Args:
+            agent_id: ID of the agent
+
+        Returns:
+            LoopbackPlug: The plug, or None if the agent is not registered
+        """
+        return self.plugs.get(agent_id)
+
+    def agents(self) -> List[str]:
+        """
+        Get the IDs of the registered agents.
+        """
+        with self.lock:
+            return list(self.plugs)
+
+
+class LoopbackPlug(Plug):
+    """
+    Plug exchanging messages with agents of the same process.
+
+    Received messages are delivered like those of gRPCPlug: the 'message' event
+    handlers are triggered, then the message is handed to the agent or queued for
+    ReceiveMessage, as a dict whose content is the decoded message. The loopback
+    plug stands in for the network plugs of its agent, so the handlers registered
+    on those plugs are triggered too.
+
+    Attributes:
+        agent_id: ID the plug is registered under, None while it is not registered
+        directory: The directory the plug registers in
+        event_handlers: Dictionary of registered event handlers
+    """
+
+    def __init__(self, name: str, description: str = None, directory: LoopbackDirectory = None,
+                 queue_size: int = 10000, high_water_mark: int = None):
+        """
+        Initialize a LoopbackPlug.
+
+        Args:
+            name: Name of the plug
+            description: Description of the plug
+            directory: Directory to register in, the directory of the process if None
+            queue_size: Maximum number of received messages waiting for ReceiveMessage
+            high_water_mark: Number of waiting messages from which new messages are rejected
+        """
+        super().__init__(name, description or f"Loopback plug {name}", None, queue_size, high_water_mark)
+        self.directory = directory or LoopbackDirectory.default()
+        self.agent_id = None
+        self.event_handlers = {}
+
+    def Register(self, agent_id: str):
+        """
+        Register the plug as the in-process endpoint of an agent.
+
+        Args:
+            agent_id: ID of the agent
+        """
+        if self.agent_id is not None and self.agent_id != agent_id:
+            self.directory.unregister(self.agent_id, self)
+        self.agent_id = agent_id
+        self.directory.register(agent_id, self)
+
+    def Unregister(self):
+        """
+        Remove the plug from the directory.
+        """
+        if self.agent_id is not None:
+            self.directory.unregister(self.agent_id, self)
+            self.agent_id = None
+
+    def IsLocal(self, agent: AgentAddress) -> bool:
+        """
+        Check whether an agent runs in this process.
+
+        Args:
+            agent: Address of the agent
+
+        Returns:
+            bool: True if the agent is registered in the directory
+        """
+        return self.directory.lookup(agent.agent_id) is not None
+
+    def SendMessage(self, agent: AgentAddress, message: Message, plugs_info: Dict[str, Any] = None):
+        """
+        Deliver a message to an agent of this process.
+
+        Args:
+            agent: Address of the recipient
+            message: The message, it must not be modified until SendMessage returns
+            plugs_info: Unused, agents are found in the directory
+
+        Returns:
+            bool: True if the message was delivered, False if the agent is not registered or is busy
+        """
+        target = self.directory.lookup(agent.agent_id)
+        if target is None:
+            self.log(f"Agent {agent} is not running in this process", 'DEBUG')
+            return False
+        if not isinstance(message, Message):
+            self.log(f"LoopbackPlug only delivers Message objects, got {type(message).__name__}", 'ERROR')
+            return False
+        return target.Deliver(message.Freeze())
+
+    def Deliver(self, message: Message) -> bool:
+        """
+        Hand a message sent by another agent of the process to this plug's agent.
+
+        Triggers the message event handlers and hands the message to the agent,
+        messages the agent does not consume are added to the message queue.
+
+        Args:
+            message: The frozen message
+
+        Returns:
+            bool: False if the message was rejected because the queue is at its high-water mark
+        """
+        # the dict a network plug delivers, without encoding the message
+        received = {
+            'id': str(uuid.uuid4()),
+            'type': 'Message',
+            'content': message.ToJson(),
+            'timestamp': int(time.time())
+        }
+        if message.priority != PRIORITY_NORMAL:
+            received['priority'] = message.priority
+
+        self.trigger_event('message', message=received)
+
+        if self._NotifyAgent(received):
+            return True
+        return self._EnqueueMessage(received, force=message.type == 'StatusMessage')
+
+    def ExecutePractice(self, agent: AgentAddress, practice_name: str, arguments: Dict[str, Any],
+                        deadline: Optional[float] = None):
+        """
+        Execute a practice of an agent of this process, like gRPCPlug.ExecutePractice.
+
+        Args:
+            agent: Address of the agent
+            practice_name: Name of the practice
+            arguments: Arguments of the practice, passed by reference
+            deadline: Absolute deadline the practice runs under (see Deadline)
+
+        Returns:
+            dict: {"success": bool, "result": Any, "error": str}, or None if the agent
+                is not registered
+        """
+        target = self.directory.lookup(agent.agent_id)
+        target_agent = getattr(target, 'agent', None) if target is not None else None
+        if target_agent is None or not hasattr(target_agent, 'UsePractice'):
+            return None
+        if Deadline.Expired(deadline):
+            return {"success": False, "result": None, "error": "Deadline exceeded before execution"}
+        try:
+            result = Deadline.Call(deadline, target_agent.UsePractice, practice_name, **(arguments or {}))
+        except Exception as e:
+            return {"success": False, "result": None, "error": str(e)}
+        return {"success": True, "result": result, "error": None}
+
+    def ReceiveMessage(self, msg_count: int = 0, timeout: float = 0):
+        """
+        Receive a message.
+
+        Args:
+            msg_count: Number of messages to receive
+            timeout: Seconds to wait for a message, 0 returns at once, None waits forever
+
+        Returns:
+            dict: Received message, or None if no message is available
+        """
+        return self.message_queue.get(timeout)
+
+    def register_event_handler(self, event_type: str, handler_func: Callable):
+        """Register an event handler
+
+        Args:
+            event_type: Type of event to register for
+            handler_func: Function to call when event occurs
+        """
+        if event_type not in self.event_handlers:
+            self.event_handlers[event_type] = []
+
+        self.event_handlers[event_type].append(handler_func)
+        self.log(f"Registered event handler for {event_type} events in Loopback Plug {self.name}", 'INFO')
+
+    def unregister_event_handler(self, event_type: str, handler_func: Optional[Callable] = None):
+        """Unregister an event handler
+
+        Args:
+            event_type: Type of event to unregister for
+            handler_func: Function to unregister, or None to unregister all
+        """
+        if event_type not in self.event_handlers:
+            self.log(f"No handlers registered for {event_type} events in Loopback Plug {self.name}", 'WARNING')
+            return
+
+        if handler_func is None:
+            self.event_handlers[event_type] = []
+        elif handler_func in self.event_handlers[event_type]:
+            self.event_handlers[event_type].remove(handler_func)
+        else:
+            self.log(f"Handler not found for {event_type} events in Loopback Plug {self.name}", 'WARNING')
+
+    def trigger_event(self, event_type: str, **event_data):
+        """Trigger an event
+
+        Calls the handlers registered on this plug and on the other plugs of the agent,
+        each handler once.
+
+        Args:
+            event_type: Type of event to trigger
+            **event_data: Data to pass to event handlers
+        """
+        handlers = list(self.event_handlers.get(event_type, []))
+        agent = getattr(self, 'agent', None)
+        for plug in (getattr(agent, 'plugs', None) or {}).values():
+            for handler in getattr(plug, 'event_handlers', {}).get(event_type, []):
+                if handler not in handlers:
+                    handlers.append(handler)
+        if handlers:
+            self.log(f"Triggering event {event_type} with data: {event_data}", 'DEBUG')
+        for handler in handlers:
+            try:
+                handler(event_type, **event_data)
+            except Exception as e:
+                self.log(f"Error in event handler for {event_type} event: {str(e)}\n{traceback.format_exc()}", 'ERROR')
+
+    # Plug interface
+
+    def _Listen(self, plugs_info: Dict[str, Any]):
+        """
+        Register the plug under the ID of its agent.
+
+        Returns:
+            bool: True if registered, False if the plug has no agent
+        """
+        agent_id = getattr(getattr(self, 'agent', None), 'agent_id', None)
+        if agent_id is None:
+            return False
+        self.Register(agent_id)
+        return True
+
+    def _Connect(self, agent: AgentAddress, plugs_info: Dict[str, Any]):
+        """
+        Check that an agent runs in this process, there is nothing to connect.
+        """
+        return self.IsLocal(agent)
+
+    def _Disconnect(self, agent: AgentAddress, plugs_info: Dict[str, Any]):
+        """
+        Nothing to disconnect.
+        """
+        return True
+
+    def _IsConnected(self) -> bool:
+        """
+        Check if the plug is registered.
+        """
+        return self.agent_id is not None
+
+    def _Echo(self, message: str):
+        """
+        Echo a message back.
+
+        Args:
+            message: Message to echo
+
+        Returns:
+            dict: The message
+        """
+        return {"echo": message}
+
+    def start(self):
+        """Register the plug under the ID of its agent"""
+        return self._Listen({})
+
+    def stop(self):
+        """Remove the plug from the directory"""
+        self.Unregister()
+        return True
@@ -0,0 +1,274 @@
+# MessageStream carries messages between two agents over one bidirectional gRPC stream
+# Both ends of the stream use the same class. Each direction starts with a hello frame
+# carrying the agent_id of the sender and its window, the number of unacknowledged
+# message frames it accepts. A sender waits when the window of its peer is used up,
+# so a slow receiver pushes back on its callers instead of buffering without limit,
+# and a message counts as sent once the peer acknowledged it (an ack marked busy if
+# the peer rejected it).
+
+import queue
+import threading
+import time
+from concurrent.futures import Executor
+from typing import Callable, Dict, Optional, Set
+import logging
+
+import grpc
+
+from prompits.plugs.protos import agent_pb2
+
+logger = logging.getLogger(__name__)
+
+# outcomes of MessageStream.send_status
+SEND_ACKED = "acked"
+SEND_BUSY = "busy"
+SEND_TIMEOUT = "timeout"
+SEND_CLOSED = "closed"
+
+
+class MessageStream:
+    """
+    One end of a MessageStream RPC.
+
+    Frames to send are queued and written by gRPC from the outgoing() iterator,
+    frames received are passed to handle_frame() by a reader thread (read()).
+    Message frames are handed to on_message, on the executor if one is given,
+    and acknowledged after it returns, so the window also bounds the number of
+    messages from one peer being handled at a time. When on_message returns False
+    (the message was rejected) the ack is marked busy.
+
+    A sender waits for the ack of its message: the send fails if the peer rejected
+    it as busy, did not acknowledge it in time, or the stream ended before the ack,
+    so callers can send the message another way.
+
+    Attributes:
+        name: Name of the peer, used in logs
+        local_id: agent_id sent to the peer in the hello frame
+        window: Number of unacknowledged message frames accepted from the peer
+        peer_id: agent_id of the peer, known once its hello frame arrived
+        peer_window: Window granted by the peer, None until its hello frame arrived
+        closed: Whether the stream has ended
+        call: The client call object, set on the client end so close() can cancel it
+    """
+
+    def __init__(self, name: str, on_message: Callable[[agent_pb2.Message], None],
+                 local_id: str = "", window: int = 64, on_open: Optional[Callable[['MessageStream'], None]] = None,
+                 executor: Optional[Executor] = None):
+        """
+        Initialize a MessageStream.
+
+        Args:
+            name: Name of the peer, used in logs
+            on_message: Function called with each received agent_pb2.Message, returning
+                False if the message is rejected as busy
+            local_id: agent_id of the local agent
+            window: Number of unacknowledged message frames accepted from the peer
+            on_open: Function called with the stream when the hello of the peer arrives
+            executor: Executor running on_message, None runs it on the reader thread
+        """
+        self.name = name
+        self.on_message = on_message
+        self.on_open = on_open
+        self.executor = executor
+        self.local_id = local_id or ""
+        self.window = window
+        self.peer_id = None
+        self.peer_window = None
+        self.closed = False
+        self.call = None
+        self.error_code = None
+        self.sent_count = 0
+        self.received_count = 0
+        self.busy_count = 0
+        self.last_used = time.time()
+        self._outgoing = queue.Queue()
+        self._cond = threading.Condition()
+        self._next_seq = 1
+        self._unacked: Set[int] = set()  # seq of the message frames not acknowledged by the peer
+        self._acks: Dict[int, bool] = {}  # seq -> accepted, for the acks a sender waits for
+        self._abandoned: Set[int] = set()  # seq of the frames whose sender stopped waiting
+
+    @property
+    def in_flight(self) -> int:
+        """Number of message frames sent and not yet acknowledged by the peer."""
+        return len(self._unacked)
+
+    def outgoing(self):
+        """
+        Iterate over the frames to write to the stream, starting with the hello frame.
+
+        Yields:
+            agent_pb2.StreamFrame: The next frame to send
+        """
+        yield agent_pb2.StreamFrame(sender=self.local_id, window=self.window)
+        while True:
+            frame = self._outgoing.get()
+            if frame is None:
+                return
+            yield frame
+
+    def read(self, frames):
+        """
+        Handle received frames until the stream ends, then close it.
+
+        Runs on a dedicated thread.
+
+        Args:
+            frames: Iterator of received agent_pb2.StreamFrame
+        """
+        try:
+            for frame in frames:
+                self.handle_frame(frame)
+        except grpc.RpcError as e:
+            # on the server end the request iterator raises a bare RpcError once the peer ended the call
+            self.error_code = e.code() if isinstance(e, grpc.Call) else grpc.StatusCode.CANCELLED
+            if self.error_code != grpc.StatusCode.CANCELLED:
+                logger.debug(f"Message stream with {self.name} ended: {e.code()} {e.details()}")
+        except Exception as e:
+            logger.error(f"Error reading message stream with {self.name}: {str(e)}")
+        finally:
+            self.close()
+
+    def handle_frame(self, frame):
+        """
+        Handle one received frame.
+
+        Args:
+            frame: The received agent_pb2.StreamFrame
+        """
+        if frame.window:
+            opened = False
+            with self._cond:
+                if frame.sender:
+                    self.peer_id = frame.sender
+                opened = self.peer_window is None
+                self.peer_window = frame.window
+                self._cond.notify_all()
+            if opened and self.on_open:
+                self.on_open(self)
+        if frame.ack:
+            with self._cond:
+                # one ack per message frame, messages may finish out of order on the executor
+                if frame.ack in self._unacked:
+                    self._unacked.discard(frame.ack)
+                    if frame.busy:
+                        self.busy_count += 1
+                    if frame.ack in self._abandoned:
+                        self._abandoned.discard(frame.ack)
+                    else:
+                        self._acks[frame.ack] = not frame.busy
+                    self._cond.notify_all()
+        if frame.HasField('message'):
+            self.received_count += 1
+            self.last_used = time.time()
+            if self.executor is not None:
+                self.executor.submit(self._deliver, frame.message, frame.seq)
+            else:
+                self._deliver(frame.message, frame.seq)
+
+    def _deliver(self, message, seq: int):
+        """
+        Pass a received message to on_message and acknowledge it, marking the ack busy if it was rejected.
+        """
+        busy = False
+        try:
+            busy = self.on_message(message) is False
+        except Exception as e:
+            logger.error(f"Error handling message from stream with {self.name}: {str(e)}")
+        finally:
+            if not self.closed:
+                self._outgoing.put(agent_pb2.StreamFrame(ack=seq, busy=busy))
+
+    def wait_open(self, timeout: float = None) -> bool:
+        """
+        Wait for the hello frame of the peer.
+
+        Args:
+            timeout: Seconds to wait, None waits forever
+
+        Returns:
+            bool: True if the stream is open, False if it ended or the timeout expired
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self.peer_window is not None or self.closed, timeout)
+            return self.peer_window is not None and not self.closed
+
+    def send(self, message, timeout: float = None) -> bool:
+        """
+        Send a message and wait for the peer to acknowledge it, see send_status.
+
+        Returns:
+            bool: True if the peer accepted the message
+        """
+        return self.send_status(message, timeout) == SEND_ACKED
+
+    def send_status(self, message, timeout: float = None) -> str:
+        """
+        Send a message, waiting while the window of the peer is used up, then for the ack of the message.
+
+        Args:
+            message: The agent_pb2.Message to send
+            timeout: Seconds to wait for room in the window and the ack, None waits forever
+
+        Returns:
+            str: SEND_ACKED if the peer accepted the message, SEND_BUSY if it rejected it as busy,
+                SEND_TIMEOUT if it did not acknowledge it in time (it may still be handled),
+                SEND_CLOSED if the stream ended before the ack
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        remaining = lambda: max(deadline - time.time(), 0) if deadline is not None else None
+        with self._cond:
+            has_room = self._cond.wait_for(
+                lambda: self.closed or (self.peer_window is not None and self.in_flight < self.peer_window),
+                timeout)
+            if self.closed:
+                return SEND_CLOSED
+            if not has_room:
+                return SEND_TIMEOUT
+            seq = self._next_seq
+            self._next_seq += 1
+            self.sent_count += 1
+            self._unacked.add(seq)
+            self.last_used = time.time()
+            # queue under the lock so frames leave in sequence order
+            self._outgoing.put(agent_pb2.StreamFrame(message=message, seq=seq))
+            if not self._cond.wait_for(lambda: seq in self._acks or self.closed, remaining()):
+                self._abandoned.add(seq)
+                return SEND_TIMEOUT
+            if seq not in self._acks:
+                return SEND_CLOSED
+            return SEND_ACKED if self._acks.pop(seq) else SEND_BUSY
+
+    def close(self):
+        """
+        Close the stream. Waiting senders fail with SEND_CLOSED, including those whose message
+        was sent and not acknowledged yet.
+        """
+        with self._cond:
+            if self.closed:
+                return
+            self.closed = True
+            unacked = self.in_flight
+            self._cond.notify_all()
+        self._outgoing.put(None)
+        if self.call is not None:
+            self.call.cancel()
+        if unacked:
+            logger.warning(f"Message stream with {self.name} closed with {unacked} unacknowledged messages")
+
+    def stats(self):
+        """
+        Get statistics about the stream.
+
+        Returns:
+            dict: Counters and flow control state
+        """
+        return {
+            "peer_id": self.peer_id,
+            "sent": self.sent_count,
+            "received": self.received_count,
+            "in_flight": self.in_flight,
+            "busy": self.busy_count,
+            "peer_window": self.peer_window,
+            "closed": self.closed
+        }
@@ -0,0 +1,259 @@
+# PracticeScheduler runs the practices requested through ExecutePractice on bounded executors
+# The gRPC server ran every call on one pool of 10 threads, so a few slow practices such
+# as LLM Chat calls could hold all of them and cheap calls (GetAgentInfo, ListPractices,
+# Heartbeat) waited behind them. Practices are now split in two planes: control-plane
+# practices (agent bookkeeping) and data-plane practices (everything else), each run on
+# its own executor. Data-plane calls beyond data_workers wait for a thread, like they
+# did before; data_queue can bound the waiting calls, rejecting calls beyond it as busy,
+# so waiting calls do not hold every server thread. A practice can also be given its own
+# concurrency limit (a semaphore), calls beyond it are rejected as busy. Senders retry
+# busy calls with backoff (PeerHealth).
+
+import threading
+from concurrent import futures
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Optional
+
+# practices run on the control-plane executor unless configured otherwise
+CONTROL_PRACTICES = ("Advertise", "Echo", "ListPits", "PeerHealth", "QueueStats", "ExecutorStats", "ReceiveMessage",
+                     "RefreshPractice", "StopAgent", "ConnectToAgent", "DisconnectFromAgent",
+                     "Heartbeat", "GetAgentInfo", "ListPractices")
+
+CONTROL = "control"
+DATA = "data"
+
+
+class PracticeBusyError(Exception):
+    """
+    Raised when a practice call is not admitted: its plane or the practice is at its limit.
+    """
+
+
+class _Plane:
+    """
+    Executor and counters of one plane.
+    """
+
+    def __init__(self, name: str, workers: int, queue: Optional[int]):
+        self.name = name
+        self.workers = workers
+        self.queue = queue
+        self.executor = None
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def limit(self) -> Optional[int]:
+        """Number of admitted calls from which calls are rejected, None for no limit."""
+        return None if self.queue is None else self.workers + self.queue
+
+    def ToJson(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queue": self.queue,
+            "active": self.active,
+            "running": min(self.active, self.workers),
+            "waiting": max(self.active - self.workers, 0),
+            "utilization": round(min(self.active, self.workers) / self.workers, 3),
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+
+
+class _PracticeLimit:
+    """
+    Concurrency limit of one practice.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.semaphore = threading.BoundedSemaphore(limit)
+        self.active = 0
+        self.rejected = 0
+
+    def ToJson(self) -> Dict[str, Any]:
+        return {"limit": self.limit, "active": self.active, "rejected": self.rejected}
+
+
+class PracticeScheduler:
+    """
+    Control-plane and data-plane executors with per-practice concurrency limits.
+
+    Attributes:
+        control_practices: Names of the practices run on the control-plane executor
+        limits: Concurrency limit per practice name
+    """
+
+    def __init__(self, name: str, control_workers: int = 2, data_workers: int = 8, data_queue: Optional[int] = None,
+                 practice_limits: Dict[str, int] = None, control_practices: Iterable[str] = None):
+        """
+        Initialize a PracticeScheduler.
+
+        Args:
+            name: Prefix of the names of the executor threads
+            control_workers: Number of threads running control-plane practices
+            data_workers: Number of threads running data-plane practices
+            data_queue: Number of data-plane calls waiting for a thread from which further
+                calls are rejected as busy, None (default) to let every call wait
+            practice_limits: Maximum number of concurrent calls per practice name. A name without
+                "/" also limits the practice of that name in any pit (e.g. "Chat" for "ollama/Chat")
+            control_practices: Names of the control-plane practices (default: CONTROL_PRACTICES)
+        """
+        self.name = name
+        self.control_practices = set(CONTROL_PRACTICES if control_practices is None else control_practices)
+        self.planes = {
+            CONTROL: _Plane(CONTROL, max(1, control_workers), None),
+            DATA: _Plane(DATA, max(1, data_workers), data_queue)
+        }
+        self.limits: Dict[str, _PracticeLimit] = {
+            practice: _PracticeLimit(limit) for practice, limit in (practice_limits or {}).items() if limit
+        }
+        self.lock = threading.Lock()
+
+    def Plane(self, practice_name: str) -> str:
+        """
+        Get the plane of a practice.
+
+        Args:
+            practice_name: Name of the practice, "pit/practice" or "practice"
+
+        Returns:
+            str: "control" or "data"
+        """
+        if practice_name in self.control_practices or practice_name.rpartition('/')[2] in self.control_practices:
+            return CONTROL
+        return DATA
+
+    def _Limit(self, practice_name: str) -> Optional[_PracticeLimit]:
+        """
+        Get the concurrency limit of a practice, None if it has none.
+        """
+        limit = self.limits.get(practice_name)
+        if limit is None and '/' in practice_name:
+            limit = self.limits.get(practice_name.rpartition('/')[2])
+        return limit
+
+    def _Admit(self, practice_name: str):
+        """
+        Admit a call of a practice, counting it in its plane and its limit.
+
+        Returns:
+            tuple: (plane, practice limit or None), to pass to _Release
+
+        Raises:
+            PracticeBusyError: If the plane or the practice is at its limit
+        """
+        plane = self.planes[self.Plane(practice_name)]
+        limit = self._Limit(practice_name)
+        with self.lock:
+            if plane.limit is not None and plane.active >= plane.limit:
+                plane.rejected += 1
+                raise PracticeBusyError(f"Busy: {plane.active} {plane.name}-plane practices in progress")
+            if limit is not None and not limit.semaphore.acquire(blocking=False):
+                limit.rejected += 1
+                raise PracticeBusyError(f"Busy: practice {practice_name} is at its limit of {limit.limit} concurrent calls")
+            plane.active += 1
+            if limit is not None:
+                limit.active += 1
+        return plane, limit
+
+    def _Release(self, plane: _Plane, limit: Optional[_PracticeLimit]):
+        """
+        Release a call admitted by _Admit.
+        """
+        with self.lock:
+            plane.active -= 1
+            plane.completed += 1
+            if limit is not None:
+                limit.active -= 1
+                limit.semaphore.release()
+
+    def _Executor(self, plane: _Plane) -> futures.ThreadPoolExecutor:
+        """
+        Get the executor of a plane, creating it on first use.
+        """
+        if plane.executor is None:
+            with self.lock:
+                if plane.executor is None:
+                    plane.executor = futures.ThreadPoolExecutor(
+                        max_workers=plane.workers, thread_name_prefix=f"{self.name}_{plane.name}")
+        return plane.executor
+
+    def Submit(self, practice_name: str, func: Callable[..., Any], *args, **kwargs) -> futures.Future:
+        """
+        Run a call of a practice on the executor of its plane.
+
+        The call counts against the limits until func returns, even if the caller
+        stops waiting for the future.
+
+        Args:
+            practice_name: Name of the practice
+            func: Function running the practice
+            *args, **kwargs: Arguments of func
+
+        Returns:
+            concurrent.futures.Future: Future of the result of func
+
+        Raises:
+            PracticeBusyError: If the plane or the practice is at its limit
+        """
+        plane, limit = self._Admit(practice_name)
+        try:
+            future = self._Executor(plane).submit(func, *args, **kwargs)
+        except BaseException:
+            self._Release(plane, limit)
+            raise
+        future.add_done_callback(lambda _: self._Release(plane, limit))
+        return future
+
+    @contextmanager
+    def Slot(self, practice_name: str):
+        """
+        Count a call of a practice run by the caller itself (e.g. an async practice awaited on an event loop).
+
+        Raises:
+            PracticeBusyError: If the plane or the practice is at its limit
+        """
+        plane, limit = self._Admit(practice_name)
+        try:
+            yield
+        finally:
+            self._Release(plane, limit)
+
+    def Shutdown(self):
+        """
+        Stop the executors, letting running practices finish.
+        """
+        for plane in self.planes.values():
+            if plane.executor is not None:
+                plane.executor.shutdown(wait=False)
+                plane.executor = None
+
+    def Limits(self) -> Dict[str, Any]:
+        """
+        Get the configured limits of the executors and of the limited practices, without their counters.
+
+        Returns:
+            dict: Per plane workers and queue, and per limited practice its limit
+        """
+        with self.lock:
+            return {
+                "control": {"workers": self.planes[CONTROL].workers, "queue": self.planes[CONTROL].queue},
+                "data": {"workers": self.planes[DATA].workers, "queue": self.planes[DATA].queue},
+                "practice_limits": {practice: limit.limit for practice, limit in self.limits.items()}
+            }
+
+    def ToJson(self) -> Dict[str, Any]:
+        """
+        Get the limits and utilization of the executors and of the limited practices.
+
+        Returns:
+            dict: Per plane workers, queue and active calls, and per limited practice its limit and active calls
+        """
+        with self.lock:
+            return {
+                "control": self.planes[CONTROL].ToJson(),
+                "data": self.planes[DATA].ToJson(),
+                "practice_limits": {practice: limit.ToJson() for practice, limit in self.limits.items()}
+            }
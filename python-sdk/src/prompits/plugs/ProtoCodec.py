@@ -0,0 +1,233 @@
+# ProtoCodec converts Messages to and from the typed AgentMessage protobuf
+# Used on the gRPC path with peers that advertise "proto_messages", so a message is
+# serialized once into protobuf instead of into a JSON string carried in Message.content.
+# Bodies use google.protobuf.Struct/Value and bytes attachments are sent as is.
+
+from datetime import datetime
+from typing import Any, Dict
+
+from google.protobuf import struct_pb2
+
+from prompits.plugs.protos import agent_pb2
+from prompits.Message import TYPE_PRIORITIES, PRIORITY_NORMAL
+
+# Struct numbers are doubles, integers above this cannot be sent exactly
+_MAX_SAFE_INTEGER = 2 ** 53
+
+
+class ProtoCodec:
+    """
+    Codec between prompits.Message and agent_pb2.AgentMessage.
+
+    Encode raises TypeError or ValueError for messages that cannot be represented
+    (e.g. bodies holding arbitrary objects); callers fall back to the JSON content.
+    Decode returns the same dictionary as Message.ToJson.
+
+    Numbers travel as doubles, so integral numbers are decoded as int.
+    """
+
+    @staticmethod
+    def Encode(message, target: agent_pb2.AgentMessage = None) -> agent_pb2.AgentMessage:
+        """
+        Encode a message.
+
+        Args:
+            message: The Message to encode
+            target: AgentMessage to fill in place, a new one is created if None
+
+        Returns:
+            agent_pb2.AgentMessage: The encoded message
+        """
+        pb = target if target is not None else agent_pb2.AgentMessage()
+        pb.type = message.type or ""
+        pb.msg_id = message.msg_id or ""
+        timestamp = getattr(message, 'timestamp', None)
+        if isinstance(timestamp, datetime):
+            pb.timestamp = timestamp.isoformat()
+        elif timestamp:
+            pb.timestamp = str(timestamp)
+        if message.sender is not None:
+            ProtoCodec._EncodeAddress(message.sender, pb.sender)
+        for recipient in message.recipients or []:
+            ProtoCodec._EncodeAddress(recipient, pb.recipients.add())
+        for attachment in message.attachments or []:
+            ProtoCodec._EncodeAttachment(attachment, pb.attachments.add())
+        priority = getattr(message, 'priority', None)
+        if priority and priority != TYPE_PRIORITIES.get(message.type, PRIORITY_NORMAL):
+            pb.priority = priority
+
+        body = message.body
+        if not isinstance(body, dict):
+            raise TypeError(f"Message body must be a dict, got {type(body).__name__}")
+        if message.type == "UsePracticeRequest" and "practice_name" in body:
+            pb.use_practice_request.practice_name = body["practice_name"]
+            ProtoCodec._EncodeStruct(body.get("arguments") or {}, pb.use_practice_request.arguments)
+            if body.get("deadline"):
+                pb.use_practice_request.deadline = body["deadline"]
+        elif message.type == "UsePracticeResponse" and "practice_name" in body:
+            pb.use_practice_response.practice_name = body["practice_name"]
+            ProtoCodec._EncodeValue(body.get("result"), pb.use_practice_response.result)
+            if body.get("error") is not None:
+                pb.use_practice_response.error = str(body["error"])
+        else:
+            ProtoCodec._EncodeStruct(body, pb.generic)
+        return pb
+
+    @staticmethod
+    def Decode(pb: agent_pb2.AgentMessage) -> Dict[str, Any]:
+        """
+        Decode a message into the dictionary form of Message.ToJson.
+
+        Args:
+            pb: The AgentMessage to decode
+
+        Returns:
+            dict: The message as a dictionary
+        """
+        body_kind = pb.WhichOneof('body')
+        if body_kind == 'use_practice_request':
+            body = {
+                "practice_name": pb.use_practice_request.practice_name,
+                "arguments": ProtoCodec._DecodeStruct(pb.use_practice_request.arguments)
+            }
+            if pb.use_practice_request.deadline:
+                body["deadline"] = pb.use_practice_request.deadline
+        elif body_kind == 'use_practice_response':
+            response = pb.use_practice_response
+            body = {
+                "practice_name": response.practice_name,
+                "result": ProtoCodec._DecodeValue(response.result) if response.HasField('result') else None,
+                "error": response.error if response.HasField('error') else None
+            }
+        elif body_kind == 'generic':
+            body = ProtoCodec._DecodeStruct(pb.generic)
+        else:
+            body = {}
+        json_data = {
+            "type": pb.type,
+            "body": body,
+            "sender": f"{pb.sender.agent_id}@{pb.sender.plaza_name}" if pb.HasField('sender') else None,
+            "recipients": [f"{r.agent_id}@{r.plaza_name}" for r in pb.recipients],
+            "msg_id": pb.msg_id or None,
+            "attachments": [ProtoCodec._DecodeAttachment(a) for a in pb.attachments],
+            "timestamp": pb.timestamp
+        }
+        if pb.priority:
+            json_data["priority"] = pb.priority
+        return json_data
+
+    @staticmethod
+    def _EncodeAddress(address, pb: agent_pb2.AgentAddress):
+        """
+        Encode an AgentAddress, a dict or an "agent_id@plaza_name" string.
+        """
+        if isinstance(address, str):
+            agent_id, _, plaza_name = address.partition('@')
+        elif isinstance(address, dict):
+            agent_id, plaza_name = address.get("agent_id"), address.get("plaza_name")
+        else:
+            agent_id, plaza_name = address.agent_id, address.plaza_name
+        pb.agent_id = agent_id or ""
+        pb.plaza_name = plaza_name or ""
+
+    @staticmethod
+    def _EncodeAttachment(attachment, pb: agent_pb2.Attachment):
+        """
+        Encode an Attachment or its dictionary form.
+        """
+        if isinstance(attachment, dict):
+            name, content_type, data = attachment.get("name"), attachment.get("content_type"), attachment.get("data")
+            handle, size = attachment.get("handle"), attachment.get("size")
+        else:
+            name, content_type, data = attachment.name, attachment.content_type, attachment.data
+            handle, size = attachment.handle, attachment.size
+        pb.name = name or ""
+        pb.content_type = content_type or ""
+        if handle:
+            # the content was uploaded with PutAttachment
+            pb.handle = handle
+            pb.size = size or 0
+        elif isinstance(data, (bytes, bytearray, memoryview)):
+            pb.binary = bytes(data)
+        else:
+            ProtoCodec._EncodeValue(data, pb.value)
+
+    @staticmethod
+    def _DecodeAttachment(pb: agent_pb2.Attachment) -> Dict[str, Any]:
+        """
+        Decode an attachment into the dictionary form of Attachment.ToJson.
+        """
+        kind = pb.WhichOneof('data')
+        if kind == 'binary':
+            data = pb.binary
+        elif kind == 'value':
+            data = ProtoCodec._DecodeValue(pb.value)
+        elif kind == 'handle':
+            return {"name": pb.name, "content_type": pb.content_type, "data": None, "handle": pb.handle, "size": pb.size}
+        else:
+            data = None
+        return {"name": pb.name, "content_type": pb.content_type, "data": data}
+
+    @staticmethod
+    def _EncodeStruct(data: Dict[str, Any], pb: struct_pb2.Struct):
+        """
+        Encode a dictionary with string keys into a Struct.
+        """
+        for key, value in data.items():
+            if not isinstance(key, str):
+                raise TypeError(f"Struct keys must be strings, got {type(key).__name__}")
+            ProtoCodec._EncodeValue(value, pb.fields[key])
+
+    @staticmethod
+    def _EncodeValue(value: Any, pb: struct_pb2.Value):
+        """
+        Encode a JSON-compatible value into a Value.
+        """
+        if value is None:
+            pb.null_value = struct_pb2.NULL_VALUE
+        elif isinstance(value, bool):
+            pb.bool_value = value
+        elif isinstance(value, int):
+            if abs(value) > _MAX_SAFE_INTEGER:
+                raise ValueError(f"Integer {value} cannot be sent exactly as a Struct number")
+            pb.number_value = value
+        elif isinstance(value, float):
+            pb.number_value = value
+        elif isinstance(value, str):
+            pb.string_value = value
+        elif isinstance(value, dict):
+            ProtoCodec._EncodeStruct(value, pb.struct_value)
+        elif isinstance(value, (list, tuple)):
+            values = pb.list_value.values
+            for item in value:
+                ProtoCodec._EncodeValue(item, values.add())
+        else:
+            raise TypeError(f"Cannot encode value of type {type(value).__name__}")
+
+    @staticmethod
+    def _DecodeStruct(pb: struct_pb2.Struct) -> Dict[str, Any]:
+        """
+        Decode a Struct into a dictionary.
+        """
+        return {key: ProtoCodec._DecodeValue(value) for key, value in pb.fields.items()}
+
+    @staticmethod
+    def _DecodeValue(pb: struct_pb2.Value) -> Any:
+        """
+        Decode a Value.
+        """
+        kind = pb.WhichOneof('kind')
+        if kind == 'string_value':
+            return pb.string_value
+        if kind == 'number_value':
+            number = pb.number_value
+            if number.is_integer() and abs(number) <= _MAX_SAFE_INTEGER:
+                return int(number)
+            return number
+        if kind == 'bool_value':
+            return pb.bool_value
+        if kind == 'struct_value':
+            return ProtoCodec._DecodeStruct(pb.struct_value)
+        if kind == 'list_value':
+            return [ProtoCodec._DecodeValue(item) for item in pb.list_value.values]
+        return None
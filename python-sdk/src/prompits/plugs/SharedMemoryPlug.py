@@ -0,0 +1,530 @@
+# SharedMemoryPlug carries messages between agents running on the same host through shared memory
+# Each plug has an inbox: a set of ShmRing slots named after it. An agent sending to
+# the plug claims a free slot by creating its ring (creating a segment that exists
+# fails, so two senders never share a slot) and is the only producer of that ring,
+# the plug the only consumer. A reader thread polls the rings, spinning briefly
+# before backing off to poll_interval, so an idle plug costs little CPU and a busy
+# one delivers in microseconds. The plug advertises its inbox and host_id; Agent
+# prefers it for peers advertising the same host_id. The reader thread only copies
+# records out of the rings: event handlers and the agent run on worker threads, in
+# order per ring.
+
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+from concurrent import futures
+from typing import Any, Callable, Dict, List, Optional
+
+from ..Plug import Plug
+from ..Message import Message
+from ..AgentAddress import AgentAddress
+from ..codecs import CodecRegistry
+from .ShmRing import ShmRing
+
+
+def HostId() -> str:
+    """
+    Get an identifier of the host, shared by all processes that can map the same shared memory.
+
+    Returns:
+        str: Host name and machine id
+    """
+    machine_id = ""
+    for path in ("/etc/machine-id", "/var/lib/dbus/machine-id"):
+        try:
+            with open(path) as f:
+                machine_id = f.read().strip()
+            break
+        except OSError:
+            continue
+    return f"{socket.gethostname()}:{machine_id}"
+
+
+class SharedMemoryPlug(Plug):
+    """
+    Plug exchanging messages with agents on the same host through shared memory rings.
+
+    Received messages are handled like those of gRPCPlug: the 'message' event
+    handlers are triggered, then the message is handed to the agent or queued for
+    ReceiveMessage. Messages are handled by handler_workers worker threads, in order
+    per ring; a ring with max_pending messages waiting for a worker is not read until
+    they drain. While the queue is at its high-water mark the plug stops reading its
+    rings, so senders see their ring fill up and SendMessage fails after send_timeout.
+
+    Attributes:
+        inbox: Name prefix of the ring slots of the plug
+        host_id: Identifier of the host, advertised to peers
+        max_peers: Number of ring slots, i.e. of agents that can send to the plug at a time
+        ring_size: Size in bytes of the rings created to send to peers
+        inbound: Rings read by the plug, by slot name
+        outbound: Rings written by the plug, by inbox of the peer
+        event_handlers: Dictionary of registered event handlers
+    """
+
+    def __init__(self, name: str, description: str = None, ring_size: int = 4 * 1024 * 1024, max_peers: int = 64,
+                 poll_interval: float = 0.001, spin_time: float = 0.02, scan_interval: float = 0.2,
+                 send_timeout: float = 1, codecs: List[str] = None, queue_size: int = 10000, high_water_mark: int = None,
+                 handler_workers: int = 4, max_pending: int = 64):
+        """
+        Initialize a SharedMemoryPlug.
+
+        Args:
+            name: Name of the plug
+            description: Description of the plug
+            ring_size: Size in bytes of the rings created to send to peers
+            max_peers: Number of ring slots of the inbox
+            poll_interval: Longest sleep of the reader thread between polls, in seconds
+            spin_time: Seconds the reader thread keeps polling without sleeping after a message
+            scan_interval: Seconds between scans of the inbox for rings created by new peers
+            send_timeout: Seconds SendMessage waits for room in a full ring
+            codecs: Names of the codecs accepted, all available codecs if None
+            queue_size: Maximum number of received messages waiting for ReceiveMessage
+            high_water_mark: Number of waiting messages from which the plug stops reading its rings
+            handler_workers: Number of threads running the event handlers and the agent on received messages
+            max_pending: Received messages waiting for a worker per ring, the ring is not read above it
+        """
+        super().__init__(name, description or f"Shared memory plug {name}", codecs, queue_size, high_water_mark)
+        # records are standard JSON, written and read by the fastest JSON codec available
+        self.frame_codec = CodecRegistry.Negotiate(None, self.codecs)
+        # segment names are short on some platforms, keep the prefix under 20 characters
+        self.inbox = f"pm{uuid.uuid4().hex[:12]}"
+        self.host_id = HostId()
+        self.ring_size = ring_size
+        self.max_peers = max_peers
+        self.poll_interval = poll_interval
+        self.spin_time = spin_time
+        self.scan_interval = scan_interval
+        self.send_timeout = send_timeout
+        self.inbound: Dict[str, ShmRing] = {}
+        self.outbound: Dict[str, ShmRing] = {}
+        self.lock = threading.Lock()
+        self.running = False
+        self.reader_thread = None
+        self.event_handlers = {}
+        self.handler_workers = handler_workers
+        self.max_pending = max(1, max_pending)
+        self.handler_executor = None
+        self.pending: Dict[str, deque] = {}  # slot name -> received messages waiting for a worker
+        self.dispatching = set()  # slot names a worker is handling the messages of
+        self.pending_lock = threading.Lock()
+
+    def ToJson(self):
+        """
+        Convert the plug to a JSON object.
+
+        Returns:
+            dict: JSON representation of the plug, with the inbox peers send to
+        """
+        json_data = super().ToJson()
+        json_data.update({
+            "inbox": self.inbox,
+            "host_id": self.host_id,
+            "max_peers": self.max_peers
+        })
+        return json_data
+
+    def FromJson(self, json_data):
+        """
+        Initialize the plug from a JSON object.
+
+        Args:
+            json_data: JSON object containing the plug configuration
+
+        Returns:
+            SharedMemoryPlug: The initialized plug
+        """
+        super().FromJson(json_data)
+        self.ring_size = json_data.get("ring_size", self.ring_size)
+        self.max_peers = json_data.get("max_peers", self.max_peers)
+        return self
+
+    def IsLocal(self, plug_info: Dict[str, Any]) -> bool:
+        """
+        Check whether a peer plug can be reached through shared memory.
+
+        Args:
+            plug_info: Plug information advertised by the peer
+
+        Returns:
+            bool: True if the peer advertises an inbox on this host
+        """
+        return bool(plug_info) and bool(plug_info.get("inbox")) and plug_info.get("host_id") == self.host_id
+
+    # Sending
+
+    def _GetRing(self, plug_info: Dict[str, Any]) -> Optional[ShmRing]:
+        """
+        Get the ring to a peer's inbox, claiming a free slot on first use.
+
+        Args:
+            plug_info: Plug information advertised by the peer
+
+        Returns:
+            ShmRing: The ring, or None if all slots of the inbox are taken
+        """
+        inbox = plug_info["inbox"]
+        ring = self.outbound.get(inbox)
+        if ring is not None:
+            return ring
+        with self.lock:
+            ring = self.outbound.get(inbox)
+            if ring is not None:
+                return ring
+            for slot in range(plug_info.get("max_peers", self.max_peers)):
+                try:
+                    ring = ShmRing.Create(f"{inbox}_{slot}", self.ring_size)
+                except FileExistsError:
+                    continue
+                self.outbound[inbox] = ring
+                self.log(f"Opened shared memory ring {ring.name}", 'DEBUG')
+                return ring
+        self.log(f"All {plug_info.get('max_peers', self.max_peers)} slots of inbox {inbox} are taken", 'ERROR')
+        return None
+
+    def SendMessage(self, agent: AgentAddress, message: Message, plug_info: Dict[str, Any] = {}):
+        """
+        Send a message to an agent on the same host.
+
+        Args:
+            agent: AgentAddress
+            message: Message
+            plug_info: Plug information advertised by the peer
+                {
+                    "inbox": str,
+                    "host_id": str
+                }
+
+        Returns:
+            bool: True if the message was written to the peer's ring, False otherwise
+        """
+        if not self.IsLocal(plug_info):
+            self.log(f"Agent {agent} is not reachable through shared memory", 'DEBUG')
+            return False
+        ring = self._GetRing(plug_info)
+        if ring is None:
+            return False
+        record = self.frame_codec.Encode({
+            "id": str(uuid.uuid4()),
+            "type": "Message",
+            "content": message.ToJson() if isinstance(message, Message) else message,
+            "timestamp": int(time.time())
+        })
+        if len(record) + 4 > ring.capacity:
+            self.log(f"Message of {len(record)} bytes does not fit in a ring of {ring.capacity} bytes", 'ERROR')
+            return False
+        # the producer of a ring is one plug, serialize the senders of this process
+        deadline = time.monotonic() + self.send_timeout
+        delay = 0.00001
+        while True:
+            with self.lock:
+                if ring.buf is None or ring.closed:
+                    return False
+                if ring.Put(record):
+                    return True
+            if time.monotonic() >= deadline:
+                self.log(f"Ring {ring.name} to agent {agent} is full, the peer is not reading", 'WARNING')
+                return False
+            time.sleep(delay)
+            delay = min(delay * 2, self.poll_interval)
+
+    # Receiving
+
+    def _Listen(self, plugs_info: Dict[str, Any]):
+        """
+        Start reading the rings of the inbox.
+
+        Args:
+            plugs_info: Dictionary with connection information
+
+        Returns:
+            bool: True
+        """
+        if self.running:
+            return True
+        self.running = True
+        self.reader_thread = threading.Thread(target=self._ReadLoop, daemon=True, name=f"{self.name}_shm_reader")
+        self.reader_thread.start()
+        self.log(f"Shared memory plug {self.name} reading inbox {self.inbox}", 'INFO')
+        return True
+
+    def _Scan(self):
+        """
+        Attach to the rings created by new peers and drop the rings closed by their producer.
+        """
+        for name, ring in list(self.inbound.items()):
+            if len(ring):
+                continue
+            if ring.closed or not self._ProducerAlive(ring):
+                del self.inbound[name]
+                ring.Close()
+        for slot in range(self.max_peers):
+            name = f"{self.inbox}_{slot}"
+            if name in self.inbound:
+                continue
+            try:
+                ring = ShmRing.Attach(name)
+            except (FileNotFoundError, ValueError):
+                # ValueError: the producer has created the segment but not sized it yet
+                continue
+            if ring.capacity == 0:
+                ring.Close()
+                continue
+            self.inbound[name] = ring
+            self.log(f"Attached shared memory ring {name}", 'DEBUG')
+
+    @staticmethod
+    def _ProducerAlive(ring: ShmRing) -> bool:
+        """
+        Check whether the process writing a ring is still running.
+        """
+        try:
+            os.kill(ring.producer_pid, 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            # exists, owned by another user
+            pass
+        return True
+
+    def _ReadLoop(self):
+        """
+        Read the rings of the inbox until the plug is stopped.
+        """
+        last_scan = 0
+        last_message = time.monotonic()
+        delay = 0
+        while self.running:
+            now = time.monotonic()
+            if now - last_scan >= self.scan_interval:
+                try:
+                    self._Scan()
+                except Exception as e:
+                    self.log(f"Error scanning inbox {self.inbox}: {str(e)}", 'ERROR')
+                last_scan = now
+            received = 0
+            if not self.message_queue.busy:
+                for name, ring in list(self.inbound.items()):
+                    pending = self.pending.setdefault(name, deque())
+                    while len(pending) < self.max_pending:
+                        record = ring.Get()
+                        if record is None:
+                            break
+                        received += 1
+                        self._Dispatch(name, record)
+                        if self.message_queue.busy:
+                            break
+            if received:
+                last_message = now
+                delay = 0
+            elif now - last_message < self.spin_time:
+                # keep polling right after a message, replies usually follow quickly;
+                # sleep(0) releases the GIL so the thread handling the message can run
+                time.sleep(0)
+            else:
+                delay = min(max(delay * 2, 0.00005), self.poll_interval)
+                time.sleep(delay)
+
+    def _GetHandlerExecutor(self):
+        """
+        Get the executor handling received messages, creating it on first use.
+
+        Returns:
+            ThreadPoolExecutor: The executor
+        """
+        with self.pending_lock:
+            if self.handler_executor is None:
+                self.handler_executor = futures.ThreadPoolExecutor(max_workers=self.handler_workers,
+                                                                   thread_name_prefix=f"{self.name}_shm_handler")
+            return self.handler_executor
+
+    def _Dispatch(self, name: str, record: bytes):
+        """
+        Queue a record read from a ring for the workers, starting a worker on the ring if
+        none is handling it. Runs on the reader thread.
+        """
+        with self.pending_lock:
+            self.pending[name].append(record)
+            start = name not in self.dispatching
+            self.dispatching.add(name)
+        if start:
+            self._GetHandlerExecutor().submit(self._Drain, name)
+
+    def _Drain(self, name: str):
+        """
+        Handle the pending records of a ring in order. Runs on a worker.
+        """
+        pending = self.pending[name]
+        while True:
+            with self.pending_lock:
+                if not pending:
+                    self.dispatching.discard(name)
+                    return
+                record = pending.popleft()
+            try:
+                self._HandleIncoming(record)
+            except Exception as e:
+                self.log(f"Error handling a message from ring {name}: {str(e)}\n{traceback.format_exc()}", 'ERROR')
+
+    def _HandleIncoming(self, record: bytes):
+        """
+        Decode a record, trigger the message event handlers and hand the message to the
+        agent or the message queue. Runs on a worker.
+        """
+        try:
+            message = self.frame_codec.Decode(record)
+        except Exception as e:
+            self.log(f"Dropping undecodable record on inbox {self.inbox}: {str(e)}", 'ERROR')
+            return
+        self.trigger_event('message', message=message)
+        if self._NotifyAgent(message):
+            return
+        # the reader stops reading once the queue is busy, this forced put never exceeds maxsize by much
+        self._EnqueueMessage(message, force=True)
+
+    def ReceiveMessage(self, msg_count: int = 0, timeout: float = 0):
+        """
+        Receive a message.
+
+        Args:
+            msg_count: Number of messages to receive
+            timeout: Seconds to wait for a message, 0 returns at once, None waits forever
+
+        Returns:
+            dict: Received message, or None if no message is available
+        """
+        return self.message_queue.get(timeout)
+
+    def register_event_handler(self, event_type: str, handler_func: Callable):
+        """Register an event handler
+
+        Args:
+            event_type: Type of event to register for
+            handler_func: Function to call when event occurs
+        """
+        if event_type not in self.event_handlers:
+            self.event_handlers[event_type] = []
+
+        self.event_handlers[event_type].append(handler_func)
+        self.log(f"Registered event handler for {event_type} events in Shared memory plug {self.name}", 'INFO')
+
+    def unregister_event_handler(self, event_type: str, handler_func: Optional[Callable] = None):
+        """Unregister an event handler
+
+        Args:
+            event_type: Type of event to unregister for
+            handler_func: Function to unregister, or None to unregister all
+        """
+        if event_type not in self.event_handlers:
+            self.log(f"No handlers registered for {event_type} events in Shared memory plug {self.name}", 'WARNING')
+            return
+
+        if handler_func is None:
+            self.event_handlers[event_type] = []
+        elif handler_func in self.event_handlers[event_type]:
+            self.event_handlers[event_type].remove(handler_func)
+        else:
+            self.log(f"Handler not found for {event_type} events in Shared memory plug {self.name}", 'WARNING')
+
+    def trigger_event(self, event_type: str, **event_data):
+        """Trigger an event
+
+        Args:
+            event_type: Type of event to trigger
+            **event_data: Data to pass to event handlers
+        """
+        if event_type in self.event_handlers:
+            self.log(f"Triggering event {event_type} with data: {event_data}", 'DEBUG')
+            for handler in self.event_handlers[event_type]:
+                try:
+                    handler(event_type, **event_data)
+                except Exception as e:
+                    self.log(f"Error in event handler for {event_type} event: {str(e)}\n{traceback.format_exc()}", 'ERROR')
+
+    # Plug interface
+
+    def _Connect(self, agent: AgentAddress, plugs_info: Dict[str, Any]):
+        """
+        Claim a ring to an agent's inbox.
+
+        Args:
+            agent: AgentAddress
+            plugs_info: Plug information advertised by the agent
+
+        Returns:
+            bool: True if a ring is available
+        """
+        return self.IsLocal(plugs_info) and self._GetRing(plugs_info) is not None
+
+    def _Disconnect(self, agent: AgentAddress, plugs_info: Dict[str, Any]):
+        """
+        Release the ring to an agent's inbox.
+
+        Args:
+            agent: AgentAddress
+            plugs_info: Plug information advertised by the agent
+
+        Returns:
+            bool: True if a ring was released
+        """
+        with self.lock:
+            ring = self.outbound.pop(plugs_info.get("inbox"), None)
+        if ring is None:
+            return False
+        self._ReleaseRing(ring)
+        return True
+
+    @staticmethod
+    def _ReleaseRing(ring: ShmRing):
+        """
+        Close a ring written by the plug. The consumer drains it before it drops it.
+        """
+        ring.MarkClosed()
+        ring.Close(unlink=True)
+
+    def _IsConnected(self) -> bool:
+        """
+        Check if the plug reads its inbox.
+
+        Returns:
+            bool: True if the reader thread runs
+        """
+        return self.running
+
+    def _Echo(self, message: str):
+        """
+        Echo a message back.
+
+        Args:
+            message: Message to echo
+
+        Returns:
+            dict: The message
+        """
+        return {"echo": message}
+
+    def start(self):
+        """Start reading the inbox"""
+        return self._Listen({})
+
+    def stop(self):
+        """Stop reading the inbox and release all rings"""
+        self.running = False
+        if self.reader_thread is not None and self.reader_thread is not threading.current_thread():
+            self.reader_thread.join(timeout=1)
+        self.reader_thread = None
+        with self.lock:
+            outbound, self.outbound = list(self.outbound.values()), {}
+        for ring in outbound:
+            self._ReleaseRing(ring)
+        for ring in list(self.inbound.values()):
+            ring.Close()
+        self.inbound = {}
+        if self.handler_executor is not None:
+            # messages being handled finish in the background
+            self.handler_executor.shutdown(wait=False)
+            self.handler_executor = None
+        return True
@@ -0,0 +1,186 @@
+# ShmRing is a single-producer/single-consumer ring buffer in a shared memory segment
+# One process appends length-prefixed records, another one reads them, without locks:
+# only the producer writes the head and only the consumer writes the tail. Records are
+# copied into the ring before the head is published, so the consumer never sees a
+# partial record. Positions are 8-byte aligned counters that only grow, which relies
+# on aligned 8-byte stores being atomic, as they are on the 64-bit platforms we run on.
+
+import os
+import struct
+from multiprocessing import shared_memory
+from typing import Optional
+
+# head, tail, capacity, producer pid, closed
+_HEADER = struct.Struct('QQQII')
+_HEADER_SIZE = 64  # header padded to a cache line
+# indexes of head and tail in the header viewed as unsigned 64-bit integers
+_HEAD = 0
+_TAIL = 1
+_LENGTH = struct.Struct('=I')
+
+
+def _attach_segment(name: str) -> shared_memory.SharedMemory:
+    """
+    Attach to a shared memory segment without registering it with the resource tracker.
+
+    The tracker unlinks the segments a process used when it exits, which would
+    remove rings still written by other agents. Segments stay registered in the
+    process that created them, so they are removed when it exits, even if it crashes.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 has no track argument, undo the registration unless this process created the segment
+        shm = shared_memory.SharedMemory(name=name)
+        if shm.size >= _HEADER.size and _HEADER.unpack_from(shm.buf, 0)[3] != os.getpid():
+            try:
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(shm._name, "shared_memory")
+            except Exception:
+                pass
+        return shm
+
+
+class ShmRing:
+    """
+    A ring buffer of records in a shared memory segment.
+
+    Attributes:
+        name: Name of the shared memory segment
+        capacity: Size in bytes of the data area
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory):
+        self.shm = shm
+        self.name = shm.name
+        self.buf = shm.buf
+        _, _, self.capacity, _, _ = _HEADER.unpack_from(self.buf, 0)
+        # head and tail are only accessed through this view: an item assignment is a
+        # single aligned store, while struct.pack_into clears the bytes before packing
+        # them, so the other process could see a position go through zero
+        self.positions = self.buf[:16].cast('Q')
+
+    @staticmethod
+    def Create(name: str, capacity: int) -> 'ShmRing':
+        """
+        Create a ring, owned by the calling process as its producer.
+
+        Args:
+            name: Name of the shared memory segment
+            capacity: Size in bytes of the data area
+
+        Returns:
+            ShmRing: The ring
+
+        Raises:
+            FileExistsError: If a segment with this name exists
+        """
+        shm = shared_memory.SharedMemory(name=name, create=True, size=_HEADER_SIZE + capacity)
+        _HEADER.pack_into(shm.buf, 0, 0, 0, capacity, os.getpid(), 0)
+        return ShmRing(shm)
+
+    @staticmethod
+    def Attach(name: str) -> 'ShmRing':
+        """
+        Attach to a ring created by another process, as its consumer.
+
+        Raises:
+            FileNotFoundError: If there is no segment with this name
+        """
+        return ShmRing(_attach_segment(name))
+
+    @property
+    def producer_pid(self) -> int:
+        """Pid of the process that created the ring."""
+        return _HEADER.unpack_from(self.buf, 0)[3]
+
+    @property
+    def closed(self) -> bool:
+        """Whether the producer closed the ring."""
+        return bool(_HEADER.unpack_from(self.buf, 0)[4])
+
+    def __len__(self) -> int:
+        head = self.positions[_HEAD]
+        tail = self.positions[_TAIL]
+        return head - tail
+
+    def _Write(self, position: int, data) -> None:
+        """
+        Copy data into the data area at a position, wrapping around its end.
+        """
+        start = _HEADER_SIZE + position % self.capacity
+        first = min(len(data), _HEADER_SIZE + self.capacity - start)
+        self.buf[start:start + first] = data[:first]
+        if first < len(data):
+            self.buf[_HEADER_SIZE:_HEADER_SIZE + len(data) - first] = data[first:]
+
+    def _Read(self, position: int, size: int) -> bytes:
+        """
+        Copy size bytes out of the data area at a position, wrapping around its end.
+        """
+        start = _HEADER_SIZE + position % self.capacity
+        first = min(size, _HEADER_SIZE + self.capacity - start)
+        if first == size:
+            return bytes(self.buf[start:start + size])
+        return bytes(self.buf[start:start + first]) + bytes(self.buf[_HEADER_SIZE:_HEADER_SIZE + size - first])
+
+    def Put(self, payload: bytes) -> bool:
+        """
+        Append a record. Producer only.
+
+        Args:
+            payload: The record
+
+        Returns:
+            bool: False if the ring does not have room for the record
+        """
+        needed = _LENGTH.size + len(payload)
+        head = self.positions[_HEAD]
+        tail = self.positions[_TAIL]
+        if needed > self.capacity - (head - tail):
+            return False
+        self._Write(head, _LENGTH.pack(len(payload)))
+        self._Write(head + _LENGTH.size, payload)
+        # publish the record
+        self.positions[_HEAD] = head + needed
+        return True
+
+    def Get(self) -> Optional[bytes]:
+        """
+        Remove the oldest record. Consumer only.
+
+        Returns:
+            bytes: The record, or None if the ring is empty
+        """
+        head = self.positions[_HEAD]
+        tail = self.positions[_TAIL]
+        if head == tail:
+            return None
+        (size,) = _LENGTH.unpack(self._Read(tail, _LENGTH.size))
+        payload = self._Read(tail + _LENGTH.size, size)
+        # release the space of the record
+        self.positions[_TAIL] = tail + _LENGTH.size + size
+        return payload
+
+    def MarkClosed(self) -> None:
+        """
+        Tell the consumer that no more records will be written. Producer only.
+        """
+        struct.pack_into('=I', self.buf, 28, 1)
+
+    def Close(self, unlink: bool = False) -> None:
+        """
+        Unmap the ring, and remove the segment if unlink is set. Producer only for unlink.
+        """
+        self.positions.release()
+        self.buf = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # a memoryview of the segment is still referenced, it is unmapped when released
+            pass
+        if unlink:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
@@ -1,43 +1,103 @@
 """
-!!! This is not implemented yet.
-
 TCP Plug module for communication between agents over TCP sockets.
 
 A TCP Plug allows agents to communicate with each other over TCP sockets.
 It provides methods for sending and receiving TCP messages.
-"""
 
-import json
-import traceback
+All the sockets of a plug, the listening socket, the connections accepted from
+peers and the connections opened to peers, are served by one selectors event loop
+on one thread, so an agent can talk to thousands of peers without a thread per
+connection. Messages are framed with a 4-byte big-endian length prefix. Writes
+never block: what the socket does not take at once is kept in a per-connection
+write buffer and flushed by the event loop. Connections opened to peers are kept
+and reused for later messages to the same address. The event loop only does socket
+I/O: received messages are handed to a pool of worker threads, which run the event
+handlers and the agent, in order per connection.
+"""
 
+import selectors
+import socket
+import struct
 import threading
 import time
-import socket
+import traceback
 import uuid
-import struct
-from typing import Dict, Any, Optional, List, Union, TYPE_CHECKING
+from collections import deque
+from concurrent import futures
+from typing import Dict, Any, Optional, List, Union, Callable
+
+from ..Plug import Plug
+from ..Message import Message
+from ..AgentAddress import AgentAddress
+from ..LogEvent import LogEvent
+from ..codecs import CodecRegistry
+
+# Length prefix of a frame
+_HEADER = struct.Struct('!I')
+# Bytes read from a socket at a time
+_READ_SIZE = 256 * 1024
+
+
+class _Connection:
+    """
+    A TCP connection served by the event loop of a TCPPlug.
+    
+    Attributes:
+        sock: The non-blocking socket
+        address: "host:port" of the peer
+        outbound: Whether the plug opened the connection
+        inbuf: Received bytes not yet framed
+        outbuf: Bytes waiting to be written
+        want_write: Whether the event loop watches the socket for writability
+        pending: Received messages waiting for a worker, handled in order
+        dispatching: Whether a worker is handling the pending messages
+        paused: Whether the event loop stopped reading until the pending messages drain
+    """
+    
+    def __init__(self, sock: socket.socket, address: str, outbound: bool):
+        self.sock = sock
+        self.fd = sock.fileno()
+        self.address = address
+        self.outbound = outbound
+        self.inbuf = bytearray()
+        self.outbuf = bytearray()
+        self.lock = threading.Lock()
+        self.want_write = False
+        self.closed = False
+        self.last_used = time.time()
+        self.pending = deque()
+        self.dispatching = False
+        self.paused = False
+        self.events = 0  # events the selector watches the socket for, 0 if it is not registered
 
-from prompits.Practice import Practice
 
-# Use TYPE_CHECKING to avoid circular imports
-if TYPE_CHECKING:
-    from ..Plug import Plug
-    from ..Message import Message
-    from ..AgentAddress import AgentAddress
-else:
-    # Import the base classes directly
-    from ..Plug import Plug
-    from ..Message import Message
-    from ..Practice import Practice
 class TCPPlug(Plug):
     """
     TCP Plug for communication between agents.
     
     A TCP Plug allows agents to communicate with each other over TCP sockets.
     It provides methods for sending and receiving TCP messages.
+    
+    Received messages are handled by handler_workers worker threads, in order per
+    connection, so an event handler that blocks (e.g. runs a practice) holds up the
+    messages of its connection only. A connection with max_pending messages waiting
+    for a worker is not read until they drain.
+    
+    Attributes:
+        is_server: Whether the plug listens for connections
+        connections: Open connections, by socket file descriptor
+        peer_connections: Connections opened to peers, by "host:port", reused for later messages
+        max_frame_size: Largest frame accepted, larger frames close the connection
+        max_write_buffer: Bytes buffered per connection before sends fail
+        handler_workers: Number of threads handling received messages
+        max_pending: Received messages waiting for a worker per connection before reads pause
     """
     
-    def __init__(self, name: str, description: str = None, host: str = "localhost", port: int = 9000, is_server: bool = False):
+    def __init__(self, name: str, description: str = None, host: str = "localhost", port: int = 9000, is_server: bool = False,
+                 codecs: List[str] = None, queue_size: int = 10000, high_water_mark: int = None,
+                 max_frame_size: int = 64 * 1024 * 1024, max_write_buffer: int = 16 * 1024 * 1024,
+                 connect_timeout: float = 5, idle_timeout: float = 300, handler_workers: int = 10,
+                 max_pending: int = 64):
         """
         Initialize a TCP Plug.
         
@@ -45,40 +105,53 @@ class TCPPlug(Plug):
             name: Name of the plug
             description: Description of the plug
             host: Host to connect to (for client) or bind to (for server)
-            port: Port to connect to (for client) or bind to (for server)
+            port: Port to connect to (for client) or bind to (for server), 0 uses the first free port from 9000
             is_server: Whether this plug is a server or client
-        """
-        super().__init__(name, description or f"TCP Plug {name}")
+            codecs: Names of the codecs accepted, all available codecs if None
+            queue_size: Maximum number of received messages waiting for receive()
+            high_water_mark: Number of waiting messages from which new messages are rejected as busy
+            max_frame_size: Largest frame accepted, in bytes
+            max_write_buffer: Bytes buffered per connection before sends fail
+            connect_timeout: Seconds to wait when opening a connection to a peer
+            idle_timeout: Seconds after which an unused connection to a peer is closed, 0 keeps them open
+            handler_workers: Number of threads running the event handlers and the agent on received messages
+            max_pending: Received messages waiting for a worker per connection, reads pause above it
+        """
+        super().__init__(name, description or f"TCP Plug {name}", codecs, queue_size, high_water_mark)
+        # frames are standard JSON, written and read by the fastest JSON codec available
+        self.frame_codec = CodecRegistry.Negotiate(None, self.codecs)
         # if host is *, then use all ip addresses of the machine
         if host == "*":
             self.host = "0.0.0.0"
         else:
             self.host = host
-        # if port =0, then use a random port, try starting at 9000 and incrementing by 1
-        if port == 0:
-            self.port = 9000
-            while True:
-                try:
-                    self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                    self.socket.bind((self.host, self.port))    
-                    break
-                except Exception as e:
-                    self.port += 1
-        else:   
-            self.port = port
+        self.port = port
         self.is_server = is_server
+        self.max_frame_size = max_frame_size
+        self.max_write_buffer = max_write_buffer
+        self.connect_timeout = connect_timeout
+        self.idle_timeout = idle_timeout
+        self.handler_workers = handler_workers
+        self.max_pending = max(1, max_pending)
+        self.handler_executor = None
         self.connected = False
-        self.socket = None
-        self.server_socket = None
-        self.client_sockets = []
-        self.message_queue = []
-        self.message_lock = threading.Lock()
         self.running = False
-        self.server_thread = None
-        self.receiver_thread = None
+        self.server_socket = None
+        self.selector = None
+        self.loop_thread = None
+        self.connections: Dict[int, _Connection] = {}
+        self.peer_connections: Dict[str, _Connection] = {}
+        self.lock = threading.Lock()
+        self._wakeup_r = None
+        self._wakeup_w = None
+        self._pending = []  # (action, connection) applied by the event loop
+        self._last_sweep = time.time()
         self.event_handlers = {}  # Dictionary to store event handlers
+        self.bytes_sent = 0
+        self.bytes_received = 0
         
-        # Add TCP-specific practices
+        if self.is_server:
+            self._Listen({})
         
     def ToJson(self):
         """
@@ -87,17 +160,18 @@ class TCPPlug(Plug):
         Returns:
             dict: JSON representation of the TCP plug
         """
-        #print("Practices:",[practice for practice in self.practices.keys()])
         json_data = super().ToJson()
-        #print(json_data," from super()")
-        # host is all the ip addresses of the machine not hostname
-        host_info = socket.gethostbyname_ex(socket.gethostname())
+        # a plug bound to all interfaces advertises all the ip addresses of the machine
+        if self.host == "0.0.0.0":
+            host = socket.gethostbyname_ex(socket.gethostname())[2]
+        else:
+            host = [self.host]
         json_data.update({
-            "host": host_info[2],
+            "host": host,
             "port": self.port,
-            "is_server": self.is_server
+            "is_server": self.is_server,
+            "max_frame_size": self.max_frame_size
         })
-        #print(json_data," from ToJson")
         return json_data
     
     def FromJson(self, json_data):
@@ -111,121 +185,647 @@ class TCPPlug(Plug):
             TCPPlug: The initialized TCP plug
         """
         super().FromJson(json_data)
-        self.host = json_data.get("host", self.host)
+        host = json_data.get("host", self.host)
+        self.host = host[0] if isinstance(host, list) and host else host
         self.port = json_data.get("port", self.port)
         self.is_server = json_data.get("is_server", self.is_server)
+        self.max_frame_size = json_data.get("max_frame_size", self.max_frame_size)
         return self
     
-    def connect(self):
+    # Event loop
+    
+    def _StartLoop(self):
+        """
+        Start the event loop thread if it is not running.
+        """
+        with self.lock:
+            if self.running:
+                return
+            self.selector = selectors.DefaultSelector()
+            self._wakeup_r, self._wakeup_w = socket.socketpair()
+            self._wakeup_r.setblocking(False)
+            self._wakeup_w.setblocking(False)
+            self.selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+            self.running = True
+            self.loop_thread = threading.Thread(target=self._Loop, daemon=True, name=f"{self.name}_tcp_loop")
+            self.loop_thread.start()
+    
+    def _Wakeup(self):
         """
-        Connect the TCP plug.
+        Wake the event loop up from select.
+        """
+        try:
+            self._wakeup_w.send(b'\0')
+        except OSError:
+            # the wakeup socket is full, the loop wakes up anyway
+            pass
+    
+    def _Submit(self, action: str, conn: Optional[_Connection]):
+        """
+        Ask the event loop to register a socket, or to watch a connection for writability
+        or for reads again.
         
-        Returns:
-            bool: True if connected successfully, False otherwise
+        Args:
+            action: "listen", "register", "write" or "resume"
+            conn: The connection, None for "listen"
+        """
+        with self.lock:
+            self._pending.append((action, conn))
+        self._Wakeup()
+    
+    def _Loop(self):
+        """
+        Serve all sockets of the plug until the plug is stopped.
+        """
+        self.log(f"TCP Plug {self.name} event loop started", 'DEBUG')
+        while self.running:
+            try:
+                events = self.selector.select(timeout=1.0)
+            except OSError as e:
+                if self.running:
+                    self.log(f"Error in TCP Plug {self.name} event loop: {str(e)}", 'ERROR')
+                break
+            for key, mask in events:
+                if key.data is None:
+                    try:
+                        while self._wakeup_r.recv(4096):
+                            pass
+                    except OSError:
+                        pass
+                elif key.data == "listen":
+                    self._Accept()
+                else:
+                    conn = key.data
+                    if mask & selectors.EVENT_READ:
+                        self._Read(conn)
+                    if mask & selectors.EVENT_WRITE and not conn.closed:
+                        self._Flush(conn)
+            self._ApplyPending()
+            if self.idle_timeout and time.time() - self._last_sweep > min(self.idle_timeout, 60):
+                self._SweepIdle()
+        self.log(f"TCP Plug {self.name} event loop stopped", 'DEBUG')
+    
+    def _ApplyPending(self):
+        """
+        Apply the registrations requested by other threads. Runs on the event loop.
+        """
+        with self.lock:
+            pending, self._pending = self._pending, []
+        for action, conn in pending:
+            try:
+                if action == "listen":
+                    if self.server_socket is not None:
+                        self.selector.register(self.server_socket, selectors.EVENT_READ, "listen")
+                elif conn.closed:
+                    continue
+                else:
+                    # "register", "write" and "resume" all watch the events the connection needs now
+                    self._Watch(conn)
+            except (KeyError, ValueError, OSError) as e:
+                self.log(f"Error registering {action} on TCP Plug {self.name}: {str(e)}", 'DEBUG')
+    
+    def _Watch(self, conn: _Connection):
+        """
+        Watch a connection for the events it needs: reads unless paused, writes while
+        bytes are buffered. Runs on the event loop.
+        """
+        with conn.lock:
+            events = (0 if conn.paused else selectors.EVENT_READ) | (selectors.EVENT_WRITE if conn.want_write else 0)
+        if events == conn.events or conn.closed:
+            return
+        if not events:
+            self.selector.unregister(conn.sock)
+        elif not conn.events:
+            self.selector.register(conn.sock, events, conn)
+        else:
+            self.selector.modify(conn.sock, events, conn)
+        conn.events = events
+    
+    def _Accept(self):
+        """
+        Accept the pending connections on the listening socket. Runs on the event loop.
+        """
+        while True:
+            try:
+                sock, address = self.server_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                if self.running:
+                    self.log(f"Error accepting connection on TCP Plug {self.name}: {str(e)}", 'ERROR')
+                return
+            sock.setblocking(False)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = _Connection(sock, f"{address[0]}:{address[1]}", outbound=False)
+            with self.lock:
+                self.connections[conn.fd] = conn
+            self._Watch(conn)
+            self.log(f"TCP Plug {self.name} accepted connection from {conn.address}", 'DEBUG')
+            if self.event_handlers.get('connection'):
+                self._GetHandlerExecutor().submit(self.trigger_event, 'connection', client_socket=sock, client_address=address)
+    
+    def _Read(self, conn: _Connection):
+        """
+        Read from a readable connection and handle the complete frames. Runs on the event loop.
         """
-        if self.connected:
-            print(f"TCP Plug {self.name} is already connected")
-            return True
-        print(f"Connecting TCP Plug {self.name} to {self.host}:{self.port}")
         try:
-            if self.is_server:
-                # Create a server socket
-                self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-                self.server_socket.bind((self.host, self.port))
-                self.server_socket.listen(5)
-                
-                # Start the server thread
-                self.running = True
-                self.server_thread = threading.Thread(
-                    target=self._server_loop,
-                    daemon=True
-                )
-                self.server_thread.start()
-                
-                print(f"TCP Plug {self.name} listening on {self.host}:{self.port}")
-                self.connected = True
-                return True
+            data = conn.sock.recv(_READ_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            self._Close(conn, f"read failed: {str(e)}")
+            return
+        if not data:
+            self._Close(conn, "closed by peer")
+            return
+        self.bytes_received += len(data)
+        conn.last_used = time.time()
+        buf = conn.inbuf
+        buf += data
+        offset = 0
+        while len(buf) - offset >= _HEADER.size:
+            (length,) = _HEADER.unpack_from(buf, offset)
+            if length > self.max_frame_size:
+                self._Close(conn, f"frame of {length} bytes exceeds max_frame_size")
+                return
+            end = offset + _HEADER.size + length
+            if len(buf) < end:
+                break
+            payload = bytes(buf[offset + _HEADER.size:end])
+            offset = end
+            try:
+                message = self.frame_codec.Decode(payload)
+            except Exception as e:
+                self.log(f"Dropping undecodable frame from {conn.address}: {str(e)}", 'ERROR')
+                continue
+            self._Dispatch(message, conn)
+        if offset:
+            del buf[:offset]
+        with conn.lock:
+            pause = not conn.paused and len(conn.pending) >= self.max_pending
+            if pause:
+                conn.paused = True
+        if pause:
+            self.log(f"{len(conn.pending)} messages from {conn.address} wait for a worker, pausing reads", 'DEBUG')
+            self._Watch(conn)
+    
+    def _Flush(self, conn: _Connection):
+        """
+        Write the buffered bytes of a writable connection. Runs on the event loop.
+        """
+        with conn.lock:
+            try:
+                sent = conn.sock.send(conn.outbuf)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                error = str(e)
             else:
-                # Create a client socket
-                self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                self.socket.connect((self.host, self.port))
-                
-                # Start the receiver thread
-                self.running = True
-                self.receiver_thread = threading.Thread(
-                    target=self._receiver_loop,
-                    daemon=True
-                )
-                self.receiver_thread.start()
+                error = None
+                self.bytes_sent += sent
+                del conn.outbuf[:sent]
+                if not conn.outbuf:
+                    conn.want_write = False
+        if error is not None:
+            self._Close(conn, f"write failed: {error}")
+        elif not conn.want_write:
+            try:
+                self._Watch(conn)
+            except (KeyError, ValueError, OSError):
+                pass
+    
+    def _Close(self, conn: _Connection, reason: str = ""):
+        """
+        Close a connection and forget it.
+        
+        Args:
+            conn: The connection
+            reason: Why it is closed, for the log
+        """
+        with conn.lock:
+            if conn.closed:
+                return
+            conn.closed = True
+            unsent = len(conn.outbuf)
+            conn.pending.clear()
+        try:
+            if conn.events:
+                self.selector.unregister(conn.sock)
+        except (KeyError, ValueError, OSError):
+            pass
+        with self.lock:
+            self.connections.pop(conn.fd, None)
+            if conn.outbound and self.peer_connections.get(conn.address) is conn:
+                del self.peer_connections[conn.address]
+        try:
+            conn.sock.close()
+        except OSError:
+            pass
+        self.log(f"TCP connection {conn.address} closed ({reason}), {unsent} bytes unsent", 'WARNING' if unsent else 'DEBUG')
+    
+    def _SweepIdle(self):
+        """
+        Close the connections to peers unused for idle_timeout seconds. Runs on the event loop.
+        """
+        now = time.time()
+        self._last_sweep = now
+        with self.lock:
+            idle = [conn for conn in self.peer_connections.values()
+                    if now - conn.last_used > self.idle_timeout and not conn.outbuf]
+        for conn in idle:
+            self._Close(conn, "idle")
+    
+    # Framing and delivery
+    
+    def _Frame(self, message: Dict[str, Any]) -> bytes:
+        """
+        Encode a message as a length-prefixed frame.
+        
+        Args:
+            message: The message
+            
+        Returns:
+            bytes: The frame
+        """
+        payload = self.frame_codec.Encode(message)
+        if len(payload) > self.max_frame_size:
+            raise ValueError(f"Message of {len(payload)} bytes exceeds max_frame_size")
+        return _HEADER.pack(len(payload)) + payload
+    
+    def _Write(self, conn: _Connection, data: bytes) -> bool:
+        """
+        Write a frame without blocking, buffering what the socket does not take.
+        
+        Args:
+            conn: The connection
+            data: The frame
+            
+        Returns:
+            bool: False if the connection is closed or its write buffer is full
+        """
+        with conn.lock:
+            if conn.closed:
+                return False
+            if len(conn.outbuf) + len(data) > self.max_write_buffer:
+                self.log(f"Write buffer of {conn.address} is full, the peer is not reading", 'WARNING')
+                return False
+            conn.last_used = time.time()
+            if not conn.outbuf:
+                try:
+                    sent = conn.sock.send(data)
+                except (BlockingIOError, InterruptedError):
+                    sent = 0
+                except OSError:
+                    # the event loop notices the broken connection and closes it
+                    return False
+                self.bytes_sent += sent
+                if sent == len(data):
+                    return True
+                data = data[sent:]
+            conn.outbuf += data
+            request = not conn.want_write
+            conn.want_write = True
+        if request:
+            self._Submit("write", conn)
+        return True
+    
+    def _GetHandlerExecutor(self):
+        """
+        Get the executor handling received messages, creating it on first use.
+        
+        Returns:
+            ThreadPoolExecutor: The executor
+        """
+        with self.lock:
+            if self.handler_executor is None:
+                self.handler_executor = futures.ThreadPoolExecutor(max_workers=self.handler_workers,
+                                                                   thread_name_prefix=f"{self.name}_tcp_handler")
+            return self.handler_executor
+    
+    def _Dispatch(self, message, conn: _Connection):
+        """
+        Queue a received message for the workers, starting a worker on the connection
+        if none is handling it. Runs on the event loop.
+        """
+        with conn.lock:
+            conn.pending.append(message)
+            start = not conn.dispatching
+            conn.dispatching = True
+        if start:
+            self._GetHandlerExecutor().submit(self._Drain, conn)
+    
+    def _Drain(self, conn: _Connection):
+        """
+        Handle the pending messages of a connection in order, resuming reads once they
+        have drained to half of max_pending. Runs on a worker.
+        """
+        while True:
+            with conn.lock:
+                if not conn.pending:
+                    conn.dispatching = False
+                    return
+                message = conn.pending.popleft()
+                resume = conn.paused and len(conn.pending) <= self.max_pending // 2
+                if resume:
+                    conn.paused = False
+            if resume:
+                self._Submit("resume", conn)
+            try:
+                self._HandleIncoming(message, conn)
+            except Exception as e:
+                self.log(f"Error handling a message from {conn.address}: {str(e)}\n{traceback.format_exc()}", 'ERROR')
+    
+    def _HandleIncoming(self, message, conn: _Connection):
+        """
+        Handle a received message. Runs on a worker.
+        
+        Triggers the message event handlers and hands the message to the agent.
+        Messages the agent does not consume are queued for ReceiveMessage; when the
+        queue is at its high-water mark the sender gets a busy StatusMessage back.
+        
+        Args:
+            message: The decoded message
+            conn: The connection it arrived on
+        """
+        self.trigger_event('message', message=message, client_socket=conn.sock, client_address=conn.address)
+        
+        # Responses to pending requests go straight to the waiting caller
+        if self._NotifyAgent(message):
+            return
+        
+        # status messages are accepted above the high-water mark
+        is_status = isinstance(message, dict) and message.get("type") == "StatusMessage"
+        if not self._EnqueueMessage(message, force=is_status) and not is_status:
+            self._Write(conn, self._Frame({
+                "id": str(uuid.uuid4()),
+                "type": "StatusMessage",
+                "content": self._BusyStatus().ToJson(),
+                "timestamp": int(time.time())
+            }))
+    
+    def _GetConnection(self, hosts: Union[str, List[str]], port: int) -> Optional[_Connection]:
+        """
+        Get the connection to a peer, opening it if there is none.
+        
+        Args:
+            hosts: Host of the peer, or the list of addresses it advertises
+            port: Port of the peer
+            
+        Returns:
+            _Connection: The connection, or None if the peer cannot be reached
+        """
+        if isinstance(hosts, str):
+            hosts = [hosts]
+        for host in hosts:
+            conn = self.peer_connections.get(f"{host}:{port}")
+            if conn is not None and not conn.closed:
+                return conn
+        self._StartLoop()
+        for host in hosts:
+            address = f"{host}:{port}"
+            try:
+                sock = socket.create_connection((host, port), timeout=self.connect_timeout)
+            except OSError as e:
+                self.log(f"Cannot connect to {address}: {str(e)}", 'DEBUG')
+                continue
+            sock.setblocking(False)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = _Connection(sock, address, outbound=True)
+            with self.lock:
+                existing = self.peer_connections.get(address)
+                if existing is not None and not existing.closed:
+                    # another thread connected first, use its connection
+                    sock.close()
+                    return existing
+                self.peer_connections[address] = conn
+                self.connections[conn.fd] = conn
+            self._Submit("register", conn)
+            self.log(f"Opened TCP connection to {address}", 'DEBUG')
+            return conn
+        return None
+    
+    # Plug interface
+    
+    def SendMessage(self, agent: AgentAddress, message: Message, plug_info: Dict[str, Any] = {}):
+        """
+        Send a message to an agent over TCP.
+        
+        Args:
+            agent: AgentAddress
+            message: Message
+            plug_info: Plug information advertised by the peer
+                {
+                    "host": str or list of str,
+                    "port": int
+                }
                 
-                print(f"TCP Plug {self.name} connected to {self.host}:{self.port}")
-                self.connected = True
-                return True
+        Returns:
+            bool: True if the message was written or buffered, False otherwise
+        """
+        if not plug_info or not plug_info.get('host') or not plug_info.get('port'):
+            self.log(f"No connection info for agent {agent}, skipping", 'WARNING')
+            return False
+        try:
+            conn = self._GetConnection(plug_info['host'], plug_info['port'])
+            if conn is None:
+                self.log(f"Cannot connect to agent {agent} at {plug_info['host']}:{plug_info['port']}", 'ERROR')
+                return False
+            frame = self._Frame({
+                "id": str(uuid.uuid4()),
+                "type": "Message",
+                "content": message.ToJson() if isinstance(message, Message) else message,
+                "timestamp": int(time.time())
+            })
+            self.log(LogEvent('DEBUG', 'TCP_SEND_MESSAGE', f"Message to {conn.address} ({len(frame)} bytes)"))
+            return self._Write(conn, frame)
         except Exception as e:
-            print(f"Error connecting TCP Plug {self.host}:{self.port}: {str(e)} (test)")
-            if self.server_socket:
-                self.server_socket.close()
-                self.server_socket = None
-            if self.socket:
-                self.socket.close()
-                self.socket = None
-            traceback.print_exc()
+            self.log(LogEvent('ERROR', 'TCP_SEND_MESSAGE', f"Error sending message: {str(e)}\n{traceback.format_exc()}"))
             return False
     
-    def disconnect(self):
+    def ReceiveMessage(self, msg_count: int = 0, timeout: float = 0):
         """
-        Disconnect the TCP plug.
+        Receive a message.
         
+        Args:
+            msg_count: Number of messages to receive
+            timeout: Seconds to wait for a message, 0 returns at once, None waits forever
+            
         Returns:
-            bool: True if disconnected successfully, False otherwise
+            dict: Received message, or None if no message is available
         """
-        if not self.connected:
-            print(f"TCP Plug {self.name} is not connected")
-            return True
+        return self.message_queue.get(timeout)
+    
+    def _Listen(self, plugs_info: Dict[str, Any]):
+        """
+        Listen for incoming connections.
         
-        try:
-            # Stop the threads
-            self.running = False
+        Args:
+            plugs_info: Dictionary with connection information
             
-            # Close the sockets
-            if self.is_server:
-                if self.server_socket:
-                    self.server_socket.close()
-                    self.server_socket = None
-                
-                # Close all client sockets
-                for client_socket in self.client_sockets:
+        Returns:
+            bool: True if listening, False otherwise
+        """
+        if self.server_socket is not None:
+            return True
+        try:
+            server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            # if port is 0, use the first free port starting at 9000
+            if self.port == 0:
+                port = 9000
+                while True:
                     try:
-                        client_socket.close()
-                    except:
-                        pass
-                self.client_sockets = []
+                        server_socket.bind((self.host, port))
+                        break
+                    except OSError:
+                        port += 1
+                self.port = port
             else:
-                if self.socket:
-                    self.socket.close()
-                    self.socket = None
+                server_socket.bind((self.host, self.port))
+            server_socket.listen(1024)
+            server_socket.setblocking(False)
+            self.server_socket = server_socket
+            self._StartLoop()
+            self._Submit("listen", None)
+            self.connected = True
+            self.log(f"TCP Plug {self.name} listening on {self.host}:{self.port}", 'INFO')
+            return True
+        except Exception as e:
+            self.log(f"Error starting TCP Plug {self.name} on {self.host}:{self.port}: {str(e)}", 'ERROR')
+            self.server_socket = None
+            return False
+    
+    def _Connect(self, agent: AgentAddress, plugs_info: Dict[str, Any]):
+        """
+        Open the connection to an agent.
+        
+        Args:
+            agent: AgentAddress
+            plugs_info: Plug information advertised by the agent
             
-            # Wait for threads to finish
-            if self.server_thread:
-                self.server_thread.join(timeout=1)
-                self.server_thread = None
+        Returns:
+            bool: True if connected, False otherwise
+        """
+        return self._GetConnection(plugs_info.get('host', self.host), plugs_info.get('port', self.port)) is not None
+    
+    def _Disconnect(self, agent: AgentAddress, plugs_info: Dict[str, Any]):
+        """
+        Close the connection to an agent.
+        
+        Args:
+            agent: AgentAddress
+            plugs_info: Plug information advertised by the agent
             
-            if self.receiver_thread:
-                self.receiver_thread.join(timeout=1)
-                self.receiver_thread = None
+        Returns:
+            bool: True if a connection was closed
+        """
+        hosts = plugs_info.get('host', self.host)
+        for host in [hosts] if isinstance(hosts, str) else hosts:
+            conn = self.peer_connections.get(f"{host}:{plugs_info.get('port', self.port)}")
+            if conn is not None:
+                self._Close(conn, "disconnected")
+                return True
+        return False
+    
+    def _IsConnected(self) -> bool:
+        """
+        Check if the plug is listening or has open connections.
+        
+        Returns:
+            bool: True if connected, False otherwise
+        """
+        return self.connected or bool(self.connections)
+    
+    def _Echo(self, message: str):
+        """
+        Echo a message back.
+        
+        Args:
+            message: Message to echo
             
+        Returns:
+            dict: The message
+        """
+        return {"echo": message}
+    
+    def Stats(self) -> Dict[str, Any]:
+        """
+        Get statistics about the connections of the plug.
+        
+        Returns:
+            dict: Connection counts, buffered bytes and traffic counters
+        """
+        with self.lock:
+            connections = list(self.connections.values())
+        return {
+            "connections": len(connections),
+            "outbound": sum(1 for conn in connections if conn.outbound),
+            "write_buffered": sum(len(conn.outbuf) for conn in connections),
+            "dispatch_pending": sum(len(conn.pending) for conn in connections),
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received
+        }
+    
+    def start(self):
+        """Start the TCP plug"""
+        return self.connect()
+    
+    def stop(self):
+        """Stop the TCP plug"""
+        return self.disconnect()
+    
+    def connect(self):
+        """
+        Connect the TCP plug: listen in server mode, open the connection to host:port in client mode.
+        
+        Returns:
+            bool: True if connected successfully, False otherwise
+        """
+        if self.is_server:
+            return self._Listen({})
+        self.connected = self._GetConnection(self.host, self.port) is not None
+        return self.connected
+    
+    def disconnect(self):
+        """
+        Disconnect the TCP plug, closing all connections and stopping the event loop.
+        
+        Returns:
+            bool: True if disconnected successfully, False otherwise
+        """
+        if not self.running:
             self.connected = False
-            print(f"Disconnected TCP Plug {self.name}")
+            return True
+        try:
+            self.running = False
+            self._Wakeup()
+            if self.loop_thread is not None and self.loop_thread is not threading.current_thread():
+                self.loop_thread.join(timeout=2)
+            with self.lock:
+                connections = list(self.connections.values())
+            for conn in connections:
+                self._Close(conn, "plug stopped")
+            if self.server_socket is not None:
+                self.server_socket.close()
+                self.server_socket = None
+            self.selector.close()
+            self._wakeup_r.close()
+            self._wakeup_w.close()
+            self.loop_thread = None
+            if self.handler_executor is not None:
+                # messages being handled finish in the background
+                self.handler_executor.shutdown(wait=False)
+                self.handler_executor = None
+            self.connected = False
+            self.log(f"Disconnected TCP Plug {self.name}", 'INFO')
             return True
         except Exception as e:
-            print(f"Error disconnecting TCP Plug {self.name}: {str(e)}")
-            traceback.print_exc()
+            self.log(f"Error disconnecting TCP Plug {self.name}: {str(e)}", 'ERROR')
             return False
     
     def _send(self, message: Dict[str, Any]):
         """
-        Send a message.
+        Send a message to host:port in client mode, or to all connected clients in server mode.
         
         Args:
             message: Message to send
@@ -233,56 +833,30 @@ class TCPPlug(Plug):
         Returns:
             bool: True if sent successfully, False otherwise
         """
-        if not self.connected:
-            print(f"TCP Plug {self.name} is not connected")
-            return False
-        
         try:
-            # Convert message to JSON
-            message_json = json.dumps(message)
-            message_bytes = message_json.encode('utf-8')
-            
-            # Prefix the message with its length
-            message_length = len(message_bytes)
-            length_prefix = struct.pack('!I', message_length)
-            
+            frame = self._Frame(message)
             if self.is_server:
-                # Send to all connected clients
-                for client_socket in self.client_sockets:
-                    try:
-                        client_socket.sendall(length_prefix + message_bytes)
-                    except:
-                        # Remove the client if sending fails
-                        try:
-                            client_socket.close()
-                        except:
-                            pass
-                        self.client_sockets.remove(client_socket)
-            else:
-                # Send to the server
-                self.socket.sendall(length_prefix + message_bytes)
-            
-            print(f"Sent message via TCP Plug {self.name}")
-            return True
+                with self.lock:
+                    connections = [conn for conn in self.connections.values() if not conn.outbound]
+                return all([self._Write(conn, frame) for conn in connections])
+            conn = self._GetConnection(self.host, self.port)
+            return conn is not None and self._Write(conn, frame)
         except Exception as e:
-            print(f"Error sending message via TCP Plug {self.name}: {str(e)}")
-            traceback.print_exc()
+            self.log(f"Error sending message via TCP Plug {self.name}: {str(e)}", 'ERROR')
             return False
     
-    def receive(self) -> Optional[Message]:
+    def receive(self, timeout: float = 0) -> Optional[Message]:
         """
         Receive a message.
         
+        Args:
+            timeout: Seconds to wait for a message, 0 returns at once, None waits forever
+        
         Returns:
             dict: Received message, or None if no message is available
         """
-        
-        with self.message_lock:
-            if not self.message_queue:
-                return None
-            
-            # Get the oldest message
-            return self.message_queue.pop(0)
+        # Get the oldest message
+        return self.message_queue.get(timeout)
     
     def is_connected(self) -> bool:
         """
@@ -291,7 +865,7 @@ class TCPPlug(Plug):
         Returns:
             bool: True if connected, False otherwise
         """
-        return self.connected
+        return self._IsConnected()
     
     def send_message(self, message):
         """
@@ -303,9 +877,6 @@ class TCPPlug(Plug):
         Returns:
             bool: True if sent successfully, False otherwise
         """
-        # Lazy import to avoid circular imports
-        from ..Message import Message
-        
         if isinstance(message, Message):
             return self._send(message.ToJson())
         else:
@@ -330,10 +901,9 @@ class TCPPlug(Plug):
         Returns:
             dict: The message
         """
-        print(f"Echoing message: {message}")
-        return {"echo": message}
+        return self._Echo(message)
     
-    def register_event_handler(self, event_type: str, handler_func):
+    def register_event_handler(self, event_type: str, handler_func: Callable):
         """
         Register an event handler for a specific event type.
         
@@ -348,7 +918,7 @@ class TCPPlug(Plug):
             self.event_handlers[event_type] = []
         
         self.event_handlers[event_type].append(handler_func)
-        print(f"Registered event handler for {event_type} events in TCP Plug {self.name}")
+        self.log(f"Registered event handler for {event_type} events in TCP Plug {self.name}", 'DEBUG')
         return True
     
     def unregister_event_handler(self, event_type: str, handler_func=None):
@@ -363,21 +933,17 @@ class TCPPlug(Plug):
             bool: True if unregistered successfully, False otherwise
         """
         if event_type not in self.event_handlers:
-            print(f"No handlers registered for {event_type} events in TCP Plug {self.name}")
             return False
         
         if handler_func is None:
             # Unregister all handlers for this event type
             self.event_handlers[event_type] = []
-            print(f"Unregistered all handlers for {event_type} events in TCP Plug {self.name}")
             return True
         
         if handler_func in self.event_handlers[event_type]:
             self.event_handlers[event_type].remove(handler_func)
-            print(f"Unregistered handler for {event_type} events in TCP Plug {self.name}")
             return True
         
-        print(f"Handler not found for {event_type} events in TCP Plug {self.name}")
         return False
     
     def trigger_event(self, event_type: str, **event_data):
@@ -391,7 +957,6 @@ class TCPPlug(Plug):
         Returns:
             bool: True if any handlers were called, False otherwise
         """
-        print(f"Triggering event {event_type} with data {event_data}")
         if event_type not in self.event_handlers or not self.event_handlers[event_type]:
             return False
         
@@ -399,168 +964,6 @@ class TCPPlug(Plug):
             try:
                 handler(self, **event_data)
             except Exception as e:
-                print(f"TCPPlug.trigger_event: Error in event handler for {event_type} event: {str(e)}")
-                print(f"TCPPlug.trigger_event: Event data: {event_data}")
-                # print the stack trace
-                traceback.print_exc()
+                self.log(f"Error in event handler for {event_type} event: {str(e)}\n{traceback.format_exc()}", 'ERROR')
         
         return True
-    
-    def _server_loop(self):
-        """
-        Server loop for accepting client connections.
-        """
-        print(f"TCP Plug {self.name} server loop started")
-        
-        while self.running:
-            try:
-                # Accept a client connection
-                client_socket, client_address = self.server_socket.accept()
-                print(f"TCP Plug {self.name} accepted connection from {client_address}")
-                
-                # Add the client socket to the list
-                self.client_sockets.append(client_socket)
-                
-                # Trigger connection event
-                self.trigger_event('connection', client_socket=client_socket, client_address=client_address)
-                
-                # Start a receiver thread for this client
-                client_thread = threading.Thread(
-                    target=self._client_receiver_loop,
-                    args=(client_socket, client_address),
-                    daemon=True
-                )
-                client_thread.start()
-            except Exception as e:
-                if self.running:
-                    print(f"Error accepting client connection: {str(e)}")
-                    traceback.print_exc()
-                    time.sleep(1)
-        
-        print(f"TCP Plug {self.name} server loop stopped")
-    
-    def _client_receiver_loop(self, client_socket, client_address):
-        """
-        Receiver loop for a client connection.
-        
-        Args:
-            client_socket: Client socket
-            client_address: Client address
-        """
-        print(f"TCP Plug {self.name} client receiver loop started for {client_address}")
-        
-        while self.running:
-            try:
-                # Receive the message length prefix
-                length_prefix = client_socket.recv(4)
-                if not length_prefix:
-                    # Connection closed
-                    break
-                
-                # Unpack the message length
-                message_length = struct.unpack('!I', length_prefix)[0]
-                
-                # Receive the message
-                message_bytes = b''
-                bytes_received = 0
-                
-                while bytes_received < message_length:
-                    chunk = client_socket.recv(min(4096, message_length - bytes_received))
-                    if not chunk:
-                        # Connection closed
-                        break
-                    message_bytes += chunk
-                    bytes_received += len(chunk)
-                
-                if bytes_received < message_length:
-                    # Connection closed before receiving the full message
-                    break
-                
-                # Decode the message
-                message_json = message_bytes.decode('utf-8')
-                message = json.loads(message_json)
-                
-                # Add the message to the queue
-                with self.message_lock:
-                    self.message_queue.append(message)
-                
-                print(f"Received message from {client_address} via TCP Plug {self.name}")
-                
-                # Trigger message event
-                self.trigger_event('message', message=message, client_socket=client_socket, client_address=client_address)
-                
-                # Notify the agent about the received message
-                self.notify_agent(message)
-            except Exception as e:
-                if self.running:
-                    print(f"Error receiving message from {client_address}: {str(e)}")
-                    traceback.print_exc()
-                    break
-        
-        # Remove the client socket from the list
-        if client_socket in self.client_sockets:
-            self.client_sockets.remove(client_socket)
-        
-        # Close the client socket
-        try:
-            client_socket.close()
-        except:
-            pass
-        
-        print(f"TCP Plug {self.name} client receiver loop stopped for {client_address}")
-    
-    def _receiver_loop(self):
-        """
-        Receiver loop for client mode.
-        """
-        print(f"TCP Plug {self.name} receiver loop started")
-        
-        while self.running:
-            try:
-                # Receive the message length prefix
-                length_prefix = self.socket.recv(4)
-                if not length_prefix:
-                    # Connection closed
-                    break
-                
-                # Unpack the message length
-                message_length = struct.unpack('!I', length_prefix)[0]
-                
-                # Receive the message
-                message_bytes = b''
-                bytes_received = 0
-                
-                while bytes_received < message_length:
-                    chunk = self.socket.recv(min(4096, message_length - bytes_received))
-                    if not chunk:
-                        # Connection closed
-                        break
-                    message_bytes += chunk
-                    bytes_received += len(chunk)
-                
-                if bytes_received < message_length:
-                    # Connection closed before receiving the full message
-                    break
-                
-                # Decode the message
-                message_json = message_bytes.decode('utf-8')
-                message = json.loads(message_json)
-                
-                # Add the message to the queue
-                with self.message_lock:
-                    self.message_queue.append(message)
-                
-                print(f"Received message via TCP Plug {self.name}")
-                
-                # Trigger message event
-                self.trigger_event('message', message=message, client_socket=self.socket, client_address=None)
-                
-                # Notify the agent about the received message
-                self.notify_agent(message)
-            except Exception as e:
-                if self.running:
-                    print(f"Error receiving message: {str(e)}")
-                    traceback.print_exc()
-                    break
-        
-        print(f"TCP Plug {self.name} receiver loop stopped") 
\ No newline at end of file
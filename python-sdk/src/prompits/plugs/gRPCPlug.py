@@ -7,6 +7,8 @@ import traceback
 import threading
 import time
 import uuid
+import copy
+import functools
 import grpc
 from concurrent import futures
 from typing import Dict, Any, Optional, List, Union, Callable
@@ -14,9 +16,17 @@ import logging
 
 from ..Plug import Plug
 from ..Practice import Practice
-from ..Message import Message, Attachment
+from ..Message import Message, Attachment, PRIORITY_NORMAL
 from ..AgentAddress import AgentAddress
 from ..LogEvent import LogEvent
+from .. import Deadline
+from .ChannelManager import ChannelManager
+from .MessageStream import MessageStream, SEND_ACKED, SEND_BUSY, SEND_TIMEOUT
+from .ProtoCodec import ProtoCodec
+from .Compression import Compression
+from .AttachmentSpool import AttachmentSpool, CHUNK_SIZE
+from .PracticeScheduler import PracticeScheduler, PracticeBusyError
+from ..codecs import CodecRegistry
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -145,9 +155,8 @@ class AgentServicer(agent_pb2_grpc.AgentServicer):
         """
         Handle incoming message requests from other agents.
         
-        This method receives a message from another agent, triggers any registered
-        message event handlers, and adds the message to the message queue for
-        later processing.
+        This method receives a message from another agent and passes it to
+        gRPCPlug._HandleIncoming.
         
         Args:
             request: The gRPC Message request object containing the message data
@@ -156,24 +165,55 @@ class AgentServicer(agent_pb2_grpc.AgentServicer):
         Returns:
             MessageResponse: A response indicating success or failure
         """
-        # Convert protobuf message to dict
-        message = {
-            'id': request.id,
-            'type': request.type,
-            'content': request.content,
-            'timestamp': request.timestamp
-        }
-        
-        # Trigger message event
-        self.grpc_plug.trigger_event('message', message=message)
-        
-        # Add to message queue
-        with self.grpc_plug.message_lock:
-            self.grpc_plug.message_queue.append(message)
+        if not self.grpc_plug._HandleIncoming(request):
+            # the queue is at its high-water mark, tell the sender to back off
+            status = json.dumps(self.grpc_plug._BusyStatus().ToJson())
+            context.set_code(grpc.StatusCode.RESOURCE_EXHAUSTED)
+            context.set_details(status)
+            return agent_pb2.MessageResponse(success=False, message=status)
         
         # Return response
         return agent_pb2.MessageResponse(success=True, message="Message received")
     
+    def MessageStream(self, request_iterator, context):
+        """
+        Handle a long-lived message stream opened by another agent.
+        
+        Messages received on the stream are handled like SendMessage requests,
+        and the plug pushes messages for the calling agent over the same stream.
+        
+        Args:
+            request_iterator: Iterator of StreamFrame sent by the caller
+            context: The gRPC context object
+            
+        Returns:
+            Iterator of StreamFrame sent to the caller
+        """
+        stream = self.grpc_plug._AcceptStream(request_iterator, context)
+        if stream is None:
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "Too many message streams")
+        return stream.outgoing()
+    
+    def PutAttachment(self, request_iterator, context):
+        """
+        Receive an attachment uploaded in chunks, ahead of the message referring to it.
+        
+        Args:
+            request_iterator: Iterator of AttachmentChunk sent by the caller
+            context: The gRPC context object
+            
+        Returns:
+            AttachmentReceipt: The number of bytes spooled
+        """
+        try:
+            handle, size = self.grpc_plug.attachment_spool.Receive(request_iterator)
+        except Exception as e:
+            self.grpc_plug.log(f"Error receiving attachment: {str(e)}", 'ERROR')
+            return agent_pb2.AttachmentReceipt(success=False, error=str(e))
+        if handle is None:
+            return agent_pb2.AttachmentReceipt(success=False, error="Incomplete attachment")
+        return agent_pb2.AttachmentReceipt(success=True, size=size)
+    
     def Echo(self, request, context):
         """
         Echo a message back to the sender.
@@ -316,10 +356,40 @@ class AgentServicer(agent_pb2_grpc.AgentServicer):
             context.set_code(grpc.StatusCode.UNAVAILABLE)
             context.set_details("Agent not available")
             return agent_pb2.PracticeResponse(success=False, error="Agent not available")
-            
+        
+        # A retried request is executed once, duplicates get the response of the first one
+        dedup_cache = getattr(agent, 'dedup_cache', None)
+        if not request.request_id or dedup_cache is None:
+            return self._ExecutePractice(agent, request, context)
+        future, new = dedup_cache.Begin(request.request_id)
+        if not new:
+            self.grpc_plug.log(f"Duplicate ExecutePractice request {request.request_id}, answering with its response", 'DEBUG')
+            try:
+                return future.result(timeout=context.time_remaining())
+            except futures.TimeoutError:
+                return agent_pb2.PracticeResponse(success=False, error=f"Request {request.request_id} is still running")
+        response = agent_pb2.PracticeResponse(success=False, error="Practice execution interrupted")
+        try:
+            response = self._ExecutePractice(agent, request, context)
+        finally:
+            # failures are not kept, a retry executes the practice again
+            dedup_cache.Complete(request.request_id, response, keep=response.success)
+        return response
+
+    def _ExecutePractice(self, agent, request, context):
+        """
+        Execute the practice of an ExecutePractice request.
+        """
         # Get practice name
         practice_name = request.practice_name
         
+        # Shed requests whose caller gave up while they waited for a worker
+        remaining = context.time_remaining()
+        if (remaining is not None and remaining <= 0) or not context.is_active():
+            self.grpc_plug.log(f"Deadline of practice {practice_name} exceeded before execution, dropping it", 'WARNING')
+            return agent_pb2.PracticeResponse(success=False, error="Deadline exceeded before execution")
+        deadline = time.time() + remaining if remaining is not None else None
+        
         # Check if practice exists
         if not hasattr(agent, 'UsePractice'):
             return agent_pb2.PracticeResponse(
@@ -328,6 +398,33 @@ class AgentServicer(agent_pb2_grpc.AgentServicer):
             )
             
         # Convert parameters
+        params = self._DecodeParameters(request)
+                
+        # Execute practice on the executor of its plane, the server thread only waits;
+        # a call still waiting for a worker at its deadline is dropped (Deadline.Start)
+        try:
+            future = self.grpc_plug.practice_scheduler.Submit(
+                practice_name, Deadline.Start, deadline, agent.UsePractice, practice_name, **params)
+        except PracticeBusyError as e:
+            context.set_code(grpc.StatusCode.RESOURCE_EXHAUSTED)
+            context.set_details(str(e))
+            return agent_pb2.PracticeResponse(success=False, error=str(e))
+        try:
+            result = future.result(timeout=remaining)
+            return self._PracticeResponse(result, context)
+        except futures.TimeoutError:
+            return agent_pb2.PracticeResponse(success=False, error=f"Deadline exceeded while executing practice {practice_name}")
+        except Exception as e:
+            return agent_pb2.PracticeResponse(
+                success=False,
+                error=str(e)
+            )
+
+    @staticmethod
+    def _DecodeParameters(request) -> Dict[str, Any]:
+        """
+        Decode the parameters of an ExecutePracticeRequest, each JSON encoded or a plain string.
+        """
         params = {}
         for key, value in request.parameters.items():
             # Try to convert to appropriate type
@@ -337,27 +434,26 @@ class AgentServicer(agent_pb2_grpc.AgentServicer):
             except json.JSONDecodeError:
                 # Use as string
                 params[key] = value
-                
-        # Execute practice
+        return params
+
+    def _PracticeResponse(self, result, context):
+        """
+        Build the PracticeResponse of a successful practice.
+        """
+        # JSON encode the result, strings included, so the caller can decode it unambiguously
         try:
-            result = agent.UsePractice(practice_name, **params)
-            
-            # Convert result to string if needed
-            if not isinstance(result, str):
-                try:
-                    result = json.dumps(result)
-                except:
-                    result = str(result)
-                    
-            return agent_pb2.PracticeResponse(
-                success=True,
-                result=result
-            )
-        except Exception as e:
-            return agent_pb2.PracticeResponse(
-                success=False,
-                error=str(e)
-            )
+            result = json.dumps(result, default=vars)
+        except (TypeError, ValueError):
+            result = json.dumps(str(result))
+        
+        # gzip large results, every gRPC client decompresses it
+        if self.grpc_plug._UseTransportCompression(len(result)):
+            context.set_compression(grpc.Compression.Gzip)
+                
+        return agent_pb2.PracticeResponse(
+            success=True,
+            result=result
+        )
 
 class gRPCPlug(Plug):
     """
@@ -376,13 +472,33 @@ class gRPCPlug(Plug):
         server: The gRPC server instance (if in server mode)
         channel: The gRPC channel (if in client mode)
         stub: The gRPC stub for making calls (if in client mode)
-        message_queue: Queue of received messages
+        channel_manager: The ChannelManager providing pooled channels, shared with the plugs of
+            the process configured with the same channel settings
+        streaming: Whether messages are sent over MessageStream to peers that support it
+        proto_messages: Whether Messages are sent as typed protobuf to peers that support it
+        compression: Compression algorithms enabled, in order of preference
+        compression_threshold: Size in bytes from which messages are compressed
+        attachment_threshold: Size in bytes from which attachments are uploaded in chunks
+        attachment_spool: Spool files of attachments uploaded by peers
+        outbound_streams: Streams opened by this plug, by peer address
+        inbound_streams: Streams opened by peers, by peer agent_id
+        message_queue: Bounded queue of received messages (MessageQueue)
         event_handlers: Dictionary of registered event handlers
+        max_workers: Number of server threads handling calls, besides one per accepted stream
+        practice_scheduler: Control-plane and data-plane executors running ExecutePractice calls
     """
     # TODO: Support listening on all interfaces
     # TODO: Support listening on a specific interface
 
-    def __init__(self, name: str, description: str = None, host: str = "localhost", port: int = 9000, is_server: bool = False):
+    def __init__(self, name: str, description: str = None, host: str = "localhost", port: int = 9000, is_server: bool = False,
+                 max_channels: int = None, channel_idle_timeout: float = None, keepalive_time_ms: int = None,
+                 streaming: bool = True, stream_window: int = 64, max_streams: int = 100, stream_send_timeout: float = 10,
+                 proto_messages: bool = True, codecs: List[str] = None,
+                 compression: List[str] = None, compression_threshold: int = 16384,
+                 queue_size: int = 10000, high_water_mark: int = None,
+                 attachment_threshold: int = 1024 * 1024, attachment_chunk_size: int = CHUNK_SIZE,
+                 spool_dir: str = None, max_workers: int = 10, control_workers: int = 2, data_workers: int = None,
+                 data_queue: Optional[int] = None, practice_limits: Dict[str, int] = None, control_practices: List[str] = None):
         """Initialize the gRPC plug
         
         Args:
@@ -391,19 +507,71 @@ class gRPCPlug(Plug):
             host: Host to connect to
             port: Port to connect to
             is_server: Whether this plug is a server
+            max_channels: Maximum number of pooled channels kept open for the plugs with these settings
+            channel_idle_timeout: Seconds after which an unused pooled channel is closed
+            keepalive_time_ms: Interval between keepalive pings on pooled channels
+            streaming: Whether to send messages over MessageStream to peers that advertise it
+            stream_window: Number of unacknowledged messages a peer may send on one stream
+            max_streams: Maximum number of streams accepted from peers
+            stream_send_timeout: Seconds to wait for a peer to acknowledge a message sent over a stream
+                before giving up
+            proto_messages: Whether to send Messages as typed protobuf to peers that advertise it
+            codecs: Names of the codecs the plug accepts, in order of preference (default: all available)
+            compression: Compression algorithms to use, in order of preference (default: all available,
+                [] disables compression)
+            compression_threshold: Size in bytes from which messages are compressed
+            queue_size: Maximum number of received messages waiting for ReceiveMessage
+            high_water_mark: Number of waiting messages from which new messages are rejected as busy
+            attachment_threshold: Size in bytes from which attachments are uploaded in chunks
+                to peers that advertise attachment streaming
+            attachment_chunk_size: Size in bytes of the uploaded chunks
+            spool_dir: Directory where attachments uploaded by peers are written
+            max_workers: Number of server threads handling calls, besides one per accepted stream
+            control_workers: Number of threads running control-plane practices (see PracticeScheduler)
+            data_workers: Number of threads running data-plane practices (default: max_workers -
+                control_workers, so data-plane calls leave server threads to other calls)
+            data_queue: Number of data-plane calls waiting for a thread from which further calls
+                are rejected as busy, None (default) to let every call wait
+            practice_limits: Maximum number of concurrent calls per practice name, e.g. {"Chat": 4}
+            control_practices: Names of the control-plane practices (default: CONTROL_PRACTICES)
         """
-        super().__init__(name, description)
+        super().__init__(name, description, codecs, queue_size, high_water_mark)
         self._host = host
         self._port = port
         self.is_server = is_server
         self.server = None
         self.channel = None
         self.stub = None
+        self.channel_entry = None
+        self.channel_manager = ChannelManager.shared(
+            max_channels=max_channels,
+            idle_timeout=channel_idle_timeout,
+            keepalive_time_ms=keepalive_time_ms
+        )
         self.running = False
         self.connected = False
-        self.message_queue = []
-        self.message_lock = threading.Lock()
         self.event_handlers = {}
+        self.streaming = streaming
+        self.stream_window = stream_window
+        self.max_streams = max_streams
+        self.stream_send_timeout = stream_send_timeout
+        self.outbound_streams: Dict[str, MessageStream] = {}
+        self.inbound_streams: Dict[str, MessageStream] = {}
+        self.no_stream_peers = set()
+        self.stream_lock = threading.Lock()
+        self.stream_executor = None
+        self.proto_messages = proto_messages
+        self.compression = self._FilterCompression(compression)
+        self.compression_threshold = compression_threshold
+        self.attachment_threshold = attachment_threshold
+        self.attachment_chunk_size = attachment_chunk_size
+        self.attachment_spool = AttachmentSpool(spool_dir)
+        self.max_workers = max_workers
+        self.practice_scheduler = PracticeScheduler(
+            self.name, control_workers,
+            data_workers if data_workers is not None else max(1, max_workers - control_workers),
+            data_queue, practice_limits, control_practices)
+        self.AddPractice(Practice("ExecutorStats", self.ExecutorStats))
         
         if self.is_server:
             self._Listen({})
@@ -429,51 +597,537 @@ class gRPCPlug(Plug):
             agent_id = agent.agent_id
             server_address = None
             
+            # A request nobody waits for anymore is not worth sending
+            deadline = Deadline.Of(message)
+            if Deadline.Expired(deadline):
+                self.log(f"Deadline of message {getattr(message, 'msg_id', '')} to {agent} exceeded, dropping it", 'WARNING')
+                return False
+            timeout = max(deadline - time.time(), 0.001) if deadline is not None else None
+            
             self.log(f"Sending message to {agent.ToJson()}", 'DEBUG')
             if plug_info and plug_info.get('host') and plug_info.get('port'):
                 server_address = f"{plug_info.get('host')}:{plug_info.get('port')}"
-                self.log(f"Connecting to {server_address} via gRPC Plug {self.name}", 'INFO')
-                
-                # Create a channel
-                channel = grpc.insecure_channel(server_address)
+                self.log(f"Sending to {server_address} via gRPC Plug {self.name}", 'DEBUG')
+                msg, size = self._BuildMessage(message, plug_info)
                 
-                # Create a stub
-                stub = agent_pb2_grpc.AgentStub(channel)
+                # Prefer a stream opened by the peer (server push), then a stream to the peer
+                stream = self.inbound_streams.get(agent_id)
+                if (stream is None or stream.closed) and self.streaming and plug_info.get('streaming'):
+                    stream = self._GetStream(server_address)
+                if stream is not None and not stream.closed:
+                    status = stream.send_status(msg, timeout=self.stream_send_timeout)
+                    if status == SEND_ACKED:
+                        self.log(LogEvent('DEBUG', 'GRPC_SEND_MESSAGE', "Message sent over stream"))
+                        return True
+                    if status == SEND_BUSY:
+                        self.log(f"Peer {server_address} is busy, message rejected", 'WARNING')
+                        return False
+                    if status == SEND_TIMEOUT:
+                        self.log(f"Peer {server_address} did not acknowledge the message within {self.stream_send_timeout} seconds", 'WARNING')
+                        return False
+                    # the stream ended before the ack, send the message again on its own call
+                    self.log(f"Message stream with {server_address} closed, sending with SendMessage", 'DEBUG')
                 
-                # Convert message to JSON string
-                timestamp = int(time.time())
-                # Handle special cases in the message
-                if isinstance(message, dict) and isinstance(message.get('content'), dict):
-                    message['content'] = message['content'].ToJson()
-                    msg_type = message.get('type', 'Message')
-                    msg_str = json.dumps(message.ToJson(), default=vars)
-                elif isinstance(message, Message):
-                    msg_json = message.ToJson()
-                    msg_str = json.dumps(msg_json, default=vars)
-                    msg_type = 'Message'
-                else:
-                    msg_str = message
-                    msg_type = 'Message'
-                
-                # Create message
-                msg = agent_pb2.Message()
-                msg.id = str(uuid.uuid4())
-                msg.type = msg_type
-                msg.content = msg_str
-                msg.timestamp = timestamp
-                
-                self.log(LogEvent('DEBUG', 'GRPC_SEND_MESSAGE', f"Message: {msg}"))
-                stub.SendMessage(msg)
+                # Reuse the pooled channel and stub for the peer
+                with self.channel_manager.use_stub(server_address) as stub:
+                    if not msg.compression and self._UseTransportCompression(size):
+                        # the peer does not advertise compression, but every gRPC server decompresses gzip
+                        stub.SendMessage(msg, timeout=timeout, compression=grpc.Compression.Gzip)
+                    else:
+                        stub.SendMessage(msg, timeout=timeout)
                 self.log(LogEvent('DEBUG', 'GRPC_SEND_MESSAGE', "Message sent"))
                 return True
             else:
                 self.log(f"No connection info for agent {agent}, skipping", 'WARNING')
                 return False
+        except grpc.RpcError as e:
+            if e.code() == grpc.StatusCode.RESOURCE_EXHAUSTED:
+                self.log(f"Peer {server_address} is busy, message rejected: {e.details()}", 'WARNING')
+                return False
+            # the channel manager replaces a channel which failed to connect on its next use
+            self.log(f"Error sending message to {server_address}: {e.code()} {e.details()}", 'ERROR')
+            return False
         except Exception as e:
             print(f"Error sending message: {str(e)}\n{traceback.format_exc()}")
             self.log(LogEvent('ERROR', 'GRPC_SEND_MESSAGE', f"Error sending message: {str(e)}\n{traceback.format_exc()}"))
             return False
 
+    def _BuildMessage(self, message, plug_info: Dict[str, Any]):
+        """
+        Build the agent_pb2.Message sent for a message, encoded and compressed for the peer.
+        
+        Args:
+            message: The Message to send, or its dictionary or string form
+            plug_info: Plug information advertised by the peer
+            
+        Returns:
+            tuple: (agent_pb2.Message, serialized size before compression)
+        """
+        if isinstance(message, Message) and message.attachments:
+            message = self._PrepareAttachments(message, plug_info)
+        
+        msg = agent_pb2.Message()
+        msg.id = str(uuid.uuid4())
+        msg.type = 'Message'
+        msg.timestamp = int(time.time())
+        # read by the receiver without decoding the content, to queue the message by priority
+        priority = getattr(message, 'priority', None)
+        if priority and priority != PRIORITY_NORMAL:
+            msg.priority = priority
+        
+        # Encode with the fastest codec the peer reads, then typed protobuf, then the JSON string
+        if isinstance(message, Message):
+            codec = self._GetCodec(plug_info)
+            if plug_info.get('codecs') and codec.name != "json":
+                try:
+                    msg.data = codec.Encode(message.ToJson())
+                    msg.codec = codec.name
+                except (TypeError, ValueError) as e:
+                    self.log(f"Cannot encode message {message.msg_id} with {codec.name}: {str(e)}", 'DEBUG')
+            if not msg.codec and self.proto_messages and plug_info.get('proto_messages'):
+                try:
+                    message.ToProto(msg.payload)
+                except (TypeError, ValueError) as e:
+                    self.log(f"Sending message {message.msg_id} as JSON: {str(e)}", 'DEBUG')
+                    msg.ClearField('payload')
+        
+        if not msg.codec and not msg.HasField('payload'):
+            # Convert message to JSON string
+            # Handle special cases in the message
+            if isinstance(message, dict) and isinstance(message.get('content'), dict):
+                message['content'] = message['content'].ToJson()
+                msg_type = message.get('type', 'Message')
+                msg_str = json.dumps(message.ToJson(), default=vars)
+            elif isinstance(message, Message):
+                msg_json = message.ToJson()
+                # the standard library json module, which accepts any int (orjson stops at 64 bits)
+                msg_str = json.dumps(msg_json, default=vars)
+                msg_type = 'Message'
+            else:
+                msg_str = message
+                msg_type = 'Message'
+            msg.type = msg_type
+            msg.content = msg_str
+        
+        # log the size only, rendering large messages as text costs more than sending them
+        size = msg.ByteSize()
+        self.log(LogEvent('DEBUG', 'GRPC_SEND_MESSAGE', f"Message {msg.id} ({size} bytes)"))
+        msg = self._Compress(msg, size, plug_info)
+        return msg, size
+
+    def _HandleIncoming(self, request):
+        """
+        Handle a message received with SendMessage or on a MessageStream.
+        
+        Triggers the registered message event handlers and hands the message to
+        the agent. Messages the agent does not consume (responses to its pending
+        requests) are added to the message queue for later processing.
+        
+        Args:
+            request: The received agent_pb2.Message
+            
+        Returns:
+            bool: False if the message was rejected because the queue is at its high-water mark
+        """
+        if request.compression:
+            try:
+                inner = agent_pb2.Message()
+                inner.ParseFromString(Compression.Decompress(request.compression, request.data))
+            except Exception as e:
+                self.log(f"Dropping message {request.id} compressed with {request.compression}: {str(e)}", 'ERROR')
+                return True
+            request = inner
+        
+        # Convert protobuf message to dict
+        # typed and codec encoded messages are delivered as the dictionary of Message.ToJson,
+        # others as the JSON string
+        if request.codec:
+            codec = CodecRegistry.Get(request.codec)
+            if codec is None:
+                self.log(f"Dropping message {request.id} encoded with unavailable codec {request.codec}", 'ERROR')
+                return True
+            content = codec.Decode(request.data)
+        elif request.HasField('payload'):
+            content = ProtoCodec.Decode(request.payload)
+        else:
+            content = request.content
+        content = self._ResolveAttachments(content)
+        message = {
+            'id': request.id,
+            'type': request.type,
+            'content': content,
+            'timestamp': request.timestamp
+        }
+        # the priority of the (decompressed) message, or of its decoded content (PriorityOf)
+        if request.priority:
+            message['priority'] = request.priority
+        
+        # Trigger message event
+        self.trigger_event('message', message=message)
+        
+        # Responses to pending requests go straight to the waiting caller
+        if self._NotifyAgent(message):
+            return True
+        
+        # Add to message queue, high-priority (status) messages are accepted above the high-water mark
+        return self._EnqueueMessage(message)
+
+    def _IsLargeAttachment(self, attachment) -> bool:
+        """
+        Whether an attachment is uploaded in chunks rather than sent inline.
+        """
+        if attachment.handle is not None:
+            return False
+        if attachment.data is None:
+            return attachment.path is not None
+        return isinstance(attachment.data, (bytes, bytearray, memoryview)) and len(attachment.data) >= self.attachment_threshold
+
+    def _PrepareAttachments(self, message: Message, plug_info: Dict[str, Any]) -> Message:
+        """
+        Upload the large attachments of a message to a peer that supports it.
+        
+        Large attachments are sent to the peer with PutAttachment and replaced by
+        their handle. For peers without attachment streaming, attachments kept in a
+        file are read so they can be sent inline. The message itself is not modified,
+        it can be sent to several recipients at a time.
+        
+        Args:
+            message: The message to send
+            plug_info: Plug information advertised by the peer
+            
+        Returns:
+            Message: The message to encode, a copy if an attachment changed
+            
+        Raises:
+            ValueError: If an upload fails
+        """
+        streaming = plug_info.get('attachment_streaming')
+        attachments = []
+        for attachment in message.attachments:
+            if not self._IsLargeAttachment(attachment):
+                attachments.append(attachment)
+            elif streaming:
+                attachments.append(self._UploadAttachment(attachment, f"{plug_info.get('host')}:{plug_info.get('port')}"))
+            elif attachment.data is None:
+                attachments.append(Attachment(attachment.name, attachment.content_type, attachment.Read()))
+            else:
+                attachments.append(attachment)
+        if all(a is b for a, b in zip(attachments, message.attachments)):
+            return message
+        message = copy.copy(message)
+        message.attachments = attachments
+        return message
+
+    def _UploadAttachment(self, attachment: Attachment, server_address: str) -> Attachment:
+        """
+        Upload an attachment to a peer with PutAttachment.
+        
+        Args:
+            attachment: Attachment with bytes data or a path
+            server_address: "host:port" of the peer
+            
+        Returns:
+            Attachment: The attachment to send in the message, carrying the handle
+        """
+        handle = AttachmentSpool.NewHandle()
+        with self.channel_manager.use_stub(server_address) as stub:
+            receipt = stub.PutAttachment(AttachmentSpool.Chunks(attachment, handle, self.attachment_chunk_size))
+        if not receipt.success:
+            raise ValueError(f"Upload of attachment {attachment.name} to {server_address} failed: {receipt.error}")
+        self.log(f"Uploaded attachment {attachment.name} to {server_address} ({receipt.size} bytes)", 'DEBUG')
+        return Attachment(attachment.name, attachment.content_type, size=receipt.size, handle=handle)
+
+    def _ResolveAttachments(self, content):
+        """
+        Replace the handles of uploaded attachments in received content by the paths of their spool files.
+        
+        Args:
+            content: Content of a received message, a Message.ToJson dict or a JSON string
+            
+        Returns:
+            The content, with "path" set on uploaded attachments
+        """
+        if isinstance(content, str):
+            # the JSON string form is only parsed when it refers to an upload
+            if '"handle"' not in content:
+                return content
+            try:
+                resolved = self._ResolveAttachments(json.loads(content))
+            except ValueError:
+                return content
+            return json.dumps(resolved)
+        if not isinstance(content, dict) or not content.get("attachments"):
+            return content
+        for attachment in content["attachments"]:
+            handle = attachment.get("handle") if isinstance(attachment, dict) else None
+            if not handle:
+                continue
+            spooled = self.attachment_spool.Claim(handle)
+            if spooled is None:
+                self.log(f"Attachment {attachment.get('name')} was not uploaded (handle {handle})", 'ERROR')
+                continue
+            attachment["path"], attachment["size"] = spooled
+            attachment["data"] = None
+            del attachment["handle"]
+        return content
+
+    def _HandleStreamMessage(self, stream: MessageStream, request):
+        """
+        Handle a message received on a stream.
+        
+        Returns:
+            bool: False if the message was rejected, so its ack tells the sender the plug is busy
+        """
+        return self._HandleIncoming(request)
+
+    def _FilterCompression(self, compression: Optional[List[str]]) -> List[str]:
+        """
+        Keep the available algorithms of a configured list, all available algorithms if None.
+        """
+        if compression is None:
+            return Compression.Available()
+        if isinstance(compression, str):
+            compression = [compression]
+        available = Compression.Available()
+        for name in compression:
+            if name not in available:
+                self.log(f"Compression algorithm {name} is not available, ignoring it", 'WARNING')
+        return [name for name in compression if name in available]
+
+    def _UseTransportCompression(self, size: int) -> bool:
+        """
+        Whether a call of the given size is sent with gRPC gzip compression.
+        """
+        return "gzip" in self.compression and size >= self.compression_threshold
+
+    def _Compress(self, msg, size: int, plug_info: Dict[str, Any]):
+        """
+        Compress a message above the threshold for a peer that advertises compression.
+        
+        Args:
+            msg: The agent_pb2.Message to send
+            size: Serialized size of msg
+            plug_info: Plug information of the peer
+            
+        Returns:
+            agent_pb2.Message: The compressed envelope, or msg if it is not compressed
+        """
+        if size < self.compression_threshold:
+            return msg
+        algorithm = Compression.Negotiate(plug_info.get('compression'), self.compression)
+        if algorithm is None:
+            return msg
+        data = Compression.Compress(algorithm, msg.SerializeToString())
+        if len(data) >= size:
+            # incompressible, e.g. an already compressed attachment
+            return msg
+        self.log(f"Compressed message {msg.id} with {algorithm}: {size} -> {len(data)} bytes", 'DEBUG')
+        return agent_pb2.Message(id=msg.id, type=msg.type, timestamp=msg.timestamp, priority=msg.priority,
+                                 compression=algorithm, data=data)
+
+    def _GetStreamExecutor(self):
+        """
+        Get the executor handling messages received on streams, creating it on first use.
+        
+        Returns:
+            ThreadPoolExecutor: The executor
+        """
+        with self.stream_lock:
+            if self.stream_executor is None:
+                self.stream_executor = futures.ThreadPoolExecutor(max_workers=10, thread_name_prefix=f"{self.name}_stream")
+            return self.stream_executor
+
+    def _GetStream(self, server_address: str):
+        """
+        Get the open stream to a peer, opening it if needed.
+        
+        Args:
+            server_address: The "host:port" address of the peer
+            
+        Returns:
+            MessageStream: The stream, or None if the peer does not accept streams
+        """
+        stream = self.outbound_streams.get(server_address)
+        if stream is not None and not stream.closed:
+            return stream
+        if server_address in self.no_stream_peers:
+            return None
+        executor = self._GetStreamExecutor()
+        with self.stream_lock:
+            # another thread may have opened it while we waited for the lock
+            stream = self.outbound_streams.get(server_address)
+            if stream is not None and not stream.closed:
+                return stream
+            local_id = getattr(self.agent, 'agent_id', "") if getattr(self, 'agent', None) else ""
+            stream = MessageStream(server_address, None, local_id, self.stream_window, executor=executor)
+            stream.on_message = functools.partial(self._HandleStreamMessage, stream)
+            # the stream holds the pooled channel until it ends
+            entry = self.channel_manager.acquire(server_address)
+            try:
+                stream.call = entry.stub.MessageStream(stream.outgoing())
+            except Exception as e:
+                self.channel_manager.release(entry)
+                self.log(f"Error opening message stream to {server_address}: {str(e)}", 'ERROR')
+                return None
+            threading.Thread(target=self._ReadOutboundStream, args=(stream, entry), daemon=True,
+                             name=f"{self.name}_stream_{server_address}").start()
+            if not stream.wait_open(self.stream_send_timeout):
+                stream.close()
+                if stream.error_code == grpc.StatusCode.UNIMPLEMENTED:
+                    # the peer runs a version without MessageStream, don't ask again
+                    self.no_stream_peers.add(server_address)
+                self.log(f"Could not open message stream to {server_address}: {stream.error_code}", 'DEBUG')
+                return None
+            self.outbound_streams[server_address] = stream
+            self.log(f"Opened message stream to {server_address}", 'DEBUG')
+            return stream
+
+    def _ReadOutboundStream(self, stream: MessageStream, entry):
+        """
+        Read the frames of a stream opened to a peer, releasing its channel when the stream ends.
+        """
+        try:
+            stream.read(stream.call)
+        finally:
+            self.channel_manager.release(entry)
+
+    def _AcceptStream(self, request_iterator, context):
+        """
+        Accept a stream opened by a peer.
+        
+        The stream is registered by the agent_id of the peer once its hello frame
+        arrives, so messages for that agent are pushed over it.
+        
+        Args:
+            request_iterator: Iterator of StreamFrame sent by the peer
+            context: The gRPC context object
+            
+        Returns:
+            MessageStream: The stream, or None if max_streams streams are open
+        """
+        with self.stream_lock:
+            if len(self.inbound_streams) >= self.max_streams:
+                self.log(f"Refusing message stream from {context.peer()}: {self.max_streams} streams open", 'WARNING')
+                return None
+        local_id = getattr(self.agent, 'agent_id', "") if getattr(self, 'agent', None) else ""
+        stream = MessageStream(context.peer(), None, local_id, self.stream_window,
+                               on_open=self._RegisterInboundStream, executor=self._GetStreamExecutor())
+        stream.on_message = functools.partial(self._HandleStreamMessage, stream)
+        context.add_callback(stream.close)
+        threading.Thread(target=self._ReadInboundStream, args=(stream, request_iterator), daemon=True,
+                         name=f"{self.name}_stream_{context.peer()}").start()
+        return stream
+
+    def _RegisterInboundStream(self, stream: MessageStream):
+        """
+        Register a stream opened by a peer under the agent_id of the peer.
+        """
+        if not stream.peer_id:
+            return
+        with self.stream_lock:
+            old = self.inbound_streams.get(stream.peer_id)
+            self.inbound_streams[stream.peer_id] = stream
+        if old is not None and old is not stream:
+            old.close()
+        self.log(f"Accepted message stream from agent {stream.peer_id}", 'DEBUG')
+
+    def _ReadInboundStream(self, stream: MessageStream, request_iterator):
+        """
+        Read a stream opened by a peer until it ends, then unregister it.
+        """
+        stream.read(request_iterator)
+        with self.stream_lock:
+            if stream.peer_id and self.inbound_streams.get(stream.peer_id) is stream:
+                del self.inbound_streams[stream.peer_id]
+
+    def _CloseStreams(self):
+        """
+        Close all message streams of the plug.
+        """
+        with self.stream_lock:
+            streams = list(self.outbound_streams.values()) + list(self.inbound_streams.values())
+            self.outbound_streams.clear()
+            self.inbound_streams.clear()
+        for stream in streams:
+            stream.close()
+
+    def ExecutePractice(self, practice_name: str, arguments: Dict[str, Any], plug_info: Dict[str, Any], timeout: float = 20,
+                        request_id: str = None):
+        """
+        Execute a practice on a remote agent with the unary ExecutePractice RPC.
+        
+        The practice runs in a single round trip instead of a request message
+        and a response message.
+        
+        Args:
+            practice_name: Name of the practice to execute
+            arguments: Arguments of the practice, each sent JSON encoded
+            plug_info: Dictionary with connection information
+                {
+                    "host": str,
+                    "port": int
+                }
+            timeout: Deadline of the call in seconds
+            request_id: ID of the request, reused when the call is retried so the
+                peer executes the practice once
+            
+        Returns:
+            dict: {"success": bool, "result": Any, "error": str}, or None if the
+                peer does not provide the ExecutePractice RPC
+        """
+        server_address = f"{plug_info.get('host')}:{plug_info.get('port')}"
+        try:
+            request = self._PracticeRequest(practice_name, arguments, request_id)
+            self.log(f"Executing practice {practice_name} on {server_address} via gRPC Plug {self.name}", 'DEBUG')
+            with self.channel_manager.use_stub(server_address) as stub:
+                if self._UseTransportCompression(request.ByteSize()):
+                    response = stub.ExecutePractice(request, timeout=timeout, compression=grpc.Compression.Gzip)
+                else:
+                    response = stub.ExecutePractice(request, timeout=timeout)
+        except grpc.RpcError as e:
+            return self._PracticeError(practice_name, server_address, e)
+        return self._PracticeResult(response)
+
+    @staticmethod
+    def _PracticeRequest(practice_name: str, arguments: Dict[str, Any], request_id: str = None):
+        """
+        Build the PracticeRequest of ExecutePractice, each argument JSON encoded.
+        """
+        parameters = {}
+        for key, value in (arguments or {}).items():
+            parameters[key] = json.dumps(value, default=vars)
+        return agent_pb2.PracticeRequest(practice_name=practice_name, parameters=parameters, request_id=request_id or "")
+
+    def _PracticeError(self, practice_name: str, server_address: str, e: grpc.RpcError):
+        """
+        Convert an RpcError of ExecutePractice into its result, None if the peer lacks the RPC.
+        
+        The result has the name of the status code in "code", so callers can tell
+        an unreachable peer from a practice that failed.
+        """
+        if e.code() == grpc.StatusCode.UNIMPLEMENTED or (
+                e.code() == grpc.StatusCode.UNAVAILABLE and e.details() == "Agent not available"):
+            self.log(f"Peer {server_address} does not provide ExecutePractice", 'DEBUG')
+            return None
+        if e.code() == grpc.StatusCode.RESOURCE_EXHAUSTED:
+            self.log(f"Peer {server_address} is busy, practice {practice_name} rejected: {e.details()}", 'WARNING')
+        else:
+            self.log(f"Error executing practice {practice_name} on {server_address}: {e.code()} {e.details()}", 'ERROR')
+        return {"success": False, "result": None, "error": f"{e.code().name}: {e.details()}", "code": e.code().name}
+
+    @staticmethod
+    def _PracticeResult(response) -> Dict[str, Any]:
+        """
+        Convert a PracticeResponse into the result of ExecutePractice.
+        """
+        if not response.success:
+            return {"success": False, "result": None, "error": response.error}
+        try:
+            result = json.loads(response.result)
+        except json.JSONDecodeError:
+            result = response.result
+        return {"success": True, "result": result, "error": None}
+
     def _Listen(self, plugs_info:Dict[str, Any]):
         """Listen for incoming connections
         
@@ -486,10 +1140,16 @@ class gRPCPlug(Plug):
         if not self.is_server:
             self.log(f"gRPC Plug {self.name} is not a server", 'WARNING')
             return False
+        if self.server is not None:
+            # already listening, started by __init__ before the agent starts its plugs
+            return True
             
         try:
             # Create a server
-            self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+            # Each accepted message stream holds a worker for its lifetime, so add one per stream
+            max_workers = self.max_workers + (self.max_streams if self.streaming else 0)
+            # Accept the keepalive pings sent by pooled client channels
+            self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers), options=ChannelManager.server_options())
             
             # Add the servicer to the server
             agent_pb2_grpc.add_AgentServicer_to_server(AgentServicer(self), self.server)
@@ -539,8 +1199,7 @@ class gRPCPlug(Plug):
             if self._port == 0:
                 for port in range(9000, 9100):
                     try:
-                        self.channel = grpc.insecure_channel(f"{self._host}:{port}")
-                        self.stub = agent_pb2_grpc.AgentStub(self.channel)
+                        self._HoldChannel(f"{self._host}:{port}")
                         self.connected = True
                         self._port = port
                         break
@@ -553,11 +1212,8 @@ class gRPCPlug(Plug):
                 server_address = f"{host}:{port}"
             self.log(f"Connecting to {server_address} via gRPC Plug {self.name}", 'INFO')
             
-            # Create a channel
-            self.channel = grpc.insecure_channel(server_address)
-            
-            # Create a stub
-            self.stub = agent_pb2_grpc.AgentStub(self.channel)
+            # Use the pooled channel and stub for the peer
+            self._HoldChannel(server_address)
             
             # Set connected flag
             self.connected = True
@@ -580,8 +1236,9 @@ class gRPCPlug(Plug):
     def Disconnect(self):
         """Disconnect the gRPC plug"""
         try:
+            self._CloseStreams()
             if self.server:
-                self.server.stop(0)
+                self._StopServer()
                 self.server = None
                 
             self.connected = False
@@ -638,11 +1295,12 @@ class gRPCPlug(Plug):
         else:
             return self.send(message)
 
-    def ReceiveMessage(self, msg_count: int = 0):
+    def ReceiveMessage(self, msg_count: int = 0, timeout: float = 0):
         """Receive a message via gRPC
         
         Args:
             msg_count: Number of messages to receive
+            timeout: Seconds to wait for a message, 0 returns at once, None waits forever
             
         Returns:
             Message: Received message, or None if no message is available
@@ -650,9 +1308,11 @@ class gRPCPlug(Plug):
         # Receive message
         #print(f"gRPCPlug {self.name} ReceiveMessage")
         try:
-            msg = self.message_queue.pop(0)
+            msg = self.message_queue.get(timeout)
+            if msg is None:
+                return None
             #print(f"Received message: {msg}")
-            self.log(f"Received message: {msg}", 'DEBUG')
+            self.log(f"Received message {msg.get('id')}", 'DEBUG')
             return msg
         except Exception as e:
             self.log(f"Error receiving message via gRPC Plug {self.name}: {str(e)}", 'DEBUG')
@@ -742,13 +1402,19 @@ class gRPCPlug(Plug):
 
     def stop(self):
         """Stop the server"""
+        self._CloseStreams()
         if self.server:
-            self.server.stop(0)
+            self._StopServer()
             self.server = None
+            self.practice_scheduler.Shutdown()
             self.log(f"gRPC server {self.name} stopped", 'INFO')
             return True
         return False
 
+    def _StopServer(self):
+        """Stop the gRPC server without waiting for calls in progress"""
+        self.server.stop(0)
+
     def ToJson(self):
         """Convert the gRPC plug to a JSON object"""
         json_data = super().ToJson()
@@ -756,16 +1422,39 @@ class gRPCPlug(Plug):
             "host": self._host,
             "port": self._port,
             "type": "gRPCPlug",
-            "is_server": self.is_server
+            "is_server": self.is_server,
+            "streaming": self.streaming,
+            "proto_messages": self.proto_messages,
+            "compression": self.compression,
+            "compression_threshold": self.compression_threshold,
+            "attachment_streaming": True,
+            "max_workers": self.max_workers,
+            # limits only: the advertisement is refreshed by heartbeats, live counters would go stale
+            "executors": self.practice_scheduler.Limits()
         })
         return json_data
 
+    def ExecutorStats(self) -> Dict[str, Any]:
+        """
+        Get the utilization of the executors running ExecutePractice calls.
+
+        Returns:
+            dict: Per plane workers, queue and active calls, and per limited practice its limit and active calls
+        """
+        return self.practice_scheduler.ToJson()
+
     def FromJson(self, json_data):
         """Initialize the gRPC plug from a JSON object"""
         super().FromJson(json_data)
         self._host = json_data.get("host", self._host)
         self._port = json_data.get("port", self._port)
         self.is_server = json_data.get("is_server", self.is_server)
+        self.streaming = json_data.get("streaming", self.streaming)
+        self.proto_messages = json_data.get("proto_messages", self.proto_messages)
+        if "compression" in json_data:
+            self.compression = self._FilterCompression(json_data["compression"])
+        self.compression_threshold = json_data.get("compression_threshold", self.compression_threshold)
+        self.max_workers = json_data.get("max_workers", self.max_workers)
         return self
         
     def set_agent(self, agent):
@@ -773,6 +1462,20 @@ class gRPCPlug(Plug):
         self.agent = agent
         return self
 
+    def _HoldChannel(self, server_address: Optional[str]):
+        """
+        Hold the pooled channel to a peer as the channel and stub of the plug, releasing the one held before.
+
+        Args:
+            server_address: The "host:port" address of the peer, None to only release the held channel
+        """
+        previous = self.channel_entry
+        self.channel_entry = self.channel_manager.acquire(server_address) if server_address else None
+        self.channel = self.channel_entry.channel if self.channel_entry else None
+        self.stub = self.channel_entry.stub if self.channel_entry else None
+        if previous is not None:
+            self.channel_manager.release(previous)
+
     def _Disconnect(self, agent:AgentAddress, plugs_info:Dict[str, Any]):
         """Disconnect from an agent
         
@@ -784,11 +1487,9 @@ class gRPCPlug(Plug):
             bool: True if disconnected successfully, False otherwise
         """
         try:
-            # Close the channel
+            # Release the channel; it is owned by the ChannelManager and shared with other plugs
             if hasattr(self, 'channel') and self.channel:
-                self.channel.close()
-                self.channel = None
-                self.stub = None
+                self._HoldChannel(None)
                 self.connected = False
                 
             self.log(f"Disconnected from agent via gRPC Plug {self.name}", 'INFO')
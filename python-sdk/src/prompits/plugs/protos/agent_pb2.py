@@ -22,9 +22,10 @@ _runtime_version.ValidateProtobufRuntimeVersion(
 _sym_db = _symbol_database.Default()
 
 
+from google.protobuf import struct_pb2 as google_dot_protobuf_dot_struct__pb2
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0b\x61gent.proto\x12\x15prompits.plugs.protos\"\x07\n\x05\x45mpty\"G\n\x07Message\x12\n\n\x02id\x18\x01 \x01(\t\x12\x0c\n\x04type\x18\x02 \x01(\t\x12\x0f\n\x07\x63ontent\x18\x03 \x01(\t\x12\x11\n\ttimestamp\x18\x04 \x01(\x03\"3\n\x0fMessageResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\"\\\n\tAgentInfo\x12\x10\n\x08\x61gent_id\x18\x01 \x01(\t\x12\x12\n\nagent_name\x18\x02 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x03 \x01(\t\x12\x14\n\x0c\x63\x61pabilities\x18\x04 \x03(\t\"B\n\x0cPracticeList\x12\x32\n\tpractices\x18\x01 \x03(\x0b\x32\x1f.prompits.plugs.protos.Practice\"c\n\x08Practice\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x02 \x01(\t\x12\x34\n\nparameters\x18\x03 \x03(\x0b\x32 .prompits.plugs.protos.Parameter\"P\n\tParameter\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x0c\n\x04type\x18\x02 \x01(\t\x12\x10\n\x08required\x18\x03 \x01(\x08\x12\x15\n\rdefault_value\x18\x04 \x01(\t\"\xa7\x01\n\x0fPracticeRequest\x12\x15\n\rpractice_name\x18\x01 \x01(\t\x12J\n\nparameters\x18\x02 \x03(\x0b\x32\x36.prompits.plugs.protos.PracticeRequest.ParametersEntry\x1a\x31\n\x0fParametersEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\t:\x02\x38\x01\"B\n\x10PracticeResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0e\n\x06result\x18\x02 \x01(\t\x12\r\n\x05\x65rror\x18\x03 \x01(\t2\xb8\x03\n\x05\x41gent\x12W\n\x0bSendMessage\x12\x1e.prompits.plugs.protos.Message\x1a&.prompits.plugs.protos.MessageResponse\"\x00\x12H\n\x04\x45\x63ho\x12\x1e.prompits.plugs.protos.Message\x1a\x1e.prompits.plugs.protos.Message\"\x00\x12P\n\x0cGetAgentInfo\x12\x1c.prompits.plugs.protos.Empty\x1a .prompits.plugs.protos.AgentInfo\"\x00\x12T\n\rListPractices\x12\x1c.prompits.plugs.protos.Empty\x1a#.prompits.plugs.protos.PracticeList\"\x00\x12\x64\n\x0f\x45xecutePractice\x12&.prompits.plugs.protos.PracticeRequest\x1a\'.prompits.plugs.protos.PracticeResponse\"\x00\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0b\x61gent.proto\x12\x15prompits.plugs.protos\x1a\x1cgoogle/protobuf/struct.proto\"\x07\n\x05\x45mpty\"\xc1\x01\n\x07Message\x12\n\n\x02id\x18\x01 \x01(\t\x12\x0c\n\x04type\x18\x02 \x01(\t\x12\x0f\n\x07\x63ontent\x18\x03 \x01(\t\x12\x11\n\ttimestamp\x18\x04 \x01(\x03\x12\x34\n\x07payload\x18\x05 \x01(\x0b\x32#.prompits.plugs.protos.AgentMessage\x12\r\n\x05\x63odec\x18\x06 \x01(\t\x12\x0c\n\x04\x64\x61ta\x18\x07 \x01(\x0c\x12\x13\n\x0b\x63ompression\x18\x08 \x01(\t\x12\x10\n\x08priority\x18\t \x01(\r\"4\n\x0c\x41gentAddress\x12\x10\n\x08\x61gent_id\x18\x01 \x01(\t\x12\x12\n\nplaza_name\x18\x02 \x01(\t\"\x93\x01\n\nAttachment\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x14\n\x0c\x63ontent_type\x18\x02 \x01(\t\x12\x10\n\x06\x62inary\x18\x03 \x01(\x0cH\x00\x12\'\n\x05value\x18\x04 \x01(\x0b\x32\x16.google.protobuf.ValueH\x00\x12\x10\n\x06handle\x18\x05 \x01(\tH\x00\x12\x0c\n\x04size\x18\x06 \x01(\x04\x42\x06\n\x04\x64\x61ta\"=\n\x0f\x41ttachmentChunk\x12\x0e\n\x06handle\x18\x01 \x01(\t\x12\x0c\n\x04\x64\x61ta\x18\x02 \x01(\x0c\x12\x0c\n\x04size\x18\x03 \x01(\x04\"A\n\x11\x41ttachmentReceipt\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0c\n\x04size\x18\x02 \x01(\x04\x12\r\n\x05\x65rror\x18\x03 \x01(\t\"m\n\x16UsePracticeRequestBody\x12\x15\n\rpractice_name\x18\x01 \x01(\t\x12*\n\targuments\x18\x02 \x01(\x0b\x32\x17.google.protobuf.Struct\x12\x10\n\x08\x64\x65\x61\x64line\x18\x03 \x01(\x01\"v\n\x17UsePracticeResponseBody\x12\x15\n\rpractice_name\x18\x01 \x01(\t\x12&\n\x06result\x18\x02 \x01(\x0b\x32\x16.google.protobuf.Value\x12\x12\n\x05\x65rror\x18\x03 \x01(\tH\x00\x88\x01\x01\x42\x08\n\x06_error\"\xcb\x03\n\x0c\x41gentMessage\x12\x0c\n\x04type\x18\x01 \x01(\t\x12\x0e\n\x06msg_id\x18\x02 \x01(\t\x12\x33\n\x06sender\x18\x03 \x01(\x0b\x32#.prompits.plugs.protos.AgentAddress\x12\x37\n\nrecipients\x18\x04 \x03(\x0b\x32#.prompits.plugs.protos.AgentAddress\x12\x36\n\x0b\x61ttachments\x18\x05 \x03(\x0b\x32!.prompits.plugs.protos.Attachment\x12\x11\n\ttimestamp\x18\x06 \x01(\t\x12\x10\n\x08priority\x18\n \x01(\r\x12*\n\x07generic\x18\x07 \x01(\x0b\x32\x17.google.protobuf.StructH\x00\x12M\n\x14use_practice_request\x18\x08 \x01(\x0b\x32-.prompits.plugs.protos.UsePracticeRequestBodyH\x00\x12O\n\x15use_practice_response\x18\t \x01(\x0b\x32..prompits.plugs.protos.UsePracticeResponseBodyH\x00\x42\x06\n\x04\x62ody\"\x86\x01\n\x0bStreamFrame\x12/\n\x07message\x18\x01 \x01(\x0b\x32\x1e.prompits.plugs.protos.Message\x12\x0e\n\x06sender\x18\x02 \x01(\t\x12\x0b\n\x03seq\x18\x03 \x01(\x04\x12\x0b\n\x03\x61\x63k\x18\x04 \x01(\x04\x12\x0e\n\x06window\x18\x05 \x01(\r\x12\x0c\n\x04\x62usy\x18\x06 \x01(\x08\"3\n\x0fMessageResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\"\\\n\tAgentInfo\x12\x10\n\x08\x61gent_id\x18\x01 \x01(\t\x12\x12\n\nagent_name\x18\x02 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x03 \x01(\t\x12\x14\n\x0c\x63\x61pabilities\x18\x04 \x03(\t\"B\n\x0cPracticeList\x12\x32\n\tpractices\x18\x01 \x03(\x0b\x32\x1f.prompits.plugs.protos.Practice\"c\n\x08Practice\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x02 \x01(\t\x12\x34\n\nparameters\x18\x03 \x03(\x0b\x32 .prompits.plugs.protos.Parameter\"P\n\tParameter\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x0c\n\x04type\x18\x02 \x01(\t\x12\x10\n\x08required\x18\x03 \x01(\x08\x12\x15\n\rdefault_value\x18\x04 \x01(\t\"\xbb\x01\n\x0fPracticeRequest\x12\x15\n\rpractice_name\x18\x01 \x01(\t\x12J\n\nparameters\x18\x02 \x03(\x0b\x32\x36.prompits.plugs.protos.PracticeRequest.ParametersEntry\x12\x12\n\nrequest_id\x18\x03 \x01(\t\x1a\x31\n\x0fParametersEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\t:\x02\x38\x01\"B\n\x10PracticeResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0e\n\x06result\x18\x02 \x01(\t\x12\r\n\x05\x65rror\x18\x03 \x01(\t2\xfe\x04\n\x05\x41gent\x12W\n\x0bSendMessage\x12\x1e.prompits.plugs.protos.Message\x1a&.prompits.plugs.protos.MessageResponse\"\x00\x12H\n\x04\x45\x63ho\x12\x1e.prompits.plugs.protos.Message\x1a\x1e.prompits.plugs.protos.Message\"\x00\x12P\n\x0cGetAgentInfo\x12\x1c.prompits.plugs.protos.Empty\x1a .prompits.plugs.protos.AgentInfo\"\x00\x12T\n\rListPractices\x12\x1c.prompits.plugs.protos.Empty\x1a#.prompits.plugs.protos.PracticeList\"\x00\x12\x64\n\x0f\x45xecutePractice\x12&.prompits.plugs.protos.PracticeRequest\x1a\'.prompits.plugs.protos.PracticeResponse\"\x00\x12]\n\rMessageStream\x12\".prompits.plugs.protos.StreamFrame\x1a\".prompits.plugs.protos.StreamFrame\"\x00(\x01\x30\x01\x12\x65\n\rPutAttachment\x12&.prompits.plugs.protos.AttachmentChunk\x1a(.prompits.plugs.protos.AttachmentReceipt\"\x00(\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -33,26 +34,42 @@ if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
   _globals['_PRACTICEREQUEST_PARAMETERSENTRY']._loaded_options = None
   _globals['_PRACTICEREQUEST_PARAMETERSENTRY']._serialized_options = b'8\001'
-  _globals['_EMPTY']._serialized_start=38
-  _globals['_EMPTY']._serialized_end=45
-  _globals['_MESSAGE']._serialized_start=47
-  _globals['_MESSAGE']._serialized_end=118
-  _globals['_MESSAGERESPONSE']._serialized_start=120
-  _globals['_MESSAGERESPONSE']._serialized_end=171
-  _globals['_AGENTINFO']._serialized_start=173
-  _globals['_AGENTINFO']._serialized_end=265
-  _globals['_PRACTICELIST']._serialized_start=267
-  _globals['_PRACTICELIST']._serialized_end=333
-  _globals['_PRACTICE']._serialized_start=335
-  _globals['_PRACTICE']._serialized_end=434
-  _globals['_PARAMETER']._serialized_start=436
-  _globals['_PARAMETER']._serialized_end=516
-  _globals['_PRACTICEREQUEST']._serialized_start=519
-  _globals['_PRACTICEREQUEST']._serialized_end=686
-  _globals['_PRACTICEREQUEST_PARAMETERSENTRY']._serialized_start=637
-  _globals['_PRACTICEREQUEST_PARAMETERSENTRY']._serialized_end=686
-  _globals['_PRACTICERESPONSE']._serialized_start=688
-  _globals['_PRACTICERESPONSE']._serialized_end=754
-  _globals['_AGENT']._serialized_start=757
-  _globals['_AGENT']._serialized_end=1197
+  _globals['_EMPTY']._serialized_start=68
+  _globals['_EMPTY']._serialized_end=75
+  _globals['_MESSAGE']._serialized_start=78
+  _globals['_MESSAGE']._serialized_end=271
+  _globals['_AGENTADDRESS']._serialized_start=273
+  _globals['_AGENTADDRESS']._serialized_end=325
+  _globals['_ATTACHMENT']._serialized_start=328
+  _globals['_ATTACHMENT']._serialized_end=475
+  _globals['_ATTACHMENTCHUNK']._serialized_start=477
+  _globals['_ATTACHMENTCHUNK']._serialized_end=538
+  _globals['_ATTACHMENTRECEIPT']._serialized_start=540
+  _globals['_ATTACHMENTRECEIPT']._serialized_end=605
+  _globals['_USEPRACTICEREQUESTBODY']._serialized_start=607
+  _globals['_USEPRACTICEREQUESTBODY']._serialized_end=716
+  _globals['_USEPRACTICERESPONSEBODY']._serialized_start=718
+  _globals['_USEPRACTICERESPONSEBODY']._serialized_end=836
+  _globals['_AGENTMESSAGE']._serialized_start=839
+  _globals['_AGENTMESSAGE']._serialized_end=1298
+  _globals['_STREAMFRAME']._serialized_start=1301
+  _globals['_STREAMFRAME']._serialized_end=1435
+  _globals['_MESSAGERESPONSE']._serialized_start=1437
+  _globals['_MESSAGERESPONSE']._serialized_end=1488
+  _globals['_AGENTINFO']._serialized_start=1490
+  _globals['_AGENTINFO']._serialized_end=1582
+  _globals['_PRACTICELIST']._serialized_start=1584
+  _globals['_PRACTICELIST']._serialized_end=1650
+  _globals['_PRACTICE']._serialized_start=1652
+  _globals['_PRACTICE']._serialized_end=1751
+  _globals['_PARAMETER']._serialized_start=1753
+  _globals['_PARAMETER']._serialized_end=1833
+  _globals['_PRACTICEREQUEST']._serialized_start=1836
+  _globals['_PRACTICEREQUEST']._serialized_end=2023
+  _globals['_PRACTICEREQUEST_PARAMETERSENTRY']._serialized_start=1974
+  _globals['_PRACTICEREQUEST_PARAMETERSENTRY']._serialized_end=2023
+  _globals['_PRACTICERESPONSE']._serialized_start=2025
+  _globals['_PRACTICERESPONSE']._serialized_end=2091
+  _globals['_AGENT']._serialized_start=2094
+  _globals['_AGENT']._serialized_end=2732
 # @@protoc_insertion_point(module_scope)
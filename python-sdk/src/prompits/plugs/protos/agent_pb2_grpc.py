@@ -61,6 +61,16 @@ class AgentStub(object):
                 request_serializer=agent_pb2.PracticeRequest.SerializeToString,
                 response_deserializer=agent_pb2.PracticeResponse.FromString,
                 _registered_method=True)
+        self.MessageStream = channel.stream_stream(
+                '/prompits.plugs.protos.Agent/MessageStream',
+                request_serializer=agent_pb2.StreamFrame.SerializeToString,
+                response_deserializer=agent_pb2.StreamFrame.FromString,
+                _registered_method=True)
+        self.PutAttachment = channel.stream_unary(
+                '/prompits.plugs.protos.Agent/PutAttachment',
+                request_serializer=agent_pb2.AttachmentChunk.SerializeToString,
+                response_deserializer=agent_pb2.AttachmentReceipt.FromString,
+                _registered_method=True)
 
 
 class AgentServicer(object):
@@ -102,6 +112,20 @@ class AgentServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def MessageStream(self, request_iterator, context):
+        """Long-lived stream carrying messages in both directions between two agents
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def PutAttachment(self, request_iterator, context):
+        """Upload a large attachment in chunks before sending the message that refers to it
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_AgentServicer_to_server(servicer, server):
     """
@@ -139,6 +163,16 @@ def add_AgentServicer_to_server(servicer, server):
                     request_deserializer=agent_pb2.PracticeRequest.FromString,
                     response_serializer=agent_pb2.PracticeResponse.SerializeToString,
             ),
+            'MessageStream': grpc.stream_stream_rpc_method_handler(
+                    servicer.MessageStream,
+                    request_deserializer=agent_pb2.StreamFrame.FromString,
+                    response_serializer=agent_pb2.StreamFrame.SerializeToString,
+            ),
+            'PutAttachment': grpc.stream_unary_rpc_method_handler(
+                    servicer.PutAttachment,
+                    request_deserializer=agent_pb2.AttachmentChunk.FromString,
+                    response_serializer=agent_pb2.AttachmentReceipt.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'prompits.plugs.protos.Agent', rpc_method_handlers)
@@ -385,3 +419,97 @@ class Agent(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def MessageStream(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        """
+        Open a bidirectional message stream with the specified agent.
+        
+        This method is a client stub for the MessageStream RPC call.
+        
+        Args:
+            request_iterator: Iterator of frames to send
+            target: The target agent address
+            options: RPC options
+            channel_credentials: Channel credentials for secure connection
+            call_credentials: Call-specific credentials
+            insecure: Whether to use an insecure connection
+            compression: Compression method
+            wait_for_ready: Whether to wait for the server to be ready
+            timeout: RPC timeout
+            metadata: Additional metadata
+            
+        Returns:
+            Iterator of frames received from the agent
+        """
+        return grpc.experimental.stream_stream(
+            request_iterator,
+            target,
+            '/prompits.plugs.protos.Agent/MessageStream',
+            agent_pb2.StreamFrame.SerializeToString,
+            agent_pb2.StreamFrame.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def PutAttachment(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        """
+        Upload an attachment in chunks to the specified agent.
+        
+        This method is a client stub for the PutAttachment RPC call.
+        
+        Args:
+            request_iterator: Iterator of chunks to send
+            target: The target agent address
+            options: RPC options
+            channel_credentials: Channel credentials for secure connection
+            call_credentials: Call-specific credentials
+            insecure: Whether to use an insecure connection
+            compression: Compression method
+            wait_for_ready: Whether to wait for the server to be ready
+            timeout: RPC timeout
+            metadata: Additional metadata
+            
+        Returns:
+            The receipt of the agent
+        """
+        return grpc.experimental.stream_unary(
+            request_iterator,
+            target,
+            '/prompits.plugs.protos.Agent/PutAttachment',
+            agent_pb2.AttachmentChunk.SerializeToString,
+            agent_pb2.AttachmentReceipt.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
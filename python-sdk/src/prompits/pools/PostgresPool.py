@@ -926,15 +926,20 @@ class PostgresPool(DatabasePool):
                 else:
                     where_values.append(value)
             
+            # Build where clause string
+            if any(key.startswith("$") or isinstance(value, dict) or value is None for key, value in where_clause.items()):
+                # operators ($in, $lt, $and, ...) and NULL checks
+                where_clause_str = self._convert_to_sql_clause(where_clause)
+                where_values = []
+            else:
+                where_conditions = []
+                for key in where_clause.keys():
+                    where_conditions.append(f"{key} = %s")
+                where_clause_str = " AND ".join(where_conditions)
+            
             # Combine all values
             all_values = values + where_values
             
-            # Build where clause string
-            where_conditions = []
-            for key in where_clause.keys():
-                where_conditions.append(f"{key} = %s")
-            where_clause_str = " AND ".join(where_conditions)
-            
             sql = f"UPDATE {self.default_schema}.{table_name} SET {set_clause_str} WHERE {where_clause_str}"
             
             # Execute the query
@@ -980,6 +985,10 @@ class PostgresPool(DatabasePool):
                     values.append(value)
             
             where_clause = " AND ".join(where_conditions)
+            if any(key.startswith("$") or isinstance(value, dict) or value is None for key, value in data_key.items()):
+                # operators ($in, $lt, $and, ...) and NULL checks
+                where_clause = self._convert_to_sql_clause(data_key)
+                values = []
             sql = f"DELETE FROM {self.default_schema}.{table_name} WHERE {where_clause}"
             
             # Execute the query
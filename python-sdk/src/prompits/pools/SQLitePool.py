@@ -215,18 +215,22 @@ class SQLitePool(DatabasePool):
                 values = list(self._ConvertToDataType(table_schema.rowSchema.columns[key], value) for key, value in data.items()) 
                 
                 if where is not None:
-                    # Build WHERE conditions correctly
-                    where_conditions = []
-                    where_values = []
-                    
-                    for k, v in where.items():
-                        where_conditions.append(f"{k} = ?")
-                        if table_schema and k in table_schema.rowSchema.columns:
-                            where_values.append(self._ConvertToDataType(table_schema.rowSchema.columns[k], v))
-                        else:
-                            where_values.append(v)
-                    
-                    where_clause = ' AND '.join(where_conditions)
+                    if any(k.startswith("$") or isinstance(v, dict) or v is None for k, v in where.items()):
+                        # operators ($in, $lt, $and, ...) and NULL checks
+                        where_clause, where_values = self._build_where_clause(where)
+                    else:
+                        # Build WHERE conditions correctly
+                        where_conditions = []
+                        where_values = []
+                        
+                        for k, v in where.items():
+                            where_conditions.append(f"{k} = ?")
+                            if table_schema and k in table_schema.rowSchema.columns:
+                                where_values.append(self._ConvertToDataType(table_schema.rowSchema.columns[k], v))
+                            else:
+                                where_values.append(v)
+                        
+                        where_clause = ' AND '.join(where_conditions)
                     values += where_values
                     
                     update_sql = f"""
@@ -311,16 +315,22 @@ class SQLitePool(DatabasePool):
             self.log(f"Error searching data: {e}\n{traceback.format_exc()}", 'ERROR')
             return []
 
-    def _Delete(self, id: str):
-        """Delete data from the database."""
-        try:
-            self.cursor.execute(f"DELETE FROM {self.name} WHERE id = ?", (id,))
-            self.conn.commit()
-            self.log(f"Deleted data with id {id}", 'DEBUG')
-            return True
-        except Exception as e:
-            self.log(f"Error deleting data: {e}\n{traceback.format_exc()}", 'ERROR')
-            return False
+    def _Delete(self, table_name: str, where: Dict[str, Any], table_schema: TableSchema=None):
+        """Delete the rows of a table matching a where clause."""
+        def delete_data():
+            try:
+                if not where:
+                    raise ValueError("No where clause provided")
+                where_sql, where_values = self._build_where_clause(where)
+                self.cursor.execute(f"DELETE FROM {table_name} WHERE {where_sql}", where_values)
+                self.conn.commit()
+                self.log(f"Deleted {self.cursor.rowcount} rows from table {table_name}", 'DEBUG')
+                return True
+            except Exception as e:
+                self.log(f"Error deleting data: {e}\n{traceback.format_exc()}", 'ERROR')
+                return False
+        
+        return self._execute_with_retry(delete_data)
 
     def _get_sqlite_type(self, column_type: DataType) -> str:
         """Convert schema type to SQLite type."""
@@ -591,18 +601,36 @@ class SQLitePool(DatabasePool):
     
     def _CreateTableIndex(self, table_name: str, index_name: str, column_names: List[str]):
         """
-        Create an index on a table in the pool.
+        Create an index on a table in the pool, if it does not exist.
+        
+        Args:
+            table_name: Name of the table
+            index_name: Name of the index
+            column_names: Columns of the index
+            
+        Returns:
+            bool: True if the index exists, False otherwise
         """
-        # TODO: SQLite CreateTableIndex not implemented
-        raise NotImplementedError("CreateTableIndex not implemented")
+        def create_index():
+            try:
+                self.cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({', '.join(column_names)})")
+                self.conn.commit()
+                return True
+            except Exception as e:
+                self.log(f"Error creating table index: {e}", 'ERROR')
+                return False
+        
+        return self._execute_with_retry(create_index)
 
-    def _GetTableData(self, table_name: str, id_or_where: str=None, table_schema: TableSchema=None) -> dict[str, Any]:
+    def _GetTableData(self, table_name: str, id_or_where: str=None, table_schema: TableSchema=None,
+                      max_rows: int=None) -> dict[str, Any]:
         """
         Get data from a table.
         
         Args:
             table_name: Name of the table
             key: Key to identify the data
+            max_rows: Maximum number of rows to return, None for all rows
             
         Returns:
             dict: Data from the table
@@ -621,6 +649,9 @@ class SQLitePool(DatabasePool):
             else:
                 select_sql = f"SELECT * FROM {table_name}"
                 values = []
+            if max_rows is not None:
+                select_sql += " LIMIT ?"
+                values = values + [max_rows]
             #self.log(f"SQLitePool._GetTableData: {select_sql}, \nvalues:{values}", 'DEBUG')
             self.cursor.execute(select_sql, values)
             
@@ -751,6 +782,8 @@ class SQLitePool(DatabasePool):
                 clauses.append(f"{field} = ?")
                 values.append(condition)
         
+        # datetimes are stored in ISO format, compare them in the same format
+        values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
         return " AND ".join(clauses), values
     
     def _build_not_condition(self, field, condition):
@@ -0,0 +1,73 @@
+# test_advertisement.py tests that agents refresh their advertisement with heartbeats until their catalogue changes
+
+import pytest
+
+from prompits.Agent import Agent
+from prompits.plazas.AgentPlaza import AgentPlaza
+from prompits.plugs.gRPCPlug import gRPCPlug
+from prompits.pools.SQLitePool import SQLitePool
+
+PLAZA = "Plaza"
+
+
+@pytest.fixture
+def plaza(tmp_path):
+    plaza = AgentPlaza(PLAZA, pool=SQLitePool("db", "plaza db", str(tmp_path / "plaza.db")))
+    plaza.calls = []
+    advertise, heartbeat = plaza.Advertise, plaza.Heartbeat
+
+    def record_advertise(*args, **kwargs):
+        plaza.calls.append("advertise")
+        return advertise(*args, **kwargs)
+
+    def record_heartbeat(*args, **kwargs):
+        plaza.calls.append("heartbeat")
+        return heartbeat(*args, **kwargs)
+
+    plaza.Advertise, plaza.Heartbeat = record_advertise, record_heartbeat
+    return plaza
+
+
+@pytest.fixture
+def agent(plaza):
+    agent = Agent("advertised")
+    plug = gRPCPlug("advertised_grpc", port=0, is_server=True)
+    agent.plugs[plug.name] = plug
+    plug.set_agent(agent)
+    agent.plazas[PLAZA] = plaza
+    yield agent
+    plug.stop()
+
+
+def test_unchanged_catalogue_is_refreshed_with_heartbeats(agent, plaza):
+    assert agent.RefreshAdvertisement(PLAZA)
+    assert agent.RefreshAdvertisement(PLAZA)
+    assert agent.RefreshAdvertisement(PLAZA)
+    assert plaza.calls == ["advertise", "heartbeat", "heartbeat"]
+
+
+def test_executor_activity_does_not_change_the_catalogue(agent, plaza):
+    plug = agent.plugs["advertised_grpc"]
+    agent.RefreshAdvertisement(PLAZA)
+    plug.practice_scheduler.Submit("Echo", lambda: None).result(timeout=5)
+    assert plug.ExecutorStats()["control"]["completed"] == 1
+    agent.RefreshAdvertisement(PLAZA)
+    assert plaza.calls == ["advertise", "heartbeat"]
+    # the advertisement carries the limits of the executors, not their counters
+    assert plug.ToJson()["executors"]["data"] == {"workers": plug.practice_scheduler.planes["data"].workers,
+                                                  "queue": None}
+
+
+def test_changed_catalogue_is_advertised_again(agent, plaza):
+    agent.RefreshAdvertisement(PLAZA)
+    agent.AddPractice("Add", lambda a, b: a + b)
+    agent.RefreshAdvertisement(PLAZA)
+    agent.RefreshAdvertisement(PLAZA)
+    assert plaza.calls == ["advertise", "advertise", "heartbeat"]
+
+
+def test_expired_advertisement_is_advertised_again(agent, plaza):
+    agent.RefreshAdvertisement(PLAZA)
+    plaza.update_agent_stop_time(agent.agent_id)
+    agent.RefreshAdvertisement(PLAZA)
+    assert plaza.calls == ["advertise", "heartbeat", "advertise"]
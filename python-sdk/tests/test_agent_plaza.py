@@ -0,0 +1,208 @@
+# test_agent_plaza.py tests the practice index, change feed and cleanup of AgentPlaza on SQLite
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from prompits.plazas.AgentPlaza import AgentPlaza
+from prompits.pools.SQLitePool import SQLitePool
+
+
+def _info(*practices, pit="ollama"):
+    return {"components": {"pits": {pit: {"practices": list(practices)}}}}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "plaza.db")
+
+
+@pytest.fixture
+def plaza(db_path):
+    return AgentPlaza("Plaza", pool=SQLitePool("db", "plaza db", db_path), index_miss_refresh=0)
+
+
+def _agent_ids(matches):
+    return sorted(match["agent_id"] for match in matches)
+
+
+def test_find_agents_by_practice(plaza):
+    plaza.Advertise("a1", "A1", None, _info("Chat", "Embed"))
+    plaza.Advertise("a2", "A2", None, _info({"name": "Chat"}, pit="openai"))
+    assert _agent_ids(plaza.find_agents_by_practice("Chat")) == ["a1", "a2"]
+    assert plaza.find_agents_by_practice("openai/Chat") == [
+        {"agent_id": "a2", "agent_name": "A2", "pit": "openai", "practice": "openai/Chat"}]
+    assert _agent_ids(plaza.find_agents_by_practice("Embed")) == ["a1"]
+    assert plaza.find_agents_by_practice("openai/Embed") == []
+
+
+def test_advertising_again_replaces_the_indexed_practices(plaza):
+    plaza.Advertise("a1", "A1", None, _info("Chat"))
+    plaza.Advertise("a1", "A1", None, _info("Embed"))
+    assert plaza.find_agents_by_practice("Chat") == []
+    assert _agent_ids(plaza.find_agents_by_practice("Embed")) == ["a1"]
+
+
+def test_stopped_agents_are_not_found(plaza):
+    plaza.Advertise("a1", "A1", None, _info("Chat"))
+    plaza.update_agent_stop_time("a1")
+    assert plaza.find_agents_by_practice("Chat") == []
+    assert "Chat" not in plaza.practice_index
+
+
+def test_agent_advertised_through_another_plaza_is_found_on_a_miss(plaza, db_path):
+    other = AgentPlaza("Plaza", pool=SQLitePool("db2", "plaza db", db_path))
+    plaza.find_agents_by_practice("Chat")
+    other.Advertise("a1", "A1", None, _info("Chat"))
+    assert _agent_ids(plaza.find_agents_by_practice("Chat")) == ["a1"]
+
+
+def test_miss_rebuilds_are_rate_limited(db_path):
+    plaza = AgentPlaza("Plaza", pool=SQLitePool("db", "plaza db", db_path), index_miss_refresh=60)
+    other = AgentPlaza("Plaza", pool=SQLitePool("db2", "plaza db", db_path))
+    plaza.find_agents_by_practice("Chat")
+    other.Advertise("a1", "A1", None, _info("Chat"))
+    assert plaza.find_agents_by_practice("Chat") == []
+    plaza.index_time = 0
+    assert _agent_ids(plaza.find_agents_by_practice("Chat")) == ["a1"]
+
+
+def test_rebuild_keeps_agents_indexed_while_it_reads_the_table(plaza):
+    list_active_agents = plaza.list_active_agents
+
+    def slow_list_active_agents(**kwargs):
+        agents = list_active_agents(**kwargs)
+        time.sleep(0.2)
+        return agents
+
+    plaza.list_active_agents = slow_list_active_agents
+    rebuild = threading.Thread(target=plaza._rebuild_index)
+    rebuild.start()
+    time.sleep(0.05)
+    plaza._index_agent("a1", "A1", _info("Chat"), datetime.now())
+    rebuild.join()
+    assert _agent_ids(plaza._find_indexed("Chat")) == ["a1"]
+
+
+def _events(changes):
+    return [(event["event"], event["agent_id"]) for event in changes["events"]]
+
+
+def test_change_feed_reports_joins_updates_and_leaves(plaza):
+    plaza.Advertise("a1", "A1", None, _info("Chat"))
+    plaza.Advertise("a2", "A2", None, _info("Chat"))
+    plaza.Advertise("a1", "A1", None, _info("Embed"))
+    plaza.update_agent_stop_time("a2")
+    changes = plaza.SubscribeChanges(0)
+    assert not changes["reset"]
+    assert _events(changes) == [("join", "a1"), ("join", "a2"), ("update", "a1"), ("leave", "a2")]
+    assert [event["version"] for event in changes["events"]] == [1, 2, 3, 4]
+    assert changes["version"] == 4
+    assert "agent" in changes["events"][0] and "agent" not in changes["events"][3]
+    assert plaza.SubscribeChanges(changes["version"])["events"] == []
+
+
+def test_change_feed_resumes_from_a_version_with_a_limit(plaza):
+    for i in range(5):
+        plaza.Advertise(f"a{i}", f"A{i}", None, _info("Chat"))
+    first = plaza.SubscribeChanges(0, limit=2)
+    assert _events(first) == [("join", "a0"), ("join", "a1")]
+    rest = plaza.SubscribeChanges(first["version"])
+    assert _events(rest) == [("join", "a2"), ("join", "a3"), ("join", "a4")]
+
+
+def test_change_feed_resets_when_the_version_is_not_in_the_log(db_path):
+    plaza = AgentPlaza("Plaza", pool=SQLitePool("db", "plaza db", db_path), change_log_size=2)
+    for i in range(4):
+        plaza.Advertise(f"a{i}", f"A{i}", None, _info("Chat"))
+    assert plaza.SubscribeChanges(0)["reset"]
+    assert plaza.SubscribeChanges(100) == {"plaza": "Plaza", "version": 4, "reset": True, "events": []}
+    assert _events(plaza.SubscribeChanges(2)) == [("join", "a2"), ("join", "a3")]
+
+
+def test_subscriber_gets_the_changes_pushed_until_unsubscribed(plaza):
+    received = []
+    plaza.Advertise("a1", "A1", None, _info("Chat"))
+    subscription = plaza.SubscribeChanges(0, subscriber=received.append)
+    assert _events(subscription) == [("join", "a1")]
+    plaza.Advertise("a2", "A2", None, _info("Chat"))
+    plaza._notify_subscribers()
+    plaza._notify_subscribers()
+    assert [_events(changes) for changes in received] == [[("join", "a2")], []]
+    assert plaza.UnsubscribeChanges(subscription["subscription_id"])
+    assert not plaza.UnsubscribeChanges(subscription["subscription_id"])
+    plaza.Advertise("a3", "A3", None, _info("Chat"))
+    plaza._notify_subscribers()
+    assert len(received) == 2
+
+
+def test_failing_subscriber_is_unsubscribed(plaza):
+    def subscriber(changes):
+        raise RuntimeError("gone")
+
+    subscription = plaza.SubscribeChanges(0, subscriber=subscriber)
+    plaza._notify_subscribers()
+    assert not plaza.UnsubscribeChanges(subscription["subscription_id"])
+
+
+@pytest.fixture
+def cleanup_plaza(db_path):
+    return AgentPlaza("Plaza", pool=SQLitePool("db", "plaza db", db_path), expire_after=60, retention=3600,
+                      cleanup_batch_size=3, cleanup_max_batches=2)
+
+
+def _set(plaza, agent_id, **data):
+    plaza.pool.UsePractice("Update", plaza.table_name, data, {"agent_id": agent_id}, plaza.agent_table_schema)
+
+
+def _stale(plaza, *agent_ids):
+    for agent_id in agent_ids:
+        _set(plaza, agent_id, update_time=datetime.now() - timedelta(minutes=10))
+
+
+def test_cleanup_expires_in_bounded_batches(cleanup_plaza):
+    for i in range(8):
+        cleanup_plaza.Advertise(f"a{i}", f"A{i}", None, _info("Chat"))
+    _stale(cleanup_plaza, *[f"a{i}" for i in range(7)])
+    stats = cleanup_plaza.cleanup()
+    assert (stats["last_expired"], stats["backlog"]) == (6, 1)
+    stats = cleanup_plaza.cleanup()
+    assert (stats["last_expired"], stats["expired"], stats["backlog"]) == (1, 7, 0)
+    assert _agent_ids(cleanup_plaza.find_agents_by_practice("Chat")) == ["a7"]
+    assert cleanup_plaza.get_advertisement("a0")["status"] == "expired"
+
+
+def test_cleanup_reports_leave_events_for_expired_agents(cleanup_plaza):
+    cleanup_plaza.Advertise("a1", "A1", None, _info("Chat"))
+    version = cleanup_plaza.SubscribeChanges(0)["version"]
+    _stale(cleanup_plaza, "a1")
+    cleanup_plaza.cleanup()
+    assert _events(cleanup_plaza.SubscribeChanges(version)) == [("leave", "a1")]
+
+
+def test_cleanup_removes_advertisements_stopped_longer_than_retention(cleanup_plaza):
+    cleanup_plaza.Advertise("a1", "A1", None, _info("Chat"))
+    cleanup_plaza.Advertise("a2", "A2", None, _info("Chat"))
+    cleanup_plaza.update_agent_stop_time("a1")
+    cleanup_plaza.update_agent_stop_time("a2")
+    _set(cleanup_plaza, "a1", stop_time=datetime.now() - timedelta(hours=2))
+    stats = cleanup_plaza.cleanup()
+    assert (stats["last_expired"], stats["last_removed"]) == (0, 1)
+    assert cleanup_plaza.get_advertisement("a1") is None
+    assert cleanup_plaza.get_advertisement("a2") is not None
+
+
+def test_cleanup_keeps_an_agent_refreshing_during_the_batch(cleanup_plaza):
+    cleanup_plaza.Advertise("a1", "A1", None, _info("Chat"))
+    _stale(cleanup_plaza, "a1")
+    expire_agents = cleanup_plaza._expire_agents
+
+    def heartbeat_then_expire(agent_ids, where):
+        cleanup_plaza.Heartbeat("a1")
+        return expire_agents(agent_ids, where)
+
+    cleanup_plaza._expire_agents = heartbeat_then_expire
+    assert cleanup_plaza.cleanup()["last_expired"] == 0
+    assert _agent_ids(cleanup_plaza.find_agents_by_practice("Chat")) == ["a1"]
@@ -0,0 +1,158 @@
+# test_async_grpc_plug.py tests the grpc.aio server and async client of AsyncGRPCPlug
+
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from prompits.AgentAddress import AgentAddress
+from prompits.Message import Message
+from prompits.plugs.AsyncGRPCPlug import AsyncGRPCPlug
+from prompits.plugs.gRPCPlug import gRPCPlug
+
+SENDER = AgentAddress("agent1", "plaza")
+RECIPIENT = AgentAddress("agent2", "plaza")
+
+
+class PracticeAgent:
+    """
+    Agent serving the practices of the tests.
+    """
+
+    agent_id = "agent2"
+    name = "Agent2"
+    description = ""
+
+    def __init__(self):
+        self.practices = {}
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def UsePractice(self, practice_name, **kwargs):
+        with self.lock:
+            self.calls.append(practice_name)
+        if practice_name == "Fail":
+            raise ValueError("failed")
+        if practice_name == "Sleep":
+            time.sleep(kwargs.get("seconds", 0))
+        return {"practice": practice_name, "arguments": kwargs}
+
+
+def _receive(plug, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        message = plug.ReceiveMessage(timeout=0.1)
+        if message is not None:
+            return message
+    return None
+
+
+def _message(text, msg_id="n1"):
+    return Message("Note", {"text": text}, SENDER, [RECIPIENT], msg_id=msg_id)
+
+
+@pytest.fixture
+def agent():
+    return PracticeAgent()
+
+
+@pytest.fixture
+def server(agent):
+    plug = AsyncGRPCPlug("async_server", port=0, is_server=True)
+    plug.set_agent(agent)
+    yield plug
+    plug.stop()
+
+
+@pytest.fixture
+def plug_info(server):
+    return {"host": "localhost", "port": server._port}
+
+
+@pytest.fixture
+def client():
+    plug = AsyncGRPCPlug("async_client")
+    yield plug
+    plug.stop()
+
+
+def test_send_message_async_is_received(server, client, plug_info):
+    assert asyncio.run(client.SendMessageAsync(RECIPIENT, _message("hello"), plug_info))
+    received = _receive(server)
+    assert json.loads(received["content"])["body"] == {"text": "hello"}
+
+
+def test_send_message_async_from_the_loop_of_the_plug(server, client, plug_info):
+    assert client.RunCoroutine(client.SendMessageAsync(RECIPIENT, _message("hello"), plug_info)).result(timeout=5)
+    assert _receive(server) is not None
+
+
+def test_send_message_async_without_connection_info_fails(client):
+    assert not asyncio.run(client.SendMessageAsync(RECIPIENT, _message("hello"), {}))
+
+
+def test_sync_send_message_is_received(server, client, plug_info):
+    assert client.SendMessage(RECIPIENT, _message("hello"), plug_info)
+    assert json.loads(_receive(server)["content"])["body"] == {"text": "hello"}
+
+
+def test_execute_practice_async(agent, client, plug_info):
+    result = asyncio.run(client.ExecutePracticeAsync("Echo", {"text": "hi"}, plug_info))
+    assert result["success"]
+    assert result["result"] == {"practice": "Echo", "arguments": {"text": "hi"}}
+    assert agent.calls == ["Echo"]
+
+
+def test_failed_practice_returns_the_error(client, plug_info):
+    result = asyncio.run(client.ExecutePracticeAsync("Fail", {}, plug_info))
+    assert not result["success"]
+    assert "failed" in result["error"]
+
+
+def test_practices_run_concurrently(agent, client, plug_info):
+    async def run():
+        return await asyncio.gather(*[client.ExecutePracticeAsync("Sleep", {"seconds": 0.3}, plug_info)
+                                      for _ in range(4)])
+    start = time.time()
+    results = asyncio.run(run())
+    assert all(result["success"] for result in results)
+    assert time.time() - start < 1.0
+
+
+def test_execute_practice_async_times_out(client, plug_info):
+    result = asyncio.run(client.ExecutePracticeAsync("Sleep", {"seconds": 0.5}, plug_info, timeout=0.1))
+    assert not result["success"]
+
+
+def test_server_without_agent_reports_no_execute_practice(client):
+    server = AsyncGRPCPlug("agentless", port=0, is_server=True)
+    try:
+        info = {"host": "localhost", "port": server._port}
+        assert asyncio.run(client.ExecutePracticeAsync("Echo", {}, info)) is None
+    finally:
+        server.stop()
+
+
+def test_sync_client_executes_practice_on_async_server(agent, plug_info):
+    client = gRPCPlug("client", streaming=False)
+    try:
+        result = client.ExecutePractice("Echo", {"n": 1}, plug_info)
+        assert result["result"] == {"practice": "Echo", "arguments": {"n": 1}}
+    finally:
+        client.stop()
+
+
+def test_streaming_client_falls_back_to_send_message(server, plug_info):
+    # the async server answers MessageStream with UNIMPLEMENTED
+    client = gRPCPlug("client", streaming=True)
+    try:
+        info = dict(plug_info, streaming=True)
+        assert client.SendMessage(RECIPIENT, _message("first", "n1"), info)
+        assert f"localhost:{plug_info['port']}" in client.no_stream_peers
+        assert client.SendMessage(RECIPIENT, _message("second", "n2"), info)
+        texts = {json.loads(_receive(server)["content"])["body"]["text"] for _ in range(2)}
+        assert texts == {"first", "second"}
+    finally:
+        client.stop()
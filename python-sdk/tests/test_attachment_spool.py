@@ -0,0 +1,170 @@
+# test_attachment_spool.py tests the chunked upload of large attachments and the clean-up of their spool files
+
+import json
+import os
+import time
+
+import pytest
+
+from prompits.AgentAddress import AgentAddress
+from prompits.Message import Attachment, Message
+from prompits.plugs.AttachmentSpool import AttachmentSpool
+from prompits.plugs.gRPCPlug import gRPCPlug
+
+SENDER = AgentAddress("agent1", "plaza")
+RECIPIENT = AgentAddress("agent2", "plaza")
+
+DATA = bytes(range(256)) * 40  # 10240 bytes
+
+
+@pytest.fixture
+def spool(tmp_path):
+    return AttachmentSpool(str(tmp_path / "spool"))
+
+
+def _files(spool):
+    return os.listdir(spool.spool_dir)
+
+
+def test_bytes_are_split_into_chunks(spool):
+    chunks = list(AttachmentSpool.Chunks(Attachment("a.bin", "application/octet-stream", data=DATA), "h1", 1000))
+    assert len(chunks) == 11
+    assert {chunk.handle for chunk in chunks} == {"h1"}
+    # the total size is announced in the first chunk only
+    assert [chunk.size for chunk in chunks] == [len(DATA)] + [0] * 10
+    assert b"".join(chunk.data for chunk in chunks) == DATA
+
+
+def test_chunks_are_reassembled_and_claimed_once(spool):
+    handle, size = spool.Receive(AttachmentSpool.Chunks(Attachment("a.bin", "application/octet-stream", data=DATA), "h1", 1000))
+    assert (handle, size) == ("h1", len(DATA))
+    path, size = spool.Claim("h1")
+    assert size == len(DATA)
+    with open(path, 'rb') as f:
+        assert f.read() == DATA
+    assert spool.Claim("h1") is None
+
+
+def test_file_attachment_is_read_in_chunks(spool, tmp_path):
+    source = tmp_path / "source.bin"
+    source.write_bytes(DATA)
+    chunks = list(AttachmentSpool.Chunks(Attachment("a.bin", "application/octet-stream", path=str(source)), "h1", 4096))
+    assert [len(chunk.data) for chunk in chunks] == [4096, 4096, 2048]
+    assert spool.Receive(iter(chunks)) == ("h1", len(DATA))
+
+
+def test_empty_attachment_is_one_chunk(spool):
+    chunks = list(AttachmentSpool.Chunks(Attachment("empty", "text/plain", data=b""), "h1"))
+    assert len(chunks) == 1
+    assert spool.Receive(iter(chunks)) == ("h1", 0)
+
+
+def test_truncated_upload_is_deleted(spool):
+    chunks = list(AttachmentSpool.Chunks(Attachment("a.bin", "application/octet-stream", data=DATA), "h1", 1000))
+    assert spool.Receive(iter(chunks[:-1])) == (None, 0)
+    assert spool.Claim("h1") is None
+    assert _files(spool) == []
+
+
+def test_interrupted_upload_is_deleted(spool):
+    def chunks():
+        yield from list(AttachmentSpool.Chunks(Attachment("a.bin", "application/octet-stream", data=DATA), "h1", 1000))[:3]
+        raise ConnectionError("stream broken")
+    with pytest.raises(ConnectionError):
+        spool.Receive(chunks())
+    assert _files(spool) == []
+
+
+def test_unclaimed_files_expire(spool):
+    spool.ttl = 0.1
+    spool.Receive(AttachmentSpool.Chunks(Attachment("a.bin", "application/octet-stream", data=DATA), "old"))
+    assert spool.Expire() == 0
+    time.sleep(0.2)
+    # a new upload expires the files whose message never arrived
+    spool.Receive(AttachmentSpool.Chunks(Attachment("b.bin", "application/octet-stream", data=DATA), "new"))
+    assert spool.Claim("old") is None
+    assert len(_files(spool)) == 1
+    path, _ = spool.Claim("new")
+    # claimed files belong to the receiver and are not expired
+    time.sleep(0.2)
+    assert spool.Expire() == 0
+    assert os.path.exists(path)
+
+
+def _receive(plug, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        message = plug.ReceiveMessage(timeout=0.1)
+        if message is not None:
+            return message
+    return None
+
+
+def _content(received):
+    content = received["content"]
+    return json.loads(content) if isinstance(content, str) else content
+
+
+@pytest.fixture
+def server(tmp_path):
+    plug = gRPCPlug("server", port=0, is_server=True, spool_dir=str(tmp_path / "server_spool"))
+    yield plug
+    plug.stop()
+
+
+@pytest.fixture
+def client():
+    plug = gRPCPlug("client", streaming=False, attachment_threshold=1024, attachment_chunk_size=1000)
+    yield plug
+    plug.stop()
+
+
+def _info(server):
+    return dict(server.ToJson(), host="localhost", port=server._port)
+
+
+def test_large_attachment_is_uploaded_and_delivered_with_its_path(server, client):
+    message = Message("Note", {"text": "see attached"}, SENDER, [RECIPIENT], msg_id="n1",
+                      attachments=[Attachment("a.bin", "application/octet-stream", data=DATA)])
+    assert client.SendMessage(RECIPIENT, message, _info(server))
+    attachment = _content(_receive(server))["attachments"][0]
+    assert "handle" not in attachment
+    assert attachment["size"] == len(DATA)
+    assert os.path.dirname(attachment["path"]) == server.attachment_spool.spool_dir
+    with open(attachment["path"], 'rb') as f:
+        assert f.read() == DATA
+    # the message is not modified, it can be sent to other recipients
+    assert message.attachments[0].data == DATA and message.attachments[0].handle is None
+    assert server.attachment_spool.files == {}
+
+
+def test_file_attachment_is_uploaded(server, client, tmp_path):
+    source = tmp_path / "source.bin"
+    source.write_bytes(DATA)
+    message = Message("Note", {}, SENDER, [RECIPIENT],
+                      attachments=[Attachment("a.bin", "application/octet-stream", path=str(source))])
+    assert client.SendMessage(RECIPIENT, message, _info(server))
+    attachment = Message.FromJson(_content(_receive(server))).attachments[0]
+    assert attachment.path != str(source)
+    assert attachment.Read() == DATA
+
+
+def test_small_attachment_is_sent_inline(server, client):
+    message = Message("Note", {}, SENDER, [RECIPIENT], attachments=[Attachment("a.txt", "text/plain", data=b"small")])
+    assert client.SendMessage(RECIPIENT, message, _info(server))
+    attachment = Message.FromJson(_content(_receive(server))).attachments[0]
+    assert attachment.path is None
+    assert attachment.Read() == b"small"
+    assert os.listdir(server.attachment_spool.spool_dir) == []
+
+
+def test_peer_without_attachment_streaming_gets_the_attachment_inline(server, client, tmp_path):
+    source = tmp_path / "source.bin"
+    source.write_bytes(DATA)
+    info = dict(_info(server), attachment_streaming=False)
+    message = Message("Note", {}, SENDER, [RECIPIENT],
+                      attachments=[Attachment("a.bin", "application/octet-stream", path=str(source))])
+    assert client.SendMessage(RECIPIENT, message, info)
+    attachment = Message.FromJson(_content(_receive(server))).attachments[0]
+    assert attachment.Read() == DATA
+    assert os.listdir(server.attachment_spool.spool_dir) == []
@@ -0,0 +1,129 @@
+# test_channel_manager.py tests the eviction, retirement, reconnection and sharing of pooled gRPC channels
+
+import time
+
+import grpc
+import pytest
+
+from prompits.plugs.ChannelManager import ChannelManager
+from prompits.plugs.gRPCPlug import gRPCPlug
+from prompits.plugs.protos import agent_pb2
+
+# grpc's connectivity polling thread fails when it polls a channel closed right after it was opened
+pytestmark = pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+
+
+@pytest.fixture
+def manager():
+    manager = ChannelManager(max_channels=2, idle_timeout=60)
+    manager.closed = []
+    close_entry = manager._close_entry
+
+    def record_close(entry):
+        manager.closed.append(entry.address)
+        close_entry(entry)
+
+    manager._close_entry = record_close
+    yield manager
+    manager.close()
+
+
+def test_channels_are_reused_per_address(manager):
+    assert manager.get_stub("localhost:1") is manager.get_stub("localhost:1")
+    assert manager.get_stub("localhost:2") is not manager.get_stub("localhost:1")
+    assert manager.stats()["created"] == 2
+
+
+def test_cap_evicts_least_recently_used_channels_not_in_use(manager):
+    held = manager.acquire("localhost:1")
+    manager.get_channel("localhost:2")
+    manager.get_channel("localhost:3")
+    assert manager.closed == ["localhost:2"]
+    manager.get_channel("localhost:4")
+    assert manager.closed == ["localhost:2", "localhost:3"]
+    assert "localhost:1" in manager.stats()["channels"]
+    manager.release(held)
+
+
+def test_cap_is_exceeded_while_every_channel_is_in_use(manager):
+    held = [manager.acquire(f"localhost:{port}") for port in (1, 2, 3)]
+    assert manager.closed == []
+    assert manager.stats()["open_channels"] == 3
+    for entry in held:
+        manager.release(entry)
+    manager.get_channel("localhost:1")
+    assert manager.stats()["open_channels"] == 2
+
+
+def test_idle_sweep_skips_channels_in_use(manager):
+    held = manager.acquire("localhost:1")
+    manager.get_channel("localhost:2")
+    for entry in manager._entries.values():
+        entry.last_used = time.time() - 120
+    assert manager.evict_idle() == 1
+    assert manager.closed == ["localhost:2"]
+    manager.release(held)
+    held.last_used = time.time() - 120
+    assert manager.evict_idle() == 1
+
+
+def test_invalidated_channel_is_closed_by_its_last_release(manager):
+    with manager.use_stub("localhost:1") as stub:
+        entry = manager.acquire("localhost:1")
+        manager.invalidate("localhost:1")
+        assert manager.closed == []
+        assert manager.get_stub("localhost:1") is not stub
+    assert manager.closed == []
+    manager.release(entry)
+    assert manager.closed == ["localhost:1"]
+
+
+def test_invalidated_channel_not_in_use_is_closed_at_once(manager):
+    manager.get_channel("localhost:1")
+    manager.invalidate("localhost:1")
+    assert manager.closed == ["localhost:1"]
+    assert manager.stats()["open_channels"] == 0
+
+
+def test_shared_managers_are_kept_per_settings():
+    assert ChannelManager.shared() is ChannelManager.default()
+    assert ChannelManager.shared(max_channels=3) is ChannelManager.shared(max_channels=3)
+    assert ChannelManager.shared(max_channels=3) is not ChannelManager.shared(max_channels=4)
+    assert ChannelManager.shared(max_channels=3).max_channels == 3
+    assert ChannelManager.shared(idle_timeout=5, max_channels=3) is ChannelManager.shared(max_channels=3, idle_timeout=5)
+
+
+def test_channel_in_transient_failure_is_replaced(manager):
+    entry = manager.acquire("localhost:1")
+    entry.on_state_change(grpc.ChannelConnectivity.TRANSIENT_FAILURE)
+    assert manager.get_stub("localhost:1") is not entry.stub
+    assert manager.stats()["reconnected"] == 1
+    # still in use, closed by its release
+    assert manager.closed == []
+    manager.release(entry)
+    assert manager.closed == ["localhost:1"]
+
+
+def _echo(manager, address):
+    with manager.use_stub(address) as stub:
+        return stub.Echo(agent_pb2.Message(type="Ping", content="{}"), timeout=2)
+
+
+def test_channel_reconnects_to_a_restarted_peer(manager):
+    server = gRPCPlug("server", port=0, is_server=True)
+    port = server.ToJson()["port"]
+    address = f"localhost:{port}"
+    try:
+        assert _echo(manager, address)
+        # wait for the listening sockets to close so the address can be bound again
+        server.server.stop(0).wait(5)
+        server.stop()
+        with pytest.raises(grpc.RpcError) as failure:
+            _echo(manager, address)
+        assert failure.value.code() == grpc.StatusCode.UNAVAILABLE
+        # the peer comes back on the same address before the channel's reconnection backoff ends
+        server = gRPCPlug("server", port=port, is_server=True)
+        assert _echo(manager, address)
+        assert manager.stats()["reconnected"] == 1
+    finally:
+        server.stop()
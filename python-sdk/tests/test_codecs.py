@@ -0,0 +1,111 @@
+# test_codecs.py tests the message codecs, their negotiation between peers and their use on the gRPC path
+
+import time
+from datetime import datetime
+
+import pytest
+
+from prompits.AgentAddress import AgentAddress
+from prompits.Message import Message
+from prompits.codecs import CodecRegistry
+from prompits.plugs.gRPCPlug import gRPCPlug
+
+SENDER = AgentAddress("agent1", "plaza")
+RECIPIENT = AgentAddress("agent2", "plaza")
+
+DATA = {"text": "héllo", "n": 3, "x": 0.5, "ok": True, "none": None, "items": [1, "a", {"b": []}]}
+
+AVAILABLE = CodecRegistry.Available()
+
+
+@pytest.mark.parametrize("name", AVAILABLE)
+def test_codecs_round_trip(name):
+    codec = CodecRegistry.Get(name)
+    encoded = codec.Encode(DATA)
+    assert isinstance(encoded, bytes)
+    assert codec.Decode(encoded) == DATA
+
+
+@pytest.mark.parametrize("name", AVAILABLE)
+def test_codecs_convert_objects_with_default(name):
+    codec = CodecRegistry.Get(name)
+    data = {"sender": SENDER, "when": datetime(2024, 1, 2, 3, 4, 5), "tags": {"a"}}
+    assert codec.Decode(codec.Encode(data)) == {"sender": SENDER.ToJson(), "when": "2024-01-02T03:04:05",
+                                               "tags": ["a"]}
+
+
+@pytest.mark.skipif(CodecRegistry.Get("msgpack") is None, reason="msgpack is not installed")
+def test_msgpack_keeps_bytes():
+    codec = CodecRegistry.Get("msgpack")
+    assert codec.Decode(codec.Encode({"data": b"\x00\x01"})) == {"data": b"\x00\x01"}
+
+
+def test_negotiate_picks_the_first_local_codec_the_peer_accepts():
+    assert CodecRegistry.Negotiate(["json", "orjson"], ["orjson", "json"]).name == "orjson"
+    assert CodecRegistry.Negotiate(["json", "orjson"], ["json", "orjson"]).name == "json"
+
+
+def test_negotiate_falls_back_to_json():
+    # peers that predate codecs, or share none with this side, get standard JSON
+    assert CodecRegistry.Negotiate(None).json_compatible
+    assert CodecRegistry.Negotiate([]).json_compatible
+    assert CodecRegistry.Negotiate(["cbor"]).json_compatible
+    # a codec the peer accepts but that is not installed here is skipped
+    assert CodecRegistry.Negotiate(["unknown", "json"], ["unknown", "json"]).name == "json"
+
+
+def test_get_by_content_type_ignores_parameters():
+    assert CodecRegistry.GetByContentType("application/json; charset=utf-8").json_compatible
+    assert CodecRegistry.GetByContentType("text/plain") is None
+    assert CodecRegistry.GetByContentType(None) is None
+
+
+def _receive(plug, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        message = plug.ReceiveMessage(timeout=0.1)
+        if message is not None:
+            return message
+    return None
+
+
+@pytest.fixture
+def server():
+    plug = gRPCPlug("server", port=0, is_server=True)
+    yield plug
+    plug.stop()
+
+
+@pytest.fixture
+def client():
+    plug = gRPCPlug("client", streaming=False)
+    yield plug
+    plug.stop()
+
+
+def test_message_is_sent_with_a_codec_the_peer_advertises(server, client):
+    info = {"host": "localhost", "port": server._port, "codecs": server.ToJson()["codecs"]}
+    message = Message("Note", DATA, SENDER, [RECIPIENT], msg_id="n1")
+    msg, _ = client._BuildMessage(message, info)
+    assert msg.codec == CodecRegistry.Negotiate(info["codecs"], client.codecs).name
+    assert msg.data and not msg.content
+    assert client.SendMessage(RECIPIENT, message, info)
+    received = _receive(server)
+    assert received["content"]["body"] == DATA
+    assert received["content"]["msg_id"] == "n1"
+
+
+def test_message_the_codec_cannot_encode_is_sent_as_json(client):
+    # orjson stops at 64-bit integers, the standard json module does not
+    if "orjson" not in client.codecs:
+        pytest.skip("orjson is not installed")
+    message = Message("Note", {"big": 2 ** 70}, SENDER, [RECIPIENT])
+    msg, _ = client._BuildMessage(message, {"codecs": ["orjson"]})
+    assert not msg.codec
+    assert '"big": 1180591620717411303424' in msg.content
+
+
+def test_peer_without_codecs_gets_the_json_string(client):
+    msg, _ = client._BuildMessage(Message("Note", DATA, SENDER, [RECIPIENT]), {})
+    assert not msg.codec and not msg.data
+    assert msg.content
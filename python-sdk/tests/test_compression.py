@@ -0,0 +1,112 @@
+# test_compression.py tests the compression of large gRPC messages and its negotiation with peers
+
+import json
+import os
+import time
+
+import pytest
+
+from prompits.AgentAddress import AgentAddress
+from prompits.Message import Message, PRIORITY_HIGH
+from prompits.plugs.Compression import Compression
+from prompits.plugs.gRPCPlug import gRPCPlug
+from prompits.plugs.protos import agent_pb2
+
+SENDER = AgentAddress("agent1", "plaza")
+RECIPIENT = AgentAddress("agent2", "plaza")
+
+THRESHOLD = 1024
+
+
+def _receive(plug, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        message = plug.ReceiveMessage(timeout=0.1)
+        if message is not None:
+            return message
+    return None
+
+
+def _message(text, msg_id="n1", **kwargs):
+    return Message("Note", {"text": text}, SENDER, [RECIPIENT], msg_id=msg_id, **kwargs)
+
+
+@pytest.mark.parametrize("algorithm", Compression.Available())
+def test_compress_round_trip(algorithm):
+    data = b"prompits " * 1000
+    compressed = Compression.Compress(algorithm, data)
+    assert len(compressed) < len(data)
+    assert Compression.Decompress(algorithm, compressed) == data
+
+
+def test_unknown_algorithm_raises():
+    with pytest.raises(ValueError):
+        Compression.Compress("lz4", b"data")
+    with pytest.raises(ValueError):
+        Compression.Decompress("lz4", b"data")
+
+
+def test_negotiate():
+    assert Compression.Negotiate(None) is None
+    assert Compression.Negotiate([]) is None
+    assert Compression.Negotiate(["lz4"]) is None
+    assert Compression.Negotiate(["gzip", "lz4"]) == "gzip"
+    # the local order of preference wins, and locally disabled algorithms are not used
+    assert Compression.Negotiate(["gzip", "zstd"], ["gzip", "zstd"]) == "gzip"
+    assert Compression.Negotiate(["zstd"], ["gzip"]) is None
+
+
+@pytest.fixture
+def server():
+    plug = gRPCPlug("server", port=0, is_server=True)
+    yield plug
+    plug.stop()
+
+
+@pytest.fixture
+def client():
+    plug = gRPCPlug("client", streaming=False, compression_threshold=THRESHOLD)
+    yield plug
+    plug.stop()
+
+
+def test_messages_below_the_threshold_are_not_compressed(client):
+    msg, size = client._BuildMessage(_message("short"), {"compression": ["gzip"]})
+    assert size < THRESHOLD
+    assert not msg.compression
+
+
+def test_large_messages_are_compressed_for_peers_that_advertise_it(client):
+    msg, size = client._BuildMessage(_message("x" * 10 * THRESHOLD, priority=PRIORITY_HIGH), {"compression": ["gzip"]})
+    assert msg.compression == "gzip"
+    assert msg.ByteSize() < size
+    # read by the receiver without decompressing
+    assert msg.priority == PRIORITY_HIGH
+
+
+def test_large_messages_are_not_compressed_for_other_peers(client):
+    msg, _ = client._BuildMessage(_message("x" * 10 * THRESHOLD), {})
+    assert not msg.compression
+    msg, _ = client._BuildMessage(_message("x" * 10 * THRESHOLD), {"compression": ["lz4"]})
+    assert not msg.compression
+
+
+def test_incompressible_messages_are_sent_as_is(client):
+    # e.g. a message carrying an already compressed attachment
+    msg = agent_pb2.Message(id="m1", type="Message", data=os.urandom(4 * THRESHOLD))
+    assert client._Compress(msg, msg.ByteSize(), {"compression": ["gzip"]}) is msg
+
+
+def test_compressed_message_is_received(server, client):
+    text = "compressible " * 1000
+    info = dict(host="localhost", port=server._port, compression=server.ToJson()["compression"])
+    assert client.SendMessage(RECIPIENT, _message(text), info)
+    received = _receive(server)
+    assert json.loads(received["content"])["body"]["text"] == text
+
+
+def test_corrupt_compressed_message_is_dropped(server, client):
+    msg, size = client._BuildMessage(_message("x" * 10 * THRESHOLD), {"compression": ["gzip"]})
+    msg.data = b"not gzip"
+    assert server._HandleIncoming(msg)
+    assert server.ReceiveMessage() is None
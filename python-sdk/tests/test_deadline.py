@@ -0,0 +1,86 @@
+# test_deadline.py tests the deadlines carried by practice requests
+
+import json
+import threading
+import time
+
+import pytest
+
+from prompits import Deadline
+from prompits.AgentAddress import AgentAddress
+from prompits.Message import PRIORITY_LOW
+from prompits.messages.UsePracticeMessage import UsePracticeRequest, UsePracticeResponse
+
+SENDER = AgentAddress("agent1", "plaza")
+RECIPIENT = AgentAddress("agent2", "plaza")
+
+
+def test_no_deadline_outside_a_scope():
+    assert Deadline.Current() is None
+    assert Deadline.Remaining() is None
+    assert not Deadline.Expired()
+    assert Deadline.Clamp(5) == 5
+
+
+def test_scope_sets_the_deadline_and_keeps_an_earlier_one():
+    deadline = time.time() + 10
+    with Deadline.Scope(deadline):
+        assert Deadline.Current() == deadline
+        assert 9 < Deadline.Remaining() <= 10
+        assert Deadline.Clamp(30) <= 10
+        assert Deadline.Clamp(1) == 1
+        with Deadline.Scope(deadline + 60):
+            assert Deadline.Current() == deadline
+        with Deadline.Scope(deadline - 5):
+            assert Deadline.Current() == deadline - 5
+        assert Deadline.Current() == deadline
+    assert Deadline.Current() is None
+
+
+def test_expired_deadline():
+    with Deadline.Scope(time.time() - 1):
+        assert Deadline.Expired()
+        assert Deadline.Remaining() == 0
+    assert Deadline.Expired(time.time() - 1)
+    assert not Deadline.Expired(time.time() + 10)
+
+
+def test_call_carries_the_deadline_to_another_thread():
+    deadline = time.time() + 10
+    seen = []
+    thread = threading.Thread(target=Deadline.Call, args=(deadline, lambda: seen.append(Deadline.Current())))
+    thread.start()
+    thread.join()
+    assert seen == [deadline]
+
+
+def test_deadline_of_a_request_and_of_its_received_forms():
+    request = UsePracticeRequest("Chat", SENDER, [RECIPIENT], {"prompt": "hi"}, deadline=123.0)
+    assert Deadline.Of(request) == 123.0
+    assert Deadline.Of({"type": "UsePracticeRequest", "content": request.ToJson()}) == 123.0
+    assert Deadline.Of(UsePracticeRequest("Chat", SENDER, [RECIPIENT])) is None
+    assert Deadline.Of({"content": "not json"}) is None
+
+
+def test_request_from_json_keeps_deadline_and_priority():
+    request = UsePracticeRequest("Chat", SENDER, [RECIPIENT], {"prompt": "hi"}, deadline=123.0, priority=PRIORITY_LOW)
+    received = UsePracticeRequest.FromJson(request.ToJson())
+    assert isinstance(received, UsePracticeRequest)
+    assert received.deadline == 123.0
+    assert received.priority == PRIORITY_LOW
+    assert received.arguments == {"prompt": "hi"}
+    assert received.sender.agent_id == "agent1"
+
+
+def test_from_json_on_an_instance_is_deprecated():
+    request = UsePracticeRequest("Chat", SENDER, [RECIPIENT], {"prompt": "hi"})
+    with pytest.deprecated_call():
+        assert request.FromJson({"body": {"practice_name": "Embed", "arguments": {"text": "x"}}}) is request
+    assert (request.practice_name, request.arguments) == ("Embed", {"text": "x"})
+    assert request.ToJson()["body"]["practice_name"] == "Embed"
+
+    sent = UsePracticeResponse("Chat", "hello", SENDER, [RECIPIENT], msg_id="m1")
+    response = UsePracticeResponse("Chat", None, RECIPIENT, [SENDER])
+    with pytest.deprecated_call():
+        response.FromJson(json.dumps(sent.ToJson()))
+    assert (response.result, response.msg_id, response.sender.agent_id) == ("hello", "m1", "agent1")
@@ -0,0 +1,62 @@
+# test_dedup_cache.py tests the cache of received request ids
+
+import threading
+import time
+
+from prompits.DedupCache import DedupCache
+
+
+def test_duplicate_gets_the_response_of_the_first_request():
+    cache = DedupCache()
+    future, new = cache.Begin("m1")
+    assert new
+    duplicate, new = cache.Begin("m1")
+    assert not new
+    assert duplicate is future
+    assert cache.Complete("m1", "response")
+    assert duplicate.result(timeout=0) == "response"
+    assert cache.Begin("m1")[0].result(timeout=0) == "response"
+    assert cache.Stats()["hits"] == 2
+    assert cache.Stats()["misses"] == 1
+
+
+def test_duplicate_waits_for_a_running_request():
+    cache = DedupCache()
+    cache.Begin("m1")
+    duplicate, _ = cache.Begin("m1")
+    assert not duplicate.done()
+    threading.Timer(0.05, cache.Complete, args=("m1", "late")).start()
+    assert duplicate.result(timeout=2) == "late"
+
+
+def test_failures_are_forgotten_so_a_retry_executes_again():
+    cache = DedupCache()
+    future, _ = cache.Begin("m1")
+    assert cache.Complete("m1", "failed", keep=False)
+    assert future.result(timeout=0) == "failed"
+    assert cache.Get("m1") is None
+    assert cache.Begin("m1")[1]
+
+
+def test_complete_of_an_unknown_request():
+    assert not DedupCache().Complete("unknown", "response")
+
+
+def test_entries_expire_after_ttl():
+    cache = DedupCache(ttl=0.05)
+    cache.Begin("m1")
+    time.sleep(0.1)
+    assert cache.Get("m1") is None
+    assert cache.Begin("m1")[1]
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = DedupCache(max_entries=2)
+    cache.Begin("m1")
+    cache.Begin("m2")
+    cache.Begin("m1")
+    cache.Begin("m3")
+    assert len(cache) == 2
+    assert cache.Get("m2") is None
+    assert cache.Get("m1") is not None
+    assert cache.Stats()["evictions"] == 1
@@ -0,0 +1,120 @@
+# test_execute_practice.py tests the ExecutePractice RPC of gRPCPlug in this process
+
+import threading
+import time
+
+import pytest
+
+from prompits import Deadline
+from prompits.DedupCache import DedupCache
+from prompits.plugs.gRPCPlug import gRPCPlug
+
+
+class PracticeAgent:
+    """
+    Agent serving the practices of the tests, counting their executions.
+    """
+
+    agent_id = "agent1"
+    name = "Agent1"
+    description = ""
+
+    def __init__(self):
+        self.dedup_cache = DedupCache()
+        self.practices = {}
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def UsePractice(self, practice_name, **kwargs):
+        with self.lock:
+            self.calls.append(practice_name)
+        if practice_name == "Fail":
+            raise ValueError("failed")
+        if practice_name == "Sleep":
+            time.sleep(kwargs.get("seconds", 0))
+        return {"calls": len(self.calls), "remaining": Deadline.Remaining()}
+
+
+@pytest.fixture
+def agent():
+    return PracticeAgent()
+
+
+@pytest.fixture
+def server(agent):
+    plug = gRPCPlug("server", port=0, is_server=True)
+    plug.set_agent(agent)
+    yield plug
+    plug.stop()
+
+
+@pytest.fixture
+def plug_info(server):
+    return {"host": "localhost", "port": server._port}
+
+
+def test_retried_request_is_executed_once(agent, plug_info):
+    client = gRPCPlug("client")
+    first = client.ExecutePractice("Echo", {"text": "hi"}, plug_info, request_id="r1")
+    retry = client.ExecutePractice("Echo", {"text": "hi"}, plug_info, request_id="r1")
+    assert first["success"]
+    assert retry == first
+    assert agent.calls == ["Echo"]
+    assert client.ExecutePractice("Echo", {"text": "hi"}, plug_info, request_id="r2")["result"]["calls"] == 2
+
+
+def test_concurrent_duplicate_waits_for_the_first_execution(agent, plug_info):
+    client = gRPCPlug("client")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        client.ExecutePractice("Sleep", {"seconds": 0.2}, plug_info, request_id="r1"))) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert agent.calls == ["Sleep"]
+    assert results[0] == results[1]
+
+
+def test_failed_request_is_executed_again_when_retried(agent, plug_info):
+    client = gRPCPlug("client")
+    assert not client.ExecutePractice("Fail", {}, plug_info, request_id="r1")["success"]
+    assert not client.ExecutePractice("Fail", {}, plug_info, request_id="r1")["success"]
+    assert agent.calls == ["Fail", "Fail"]
+
+
+def test_requests_without_id_are_not_deduplicated(agent, plug_info):
+    client = gRPCPlug("client")
+    client.ExecutePractice("Echo", {}, plug_info)
+    client.ExecutePractice("Echo", {}, plug_info)
+    assert agent.calls == ["Echo", "Echo"]
+
+
+def test_practice_runs_within_the_deadline_of_the_call(plug_info):
+    client = gRPCPlug("client")
+    result = client.ExecutePractice("Echo", {}, plug_info, timeout=5)
+    # the grpc-timeout header rounds the deadline up, so the server may see a little more than 5 seconds
+    assert 0 < result["result"]["remaining"] <= 5.1
+
+
+def test_call_fails_once_its_deadline_passes(agent, plug_info):
+    client = gRPCPlug("client")
+    result = client.ExecutePractice("Sleep", {"seconds": 0.5}, plug_info, timeout=0.1)
+    assert not result["success"]
+    # the server gives up at the deadline too, whichever answers first
+    assert result.get("code") == "DEADLINE_EXCEEDED" or "Deadline exceeded" in result["error"]
+
+
+def test_request_expired_while_waiting_for_a_worker_is_not_executed(agent, server, plug_info):
+    client = gRPCPlug("client")
+    busy = server.practice_scheduler.planes["data"].workers
+    threads = [threading.Thread(target=client.ExecutePractice, args=("Sleep", {"seconds": 0.5}, plug_info))
+               for _ in range(busy)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    assert not client.ExecutePractice("Late", {}, plug_info, timeout=0.2)["success"]
+    for thread in threads:
+        thread.join()
+    time.sleep(0.1)
+    assert "Late" not in agent.calls
@@ -0,0 +1,136 @@
+# test_fanout.py tests the concurrent sending of a message to many recipients and its DeliveryReport
+
+import threading
+import time
+
+import pytest
+
+from prompits.Agent import Agent
+from prompits.FanOut import DeliveryReport, FanOut
+from prompits.Message import Message
+
+PLAZA = "plaza"
+
+
+@pytest.fixture
+def fanout():
+    fanout = FanOut(8, "test_fanout")
+    yield fanout
+    fanout.Shutdown()
+
+
+def _send(delays=None, failures=(), errors=()):
+    """Get a send function sleeping per recipient, failing or raising for some of them."""
+    sent = []
+
+    def send(recipient):
+        sent.append(recipient)
+        time.sleep((delays or {}).get(recipient, 0))
+        if recipient in errors:
+            raise ValueError(f"{recipient} is unknown")
+        return recipient not in failures
+    send.sent = sent
+    return send
+
+
+def test_report_of_partial_failures(fanout):
+    report = fanout.Send(_send(failures={"b"}, errors={"c"}), ["a", "b", "c", "d"])
+    assert not report
+    assert report.acks == 2
+    assert sorted(report.delivered) == ["a", "d"]
+    assert sorted(report.failed) == ["b", "c"]
+    assert report.pending == []
+    assert report.errors == {"b": "Not delivered", "c": "c is unknown"}
+    assert report.ToJson() == {"success": False, "acks": 2, "min_acks": 4,
+                               "results": {"a": "delivered", "b": "failed", "c": "failed", "d": "delivered"},
+                               "errors": {"b": "Not delivered", "c": "c is unknown"}}
+
+
+def test_report_is_true_when_every_recipient_acknowledged(fanout):
+    report = fanout.Send(_send(), ["a", "b", "c"])
+    assert report
+    assert report.ToJson()["success"]
+
+
+def test_sends_run_concurrently(fanout):
+    recipients = [f"r{i}" for i in range(8)]
+    start = time.time()
+    report = fanout.Send(_send(delays={r: 0.2 for r in recipients}), recipients)
+    assert report.acks == 8
+    assert time.time() - start < 0.8
+
+
+def test_min_acks_returns_before_slow_recipients(fanout):
+    report = fanout.Send(_send(delays={"slow": 0.5}), ["a", "b", "slow"], min_acks=2)
+    assert report
+    assert report.pending == ["slow"]
+    # the slow send completes in the background and updates the report
+    assert report.Wait(5, all_recipients=True)
+    assert report.acks == 3
+
+
+def test_min_acks_fails_once_too_many_recipients_failed(fanout):
+    report = fanout.Send(_send(failures={"a", "b"}), ["a", "b", "c"], min_acks=2)
+    assert report.complete
+    assert not report
+
+
+def test_timeout_returns_the_report_with_pending_recipients(fanout):
+    report = fanout.Send(_send(delays={"slow": 0.5}), ["a", "slow"], timeout=0.1)
+    assert not report
+    assert report.delivered == ["a"]
+    assert report.pending == ["slow"]
+
+
+def test_recipient_listed_twice_is_sent_to_once(fanout):
+    send = _send()
+    report = fanout.Send(send, ["a", "b", "a"])
+    assert sorted(send.sent) == ["a", "b"]
+    assert report.recipients == ["a", "b"]
+
+
+def test_single_recipient_is_sent_to_on_the_calling_thread(fanout):
+    threads = []
+    report = fanout.Send(lambda recipient: threads.append(threading.current_thread()) or True, ["a"])
+    assert report
+    assert threads == [threading.current_thread()]
+
+
+def test_min_acks_above_the_number_of_recipients_waits_for_all():
+    report = DeliveryReport(["a", "b"], min_acks=5)
+    assert report.min_acks == 2
+    report.Record("a", True)
+    assert not report
+    report.Record("b", True)
+    assert report
+
+
+@pytest.fixture
+def sender():
+    agent = Agent("sender")
+    agent.start()
+    yield agent
+    agent.stop()
+
+
+@pytest.fixture
+def receiver():
+    agent = Agent("receiver")
+    agent.start()
+    yield agent
+    agent.stop()
+
+
+def test_agent_reports_the_result_per_recipient(sender, receiver):
+    local = f"{receiver.agent_id}@{PLAZA}"
+    unknown = f"unknown@{PLAZA}"
+    message = Message("Note", {"text": "hello"}, f"{sender.agent_id}@{PLAZA}", [local, unknown], msg_id="n1")
+    report = sender.SendMessage(message, [local, unknown])
+    assert not report
+    assert report.delivered == [local]
+    assert report.failed == [unknown]
+    assert "not found" in report.errors[unknown]
+    received = [m for m in receiver.ReceiveMessage() if m is not None]
+    assert [m["content"]["msg_id"] for m in received] == ["n1"]
+    # the message needed one acknowledgement only
+    assert sender.SendMessage(message, [local, unknown], min_acks=1)
@@ -0,0 +1,38 @@
+# test_grpc_plug.py tests gRPCPlug between a server and a client plug in this process
+
+import pytest
+
+from prompits.AgentAddress import AgentAddress
+from prompits.Message import Message, PriorityOf, PRIORITY_HIGH, PRIORITY_NORMAL
+from prompits.messages.UsePracticeMessage import UsePracticeRequest
+from prompits.plugs.gRPCPlug import gRPCPlug
+
+ADDRESS = AgentAddress("agent1", "plaza")
+
+
+@pytest.fixture
+def server():
+    plug = gRPCPlug("server", port=0, is_server=True, high_water_mark=2)
+    yield plug
+    plug.stop()
+
+
+def _plug_info(server, **options):
+    return {"host": "localhost", "port": server._port, **options}
+
+
+def test_received_messages_are_queued_by_priority(server):
+    client = gRPCPlug("client", streaming=False)
+    info = _plug_info(server, proto_messages=True)
+    assert client.SendMessage(ADDRESS, UsePracticeRequest("Chat", ADDRESS, [ADDRESS], msg_id="r1"), info)
+    assert client.SendMessage(ADDRESS, UsePracticeRequest("Chat", ADDRESS, [ADDRESS], msg_id="r2"), info)
+    # the queue is at its high-water mark: normal messages are rejected, high-priority ones accepted
+    assert not client.SendMessage(ADDRESS, UsePracticeRequest("Chat", ADDRESS, [ADDRESS], msg_id="r3"), info)
+    assert client.SendMessage(ADDRESS, Message("Ping", {}, ADDRESS, [ADDRESS], msg_id="p1",
+                                               priority=PRIORITY_HIGH), info)
+    first = server.message_queue.get()
+    assert PriorityOf(first) == PRIORITY_HIGH
+    assert first["content"]["msg_id"] == "p1"
+    second = server.message_queue.get()
+    assert PriorityOf(second) == PRIORITY_NORMAL
+    assert second["content"]["msg_id"] == "r1"
@@ -0,0 +1,102 @@
+# test_http_plug.py tests that HTTPPlug keeps connections to a peer alive across messages
+
+import time
+
+import pytest
+
+from prompits.AgentAddress import AgentAddress
+from prompits.Message import Message
+from prompits.plugs.HTTPPlug import HTTPPlug
+
+SENDER = AgentAddress("agent1", "plaza")
+RECIPIENT = AgentAddress("agent2", "plaza")
+
+
+def _message(text, msg_id="n1"):
+    return Message("Note", {"text": text}, SENDER, [RECIPIENT], msg_id=msg_id)
+
+
+def _serve(name, **kwargs):
+    """Start an HTTPPlug server, recording the client address of each message it receives."""
+    plug = HTTPPlug(name, port=0, **kwargs)
+    assert plug.start()
+    plug.connections = []
+    handle = plug.server.routes["POST:message"]
+
+    def record(request):
+        plug.connections.append(request["client_address"])
+        return handle(request)
+    plug.server.routes["POST:message"] = record
+    return plug
+
+
+def _info(plug):
+    return {"host": "localhost", "port": plug.port}
+
+
+@pytest.fixture
+def server():
+    plug = _serve("server")
+    yield plug
+    plug.stop()
+
+
+@pytest.fixture
+def client():
+    plug = HTTPPlug("client", port=0)
+    yield plug
+    plug.stop()
+
+
+def test_messages_reuse_one_connection(server, client):
+    for i in range(5):
+        assert client.SendMessage(RECIPIENT, _message("hello", f"n{i}"), _info(server))
+    assert len(server.connections) == 5
+    assert len(set(server.connections)) == 1
+    received = [server.ReceiveMessage() for _ in range(5)]
+    assert [m["content"]["msg_id"] for m in received] == [f"n{i}" for i in range(5)]
+
+
+def test_one_session_per_peer(client):
+    first, second = _serve("first"), _serve("second")
+    try:
+        client.set_headers({"X-Test": "1"})
+        assert client.SendMessage(RECIPIENT, _message("a"), _info(first))
+        assert client.SendMessage(RECIPIENT, _message("b"), _info(second))
+        assert client.SendMessage(RECIPIENT, _message("c"), _info(first))
+        sessions = {url: session for url, session in client.sessions.items() if url != client._base_url()}
+        assert sorted(sessions) == sorted(f"http://localhost:{p.port}" for p in (first, second))
+        # default headers of the plug apply to the sessions of its peers
+        assert all(session.headers["X-Test"] == "1" for session in sessions.values())
+        assert len(set(first.connections)) == 1
+    finally:
+        first.stop()
+        second.stop()
+
+
+def test_connection_closed_by_the_server_is_reopened(client):
+    server = _serve("idle_server", keep_alive_timeout=0.2)
+    try:
+        assert client.SendMessage(RECIPIENT, _message("before"), _info(server))
+        time.sleep(0.5)
+        assert client.SendMessage(RECIPIENT, _message("after"), _info(server))
+        assert len(set(server.connections)) == 2
+    finally:
+        server.stop()
+
+
+def test_disconnect_closes_pooled_connections(server, client):
+    assert client.SendMessage(RECIPIENT, _message("before"), _info(server))
+    assert client._Disconnect(RECIPIENT, _info(server))
+    assert client.SendMessage(RECIPIENT, _message("after"), _info(server))
+    assert len(set(server.connections)) == 2
+    assert not client._Disconnect(RECIPIENT, {"host": "localhost", "port": 1})
+
+
+def test_busy_peer_rejects_the_message(client):
+    server = _serve("busy_server", high_water_mark=1)
+    try:
+        assert client.SendMessage(RECIPIENT, _message("first"), _info(server))
+        assert not client.SendMessage(RECIPIENT, _message("second"), _info(server))
+    finally:
+        server.stop()
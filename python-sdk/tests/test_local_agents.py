@@ -0,0 +1,126 @@
+# test_local_agents.py tests practice calls between two agents of this process, delivered over loopback
+
+import json
+
+import pytest
+
+from prompits.Agent import Agent
+from prompits.messages.UsePracticeMessage import UsePracticeResponse
+from prompits.plugs.gRPCPlug import gRPCPlug
+
+PLAZA = "plaza"
+
+
+def answer_requests(responder):
+    """
+    Get a message event handler answering the UsePracticeRequests received by the responder,
+    like the handler of examples/create-agent.py.
+    """
+    def handle_message(event_type, message, **kwargs):
+        content = message["content"]
+        if isinstance(content, str):
+            content = json.loads(content)
+        if content["type"] != "UsePracticeRequest":
+            return
+        body = content["body"]
+        result = responder.UsePractice(body["practice_name"], **body["arguments"])
+        response = UsePracticeResponse(body["practice_name"], result, f"{responder.agent_id}@{PLAZA}",
+                                       [content["sender"]], msg_id=content["msg_id"])
+        responder.SendMessage(response, [content["sender"]])
+    return handle_message
+
+
+@pytest.fixture
+def responder():
+    agent = Agent("responder")
+    agent.AddPractice("Add", lambda a, b: a + b)
+    plug = gRPCPlug("responder_grpc", port=0, is_server=True)
+    agent.plugs[plug.name] = plug
+    plug.set_agent(agent)
+    # registered on the network plug, as deployments do
+    plug.register_event_handler('message', answer_requests(agent))
+    agent.start()
+    yield agent
+    agent.stop()
+    plug.stop()
+
+
+@pytest.fixture
+def requester():
+    agent = Agent("requester")
+    agent.start()
+    yield agent
+    agent.stop()
+
+
+def _result(response):
+    return response[0]["content"]["body"]["result"]
+
+
+def _over_grpc(requester, responder):
+    """
+    Make the requester reach the responder through its gRPCPlug, as if it ran in another process.
+    """
+    responder.loopback_plug.stop()
+    plug = responder.plugs["responder_grpc"]
+    requester.peer_directory.Update(PLAZA, [{
+        "agent_id": responder.agent_id,
+        "agent_name": responder.name,
+        "agent_info": {"components": {"plugs": {plug.name: dict(plug.ToJson(), host="localhost")}}}
+    }])
+
+
+@pytest.mark.parametrize("mode", ["direct", "message"])
+def test_practice_between_agents_of_the_process(requester, responder, mode):
+    response = requester.UsePracticeRemote("Add", f"{responder.agent_id}@{PLAZA}", {"a": 2, "b": 3},
+                                           timeout=5, mode=mode)
+    assert isinstance(response, list), response
+    assert isinstance(response[0], dict)
+    assert _result(response) == 5
+
+
+def test_loopback_messages_trigger_message_handlers(requester, responder):
+    received = []
+    responder.loopback_plug.register_event_handler('message', lambda event_type, message: received.append(message))
+    requester.UsePracticeRemote("Add", f"{responder.agent_id}@{PLAZA}", {"a": 1, "b": 1}, timeout=5, mode="message")
+    assert [message["content"]["type"] for message in received] == ["UsePracticeRequest"]
+    assert received[0]["content"]["body"]["arguments"] == {"a": 1, "b": 1}
+
+
+def test_loopback_messages_are_received_as_dicts(requester, responder):
+    other = Agent("receiver")
+    other.start()
+    try:
+        requester.SendMessage(UsePracticeResponse("Add", 2, f"{requester.agent_id}@{PLAZA}",
+                                                  [f"{other.agent_id}@{PLAZA}"], msg_id="m1"),
+                              [f"{other.agent_id}@{PLAZA}"])
+        received = [message for message in other.ReceiveMessage() if message is not None]
+        assert len(received) == 1
+        assert received[0]["content"]["msg_id"] == "m1"
+        assert received[0]["content"]["body"]["result"] == 2
+    finally:
+        other.stop()
+
+
+@pytest.mark.parametrize("transport", ["loopback", "grpc"])
+def test_direct_and_message_mode_return_the_same_response(requester, responder, transport):
+    if transport == "grpc":
+        _over_grpc(requester, responder)
+    address = f"{responder.agent_id}@{PLAZA}"
+    direct = requester.UsePracticeRemote("Add", address, {"a": 2, "b": 3}, timeout=5, mode="direct")
+    message = requester.UsePracticeRemote("Add", address, {"a": 2, "b": 3}, timeout=5, mode="message")
+    assert isinstance(direct, list) and isinstance(message, list), (direct, message)
+    # the direct call did not fall back to messages
+    assert address not in requester.peer_call_modes
+    assert isinstance(direct[0]["content"], dict)
+    assert isinstance(message[0]["content"], dict)
+    assert direct[0]["content"]["type"] == message[0]["content"]["type"] == "UsePracticeResponse"
+    assert direct[0]["content"]["body"] == message[0]["content"]["body"]
+
+
+def test_starting_the_agent_keeps_the_server_of_its_plug(responder):
+    # the server was started with the plug, starting the agent must not start another on its port
+    plug = responder.plugs["responder_grpc"]
+    server = plug.server
+    assert plug.start()
+    assert plug.server is server
@@ -0,0 +1,97 @@
+# test_message_queue.py tests the bounded queue of received messages
+
+import threading
+
+from prompits.Message import PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL
+from prompits.MessageQueue import MessageQueue
+
+
+def test_put_rejects_messages_at_the_high_water_mark():
+    queue = MessageQueue(maxsize=10, high_water_mark=3)
+    assert all(queue.put(i) for i in range(3))
+    assert queue.busy
+    assert not queue.put("rejected")
+    stats = queue.stats()
+    assert stats["depth"] == 3
+    assert stats["accepted"] == 3
+    assert stats["dropped"] == 1
+    assert queue.busy_since is not None
+
+
+def test_forced_messages_are_accepted_up_to_maxsize():
+    queue = MessageQueue(maxsize=4, high_water_mark=2)
+    queue.put(1)
+    queue.put(2)
+    assert queue.put("status", force=True)
+    assert queue.put("status", force=True)
+    assert not queue.put("status", force=True)
+    assert len(queue) == 4
+
+
+def test_get_below_the_high_water_mark_clears_busy():
+    queue = MessageQueue(maxsize=10, high_water_mark=2)
+    queue.put(1)
+    queue.put(2)
+    queue.put(3)
+    assert queue.get() == 1
+    assert not queue.busy
+    assert queue.busy_since is None
+    assert queue.put(3)
+
+
+def test_high_water_mark_is_capped_at_maxsize():
+    assert MessageQueue(maxsize=5, high_water_mark=50).high_water_mark == 5
+    assert MessageQueue(maxsize=5).high_water_mark == 5
+
+
+def test_get_waits_for_a_message():
+    queue = MessageQueue()
+    assert queue.get() is None
+    assert queue.get(timeout=0.01) is None
+    threading.Timer(0.05, queue.put, args=("late",)).start()
+    assert queue.get(timeout=2) == "late"
+
+
+def test_get_serves_higher_priorities_first():
+    queue = MessageQueue()
+    queue.put("low", priority=PRIORITY_LOW)
+    queue.put("normal")
+    queue.put("high", priority=PRIORITY_HIGH)
+    assert [queue.get() for _ in range(3)] == ["high", "normal", "low"]
+    assert queue.stats()["depth_by_priority"] == {"high": 0, "normal": 0, "low": 0}
+
+
+def test_each_lane_is_fifo():
+    queue = MessageQueue()
+    for i in range(3):
+        queue.put(f"n{i}")
+        queue.put(f"h{i}", priority=PRIORITY_HIGH)
+    assert [queue.get() for _ in range(6)] == ["h0", "h1", "h2", "n0", "n1", "n2"]
+
+
+def test_starvation_limit_serves_a_waiting_lower_priority_message():
+    queue = MessageQueue(starvation_limit=2)
+    queue.put("normal")
+    for i in range(5):
+        queue.put(f"h{i}", priority=PRIORITY_HIGH)
+    served = [queue.get() for _ in range(6)]
+    assert served.index("normal") == 2
+    assert queue.stats()["promoted"] == 1
+
+
+def test_unknown_priority_uses_the_normal_lane():
+    queue = MessageQueue()
+    queue.put("odd", priority=7)
+    assert queue.stats()["depth_by_priority"]["normal"] == 1
+
+
+def test_priority_of_messages_and_envelopes():
+    from prompits.AgentAddress import AgentAddress
+    from prompits.Message import Message, PriorityOf
+
+    address = AgentAddress("a1", "plaza")
+    assert PriorityOf(Message("Ping", {}, address, [address], priority=PRIORITY_LOW)) == PRIORITY_LOW
+    assert PriorityOf(Message("StatusMessage", {}, address, [address])) == PRIORITY_HIGH
+    assert PriorityOf({"type": "StatusMessage", "content": "{}"}) == PRIORITY_HIGH
+    assert PriorityOf({"type": "Message", "content": {"type": "Ping", "priority": PRIORITY_LOW}}) == PRIORITY_LOW
+    assert PriorityOf({"type": "Message", "content": "{}"}) == PRIORITY_NORMAL
@@ -0,0 +1,95 @@
+# test_message_stream.py tests the acknowledgements and window of MessageStream between two ends in this process
+
+import threading
+
+import pytest
+
+from prompits.AgentAddress import AgentAddress
+from prompits.messages.UsePracticeMessage import UsePracticeRequest
+from prompits.plugs.MessageStream import MessageStream, SEND_ACKED, SEND_BUSY, SEND_CLOSED, SEND_TIMEOUT
+from prompits.plugs.gRPCPlug import gRPCPlug
+from prompits.plugs.protos import agent_pb2
+
+ADDRESS = AgentAddress("agent1", "plaza")
+
+
+def _connect(on_message, window=4):
+    """
+    Connect a sender to a receiver handling messages with on_message, each end reading the frames of the other.
+    """
+    sender = MessageStream("receiver", lambda message: None, local_id="sender")
+    receiver = MessageStream("sender", on_message, local_id="receiver", window=window)
+    for end, other in ((sender, receiver), (receiver, sender)):
+        threading.Thread(target=end.read, args=(other.outgoing(),), daemon=True).start()
+    assert sender.wait_open(5)
+    return sender, receiver
+
+
+def _message(msg_id="m1"):
+    return agent_pb2.Message(type="Ping", content="{}", id=msg_id)
+
+
+@pytest.fixture
+def release():
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def test_message_is_acked_once_handled():
+    received = []
+    sender, receiver = _connect(received.append)
+    assert sender.send_status(_message(), timeout=5) == SEND_ACKED
+    assert [message.id for message in received] == ["m1"]
+    assert sender.stats()["in_flight"] == 0
+    sender.close()
+
+
+def test_rejected_message_is_acked_busy():
+    sender, receiver = _connect(lambda message: False)
+    assert sender.send_status(_message(), timeout=5) == SEND_BUSY
+    assert not sender.send(_message("m2"), timeout=5)
+    assert sender.stats()["busy"] == 2
+    sender.close()
+
+
+def test_message_not_acked_in_time_times_out(release):
+    sender, receiver = _connect(lambda message: release.wait(5) and message.id != "m1")
+    assert sender.send_status(_message(), timeout=0.2) == SEND_TIMEOUT
+    release.set()
+    # the late ack of the abandoned message is not taken for the next one
+    assert sender.send_status(_message("m2"), timeout=5) == SEND_ACKED
+    sender.close()
+
+
+def test_sender_waits_for_room_in_the_window(release):
+    sender, receiver = _connect(lambda message: release.wait(5), window=1)
+    first = []
+    threading.Thread(target=lambda: first.append(sender.send_status(_message(), timeout=5)), daemon=True).start()
+    assert sender.send_status(_message("m2"), timeout=0.3) == SEND_TIMEOUT
+    assert sender.stats()["sent"] == 1
+    release.set()
+    assert sender.send_status(_message("m3"), timeout=5) == SEND_ACKED
+    assert first == [SEND_ACKED]
+    sender.close()
+
+
+def test_stream_closed_before_the_ack_fails_the_send(release):
+    sender, receiver = _connect(lambda message: release.wait(5))
+    threading.Timer(0.2, sender.close).start()
+    assert sender.send_status(_message(), timeout=5) == SEND_CLOSED
+    assert sender.send_status(_message("m2"), timeout=5) == SEND_CLOSED
+
+
+def test_plug_reports_a_message_rejected_on_the_stream():
+    server = gRPCPlug("server", port=0, is_server=True, high_water_mark=1)
+    try:
+        client = gRPCPlug("client")
+        info = {"host": "localhost", "port": server._port, "proto_messages": True, "streaming": True}
+        assert client.SendMessage(ADDRESS, UsePracticeRequest("Chat", ADDRESS, [ADDRESS], msg_id="r1"), info)
+        assert client.outbound_streams
+        assert not client.SendMessage(ADDRESS, UsePracticeRequest("Chat", ADDRESS, [ADDRESS], msg_id="r2"), info)
+        assert next(iter(client.outbound_streams.values())).stats()["busy"] == 1
+        assert len(server.message_queue) == 1
+    finally:
+        server.stop()
@@ -0,0 +1,172 @@
+# test_peer_directory.py tests the TTL cache of peer advertisements, its expiry, reloads and invalidation
+
+import threading
+import time
+
+import pytest
+
+from prompits.PeerDirectory import PeerDirectory
+
+PLAZA = "plaza"
+
+
+class FakePlaza:
+    """
+    Listing of the active agents of plazas, counting the loads.
+    """
+
+    def __init__(self):
+        self.agents = {PLAZA: [self.Agent("a1", "Alice"), self.Agent("b1", "Bob")]}
+        self.loads = []
+        self.delay = 0
+        self.error = None
+
+    @staticmethod
+    def Agent(agent_id, agent_name, version=1):
+        return {"agent_id": agent_id, "agent_name": agent_name, "agent_info": {"version": version}}
+
+    def List(self, plaza_name):
+        self.loads.append(plaza_name)
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return [dict(agent) for agent in self.agents.get(plaza_name, [])]
+
+
+@pytest.fixture
+def plaza():
+    return FakePlaza()
+
+
+@pytest.fixture
+def directory(plaza):
+    directory = PeerDirectory(plaza.List, ttl=0.2, negative_ttl=0.2)
+    yield directory
+    directory.Stop()
+
+
+def test_miss_loads_the_plaza_once(directory, plaza):
+    assert directory.Lookup(f"a1@{PLAZA}")["agent_name"] == "Alice"
+    # the listing answers lookups by id and by name of every agent of the plaza
+    assert directory.Lookup(f"Bob@{PLAZA}")["agent_id"] == "b1"
+    assert directory.Lookup(f"b1@{PLAZA}") is directory.Lookup(f"Bob@{PLAZA}")
+    assert plaza.loads == [PLAZA]
+    assert directory.Stats()["misses"] == 1 and directory.Stats()["hits"] == 3
+
+
+def test_unknown_peer_is_remembered_for_negative_ttl(directory, plaza):
+    assert directory.Lookup(f"a1@{PLAZA}") is not None
+    assert directory.Lookup(f"nobody@{PLAZA}") is None
+    assert directory.Lookup(f"nobody@{PLAZA}") is None
+    assert plaza.loads == [PLAZA]
+    assert directory.negative_hits == 1
+    time.sleep(0.25)
+    plaza.agents[PLAZA].append(FakePlaza.Agent("n1", "nobody"))
+    assert directory.Lookup(f"nobody@{PLAZA}")["agent_id"] == "n1"
+    assert len(plaza.loads) == 2
+
+
+def test_expired_entry_is_served_and_reloaded(directory, plaza):
+    directory.Lookup(f"a1@{PLAZA}")
+    plaza.agents[PLAZA][0] = FakePlaza.Agent("a1", "Alice", version=2)
+    assert directory.Lookup(f"a1@{PLAZA}")["agent_info"]["version"] == 1
+    time.sleep(0.25)
+    # without the background thread the caller reloads the plaza itself
+    assert directory.Lookup(f"a1@{PLAZA}") is not None
+    assert directory.stale_hits == 1
+    assert len(plaza.loads) == 2
+    assert directory.Lookup(f"a1@{PLAZA}")["agent_info"]["version"] == 2
+    assert directory.hits == 2
+
+
+def test_expired_entry_is_reloaded_in_the_background(plaza):
+    directory = PeerDirectory(plaza.List, ttl=0.1, negative_ttl=0.1, refresh_interval=10)
+    directory.Start()
+    try:
+        directory.Lookup(f"a1@{PLAZA}")
+        plaza.agents[PLAZA][0] = FakePlaza.Agent("a1", "Alice", version=2)
+        plaza.delay = 0.2
+        time.sleep(0.15)
+        start = time.time()
+        assert directory.Lookup(f"a1@{PLAZA}")["agent_info"]["version"] == 1
+        # the lookup did not wait for the reload
+        assert time.time() - start < 0.1
+        deadline = time.time() + 5
+        while directory.Get(f"a1@{PLAZA}")["agent_info"]["version"] != 2 and time.time() < deadline:
+            time.sleep(0.05)
+        assert directory.Get(f"a1@{PLAZA}")["agent_info"]["version"] == 2
+    finally:
+        directory.Stop()
+
+
+def test_agent_gone_from_the_plaza_is_removed_on_reload(directory, plaza):
+    directory.Lookup(f"a1@{PLAZA}")
+    plaza.agents[PLAZA] = [FakePlaza.Agent("b1", "Bob")]
+    directory.Refresh(PLAZA)
+    assert f"a1@{PLAZA}" not in directory
+    assert f"Alice@{PLAZA}" not in directory
+    assert directory.Lookup(f"a1@{PLAZA}") is None
+
+
+def test_invalidated_peer_reloads_its_plaza(directory, plaza):
+    directory.Lookup(f"a1@{PLAZA}")
+    directory.Invalidate(f"a1@{PLAZA}")
+    assert directory.Get(f"a1@{PLAZA}") is None
+    # the other peers of the plaza stay cached
+    assert directory.Get(f"b1@{PLAZA}") is not None
+    assert directory.Lookup(f"a1@{PLAZA}") is not None
+    assert len(plaza.loads) == 2
+
+
+def test_invalidate_all_forgets_every_peer(directory, plaza):
+    directory.Lookup(f"a1@{PLAZA}")
+    directory.Lookup(f"nobody@{PLAZA}")
+    directory.Invalidate()
+    assert len(directory) == 0
+    assert directory.Stats()["unknown"] == 0
+    assert directory.Lookup(f"b1@{PLAZA}") is not None
+    assert len(plaza.loads) == 2
+
+
+def test_concurrent_misses_load_the_plaza_once(directory, plaza):
+    plaza.delay = 0.2
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(directory.Lookup(f"a1@{PLAZA}"))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert plaza.loads == [PLAZA]
+    assert all(result["agent_id"] == "a1" for result in results)
+
+
+def test_failed_load_is_not_cached(directory, plaza):
+    plaza.error = ConnectionError("plaza down")
+    assert not directory.Refresh(PLAZA)
+    assert directory.load_errors == 1
+    plaza.error = None
+    assert directory.Lookup(f"a1@{PLAZA}") is not None
+
+
+def test_membership_changes_are_applied(directory, plaza):
+    directory.Lookup(f"a1@{PLAZA}")
+    directory.Apply({"plaza": PLAZA, "events": [
+        {"event": "join", "agent_id": "c1", "agent_name": "Carol", "agent": FakePlaza.Agent("c1", "Carol")},
+        {"event": "leave", "agent_id": "b1", "agent_name": "Bob"}]})
+    assert directory.Get(f"Carol@{PLAZA}")["agent_id"] == "c1"
+    assert directory.Get(f"b1@{PLAZA}") is None
+    assert plaza.loads == [PLAZA]
+    # a followed plaza stays fresh past the ttl of its last load
+    time.sleep(0.15)
+    directory.Apply({"plaza": PLAZA, "events": []})
+    time.sleep(0.1)
+    assert directory.Lookup(f"a1@{PLAZA}") is not None
+    assert directory.stale_hits == 0
+
+
+def test_reset_or_unknown_plaza_reloads_it(directory, plaza):
+    directory.Apply({"plaza": PLAZA, "events": [{"event": "leave", "agent_id": "a1"}]})
+    assert plaza.loads == [PLAZA]
+    assert directory.Get(f"a1@{PLAZA}") is not None
+    directory.Apply({"plaza": PLAZA, "reset": True})
+    assert plaza.loads == [PLAZA, PLAZA]
@@ -0,0 +1,129 @@
+# test_peer_health.py tests the retries and circuit breakers of calls to peers
+
+import asyncio
+import time
+
+import pytest
+
+from prompits.PeerHealth import CircuitBreaker, PeerHealth, PeerUnavailableError, RetryPolicy
+
+PEER = "agent2@plaza"
+
+
+def _health(max_attempts=1, failure_threshold=2, reset_timeout=0.05):
+    return PeerHealth(RetryPolicy(max_attempts=max_attempts, base_delay=0.001), failure_threshold, reset_timeout)
+
+
+def test_circuit_opens_after_consecutive_failures():
+    health = _health()
+    for _ in range(2):
+        assert health.Call(PEER, lambda: False) is False
+    assert health.State(PEER) == CircuitBreaker.OPEN
+    assert not health.IsAvailable(PEER)
+    assert health.Stats()["unavailable"] == [PEER]
+    with pytest.raises(PeerUnavailableError):
+        health.Call(PEER, lambda: True)
+
+
+def test_success_resets_the_consecutive_failures():
+    health = _health()
+    health.Call(PEER, lambda: False)
+    health.Call(PEER, lambda: True)
+    health.Call(PEER, lambda: False)
+    assert health.State(PEER) == CircuitBreaker.CLOSED
+
+
+def test_probe_after_reset_timeout_closes_or_reopens_the_circuit():
+    health = _health()
+    for _ in range(2):
+        health.Call(PEER, lambda: False)
+    time.sleep(0.06)
+    assert health.IsAvailable(PEER)
+    assert health.Call(PEER, lambda: False) is False
+    assert health.State(PEER) == CircuitBreaker.OPEN
+    time.sleep(0.06)
+    assert health.Call(PEER, lambda: "ok") == "ok"
+    assert health.State(PEER) == CircuitBreaker.CLOSED
+
+
+def test_half_open_circuit_lets_one_probe_through():
+    breaker = CircuitBreaker(PEER, failure_threshold=1, reset_timeout=0)
+    breaker.RecordFailure()
+    assert breaker.Allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.Allow()
+    breaker.Release()
+    assert breaker.Allow()
+
+
+def test_failed_attempts_are_retried():
+    health = _health(max_attempts=3, failure_threshold=5)
+    results = iter([False, False, "ok"])
+    assert health.Call(PEER, lambda: next(results)) == "ok"
+    assert health.Breaker(PEER).total_failures == 2
+
+
+def test_unretryable_failure_is_not_retried():
+    health = _health(max_attempts=3, failure_threshold=5)
+    calls = []
+    health.Call(PEER, lambda: calls.append(1), retryable=lambda result: False)
+    assert len(calls) == 1
+
+
+def test_busy_replies_are_retried_without_counting_as_failures():
+    health = _health(max_attempts=3, failure_threshold=1)
+    calls = []
+
+    def busy_call():
+        calls.append(1)
+        return {"code": "RESOURCE_EXHAUSTED"}
+
+    result = health.Call(PEER, busy_call, failed=lambda result: "code" in result,
+                         busy=lambda result: result.get("code") == "RESOURCE_EXHAUSTED")
+    assert result == {"code": "RESOURCE_EXHAUSTED"}
+    assert len(calls) == 3
+    assert health.State(PEER) == CircuitBreaker.CLOSED
+    assert health.Breaker(PEER).total_failures == 0
+
+
+def test_exceptions_are_raised_without_counting_as_failures():
+    health = _health()
+
+    def unknown_peer():
+        raise KeyError(PEER)
+
+    for _ in range(3):
+        with pytest.raises(KeyError):
+            health.Call(PEER, unknown_peer)
+    assert health.State(PEER) == CircuitBreaker.CLOSED
+
+
+def test_no_retry_past_the_deadline():
+    health = PeerHealth(RetryPolicy(max_attempts=5, base_delay=1, max_delay=1), failure_threshold=10)
+    calls = []
+    health.Call(PEER, lambda: calls.append(1), deadline=time.time())
+    assert len(calls) == 1
+
+
+def test_call_async_opens_the_circuit():
+    health = _health()
+
+    async def failing():
+        return False
+
+    async def run():
+        for _ in range(2):
+            await health.CallAsync(PEER, failing)
+        with pytest.raises(PeerUnavailableError):
+            await health.CallAsync(PEER, failing)
+
+    asyncio.run(run())
+    assert health.State(PEER) == CircuitBreaker.OPEN
+
+
+def test_reset_forgets_the_failures():
+    health = _health()
+    for _ in range(2):
+        health.Call(PEER, lambda: False)
+    health.Reset(PEER)
+    assert health.State(PEER) == CircuitBreaker.CLOSED
@@ -0,0 +1,104 @@
+# test_pending_requests.py tests how Agent.receive_message completes the requests UsePracticeRemote waits for
+
+import threading
+
+import pytest
+
+from prompits.Agent import Agent
+from prompits.messages.UsePracticeMessage import UsePracticeResponse
+
+PLAZA = "plaza"
+PEER = f"peer@{PLAZA}"
+
+
+@pytest.fixture
+def agent():
+    agent = Agent("requester")
+    yield agent
+    agent.stop()
+
+
+def _response(request, result):
+    """The dict a plug delivers for the response to a request."""
+    response = UsePracticeResponse(request.body["practice_name"], result, PEER, [request.sender], msg_id=request.msg_id)
+    return {"type": "Message", "content": response.ToJson()}
+
+
+def _send_with(agent, reply):
+    """Replace the sending of the agent, calling reply with each request sent on another thread."""
+    sent = []
+
+    def send_message(message, recipients):
+        sent.append(message)
+        threading.Thread(target=reply, args=(message,)).start()
+        return True
+
+    agent.SendMessage = send_message
+    return sent
+
+
+def _call(agent, timeout=2):
+    return agent.UsePracticeRemote("Add", PEER, {"a": 1, "b": 2}, timeout=timeout, mode="message")
+
+
+def test_response_completes_the_pending_request(agent):
+    answered = []
+    _send_with(agent, lambda request: answered.append(agent.receive_message(_response(request, 3))))
+    result = _call(agent)
+    assert isinstance(result, list), result
+    assert result[0]["content"]["body"]["result"] == 3
+    assert answered == [True]
+    assert agent.pending_requests == {}
+
+
+def test_timeout_removes_the_pending_request(agent):
+    sent = _send_with(agent, lambda request: None)
+    result = _call(agent, timeout=0.2)
+    assert "No response" in result["error"]
+    assert agent.pending_requests == {}
+    # the response arriving after the caller gave up answers nothing
+    assert agent.receive_message(_response(sent[0], 3)) is False
+
+
+def test_failed_send_removes_the_pending_request(agent):
+    agent.SendMessage = lambda message, recipients: False
+    result = _call(agent)
+    assert "Failed to send" in result["error"]
+    assert agent.pending_requests == {}
+
+
+def test_duplicate_response_is_not_consumed(agent):
+    answered = []
+
+    def reply_twice(request):
+        answered.append(agent.receive_message(_response(request, 3)))
+        answered.append(agent.receive_message(_response(request, 4)))
+
+    _send_with(agent, reply_twice)
+    result = _call(agent)
+    assert result[0]["content"]["body"]["result"] == 3
+    assert answered == [True, False]
+
+
+def test_responses_complete_their_own_requests(agent):
+    # each request is answered after the next one was sent, in reverse order
+    requests = []
+    both_sent = threading.Event()
+
+    def reply(request):
+        requests.append(request)
+        if len(requests) == 2:
+            both_sent.set()
+        both_sent.wait(2)
+        agent.receive_message(_response(request, request.body["arguments"]["a"]))
+
+    _send_with(agent, reply)
+    results = {}
+    threads = [threading.Thread(target=lambda a=a: results.__setitem__(
+        a, agent.UsePracticeRemote("Add", PEER, {"a": a, "b": 0}, timeout=2, mode="message"))) for a in (1, 2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert {a: result[0]["content"]["body"]["result"] for a, result in results.items()} == {1: 1, 2: 2}
+    assert agent.pending_requests == {}
@@ -0,0 +1,96 @@
+# test_practice_scheduler.py tests the executors and concurrency limits of practices
+
+import threading
+import time
+
+import pytest
+
+from prompits.plugs.PracticeScheduler import CONTROL, DATA, PracticeBusyError, PracticeScheduler
+
+
+@pytest.fixture
+def release():
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def _scheduler(**kwargs):
+    return PracticeScheduler("test", **kwargs)
+
+
+def _wait_idle(scheduler, timeout=2):
+    # calls are released by a done callback, which may run after result() returned
+    deadline = time.time() + timeout
+    while scheduler.ToJson()["data"]["active"] and time.time() < deadline:
+        time.sleep(0.01)
+    assert scheduler.ToJson()["data"]["active"] == 0
+
+
+def test_practices_are_split_in_planes():
+    scheduler = _scheduler()
+    assert scheduler.Plane("Heartbeat") == CONTROL
+    assert scheduler.Plane("agent/ListPractices") == CONTROL
+    assert scheduler.Plane("ollama/Chat") == DATA
+
+
+def test_data_calls_wait_for_a_worker_by_default(release):
+    scheduler = _scheduler(data_workers=1)
+    running = scheduler.Submit("Chat", release.wait)
+    waiting = [scheduler.Submit("Chat", lambda: "done") for _ in range(5)]
+    assert scheduler.ToJson()["data"]["waiting"] == 5
+    release.set()
+    assert running.result(timeout=2)
+    assert [future.result(timeout=2) for future in waiting] == ["done"] * 5
+    scheduler.Shutdown()
+
+
+def test_data_calls_beyond_the_queue_are_rejected_as_busy(release):
+    scheduler = _scheduler(data_workers=1, data_queue=1)
+    futures = [scheduler.Submit("Chat", release.wait) for _ in range(2)]
+    with pytest.raises(PracticeBusyError):
+        scheduler.Submit("Chat", release.wait)
+    # control-plane practices are not held up by the data plane
+    assert scheduler.Submit("Heartbeat", lambda: "alive").result(timeout=2) == "alive"
+    assert scheduler.ToJson()["data"]["rejected"] == 1
+    release.set()
+    for future in futures:
+        future.result(timeout=2)
+    _wait_idle(scheduler)
+    assert scheduler.Submit("Chat", lambda: "again").result(timeout=2) == "again"
+    scheduler.Shutdown()
+
+
+def test_practice_limit_applies_to_the_practice_in_any_pit(release):
+    scheduler = _scheduler(data_workers=4, practice_limits={"Chat": 1})
+    running = scheduler.Submit("ollama/Chat", release.wait)
+    with pytest.raises(PracticeBusyError):
+        scheduler.Submit("openai/Chat", release.wait)
+    assert scheduler.Submit("Embed", lambda: "other").result(timeout=2) == "other"
+    assert scheduler.ToJson()["practice_limits"]["Chat"]["rejected"] == 1
+    release.set()
+    running.result(timeout=2)
+    _wait_idle(scheduler)
+    assert scheduler.Submit("ollama/Chat", lambda: "free").result(timeout=2) == "free"
+    scheduler.Shutdown()
+
+
+def test_failed_calls_release_their_slot():
+    scheduler = _scheduler(data_workers=1, data_queue=0, practice_limits={"Fail": 1})
+
+    def fail():
+        raise ValueError("failed")
+
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            scheduler.Submit("Fail", fail).result(timeout=2)
+        _wait_idle(scheduler)
+    scheduler.Shutdown()
+
+
+def test_slot_counts_calls_run_by_the_caller():
+    scheduler = _scheduler(data_workers=1, data_queue=0)
+    with scheduler.Slot("Chat"):
+        with pytest.raises(PracticeBusyError):
+            scheduler.Submit("Chat", lambda: None)
+    assert scheduler.ToJson()["data"]["completed"] == 1
@@ -0,0 +1,117 @@
+# test_proto_codec.py tests the typed protobuf form of messages and its use on the gRPC path
+
+import json
+import time
+
+import pytest
+
+from prompits.AgentAddress import AgentAddress
+from prompits.Message import Attachment, Message, PRIORITY_LOW
+from prompits.messages.UsePracticeMessage import UsePracticeRequest, UsePracticeResponse
+from prompits.plugs.ProtoCodec import ProtoCodec
+from prompits.plugs.gRPCPlug import gRPCPlug
+
+SENDER = AgentAddress("agent1", "plaza")
+RECIPIENT = AgentAddress("agent2", "plaza")
+
+ARGUMENTS = {"prompt": "hi", "n": 3, "temperature": 0.5, "stream": False, "stop": None,
+             "messages": [{"role": "user", "content": "hi"}], "tags": ["a", 1]}
+
+
+def _receive(plug, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        message = plug.ReceiveMessage(timeout=0.1)
+        if message is not None:
+            return message
+    return None
+
+
+def test_request_round_trip():
+    request = UsePracticeRequest("Chat", SENDER, [RECIPIENT], ARGUMENTS, msg_id="r1",
+                                 deadline=1700000000.25, priority=PRIORITY_LOW)
+    pb = request.ToProto()
+    assert pb.WhichOneof('body') == 'use_practice_request'
+    decoded = Message.FromProto(pb)
+    assert decoded.type == "UsePracticeRequest"
+    assert decoded.body == {"practice_name": "Chat", "arguments": ARGUMENTS, "deadline": 1700000000.25}
+    assert (decoded.sender.agent_id, [r.agent_id for r in decoded.recipients]) == ("agent1", ["agent2"])
+    assert decoded.msg_id == "r1"
+    assert decoded.priority == PRIORITY_LOW
+    assert decoded.timestamp == request.timestamp
+
+
+def test_response_round_trip():
+    response = UsePracticeResponse("Chat", {"text": "hello", "tokens": 12}, SENDER, [RECIPIENT], msg_id="r1")
+    json_data = ProtoCodec.Decode(response.ToProto())
+    assert json_data["body"] == {"practice_name": "Chat", "result": {"text": "hello", "tokens": 12}, "error": None}
+    assert json_data["sender"] == "agent1@plaza"
+    assert json_data["recipients"] == ["agent2@plaza"]
+    failed = UsePracticeResponse("Chat", None, SENDER, [RECIPIENT], error="boom")
+    assert ProtoCodec.Decode(failed.ToProto())["body"] == {"practice_name": "Chat", "result": None, "error": "boom"}
+
+
+def test_generic_body_and_attachments_round_trip():
+    message = Message("Note", {"text": "x", "count": 2}, SENDER, [RECIPIENT], msg_id="n1", attachments=[
+        Attachment("image.png", "image/png", data=b"\x89PNG\x00"),
+        Attachment("meta.json", "application/json", data={"width": 2})])
+    decoded = Message.FromProto(message.ToProto())
+    assert decoded.body == {"text": "x", "count": 2}
+    assert [(a.name, a.content_type, a.data) for a in decoded.attachments] == [
+        ("image.png", "image/png", b"\x89PNG\x00"), ("meta.json", "application/json", {"width": 2})]
+
+
+def test_integers_decode_as_int_and_floats_as_float():
+    decoded = ProtoCodec.Decode(Message("Note", {"i": 2, "f": 2.5, "big": 2 ** 53}, SENDER, [RECIPIENT]).ToProto())
+    assert decoded["body"] == {"i": 2, "f": 2.5, "big": 2 ** 53}
+    assert isinstance(decoded["body"]["i"], int)
+
+
+@pytest.mark.parametrize("body, error", [
+    ({"big": 2 ** 53 + 1}, ValueError),
+    ({"when": object()}, TypeError),
+    ({1: "not a string key"}, TypeError),
+    ("not a dict", TypeError),
+])
+def test_unrepresentable_messages_raise(body, error):
+    with pytest.raises(error):
+        Message("Note", body, SENDER, [RECIPIENT]).ToProto()
+
+
+@pytest.fixture
+def server():
+    plug = gRPCPlug("server", port=0, is_server=True)
+    yield plug
+    plug.stop()
+
+
+@pytest.fixture
+def client():
+    plug = gRPCPlug("client", streaming=False)
+    yield plug
+    plug.stop()
+
+
+def test_proto_peer_receives_the_message_dictionary(server, client):
+    request = UsePracticeRequest("Chat", SENDER, [RECIPIENT], ARGUMENTS, msg_id="r1")
+    msg, _ = client._BuildMessage(request, {"proto_messages": True})
+    assert msg.HasField('payload') and not msg.content
+    assert client.SendMessage(RECIPIENT, request, {"host": "localhost", "port": server._port, "proto_messages": True})
+    received = _receive(server)
+    assert received["content"]["body"]["arguments"] == ARGUMENTS
+    assert received["content"]["msg_id"] == "r1"
+
+
+def test_unrepresentable_message_falls_back_to_json(server, client):
+    message = Message("Note", {"big": 2 ** 60}, SENDER, [RECIPIENT], msg_id="n1")
+    msg, _ = client._BuildMessage(message, {"proto_messages": True})
+    assert not msg.HasField('payload') and msg.content
+    assert client.SendMessage(RECIPIENT, message, {"host": "localhost", "port": server._port, "proto_messages": True})
+    received = _receive(server)
+    # messages sent as JSON are delivered with the JSON string as content
+    assert json.loads(received["content"])["body"] == {"big": 2 ** 60}
+
+
+def test_peer_without_proto_messages_gets_json(client):
+    msg, _ = client._BuildMessage(UsePracticeRequest("Chat", SENDER, [RECIPIENT], ARGUMENTS), {})
+    assert not msg.HasField('payload') and msg.content
@@ -0,0 +1,176 @@
+# test_shared_memory_plug.py tests ShmRing and the delivery, busy handling and handlers of SharedMemoryPlug
+
+import multiprocessing
+import threading
+import time
+import uuid
+
+import pytest
+
+from prompits.AgentAddress import AgentAddress
+from prompits.Message import Message
+from prompits.plugs.SharedMemoryPlug import SharedMemoryPlug
+from prompits.plugs.ShmRing import ShmRing
+
+ADDRESS = AgentAddress("agent1", "plaza")
+
+
+@pytest.fixture
+def ring():
+    ring = ShmRing.Create(f"pmt{uuid.uuid4().hex[:12]}", 64)
+    consumer = ShmRing.Attach(ring.name)
+    yield ring, consumer
+    consumer.Close()
+    ring.Close(unlink=True)
+
+
+@pytest.fixture
+def receiver():
+    plug = SharedMemoryPlug("receiver", scan_interval=0.01)
+    plug.start()
+    yield plug
+    plug.stop()
+
+
+@pytest.fixture
+def sender():
+    plug = SharedMemoryPlug("sender", ring_size=64 * 1024, send_timeout=0.2)
+    yield plug
+    plug.stop()
+
+
+def _message(msg_id):
+    return Message("Ping", {"n": msg_id}, ADDRESS, [ADDRESS], msg_id=msg_id)
+
+
+def _receive(plug, count, timeout=5):
+    received = []
+    deadline = time.time() + timeout
+    while len(received) < count and time.time() < deadline:
+        message = plug.ReceiveMessage(timeout=0.1)
+        if message is not None:
+            received.append(message)
+    return received
+
+
+def _msg_ids(messages):
+    return [message["content"]["msg_id"] for message in messages]
+
+
+def test_ring_wraps_around(ring):
+    producer, consumer = ring
+    # 20 byte records do not divide the 64 byte ring, they end up split across its end
+    for i in range(50):
+        record = f"record{i:04d}-".encode() + bytes([i]) * 8
+        assert producer.Put(record)
+        assert len(consumer) == 4 + len(record)
+        assert consumer.Get() == record
+    assert consumer.Get() is None
+    assert len(consumer) == 0
+
+
+def test_full_ring_refuses_records(ring):
+    producer, consumer = ring
+    assert producer.Put(b"a" * 28)
+    assert producer.Put(b"b" * 28)
+    assert not producer.Put(b"c")
+    assert consumer.Get() == b"a" * 28
+    assert producer.Put(b"c" * 28)
+    assert not producer.Put(b"d")
+    assert [consumer.Get(), consumer.Get(), consumer.Get()] == [b"b" * 28, b"c" * 28, None]
+
+
+def test_messages_are_received_in_order(receiver, sender):
+    for i in range(200):
+        assert sender.SendMessage(ADDRESS, _message(f"m{i}"), receiver.ToJson())
+    received = _receive(receiver, 200)
+    assert _msg_ids(received) == [f"m{i}" for i in range(200)]
+    assert received[0]["type"] == "Message"
+
+
+def test_message_handlers_are_triggered(receiver, sender):
+    handled = []
+    receiver.register_event_handler('message', lambda event_type, message, **kwargs: handled.append(message))
+    assert sender.SendMessage(ADDRESS, _message("m1"), receiver.ToJson())
+    assert _msg_ids(_receive(receiver, 1)) == ["m1"]
+    assert _msg_ids(handled) == ["m1"]
+
+
+def test_busy_receiver_stops_reading_until_drained(sender):
+    receiver = SharedMemoryPlug("receiver", scan_interval=0.01, high_water_mark=1, max_pending=1)
+    receiver.start()
+    try:
+        sent = 0
+        while sender.SendMessage(ADDRESS, _message(f"m{sent}"), receiver.ToJson()):
+            sent += 1
+            assert sent < 10000, "the ring never filled up"
+        # the ring is full and the receiver is not reading it
+        assert not sender.SendMessage(ADDRESS, _message("late"), receiver.ToJson())
+        received = _receive(receiver, sent)
+        assert _msg_ids(received) == [f"m{i}" for i in range(sent)]
+        assert sender.SendMessage(ADDRESS, _message("again"), receiver.ToJson())
+        assert _msg_ids(_receive(receiver, 1)) == ["again"]
+    finally:
+        receiver.stop()
+
+
+def test_blocking_handler_does_not_stall_the_reader(receiver):
+    release = threading.Event()
+    handled = []
+
+    def handler(event_type, message, **kwargs):
+        if message["content"]["msg_id"] == "slow":
+            release.wait(5)
+        handled.append(message["content"]["msg_id"])
+
+    receiver.register_event_handler('message', handler)
+    slow, fast = SharedMemoryPlug("slow"), SharedMemoryPlug("fast")
+    try:
+        assert slow.SendMessage(ADDRESS, _message("slow"), receiver.ToJson())
+        time.sleep(0.1)
+        assert fast.SendMessage(ADDRESS, _message("fast"), receiver.ToJson())
+        assert _msg_ids(_receive(receiver, 1)) == ["fast"]
+        assert handled == ["fast"]
+        release.set()
+        assert _msg_ids(_receive(receiver, 1)) == ["slow"]
+    finally:
+        release.set()
+        slow.stop()
+        fast.stop()
+
+
+def _echo(parent_info, child_infos, count):
+    """Run in a child process: receive count messages and send each one back."""
+    plug = SharedMemoryPlug("child", scan_interval=0.01)
+    plug.start()
+    try:
+        child_infos.put(plug.ToJson())
+        for message in _receive(plug, count, timeout=10):
+            reply = dict(message["content"], msg_id="re-" + message["content"]["msg_id"])
+            plug.SendMessage(ADDRESS, reply, parent_info)
+        # let the parent read the replies before the rings are released
+        time.sleep(1)
+    finally:
+        plug.stop()
+
+
+def test_round_trip_between_processes(receiver):
+    context = multiprocessing.get_context("spawn")
+    child_infos = context.Queue()
+    child = context.Process(target=_echo, args=(receiver.ToJson(), child_infos, 10))
+    child.start()
+    try:
+        child_info = child_infos.get(timeout=20)
+        sender = SharedMemoryPlug("sender")
+        try:
+            for i in range(10):
+                assert sender.SendMessage(ADDRESS, _message(f"m{i}"), child_info)
+            replies = _receive(receiver, 10, timeout=10)
+            assert _msg_ids(replies) == [f"re-m{i}" for i in range(10)]
+        finally:
+            sender.stop()
+    finally:
+        child.join(timeout=10)
+        if child.is_alive():
+            child.terminate()
+    assert child.exitcode == 0
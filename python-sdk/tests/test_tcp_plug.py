@@ -0,0 +1,159 @@
+# test_tcp_plug.py tests the framing, busy replies and handler dispatch of TCPPlug in this process
+
+import socket
+import threading
+import time
+
+import pytest
+
+from prompits.AgentAddress import AgentAddress
+from prompits.Message import Message
+from prompits.plugs.TCPPlug import TCPPlug
+
+ADDRESS = AgentAddress("agent1", "plaza")
+
+
+@pytest.fixture
+def server():
+    plug = TCPPlug("server", port=0, is_server=True)
+    yield plug
+    plug.stop()
+
+
+@pytest.fixture
+def client():
+    plug = TCPPlug("client")
+    yield plug
+    plug.stop()
+
+
+def _plug_info(server):
+    return {"host": "localhost", "port": server.port}
+
+
+def _message(msg_id):
+    return Message("Ping", {"n": msg_id}, ADDRESS, [ADDRESS], msg_id=msg_id)
+
+
+def _receive(plug, count, timeout=5):
+    received = []
+    deadline = time.time() + timeout
+    while len(received) < count and time.time() < deadline:
+        message = plug.ReceiveMessage(timeout=0.1)
+        if message is not None:
+            received.append(message)
+    return received
+
+
+def _msg_ids(messages):
+    return [message["content"]["msg_id"] for message in messages]
+
+
+def test_messages_are_received_in_order(server, client):
+    for i in range(100):
+        assert client.SendMessage(ADDRESS, _message(f"m{i}"), _plug_info(server))
+    assert _msg_ids(_receive(server, 100)) == [f"m{i}" for i in range(100)]
+    assert client.Stats()["outbound"] == 1
+
+
+def test_frames_split_and_joined_across_reads(server):
+    frames = b"".join(server._Frame({"type": "Message", "content": _message(f"m{i}").ToJson()}) for i in range(3))
+    with socket.create_connection(("localhost", server.port)) as sock:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # the first frame byte by byte, then the other two in one write
+        first = len(server._Frame({"type": "Message", "content": _message("m0").ToJson()}))
+        for i in range(first):
+            sock.sendall(frames[i:i + 1])
+            time.sleep(0.001)
+        sock.sendall(frames[first:])
+        assert _msg_ids(_receive(server, 3)) == ["m0", "m1", "m2"]
+
+
+def test_oversized_frame_closes_the_connection():
+    server = TCPPlug("server", port=0, is_server=True, max_frame_size=1024)
+    try:
+        with socket.create_connection(("localhost", server.port)) as sock:
+            sock.sendall((4096).to_bytes(4, "big") + b"x" * 16)
+            sock.settimeout(5)
+            assert sock.recv(1) == b""
+        assert server.ReceiveMessage() is None
+    finally:
+        server.stop()
+
+
+def test_busy_server_replies_with_a_busy_status(client):
+    server = TCPPlug("server", port=0, is_server=True, high_water_mark=1)
+    try:
+        assert client.SendMessage(ADDRESS, _message("m1"), _plug_info(server))
+        assert client.SendMessage(ADDRESS, _message("m2"), _plug_info(server))
+        status = _receive(client, 1)
+        assert status and status[0]["type"] == "StatusMessage"
+        assert status[0]["content"]["status"] == "busy"
+        assert _msg_ids(_receive(server, 2, timeout=0.5)) == ["m1"]
+    finally:
+        server.stop()
+
+
+def test_many_clients(server):
+    clients = [TCPPlug(f"client{i}") for i in range(50)]
+    try:
+        threads = [threading.Thread(target=lambda c=c, i=i: [c.SendMessage(ADDRESS, _message(f"c{i}m{j}"), _plug_info(server))
+                                                             for j in range(5)])
+                   for i, c in enumerate(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        received = _msg_ids(_receive(server, 250))
+        assert sorted(received) == sorted(f"c{i}m{j}" for i in range(50) for j in range(5))
+        # each connection is handled in order
+        for i in range(50):
+            assert [m for m in received if m.startswith(f"c{i}m")] == [f"c{i}m{j}" for j in range(5)]
+        assert server.Stats()["connections"] == 50
+    finally:
+        for c in clients:
+            c.stop()
+
+
+def test_blocking_handler_does_not_hold_up_other_connections(server):
+    release = threading.Event()
+    handled = []
+
+    def handler(plug, message, **kwargs):
+        if message["content"]["msg_id"] == "slow":
+            release.wait(5)
+        handled.append(message["content"]["msg_id"])
+
+    server.register_event_handler('message', handler)
+    slow, fast = TCPPlug("slow"), TCPPlug("fast")
+    try:
+        slow.SendMessage(ADDRESS, _message("slow"), _plug_info(server))
+        time.sleep(0.1)
+        fast.SendMessage(ADDRESS, _message("fast"), _plug_info(server))
+        assert _msg_ids(_receive(server, 1)) == ["fast"]
+        assert handled == ["fast"]
+        release.set()
+        assert _msg_ids(_receive(server, 1)) == ["slow"]
+    finally:
+        release.set()
+        slow.stop()
+        fast.stop()
+
+
+def test_reads_pause_while_messages_wait_for_a_worker():
+    server = TCPPlug("server", port=0, is_server=True, max_pending=4)
+    release = threading.Event()
+    server.register_event_handler('message', lambda plug, message, **kwargs: release.wait(5))
+    client = TCPPlug("client")
+    try:
+        for i in range(50):
+            client.SendMessage(ADDRESS, _message(f"m{i}"), _plug_info(server))
+        time.sleep(0.3)
+        stats = server.Stats()
+        assert stats["dispatch_pending"] < 50
+        release.set()
+        assert _msg_ids(_receive(server, 50)) == [f"m{i}" for i in range(50)]
+    finally:
+        release.set()
+        client.stop()
+        server.stop()